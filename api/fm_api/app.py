@@ -6,8 +6,8 @@ from flask import Flask
 from fm_database.database import get_session
 from fm_database.models.user import User
 
-from fm_api import auth, device, grainbin, health, user
-from fm_api.extensions import cors, jwt, smorest_api
+from fm_api import auth, changes, device, grainbin, health, live, user
+from fm_api.extensions import cors, jwt, live_events, response_cache, smorest_api
 
 
 def create_app(config=None, testing=False):
@@ -53,14 +53,18 @@ def register_extensions(app):
     smorest_api.init_app(app)
     jwt.init_app(app)
     cors.init_app(app)
+    response_cache.init_app(app)
+    live_events.init_app(app)
 
 
 def register_blueprints():
     """Register Flask blueprints."""
     smorest_api.register_blueprint(auth.views.blueprint)
+    smorest_api.register_blueprint(changes.views.blueprint)
     smorest_api.register_blueprint(device.views.blueprint)
     smorest_api.register_blueprint(grainbin.views.blueprint)
     smorest_api.register_blueprint(health.views.blueprint)
+    smorest_api.register_blueprint(live.views.blueprint)
     smorest_api.register_blueprint(user.views.blueprint)
 
 
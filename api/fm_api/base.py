@@ -1,10 +1,49 @@
 """Base Schema setup for api."""
 
+import datetime as dt
+import json
+from collections.abc import Callable, Sequence
+from functools import wraps
+from typing import Any
+
+import flask_smorest
+from flask import g, make_response, request
+from flask_smorest import abort
+from flask_smorest.exceptions import NotModified
+from flask_smorest.pagination import PaginationParameters
 from fm_database.database import get_session
+from fm_database.paginate import CachedCount, KeysetPagination, estimated_count
+from fm_database.rollups import ROLLUP_PERIODS
+from fm_database.series import SERIES_BUCKETS
+from marshmallow.fields import DateTime, Float, Int, Str
+from marshmallow.validate import OneOf
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema, SQLAlchemyAutoSchemaOpts
+from sqlalchemy import Select, func, select
+from sqlalchemy.orm import Session
+from werkzeug.http import http_date, quote_etag
+
+from fm_api.cache import CachedResponse
+from fm_api.export import EXPORT_FORMATS
+from fm_api.extensions import response_cache
 
 session = get_session()
 
+# the number of updates of a device or grainbin, estimated by the query planner
+# once a minute, so no page reads every update to count them. The
+# total_updates counters only grow, so they overcount once old updates are
+# pruned or their partitions dropped.
+update_count = CachedCount(estimated_count, ttl=60)
+# the range of rollups returned when no start is given.
+ROLLUP_DEFAULT_RANGE = {"hour": dt.timedelta(days=2), "day": dt.timedelta(days=90)}
+# the range of series returned when no start is given.
+SERIES_DEFAULT_RANGE = {
+    "minute": dt.timedelta(days=1),
+    "hour": dt.timedelta(days=30),
+    "day": dt.timedelta(days=365),
+    "week": dt.timedelta(days=365),
+    "month": dt.timedelta(days=3 * 365),
+}
+
 
 # pylint: disable=too-few-public-methods
 class BaseOpts(SQLAlchemyAutoSchemaOpts):
@@ -27,3 +66,285 @@ class BaseSchema(SQLAlchemyAutoSchema):
     """
 
     OPTIONS_CLASS = BaseOpts
+
+
+class RollupArgsSchema(BaseSchema):
+    """Marshmallow schema for the query arguments of the rollup endpoints."""
+
+    class Meta:  # pylint: disable=too-few-public-methods
+        """Meta configuration for RollupArgsSchema."""
+
+        ordered = True
+
+    period = Str(load_default="hour", validate=OneOf(ROLLUP_PERIODS))
+    start = DateTime()
+    end = DateTime()
+
+
+def rollup_range(args: dict) -> tuple[dt.datetime, dt.datetime]:
+    """Return the start and end of the rollups to get from the query arguments.
+
+    Without an end the rollups up to now are returned. Without a start the
+    rollups of the default range of the period before the end are returned.
+    """
+
+    end = args.get("end") or dt.datetime.now()
+    start = args.get("start") or end - ROLLUP_DEFAULT_RANGE[args["period"]]
+    return start, end
+
+
+class SeriesArgsSchema(BaseSchema):
+    """Marshmallow schema for the query arguments of the series endpoints."""
+
+    class Meta:  # pylint: disable=too-few-public-methods
+        """Meta configuration for SeriesArgsSchema."""
+
+        ordered = True
+
+    bucket = Str(load_default="hour", validate=OneOf(SERIES_BUCKETS))
+    start = DateTime()
+    end = DateTime()
+
+
+class SeriesSchema(BaseSchema):
+    """Marshmallow schema for the aggregates of a bucket of a series."""
+
+    bucket = DateTime()
+    avg = Float()
+    min = Float()
+    max = Float()
+    count = Int()
+
+
+def series_range(args: dict) -> tuple[dt.datetime, dt.datetime]:
+    """Return the start and end of the series to get from the query arguments.
+
+    Without an end the series up to now is returned. Without a start the
+    series of the default range of the bucket before the end is returned.
+    """
+
+    end = args.get("end") or dt.datetime.now()
+    start = args.get("start") or end - SERIES_DEFAULT_RANGE[args["bucket"]]
+    return start, end
+
+
+class ExportArgsSchema(BaseSchema):
+    """Marshmallow schema for the query arguments of the export endpoints."""
+
+    class Meta:  # pylint: disable=too-few-public-methods
+        """Meta configuration for ExportArgsSchema."""
+
+        ordered = True
+
+    format = Str(load_default="csv", validate=OneOf(EXPORT_FORMATS))
+    start = DateTime()
+    end = DateTime()
+
+
+def export_range(select_stm: Select, timestamp: Any, args: dict) -> Select:
+    """Return select_stm limited to the updates from the start up to the end in args.
+
+    Without a start or an end the updates are not limited on that side.
+    """
+
+    if args.get("start") is not None:
+        select_stm = select_stm.where(timestamp >= args["start"])
+    if args.get("end") is not None:
+        select_stm = select_stm.where(timestamp < args["end"])
+    return select_stm
+
+
+class Blueprint(flask_smorest.Blueprint):  # pylint: disable=too-many-ancestors
+    """A flask_smorest Blueprint with cursor pagination and cheap conditional GETs.
+
+    A view that pages with a cursor (see cursor_page) sets the next_cursor of
+    the pagination parameters. The X-Pagination header then holds the page
+    size and the cursor of the next page instead of the page numbers.
+
+    A view decorated with etag can call set_version with a cheap version of
+    its resource (eg. the total_updates and last_updated of a device) before
+    it queries the resource. The ETag and Last-Modified headers are set from
+    the version, and a request whose If-None-Match or If-Modified-Since
+    matches gets a 304 Not Modified without the resource being queried or
+    serialized.
+
+    A view decorated with cached, above etag, has its serialized responses
+    cached by the version of its resource (see fm_api.cache) and calls
+    set_version itself.
+    """
+
+    def set_version(self, version: Any, last_modified: dt.datetime | None = None):
+        """Set the ETag and Last-Modified of the response from the version of its resource.
+
+        The ETag is computed from the version and the query arguments. Raises
+        NotModified if the If-None-Match header holds the ETag or, without an
+        If-None-Match header, if the resource was not modified since the
+        If-Modified-Since header. last_modified is a naive UTC datetime.
+        """
+
+        if not self._is_etag_enabled():
+            return
+
+        # the datetimes of the version are hashed as strings
+        etag_data = json.loads(
+            json.dumps(
+                {"version": version, "args": sorted(request.args.items(multi=True))},
+                default=str,
+            )
+        )
+        etag = self._generate_etag(etag_data)
+        headers = {"ETag": quote_etag(etag)}
+        if last_modified is not None:
+            last_modified = last_modified.replace(microsecond=0, tzinfo=dt.timezone.utc)
+            headers["Last-Modified"] = http_date(last_modified)
+
+        if request.if_none_match:
+            not_modified = etag in request.if_none_match
+        elif last_modified is None or request.if_modified_since is None:
+            not_modified = False
+        else:
+            not_modified = last_modified <= request.if_modified_since
+        if not_modified:
+            error = NotModified()
+            error.data = {"headers": headers}
+            raise error
+
+        g.last_modified = last_modified
+        self.set_etag(etag_data)
+
+    def _set_etag_in_response(self, response):
+        """Set the ETag, and the Last-Modified given to set_version, in the response."""
+
+        super()._set_etag_in_response(response)
+        last_modified = g.pop("last_modified", None)
+        if last_modified is not None:
+            response.last_modified = last_modified
+
+    def cached(self, version: Callable[..., tuple | None]):
+        """Decorator caching the responses of a view by the version of its resource.
+
+        version is called with the arguments of the URL and returns the version
+        of the resource, whose last item is its last_updated (eg. with
+        record_version), or None if there is no resource. A cached response is
+        returned as is, or as a 304 Not Modified if it matches the request.
+        Otherwise the version is set (see set_version) and a successful
+        response of the view is cached.
+        """
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                current = version(**kwargs)
+                if current is None:
+                    return view(*args, **kwargs)
+
+                endpoint = request.endpoint or view.__qualname__
+                key = response_cache.make_key(
+                    endpoint,
+                    sorted(kwargs.items()),
+                    sorted(request.args.items(multi=True)),
+                    current,
+                )
+                entry = response_cache.get(endpoint, key)
+                if entry is not None:
+                    response = make_response(entry.body, entry.status, entry.headers)
+                    return response.make_conditional(request)
+
+                self.set_version(current, current[-1])
+                response = view(*args, **kwargs)
+                if response.status_code == 200:
+                    response_cache.set(
+                        key,
+                        CachedResponse(
+                            status=response.status_code,
+                            headers=list(response.headers),
+                            body=response.get_data(),
+                        ),
+                    )
+                return response
+
+            return wrapper
+
+        return decorator
+
+    def _set_pagination_metadata(self, page_params, result, headers):
+        """Add the cursor pagination metadata to the headers in cursor mode."""
+
+        if not hasattr(page_params, "next_cursor"):
+            return super()._set_pagination_metadata(page_params, result, headers)
+
+        metadata = {"page_size": page_params.page_size}
+        if page_params.next_cursor is not None:
+            metadata["next_cursor"] = page_params.next_cursor
+        headers = headers or {}
+        headers[self.PAGINATION_HEADER_NAME] = json.dumps(metadata)
+        return result, headers
+
+
+class CursorArgsSchema(BaseSchema):
+    """Marshmallow schema for the cursor query argument of paginated endpoints."""
+
+    cursor = Str()
+
+
+def cursor_page(
+    db_session: Session,
+    select_stm: Select,
+    key: Sequence[Any],
+    cursor: str,
+    pagination_parameters: PaginationParameters,
+) -> list:
+    """Return the page of select_stm after the cursor, newest key first.
+
+    The page size is taken from the pagination parameters, and the cursor of
+    the next page is set on them. An empty cursor returns the first page. An
+    invalid cursor aborts the request with a 400 error.
+    """
+
+    try:
+        pagination = KeysetPagination(
+            db_session,
+            select_stm,
+            key,
+            cursor=cursor,
+            per_page=pagination_parameters.page_size,
+        )
+    except ValueError as error:
+        abort(400, message=str(error))
+
+    # the items are not counted, item_count only marks the page as paginated
+    pagination_parameters.item_count = len(pagination.items)
+    pagination_parameters.next_cursor = pagination.next_cursor
+    return list(pagination.items)
+
+
+def record_version(model: Any, record_id: int) -> tuple | None:
+    """Return the (total_updates, last_updated) of a Device or Grainbin, or None.
+
+    The version of the record and its updates, read from its row only.
+    """
+
+    result = get_session().execute(
+        select(model.total_updates, model.last_updated).where(model.id == record_id)
+    )
+    version = result.one_or_none()
+    return None if version is None else tuple(version)
+
+
+def table_version(model: Any, *where: Any) -> tuple:
+    """Return the (count, total_updates, last_updated) of the Devices or Grainbins.
+
+    The version of a list of records: their count, the sum of their
+    total_updates and the latest of their last_updated. The count changes
+    when a record is deleted, and the others when one is added or updated.
+    """
+
+    # pylint: disable=not-callable
+    result = get_session().execute(
+        select(
+            func.count(model.id),
+            func.coalesce(func.sum(model.total_updates), 0),
+            func.max(model.last_updated),
+        ).where(*where)
+    )
+    return tuple(result.one())
@@ -0,0 +1,239 @@
+"""
+Cache of serialized API responses, keyed by the version of their resource.
+
+The device and grainbin resources only change when an update is ingested or
+they are edited, which changes their total_updates or last_updated. A view
+opts in with the cached decorator of the api Blueprint, which keys the
+response by the endpoint, its arguments and the version of the resource. A
+changed resource has a new key, so entries are never purged: stale entries
+are just not read again and age out of the cache. Every entry also expires
+after FM_API_RESPONSE_CACHE_TTL seconds, which bounds how long a response is
+served if its rows change without a new version.
+
+The cache of each API process is a bounded LRU in memory. With
+FM_API_RESPONSE_CACHE_URL set to a redis:// URL the entries are shared by all
+the API processes in Redis instead, which should then be configured with an
+LRU maxmemory-policy. The Redis cache needs the redis package.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+from flask import current_app
+
+try:
+    import redis
+except ImportError:  # pragma: no cover
+    redis = None
+
+
+@dataclass
+class CachedResponse:
+    """The status, headers and body of a serialized response."""
+
+    status: int
+    headers: list[tuple[str, str]]
+    body: bytes
+
+
+class MemoryBackend:
+    """A thread safe, bounded LRU cache of responses in this process.
+
+    Entries expire after ttl seconds, like in Redis.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_size: int, ttl: int = 3600):
+        """Create the cache. A max_size of 0 disables the cache."""
+
+        self.max_size = max(0, max_size)
+        self.ttl = ttl
+        # the responses and the monotonic time they expire at
+        self._entries: OrderedDict[str, tuple[CachedResponse, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of cached responses."""
+        return len(self._entries)
+
+    def get(self, key: str) -> CachedResponse | None:
+        """Return the response cached for key, or None."""
+
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            entry, expires = item
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CachedResponse) -> None:
+        """Cache the response for key, evicting the least recently used response."""
+
+        if self.max_size == 0:
+            return
+        with self._lock:
+            self._entries[key] = (entry, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all cached responses."""
+
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend:
+    """A cache of responses in Redis, shared by all the API processes.
+
+    Entries expire after ttl seconds, and are evicted by Redis when it runs
+    out of memory.
+    """
+
+    name = "redis"
+    prefix = "fm_api:response:"
+
+    def __init__(self, url: str, ttl: int):
+        """Connect to the Redis server at url. Raises an ImportError without redis."""
+
+        if redis is None:
+            raise ImportError("the shared response cache needs the redis package")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def __len__(self) -> int:
+        """Return the number of cached responses."""
+        return sum(1 for _ in self.client.scan_iter(match=f"{self.prefix}*"))
+
+    def get(self, key: str) -> CachedResponse | None:
+        """Return the response cached for key, or None."""
+
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        entry = json.loads(value)
+        return CachedResponse(
+            status=entry["status"],
+            headers=[tuple(header) for header in entry["headers"]],
+            body=entry["body"].encode("utf-8"),
+        )
+
+    def set(self, key: str, entry: CachedResponse) -> None:
+        """Cache the response for key."""
+
+        value = json.dumps({**asdict(entry), "body": entry.body.decode("utf-8")})
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    def clear(self) -> None:
+        """Remove all cached responses."""
+
+        for key in self.client.scan_iter(match=f"{self.prefix}*"):
+            self.client.delete(key)
+
+
+@dataclass
+class _CacheState:
+    """The backend and the hit/miss counters of each endpoint of an app."""
+
+    backend: MemoryBackend | RedisBackend
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    counters: dict[str, list[int]] = field(default_factory=dict)
+
+
+class ResponseCache:
+    """The Flask extension of the response cache."""
+
+    def __init__(self, app=None):
+        """Create the extension, and initialize it for app if given."""
+
+        if app is not None:
+            self.init_app(app)
+
+    @staticmethod
+    def init_app(app) -> None:
+        """Create the cache of app from its RESPONSE_CACHE_* configuration."""
+
+        url = app.config.get("RESPONSE_CACHE_URL")
+        ttl = app.config.get("RESPONSE_CACHE_TTL", 3600)
+        backend: MemoryBackend | RedisBackend
+        if url:
+            backend = RedisBackend(url, ttl)
+        else:
+            backend = MemoryBackend(app.config.get("RESPONSE_CACHE_SIZE", 1024), ttl)
+        app.extensions["response_cache"] = _CacheState(backend)
+
+    @property
+    def _state(self) -> _CacheState:
+        """Return the cache of the current app."""
+
+        state: _CacheState = current_app.extensions["response_cache"]
+        return state
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Return the cache key of parts, eg. the endpoint, arguments and version."""
+
+        data = json.dumps(parts, default=str, sort_keys=True)
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    def get(self, endpoint: str, key: str) -> CachedResponse | None:
+        """Return the response of endpoint cached for key, or None."""
+
+        state = self._state
+        entry = state.backend.get(key)
+        with state.lock:
+            counters = state.counters.setdefault(endpoint, [0, 0])
+            counters[0 if entry is not None else 1] += 1
+        return entry
+
+    def set(self, key: str, entry: CachedResponse) -> None:
+        """Cache the response for key."""
+        self._state.backend.set(key, entry)
+
+    def clear(self) -> None:
+        """Remove all cached responses and reset the counters."""
+
+        state = self._state
+        state.backend.clear()
+        with state.lock:
+            state.counters.clear()
+
+    def stats(self) -> dict:
+        """Return the size of the cache and the hit/miss counters of each endpoint."""
+
+        state = self._state
+        with state.lock:
+            endpoints = {
+                endpoint: _counter_stats(hits, misses)
+                for endpoint, (hits, misses) in sorted(state.counters.items())
+            }
+            hits = sum(counters[0] for counters in state.counters.values())
+            misses = sum(counters[1] for counters in state.counters.values())
+        return {
+            "backend": state.backend.name,
+            "size": len(state.backend),
+            **_counter_stats(hits, misses),
+            "endpoints": endpoints,
+        }
+
+
+def _counter_stats(hits: int, misses: int) -> dict:
+    """Return the hits, misses and hit rate of the counters."""
+
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+    }
@@ -0,0 +1,3 @@
+"""API for the incremental changes of devices, grainbins and their updates."""
+
+from .views import blueprint  # noqa: F401
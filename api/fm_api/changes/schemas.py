@@ -0,0 +1,26 @@
+"""Schema for the changes."""
+
+from marshmallow.fields import Bool, Int, List, Nested, Str
+
+from ..base import BaseSchema
+from ..device.schemas import DeviceSchema, DeviceUpdateSchema
+from ..grainbin.schemas import GrainbinSchema, GrainbinUpdateSchema
+
+
+class ChangesArgsSchema(BaseSchema):
+    """Marshmallow schema for the query arguments of the changes."""
+
+    since = Str(load_default="")
+
+
+class ChangesSchema(BaseSchema):
+    """Marshmallow schema of the devices, grainbins and updates changed since a cursor."""
+
+    cursor = Str()
+    has_more = Bool()
+    devices = Nested(DeviceSchema, many=True)
+    grainbins = Nested(GrainbinSchema, many=True)
+    device_updates = Nested(DeviceUpdateSchema, many=True)
+    grainbin_updates = Nested(GrainbinUpdateSchema, many=True)
+    deleted_devices = List(Int())
+    deleted_grainbins = List(Int())
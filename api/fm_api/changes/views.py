@@ -0,0 +1,307 @@
+"""Views for the changes API."""
+
+import datetime as dt
+from dataclasses import dataclass, field
+from typing import Any, NamedTuple
+
+from flask.views import MethodView
+from flask_smorest import abort
+from fm_database.database import get_session
+from fm_database.models.device import Device, DeviceUpdate, Grainbin, GrainbinUpdate
+from fm_database.paginate import decode_cursor, encode_cursor
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session, joinedload
+
+from fm_api.base import Blueprint
+from fm_api.settings import get_config
+
+from .schemas import ChangesArgsSchema, ChangesSchema
+
+config = get_config()
+
+# the most device update rows, and grainbin update rows, returned by a request.
+CHANGES_MAX_UPDATES = 1000
+_EPOCH = dt.datetime(1970, 1, 1)
+
+blueprint = Blueprint(
+    "changes",
+    "changes",
+    url_prefix=f"{config.API_PREFIX}/changes",
+    description="The changes of the devices, grainbins and their updates",
+)
+
+
+def _micros(value: dt.datetime) -> int:
+    """Return a naive datetime in microseconds since the epoch."""
+    return (value - _EPOCH) // dt.timedelta(microseconds=1)
+
+
+def _from_micros(value: int) -> dt.datetime:
+    """Return the naive datetime of microseconds since the epoch."""
+    return _EPOCH + dt.timedelta(microseconds=value)
+
+
+class Mark(NamedTuple):
+    """What a client has of a device or grainbin.
+
+    update_index is that of the newest update of the record the client has,
+    and last_updated that of the record when it was returned.
+    """
+
+    update_index: int
+    last_updated: dt.datetime
+
+
+@dataclass
+class ChangesCursor:
+    """The position of a client in the changes, a Mark for each record it has.
+
+    The cursor holds three integers for each device and grainbin, however many
+    updates they have.
+    """
+
+    device_marks: dict[int, Mark] = field(default_factory=dict)
+    grainbin_marks: dict[int, Mark] = field(default_factory=dict)
+
+    def encode(self) -> str:
+        """Return the opaque cursor."""
+
+        values = [len(self.device_marks)]
+        for marks in (self.device_marks, self.grainbin_marks):
+            for record_id, mark in sorted(marks.items()):
+                values.extend(
+                    [record_id, mark.update_index, _micros(mark.last_updated)]
+                )
+        cursor: str = encode_cursor(values)
+        return cursor
+
+    @classmethod
+    def decode(cls, cursor: str) -> "ChangesCursor":
+        """Return the position of cursor.
+
+        Raises a ValueError if the cursor is not valid.
+        """
+
+        values = decode_cursor(cursor, None)
+        if not values or (len(values) - 1) % 3 or not 0 <= values[0] * 3 < len(values):
+            raise ValueError(f"invalid cursor '{cursor}'")
+        split = 1 + values[0] * 3
+        try:
+            return cls(_decode_marks(values[1:split]), _decode_marks(values[split:]))
+        except OverflowError as error:
+            raise ValueError(f"invalid cursor '{cursor}'") from error
+
+
+def _decode_marks(values: list[int]) -> dict[int, Mark]:
+    """Return the marks of (record id, update_index, last_updated) values."""
+
+    return {
+        values[index]: Mark(values[index + 1], _from_micros(values[index + 2]))
+        for index in range(0, len(values), 3)
+    }
+
+
+class RecordChanges(NamedTuple):
+    """The changes of the records of a model since the marks of a cursor."""
+
+    record_ids: set[int]
+    updates: list
+    deleted: list[int]
+    has_more: bool
+
+
+def new_updates(
+    session: Session, record_key: Any, after: dict[int, int]
+) -> tuple[list, bool]:
+    """Return the updates of each record after its update_index in after.
+
+    record_key is the column of the updates that holds the record id. The
+    updates are ordered by record and update_index, and at most
+    CHANGES_MAX_UPDATES are returned, without splitting the rows of an update
+    over two requests. Returns the updates and whether more are left.
+
+    The updates of a record are stored in the order of their update_index, as
+    the index is allocated with a lock on the record that is held until the
+    update commits. So once an update is returned, no update of its record
+    with a lower index is stored later.
+    """
+
+    if not after:
+        return [], False
+    update_model = record_key.class_
+    updates = list(
+        session.scalars(
+            select(update_model)
+            .where(
+                or_(
+                    *(
+                        and_(record_key == record_id, update_model.update_index > index)
+                        for record_id, index in after.items()
+                    )
+                )
+            )
+            .order_by(record_key, update_model.update_index, update_model.id)
+            .limit(CHANGES_MAX_UPDATES + 1)
+        )
+    )
+    if len(updates) <= CHANGES_MAX_UPDATES:
+        return updates, False
+
+    def key(update) -> tuple[int, int]:
+        return getattr(update, record_key.key), update.update_index
+
+    cut = key(updates.pop())
+    while len(updates) > 1 and key(updates[-1]) == cut:
+        updates.pop()
+    return updates, True
+
+
+def changes_since(
+    session: Session, model: Any, record_key: Any, marks: dict[int, Mark]
+) -> RecordChanges:
+    """Return the changes of the records of model since marks.
+
+    A record changed if it has no mark, or its last_updated differs from that
+    of its mark, or it has updates after the update_index of its mark.
+    """
+
+    states = session.execute(
+        select(model.id, model.last_updated, model.total_updates)
+    ).all()
+    changed = set()
+    after = {}
+    for state in states:
+        mark = marks.get(state.id)
+        if mark is None or mark.last_updated != state.last_updated:
+            changed.add(state.id)
+        update_index = mark.update_index if mark is not None else 0
+        if state.total_updates > update_index:
+            after[state.id] = update_index
+    updates, has_more = new_updates(session, record_key, after)
+    return RecordChanges(
+        record_ids=changed | {getattr(update, record_key.key) for update in updates},
+        updates=updates,
+        deleted=sorted(set(marks) - {state.id for state in states}),
+        has_more=has_more,
+    )
+
+
+def all_records(session: Session, model: Any) -> RecordChanges:
+    """Return every record of model as changed, without updates."""
+
+    return RecordChanges(set(session.scalars(select(model.id))), [], [], False)
+
+
+def advance_marks(
+    marks: dict[int, Mark],
+    records: list,
+    changes: RecordChanges,
+    record_key: Any,
+    initial: bool,
+) -> None:
+    """Update marks to what the client has once it receives the changes.
+
+    On the first request the client starts at the newest update of each record.
+    """
+
+    for record_id in changes.deleted:
+        del marks[record_id]
+    indexes = {
+        getattr(update, record_key.key): update.update_index
+        for update in changes.updates
+    }
+    for record in records:
+        if record.id in indexes:
+            update_index = indexes[record.id]
+        elif initial:
+            update_index = record.total_updates
+        elif record.id in marks:
+            update_index = marks[record.id].update_index
+        else:
+            update_index = 0
+        marks[record.id] = Mark(update_index, record.last_updated)
+
+
+def records_by_id(session: Session, model: Any, record_ids: set[int]) -> list:
+    """Return the records of model with record_ids, ordered by id."""
+
+    if not record_ids:
+        return []
+    select_stm = select(model).where(model.id.in_(record_ids)).order_by(model.id)
+    if model is Grainbin:
+        select_stm = select_stm.options(joinedload(Grainbin.device))
+    return list(session.scalars(select_stm))
+
+
+@blueprint.route("/")
+class Changes(MethodView):
+    """MethodView for the changes since a cursor."""
+
+    @staticmethod
+    @blueprint.arguments(ChangesArgsSchema, location="query")
+    @blueprint.response(200, ChangesSchema())
+    def get(args):
+        """Get the devices, grainbins and updates changed since a cursor.
+
+        For clients that refresh instead of holding the live stream open. The
+        first request, without since, returns every device and grainbin but
+        no updates. Each response has the cursor to pass as since to the next
+        request, which returns the devices and grainbins that were edited or
+        have new updates, their new updates in the order of their
+        update_index, and the ids of the devices and grainbins deleted since.
+
+        The cursor holds the update_index and last_updated the client has of
+        each device and grainbin, so it grows with the number of devices and
+        grainbins but not with their updates.
+
+        At most 1000 device update rows and 1000 grainbin update rows are
+        returned at once. When more are left has_more is true, and the next
+        request returns them. A device or grainbin can be returned again, so
+        clients should replace them by id. Updates removed by the retention
+        policies are not reported.
+        """
+
+        session = get_session()
+        initial = not args["since"]
+        if initial:
+            cursor = ChangesCursor()
+            device_changes = all_records(session, Device)
+            grainbin_changes = all_records(session, Grainbin)
+        else:
+            try:
+                cursor = ChangesCursor.decode(args["since"])
+            except ValueError as error:
+                abort(400, message=str(error))
+            device_changes = changes_since(
+                session, Device, DeviceUpdate.device_id, cursor.device_marks
+            )
+            grainbin_changes = changes_since(
+                session, Grainbin, GrainbinUpdate.grainbin_id, cursor.grainbin_marks
+            )
+
+        devices = records_by_id(session, Device, device_changes.record_ids)
+        grainbins = records_by_id(session, Grainbin, grainbin_changes.record_ids)
+        advance_marks(
+            cursor.device_marks,
+            devices,
+            device_changes,
+            DeviceUpdate.device_id,
+            initial,
+        )
+        advance_marks(
+            cursor.grainbin_marks,
+            grainbins,
+            grainbin_changes,
+            GrainbinUpdate.grainbin_id,
+            initial,
+        )
+        return {
+            "cursor": cursor.encode(),
+            "has_more": device_changes.has_more or grainbin_changes.has_more,
+            "devices": devices,
+            "grainbins": grainbins,
+            "device_updates": device_changes.updates,
+            "grainbin_updates": grainbin_changes.updates,
+            "deleted_devices": device_changes.deleted,
+            "deleted_grainbins": grainbin_changes.deleted,
+        }
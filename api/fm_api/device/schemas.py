@@ -2,9 +2,12 @@
 
 from flask import url_for
 from fm_database.models.device import Device, DeviceUpdate
-from marshmallow.fields import Method
+from fm_database.models.rollup import DeviceRollup
+from fm_database.series import DEVICE_SERIES_COLUMNS
+from marshmallow.fields import Float, Method, Str
+from marshmallow.validate import OneOf
 
-from ..base import BaseSchema
+from ..base import BaseSchema, SeriesArgsSchema
 
 
 class DeviceSchema(BaseSchema):
@@ -38,3 +41,24 @@ class DeviceUpdateSchema(BaseSchema):
         model = DeviceUpdate
         include_relationships = True
         load_instance = True
+
+
+class DeviceRollupSchema(BaseSchema):
+    """Marshmallow DeviceRollup Schema."""
+
+    class Meta:  # pylint: disable=too-few-public-methods
+        """Meta configuration for DeviceRollupSchema."""
+
+        exclude = ("id",)
+
+        model = DeviceRollup
+        include_fk = True
+
+    interior_avg = Float(dump_only=True)
+    exterior_avg = Float(dump_only=True)
+
+
+class DeviceSeriesArgsSchema(SeriesArgsSchema):  # pylint: disable=too-many-ancestors
+    """Marshmallow schema for the query arguments of the device series."""
+
+    column = Str(load_default="interior_temp", validate=OneOf(DEVICE_SERIES_COLUMNS))
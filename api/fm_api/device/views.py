@@ -4,16 +4,38 @@ from flask import current_app
 from flask.views import MethodView
 
 # from flask_jwt_extended import jwt_required
-from flask_smorest import Blueprint, abort
+from flask_smorest import abort
 from flask_smorest.pagination import PaginationParameters
 from fm_database.database import get_session
 from fm_database.models.device import Device, DeviceUpdate
+from fm_database.models.rollup import DeviceRollup
 from fm_database.paginate import Pagination
+from fm_database.series import device_series
 from sqlalchemy import select
 
+from fm_api.base import (
+    Blueprint,
+    CursorArgsSchema,
+    ExportArgsSchema,
+    RollupArgsSchema,
+    SeriesSchema,
+    cursor_page,
+    export_range,
+    record_version,
+    rollup_range,
+    series_range,
+    table_version,
+    update_count,
+)
+from fm_api.export import EXPORT_FORMATS, export_response
 from fm_api.settings import get_config
 
-from .schemas import DeviceSchema, DeviceUpdateSchema
+from .schemas import (
+    DeviceRollupSchema,
+    DeviceSchema,
+    DeviceSeriesArgsSchema,
+    DeviceUpdateSchema,
+)
 
 config = get_config()
 
@@ -32,6 +54,8 @@ class Devices(MethodView):
     # decorators = [jwt_required()]
 
     @staticmethod
+    @blueprint.cached(lambda: table_version(Device))
+    @blueprint.etag
     @blueprint.response(200, DeviceSchema(many=True))
     def get():
         """List all Devices."""
@@ -56,6 +80,8 @@ class DevicesById(MethodView):
     # decorators = [jwt_required()]
 
     @staticmethod
+    @blueprint.cached(lambda device_id: record_version(Device, device_id))
+    @blueprint.etag
     @blueprint.response(200, DeviceSchema)
     def get(device_id):
         """Get Device by ID."""
@@ -73,25 +99,42 @@ class DeviceUpdates(MethodView):
     # decorators = [jwt_required()]
 
     @staticmethod
+    @blueprint.cached(lambda device_id: record_version(Device, device_id))
+    @blueprint.etag
+    @blueprint.arguments(CursorArgsSchema, location="query")
     @blueprint.response(200, DeviceUpdateSchema(many=True))
     @blueprint.paginate()
-    def get(device_id: int, pagination_parameters: PaginationParameters):
+    def get(args, device_id: int, pagination_parameters: PaginationParameters):
         """Get DeviceUpdates for a given Device ID with Pagination.
 
         Default pagination parameters are 10 per page starting at page 1.
         Ordered by most recent updates first.
+
+        With a cursor argument the updates are paged with a cursor instead
+        of a page number, which is as fast for old updates as for new ones.
+        An empty cursor returns the first page, and the X-Pagination header
+        holds the next_cursor of the next page.
+
+        The ETag and Last-Modified are those of the device, which change with
+        each new update.
         """
         session = get_session()
-        select_stm = (
-            select(DeviceUpdate)
-            .where(DeviceUpdate.device_id == device_id)
-            .order_by(DeviceUpdate.update_index.desc())
-        )
+        select_stm = select(DeviceUpdate).where(DeviceUpdate.device_id == device_id)
+        if "cursor" in args:
+            return cursor_page(
+                session,
+                select_stm,
+                (DeviceUpdate.update_index, DeviceUpdate.id),
+                args["cursor"],
+                pagination_parameters,
+            )
+
         device_updates = Pagination(
             session,
-            select_stm,
+            select_stm.order_by(DeviceUpdate.update_index.desc()),
             page=pagination_parameters.page,
             per_page=pagination_parameters.page_size,
+            count=update_count,
         )
 
         pagination_parameters.item_count = device_updates.total
@@ -105,6 +148,8 @@ class DeviceUpdatesLatest(MethodView):
     # decorators = [jwt_required()]
 
     @staticmethod
+    @blueprint.cached(lambda device_id: record_version(Device, device_id))
+    @blueprint.etag
     @blueprint.response(200, DeviceUpdateSchema)
     def get(device_id):
         """Get the latest DeviceUpdate for a given Device ID."""
@@ -120,3 +165,112 @@ class DeviceUpdatesLatest(MethodView):
         if device_update is None:
             abort(404, message=f"Device with device id: {device_id} not found.")
         return device_update
+
+
+@blueprint.route("/<int:device_id>/updates/export")
+class DeviceUpdatesExport(MethodView):
+    """MethodView for the export of the DeviceUpdates of a device."""
+
+    # decorators = [jwt_required()]
+
+    @staticmethod
+    @blueprint.arguments(ExportArgsSchema, location="query")
+    @blueprint.response(
+        200,
+        description="The DeviceUpdates as CSV or NDJSON.",
+        content_type=EXPORT_FORMATS["csv"],
+    )
+    def get(args, device_id):
+        """Export the DeviceUpdates of a Device as CSV or NDJSON.
+
+        The updates from start up to end are streamed as they are read, so
+        the whole history of a device can be exported. Without a start or an
+        end all the updates are exported. Ordered by update index, oldest first.
+        """
+
+        if Device.get_by_id(device_id) is None:
+            abort(404, message=f"Device with device id: {device_id} not found.")
+
+        select_stm = (
+            select(
+                DeviceUpdate.timestamp,
+                DeviceUpdate.update_index,
+                DeviceUpdate.interior_temp,
+                DeviceUpdate.exterior_temp,
+                DeviceUpdate.device_temp,
+                DeviceUpdate.uptime,
+                DeviceUpdate.load_avg,
+                DeviceUpdate.disk_total,
+                DeviceUpdate.disk_used,
+                DeviceUpdate.disk_free,
+            )
+            .where(DeviceUpdate.device_id == device_id)
+            .order_by(DeviceUpdate.update_index, DeviceUpdate.id)
+        )
+        select_stm = export_range(select_stm, DeviceUpdate.timestamp, args)
+
+        filename = f"device_{device_id}_updates"
+        return export_response(get_session(), select_stm, args["format"], filename)
+
+
+@blueprint.route("/<int:device_id>/rollups")
+class DeviceRollups(MethodView):
+    """MethodView for DeviceRollup schema that require an ID."""
+
+    # decorators = [jwt_required()]
+
+    @staticmethod
+    @blueprint.arguments(RollupArgsSchema, location="query")
+    @blueprint.response(200, DeviceRollupSchema(many=True))
+    def get(args, device_id):
+        """Get the hourly or daily interior and exterior temperatures of a Device.
+
+        Returns the count, minimum, maximum and average temperatures of each
+        hour or day from start up to end. Without a start, the last 2 days of
+        hourly or 90 days of daily rollups are returned. Ordered by bucket,
+        oldest first.
+        """
+
+        if Device.get_by_id(device_id) is None:
+            abort(404, message=f"Device with device id: {device_id} not found.")
+
+        start, end = rollup_range(args)
+        session = get_session()
+        return session.scalars(
+            select(DeviceRollup)
+            .where(DeviceRollup.device_id == device_id)
+            .where(DeviceRollup.period == args["period"])
+            .where(DeviceRollup.bucket >= start)
+            .where(DeviceRollup.bucket < end)
+            .order_by(DeviceRollup.bucket)
+        ).all()
+
+
+@blueprint.route("/<int:device_id>/series")
+class DeviceSeries(MethodView):
+    """MethodView for the time-bucketed aggregates of a Device."""
+
+    @staticmethod
+    @blueprint.arguments(DeviceSeriesArgsSchema, location="query")
+    @blueprint.response(200, SeriesSchema(many=True))
+    def get(args, device_id):
+        """Get the average, minimum, maximum and count of a column of a Device.
+
+        The DeviceUpdates from start up to end are aggregated by the database
+        in buckets of a minute, hour, day, week or month. The column is one of
+        the temperatures, load_avg or disk sizes. Without a start, the last
+        30 days of hourly buckets (or the default range of the bucket) are
+        returned. Buckets without a value are left out. Ordered by bucket,
+        oldest first.
+        """
+
+        if Device.get_by_id(device_id) is None:
+            abort(404, message=f"Device with device id: {device_id} not found.")
+
+        start, end = series_range(args)
+        session = get_session()
+        return session.execute(
+            device_series(
+                session, device_id, args["column"], start, end, bucket=args["bucket"]
+            )
+        ).all()
@@ -0,0 +1,137 @@
+"""
+Downsampling of time series for charts.
+
+A long time window of grainbin updates has far more readings per sensor than
+a chart has pixels. Largest-Triangle-Three-Buckets (LTTB) keeps max_points of
+the readings that preserve the visual shape of the series: the first and last
+reading, and from each bucket in between the reading that makes the largest
+triangle with the reading kept from the previous bucket and the average of
+the next bucket.
+
+https://skemman.is/bitstream/1946/15343/3/SS_MSthesis.pdf
+"""
+
+import datetime as dt
+from array import array
+from collections.abc import Iterable
+from typing import Any
+
+import numpy as np
+
+EPOCH = dt.datetime(1970, 1, 1)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Return the indexes of the points of (x, y) kept by LTTB.
+
+    x must be sorted ascending. All the points are kept when there are no
+    more than max_points. Raises a ValueError if max_points is less than 3.
+    """
+
+    if max_points < 3:
+        raise ValueError(f"max_points must be at least 3, not {max_points}")
+    length = len(x)
+    if length <= max_points:
+        return np.arange(length)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # max_points - 2 buckets between the first and the last point
+    edges = np.floor(
+        np.arange(max_points - 1) * (length - 2) / (max_points - 2)
+    ).astype(np.int64)
+    edges += 1
+    edges[-1] = length - 1
+    avg_x, avg_y = _next_bucket_averages(x, y, edges)
+
+    kept = np.empty(max_points, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = length - 1
+    for bucket, (start, end) in enumerate(zip(edges[:-1], edges[1:])):
+        previous = kept[bucket]
+        dx = x[previous] - avg_x[bucket]
+        dy = avg_y[bucket] - y[previous]
+        # twice the area of the triangles of each point of the bucket
+        areas = np.abs(
+            dx * (y[start:end] - y[previous]) + (x[start:end] - x[previous]) * dy
+        )
+        kept[bucket + 1] = start + np.argmax(areas)
+    return kept
+
+
+def _next_bucket_averages(
+    x: np.ndarray, y: np.ndarray, edges: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return the average point of the bucket after each bucket.
+
+    The bucket after the last bucket is the last point.
+    """
+
+    starts = edges[1:]
+    ends = np.append(edges[2:], len(x))
+    sum_x = np.concatenate(([0.0], np.cumsum(x)))
+    sum_y = np.concatenate(([0.0], np.cumsum(y)))
+    sizes = ends - starts
+    return (
+        (sum_x[ends] - sum_x[starts]) / sizes,
+        (sum_y[ends] - sum_y[starts]) / sizes,
+    )
+
+
+def _sensor_order(key: tuple) -> tuple:
+    """Order sensors by temphigh, templow and sensor_name, missing values last."""
+
+    return tuple((value is None, value or 0) for value in key[:2]) + (str(key[2]),)
+
+
+def downsample_readings(rows: Iterable[Any], max_points: int) -> list[dict[str, Any]]:
+    """Return the series of each sensor of grainbin readings, downsampled with LTTB.
+
+    rows are (timestamp, temperature, temphigh, templow, sensor_name) ordered by
+    timestamp, eg. a streamed result. Readings without a temperature are left
+    out. Returns a series per sensor, ordered by temphigh and templow, with at
+    most max_points timestamps and temperatures.
+    """
+
+    readings = _sensor_readings(rows)
+    series = []
+    for key in sorted(readings, key=_sensor_order):
+        microseconds = np.frombuffer(readings[key][0], dtype=np.int64)
+        temperatures = np.frombuffer(readings[key][1], dtype=np.float64)
+        # seconds since the first reading keep the x values small and precise
+        seconds = (microseconds - microseconds[0]) / 1_000_000
+        kept = lttb(seconds, temperatures, max_points)
+        series.append(
+            {
+                "temphigh": key[0],
+                "templow": key[1],
+                "sensor_name": key[2],
+                "timestamps": [
+                    EPOCH + dt.timedelta(microseconds=int(value))
+                    for value in microseconds[kept]
+                ],
+                "temperatures": temperatures[kept].tolist(),
+            }
+        )
+    return series
+
+
+def _sensor_readings(rows: Iterable[Any]) -> dict[tuple, tuple[array, array]]:
+    """Return the microsecond timestamps and temperatures of each sensor of rows.
+
+    The readings are kept in compact arrays while the rows are read, so memory
+    stays small for long windows.
+    """
+
+    readings: dict[tuple, tuple[array, array]] = {}
+    for timestamp, temperature, temphigh, templow, sensor_name in rows:
+        if temperature is None:
+            continue
+        key = (temphigh, templow, sensor_name)
+        if key not in readings:
+            readings[key] = (array("q"), array("d"))
+        times, values = readings[key]
+        times.append((timestamp - EPOCH) // dt.timedelta(microseconds=1))
+        values.append(temperature)
+    return readings
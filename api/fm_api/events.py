@@ -0,0 +1,201 @@
+"""
+Live events of the stored device and grainbin updates.
+
+The server publishes a compact event for each stored update to a RabbitMQ
+fanout exchange. Each API process consumes the exchange once, with an
+exclusive queue of its own, in a background thread that is started by the
+first subscriber. The thread puts each event in the queue of every subscriber,
+eg. a client of the live stream.
+
+A subscriber that does not keep up loses the events that do not fit in its
+queue. Without a broker URL nothing is consumed, and events are only those
+given to publish.
+"""
+
+import json
+import logging
+import queue
+import threading
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+
+from flask import current_app
+from kombu import Connection, Consumer, Exchange, Queue
+
+LOGGER = logging.getLogger("fm.api.events")
+
+# the seconds to wait before reconnecting to the broker.
+RECONNECT_DELAY = 5
+# the milliseconds a client of the stream waits before reconnecting.
+STREAM_RETRY_MS = 5000
+
+
+@dataclass
+class _LiveState:
+    """The subscribers and the consumer thread of an app."""
+
+    broker_url: str
+    exchange_name: str
+    queue_size: int
+    subscribers: set["Subscription"] = field(default_factory=set)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    stopping: threading.Event = field(default_factory=threading.Event)
+    thread: threading.Thread | None = None
+    received: int = 0
+    dropped: int = 0
+
+    def fan_out(self, event: dict) -> None:
+        """Put event in the queue of every subscriber that has room for it."""
+
+        with self.lock:
+            self.received += 1
+            for subscriber in self.subscribers:
+                try:
+                    subscriber.events.put_nowait(event)
+                except queue.Full:
+                    self.dropped += 1
+
+
+class Subscription:
+    """The queue of the events received for a subscriber."""
+
+    def __init__(self, state: _LiveState):
+        """Create the subscription and add it to the subscribers."""
+
+        self._state = state
+        self.events: queue.Queue[dict] = queue.Queue(maxsize=state.queue_size)
+        with state.lock:
+            state.subscribers.add(self)
+
+    def get(self, timeout: float) -> dict | None:
+        """Return the next event, or None if there is none within timeout seconds."""
+
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        """Remove the subscription from the subscribers."""
+
+        with self._state.lock:
+            self._state.subscribers.discard(self)
+
+
+class LiveEvents:
+    """The Flask extension of the live events."""
+
+    def __init__(self, app=None):
+        """Create the extension, and initialize it for app if given."""
+
+        if app is not None:
+            self.init_app(app)
+
+    @staticmethod
+    def init_app(app) -> None:
+        """Create the live events of app from its LIVE_* configuration."""
+
+        app.extensions["live_events"] = _LiveState(
+            broker_url=app.config.get("LIVE_BROKER_URL", ""),
+            exchange_name=app.config.get("LIVE_EXCHANGE_NAME", "live_updates"),
+            queue_size=app.config.get("LIVE_QUEUE_SIZE", 100),
+        )
+
+    @property
+    def _state(self) -> _LiveState:
+        """Return the live events of the current app."""
+
+        state: _LiveState = current_app.extensions["live_events"]
+        return state
+
+    def subscribe(self) -> Subscription:
+        """Return a new subscription, starting the consumer of the process if needed."""
+
+        state = self._state
+        with state.lock:
+            if state.broker_url and (
+                state.thread is None or not state.thread.is_alive()
+            ):
+                state.stopping.clear()
+                state.thread = threading.Thread(
+                    target=_consume, args=(state,), name="live-events", daemon=True
+                )
+                state.thread.start()
+        return Subscription(state)
+
+    def publish(self, event: dict) -> None:
+        """Give event to every subscriber of this process."""
+        self._state.fan_out(event)
+
+    def stop(self) -> None:
+        """Stop the consumer thread."""
+
+        state = self._state
+        state.stopping.set()
+        if state.thread is not None:
+            state.thread.join()
+
+    def stats(self) -> dict:
+        """Return the number of subscribers, and of received and dropped events."""
+
+        state = self._state
+        with state.lock:
+            return {
+                "subscribers": len(state.subscribers),
+                "received": state.received,
+                "dropped": state.dropped,
+                "consuming": state.thread is not None and state.thread.is_alive(),
+            }
+
+
+def _consume(state: _LiveState) -> None:
+    """Consume the events of the broker until stopped, reconnecting after errors."""
+
+    exchange = Exchange(state.exchange_name, type="fanout", durable=False)
+
+    def on_message(body, _message):
+        state.fan_out(body)
+
+    while not state.stopping.is_set():
+        try:
+            with Connection(state.broker_url) as connection:
+                events = Queue(exchange=exchange, exclusive=True, auto_delete=True)
+                with Consumer(
+                    connection,
+                    queues=[events],
+                    callbacks=[on_message],
+                    accept=["json"],
+                    no_ack=True,
+                ):
+                    LOGGER.info(f"Consuming live events of {state.exchange_name}")
+                    while not state.stopping.is_set():
+                        try:
+                            connection.drain_events(timeout=1)
+                        except TimeoutError:
+                            continue
+        # pylint: disable=broad-exception-caught
+        except Exception as error:  # noqa: B902
+            LOGGER.warning(f"Live events consumer failed ({error}), reconnecting")
+            state.stopping.wait(RECONNECT_DELAY)
+
+
+def event_stream(
+    subscription: Subscription, wanted: Callable[[dict], bool], keepalive: float
+) -> Iterator[str]:
+    """Return the Server-Sent Events of the wanted events of subscription.
+
+    A comment is sent when there was no event for keepalive seconds, so
+    proxies keep the connection open and a closed connection is noticed. The
+    subscription is closed when the stream is closed.
+    """
+
+    try:
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        while True:
+            event = subscription.get(keepalive)
+            if event is None:
+                yield ": keepalive\n\n"
+            elif wanted(event):
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        subscription.close()
@@ -0,0 +1,93 @@
+"""
+Streaming exports of the update history as CSV or NDJSON.
+
+The rows are read from the database in batches of EXPORT_YIELD_PER with a
+server-side cursor on PostgreSQL, and each batch is written to the response
+as one chunk as soon as it is read. So the first rows are sent before the
+query finishes, and the memory used does not grow with the number of rows.
+"""
+
+import csv
+import datetime as dt
+import io
+import json
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+from flask import Response, stream_with_context
+from sqlalchemy import Select
+from sqlalchemy.orm import Session
+
+# the media type of each export format.
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# the rows read from the database, and written as one chunk, at a time.
+EXPORT_YIELD_PER = 1000
+
+
+def _export_value(value: Any) -> Any:
+    """Return a value of a row as it is exported.
+
+    Datetimes are exported in ISO 8601 and durations in seconds.
+    """
+
+    if isinstance(value, dt.datetime):
+        return value.isoformat()
+    if isinstance(value, dt.timedelta):
+        return value.total_seconds()
+    return value
+
+
+def csv_chunks(columns: list[str], batches: Iterable[Iterable[Any]]) -> Iterator[str]:
+    """Return the CSV of batches of rows: the header, then a chunk per batch."""
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_export_value(value) for value in row] for row in batch)
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(
+    columns: list[str], batches: Iterable[Iterable[Any]]
+) -> Iterator[str]:
+    """Return the NDJSON of batches of rows, an object per line and a chunk per batch."""
+
+    for batch in batches:
+        lines = [
+            json.dumps(
+                {column: _export_value(value) for column, value in zip(columns, row)}
+            )
+            for row in batch
+        ]
+        yield "\n".join(lines) + "\n"
+
+
+def export_response(
+    session: Session, select_stm: Select, export_format: str, filename: str
+) -> Response:
+    """Return a response streaming the rows of select_stm in export_format.
+
+    The columns of the rows are the columns of select_stm. The response is
+    downloaded as filename with the extension of the format.
+    """
+
+    columns = list(select_stm.selected_columns.keys())
+    chunks = csv_chunks if export_format == "csv" else ndjson_chunks
+
+    def generate() -> Iterator[str]:
+        result = session.execute(
+            select_stm, execution_options={"yield_per": EXPORT_YIELD_PER}
+        )
+        yield from chunks(columns, result.partitions())
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}.{export_format}"
+        },
+    )
@@ -8,6 +8,11 @@ from flask_cors import CORS  # type: ignore
 from flask_jwt_extended import JWTManager
 from flask_smorest import Api
 
+from fm_api.cache import ResponseCache
+from fm_api.events import LiveEvents
+
 cors = CORS()
 jwt = JWTManager()
 smorest_api = Api()
+response_cache = ResponseCache()
+live_events = LiveEvents()
@@ -1,10 +1,12 @@
 """Schema for Grainbin."""
 
 from flask import url_for
-from fm_database.models.device import Grainbin, GrainbinUpdate
-from marshmallow.fields import Method
+from fm_database.models.device import Grainbin, GrainbinLatestReading, GrainbinUpdate
+from fm_database.models.rollup import GrainbinRollup
+from marshmallow.fields import Bool, DateTime, Float, Int, List, Method, Nested, Str
+from marshmallow.validate import Range
 
-from ..base import BaseSchema
+from ..base import BaseSchema, RollupArgsSchema, SeriesArgsSchema, SeriesSchema
 
 
 class GrainbinSchema(BaseSchema):
@@ -38,3 +40,95 @@ class GrainbinUpdateSchema(BaseSchema):
         model = GrainbinUpdate
         include_relationships = True
         load_instance = True
+
+
+class GrainbinLatestReadingSchema(BaseSchema):
+    """Marshmallow GrainbinLatestReading Schema.
+
+    Has the same fields as GrainbinUpdateSchema. The id is the id of the
+    GrainbinUpdate of the reading, and the grainbin is dumped from the foreign
+    key, so the grainbin is not loaded.
+    """
+
+    class Meta:  # pylint: disable=too-few-public-methods
+        """Meta class for GrainbinLatestReadingSchema."""
+
+        exclude = ("update_id",)
+
+        model = GrainbinLatestReading
+
+    id = Int(attribute="update_id", dump_only=True)
+    grainbin = Int(attribute="grainbin_id", dump_only=True)
+
+
+class GrainbinsLatestArgsSchema(BaseSchema):
+    """Marshmallow schema for the query arguments of the latest readings of all grainbins."""
+
+    device = Int()
+
+
+class GrainbinsLatestSchema(BaseSchema):
+    """Marshmallow schema of a grainbin with the readings of its latest update."""
+
+    grainbin = Nested(GrainbinSchema)
+    latest = Nested(GrainbinLatestReadingSchema, many=True)
+
+
+class GrainbinRollupArgsSchema(RollupArgsSchema):  # pylint: disable=too-many-ancestors
+    """Marshmallow schema for the query arguments of the grainbin rollups."""
+
+    temphigh = Int()
+    templow = Int()
+
+
+class GrainbinRollupSchema(BaseSchema):
+    """Marshmallow GrainbinRollup Schema."""
+
+    class Meta:  # pylint: disable=too-few-public-methods
+        """Meta class for GrainbinRollupSchema."""
+
+        exclude = ("id",)
+
+        model = GrainbinRollup
+        include_fk = True
+
+    temperature_avg = Float(dump_only=True)
+
+
+class GrainbinDownsampleArgsSchema(BaseSchema):
+    """Marshmallow schema for the query arguments of the downsampled updates."""
+
+    class Meta:  # pylint: disable=too-few-public-methods
+        """Meta configuration for GrainbinDownsampleArgsSchema."""
+
+        ordered = True
+
+    start = DateTime()
+    end = DateTime()
+    max_points = Int(load_default=500, validate=Range(min=3, max=5000))
+
+
+class GrainbinDownsampledSeriesSchema(BaseSchema):
+    """Marshmallow schema for the downsampled readings of a grainbin sensor."""
+
+    temphigh = Int()
+    templow = Int()
+    sensor_name = Str()
+    timestamps = List(DateTime())
+    temperatures = List(Float())
+
+
+class GrainbinSeriesArgsSchema(SeriesArgsSchema):  # pylint: disable=too-many-ancestors
+    """Marshmallow schema for the query arguments of the grainbin series."""
+
+    by_sensor = Bool(load_default=True)
+
+
+class GrainbinSeriesSchema(SeriesSchema):  # pylint: disable=too-many-ancestors
+    """Marshmallow schema for the aggregates of a bucket of a grainbin series.
+
+    temphigh and templow are only set for the series of each sensor.
+    """
+
+    temphigh = Int()
+    templow = Int()
@@ -1,19 +1,62 @@
 """Views for Grainbin API."""
 
+import datetime as dt
+
+from flask import request
 from flask.views import MethodView
-from flask_smorest import Blueprint, abort
+from flask_smorest import abort
 from flask_smorest.pagination import PaginationParameters
 from fm_database.database import get_session
-from fm_database.models.device import Grainbin, GrainbinUpdate
+from fm_database.latest import select_all_latest_readings, select_latest_readings
+from fm_database.models.device import (
+    Device,
+    Grainbin,
+    GrainbinLatestReading,
+    GrainbinUpdate,
+)
+from fm_database.models.rollup import GrainbinRollup
 from fm_database.paginate import Pagination
-from sqlalchemy import select
+from fm_database.series import grainbin_series
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
 
+from fm_api.base import (
+    Blueprint,
+    CursorArgsSchema,
+    ExportArgsSchema,
+    cursor_page,
+    export_range,
+    record_version,
+    rollup_range,
+    series_range,
+    table_version,
+    update_count,
+)
+from fm_api.downsample import downsample_readings
+from fm_api.export import EXPORT_FORMATS, export_response
 from fm_api.settings import get_config
 
-from .schemas import GrainbinSchema, GrainbinUpdateSchema
+from .schemas import (
+    GrainbinDownsampleArgsSchema,
+    GrainbinDownsampledSeriesSchema,
+    GrainbinLatestReadingSchema,
+    GrainbinRollupArgsSchema,
+    GrainbinRollupSchema,
+    GrainbinSchema,
+    GrainbinSeriesArgsSchema,
+    GrainbinSeriesSchema,
+    GrainbinsLatestArgsSchema,
+    GrainbinsLatestSchema,
+    GrainbinUpdateSchema,
+)
 
 config = get_config()
 
+# the window of the downsampled updates when no start is given.
+DOWNSAMPLE_DEFAULT_RANGE = dt.timedelta(days=7)
+# the number of rows read from the database at a time by the downsampling.
+DOWNSAMPLE_YIELD_PER = 10000
+
 blueprint = Blueprint(
     "grainbin",
     "grainbin",
@@ -22,11 +65,45 @@ blueprint = Blueprint(
 )
 
 
+def grainbins_where(device_id: int | None) -> list:
+    """Return the where clauses of the grainbins of a device, or of all grainbins."""
+
+    if device_id is None:
+        return []
+    return [Grainbin.device.has(Device.id == device_id)]
+
+
+def grainbins_latest_version(device_id: int | None) -> tuple:
+    """Return the version of the grainbins of a device, or of all grainbins.
+
+    The version of table_version, with the latest last_updated of the devices
+    of the grainbins too, since the grainbins are returned with their device.
+    The last item is the latest last_updated of either.
+    """
+
+    # pylint: disable=not-callable
+    result = get_session().execute(
+        select(
+            func.count(Grainbin.id),
+            func.coalesce(func.sum(Grainbin.total_updates), 0),
+            func.max(Grainbin.last_updated),
+            func.max(Device.last_updated),
+        )
+        .join(Grainbin.device)
+        .where(*grainbins_where(device_id))
+    )
+    version = tuple(result.one())
+    last_updated = max((value for value in version[2:] if value), default=None)
+    return (*version, last_updated)
+
+
 @blueprint.route("/")
 class Grainbins(MethodView):
     """MethodView for Grainbin schema."""
 
     @staticmethod
+    @blueprint.cached(lambda: table_version(Grainbin))
+    @blueprint.etag
     @blueprint.response(200, GrainbinSchema(many=True))
     def get():
         """List all Grainbins."""
@@ -36,11 +113,57 @@ class Grainbins(MethodView):
     # TODO: Add POST method
 
 
+@blueprint.route("/latest")
+class GrainbinsLatest(MethodView):
+    """MethodView for all the Grainbins with their latest readings."""
+
+    @staticmethod
+    @blueprint.cached(
+        lambda: grainbins_latest_version(request.args.get("device", type=int))
+    )
+    @blueprint.etag
+    @blueprint.arguments(GrainbinsLatestArgsSchema, location="query")
+    @blueprint.response(200, GrainbinsLatestSchema(many=True))
+    def get(args):
+        """Get every Grainbin with the readings of its latest update.
+
+        Optionally filtered by the id of the device of the grainbins. Built
+        from two queries however many grainbins there are: one for the
+        grainbins and their devices, and one for the latest readings of all
+        of them. Ordered by grainbin id.
+        """
+
+        where = grainbins_where(args.get("device"))
+        session = get_session()
+        grainbins = session.scalars(
+            select(Grainbin)
+            .options(joinedload(Grainbin.device))
+            .where(*where)
+            .order_by(Grainbin.id)
+        ).all()
+        latest: dict[int, list] = {grainbin.id: [] for grainbin in grainbins}
+        readings = session.scalars(
+            select_all_latest_readings(
+                GrainbinLatestReading.grainbin_id.in_(select(Grainbin.id).where(*where))
+            )
+        )
+        for reading in readings:
+            if reading.grainbin_id in latest:
+                latest[reading.grainbin_id].append(reading)
+
+        return [
+            {"grainbin": grainbin, "latest": latest[grainbin.id]}
+            for grainbin in grainbins
+        ]
+
+
 @blueprint.route("/<int:grainbin_id>")
 class GrainbinById(MethodView):
     """MethodView for Grainbin schema that require an ID."""
 
     @staticmethod
+    @blueprint.cached(lambda grainbin_id: record_version(Grainbin, grainbin_id))
+    @blueprint.etag
     @blueprint.response(200, GrainbinSchema())
     def get(grainbin_id):
         """Get Grainbin by id."""
@@ -56,26 +179,46 @@ class GrainbinUpdates(MethodView):
     """MethodView for GrainbinUpdate schema that require an ID."""
 
     @staticmethod
+    @blueprint.cached(lambda grainbin_id: record_version(Grainbin, grainbin_id))
+    @blueprint.etag
+    @blueprint.arguments(CursorArgsSchema, location="query")
     @blueprint.response(200, GrainbinUpdateSchema(many=True))
     @blueprint.paginate()
-    def get(grainbin_id, pagination_parameters: PaginationParameters):
+    def get(args, grainbin_id, pagination_parameters: PaginationParameters):
         """Get GrainbinUpdates for a given Grainbin ID with Pagination.
 
         Default pagination is set to 10 items per page.
-        Ordered by most recent updates first.
+        Ordered by most recent updates first. The total of the updates is
+        counted at most once a minute.
+
+        With a cursor argument the updates are paged with a cursor instead
+        of a page number, which is as fast for old updates as for new ones.
+        An empty cursor returns the first page, and the X-Pagination header
+        holds the next_cursor of the next page.
+
+        The ETag and Last-Modified are those of the grainbin, which change
+        with each new update.
         """
 
         session = get_session()
-        select_stm = (
-            select(GrainbinUpdate)
-            .where(GrainbinUpdate.grainbin_id == grainbin_id)
-            .order_by(GrainbinUpdate.update_index.desc())
+        select_stm = select(GrainbinUpdate).where(
+            GrainbinUpdate.grainbin_id == grainbin_id
         )
+        if "cursor" in args:
+            return cursor_page(
+                session,
+                select_stm,
+                (GrainbinUpdate.update_index, GrainbinUpdate.id),
+                args["cursor"],
+                pagination_parameters,
+            )
+
         grainbin_updates = Pagination(
             session,
-            select_stm,
+            select_stm.order_by(GrainbinUpdate.update_index.desc()),
             page=pagination_parameters.page,
             per_page=pagination_parameters.page_size,
+            count=update_count,
         )
 
         pagination_parameters.item_count = grainbin_updates.total
@@ -84,33 +227,187 @@ class GrainbinUpdates(MethodView):
 
 @blueprint.route("/<int:grainbin_id>/updates/latest")
 class GrainbinUpdatesLatest(MethodView):
-    """MethodView for GrainbinUpdate schema that require an ID."""
+    """MethodView for GrainbinLatestReading schema that require an ID."""
 
     @staticmethod
-    @blueprint.response(200, GrainbinUpdateSchema(many=True))
+    @blueprint.cached(lambda grainbin_id: record_version(Grainbin, grainbin_id))
+    @blueprint.etag
+    @blueprint.response(200, GrainbinLatestReadingSchema(many=True))
     def get(grainbin_id):
         """Get the set of latest GrainbinUpdates for a given Grainbin ID.
 
-        There is an update for each sensor reading in the Grainbin.
+        There is an update for each sensor reading in the Grainbin. The
+        readings are read from the latest readings of the sensors, so the
+        time taken does not grow with the number of updates.
         """
 
-        # get the grainbin with grainbin_id
-        grainbin = Grainbin.get_by_id(grainbin_id)
-
-        if grainbin is None:
-            abort(404, message=f"Grainbin with id: {grainbin_id} not found")
+        session = get_session()
+        readings = session.scalars(select_latest_readings(grainbin_id)).all()
 
-        if grainbin.total_updates == 0:
+        if not readings:
+            if Grainbin.get_by_id(grainbin_id) is None:
+                abort(404, message=f"Grainbin with id: {grainbin_id} not found")
             abort(404, message=f"No updates for Grainbin with id: {grainbin_id}")
 
-        # get all updates for grainbin_id with update_index equalling the grainbin total_update count.
-        # Sort by templow which is the sensor number
+        return readings
+
+
+@blueprint.route("/<int:grainbin_id>/updates/downsampled")
+class GrainbinUpdatesDownsampled(MethodView):
+    """MethodView for the downsampled GrainbinUpdates of a grainbin."""
+
+    @staticmethod
+    @blueprint.arguments(GrainbinDownsampleArgsSchema, location="query")
+    @blueprint.response(200, GrainbinDownsampledSeriesSchema(many=True))
+    def get(args, grainbin_id):
+        """Get the temperatures of each sensor of a Grainbin for charts.
+
+        The updates from start up to end are reduced to at most max_points
+        readings per sensor with Largest-Triangle-Three-Buckets, which keeps
+        the shape of the series. So the response size does not grow with the
+        window. Without an end the updates up to now are used, and without a
+        start the updates of the last 7 days before the end.
+        """
+
+        if Grainbin.get_by_id(grainbin_id) is None:
+            abort(404, message=f"Grainbin with id: {grainbin_id} not found.")
+
+        end = args.get("end") or dt.datetime.now()
+        start = args.get("start") or end - DOWNSAMPLE_DEFAULT_RANGE
+        select_stm = (
+            select(
+                GrainbinUpdate.timestamp,
+                GrainbinUpdate.temperature,
+                GrainbinUpdate.temphigh,
+                GrainbinUpdate.templow,
+                GrainbinUpdate.sensor_name,
+            )
+            .where(GrainbinUpdate.grainbin_id == grainbin_id)
+            .where(GrainbinUpdate.timestamp >= start)
+            .where(GrainbinUpdate.timestamp < end)
+            .order_by(GrainbinUpdate.timestamp)
+        )
+
         session = get_session()
-        grainbin_updates = session.scalars(
-            select(GrainbinUpdate)
+        # the rows are streamed, only the readings are held in memory
+        rows = session.execute(
+            select_stm, execution_options={"yield_per": DOWNSAMPLE_YIELD_PER}
+        )
+        return downsample_readings(rows, args["max_points"])
+
+
+@blueprint.route("/<int:grainbin_id>/updates/export")
+class GrainbinUpdatesExport(MethodView):
+    """MethodView for the export of the GrainbinUpdates of a grainbin."""
+
+    @staticmethod
+    @blueprint.arguments(ExportArgsSchema, location="query")
+    @blueprint.response(
+        200,
+        description="The GrainbinUpdates as CSV or NDJSON.",
+        content_type=EXPORT_FORMATS["csv"],
+    )
+    def get(args, grainbin_id):
+        """Export the GrainbinUpdates of a Grainbin as CSV or NDJSON.
+
+        The updates from start up to end are streamed as they are read, so
+        a whole season of temperatures can be exported. Without a start or an
+        end all the updates are exported. Ordered by update index and sensor,
+        oldest first.
+        """
+
+        if Grainbin.get_by_id(grainbin_id) is None:
+            abort(404, message=f"Grainbin with id: {grainbin_id} not found.")
+
+        select_stm = (
+            select(
+                GrainbinUpdate.timestamp,
+                GrainbinUpdate.update_index,
+                GrainbinUpdate.sensor_name,
+                GrainbinUpdate.temphigh,
+                GrainbinUpdate.templow,
+                GrainbinUpdate.temperature,
+            )
             .where(GrainbinUpdate.grainbin_id == grainbin_id)
-            .where(GrainbinUpdate.update_index == grainbin.total_updates)
-            .order_by(GrainbinUpdate.templow.desc())
-        ).all()
+            .order_by(GrainbinUpdate.update_index, GrainbinUpdate.id)
+        )
+        select_stm = export_range(select_stm, GrainbinUpdate.timestamp, args)
+
+        filename = f"grainbin_{grainbin_id}_updates"
+        return export_response(get_session(), select_stm, args["format"], filename)
+
 
-        return grainbin_updates
+@blueprint.route("/<int:grainbin_id>/rollups")
+class GrainbinRollups(MethodView):
+    """MethodView for GrainbinRollup schema that require an ID."""
+
+    @staticmethod
+    @blueprint.arguments(GrainbinRollupArgsSchema, location="query")
+    @blueprint.response(200, GrainbinRollupSchema(many=True))
+    def get(args, grainbin_id):
+        """Get the hourly or daily temperatures of a Grainbin.
+
+        Returns the count, minimum, maximum and average temperature of each
+        sensor in each hour or day from start up to end. Without a start, the
+        last 2 days of hourly or 90 days of daily rollups are returned. The
+        sensors can be filtered by temphigh (cable) and templow (sensor number).
+        Ordered by bucket, oldest first.
+        """
+
+        if Grainbin.get_by_id(grainbin_id) is None:
+            abort(404, message=f"Grainbin with id: {grainbin_id} not found.")
+
+        start, end = rollup_range(args)
+        select_stm = (
+            select(GrainbinRollup)
+            .where(GrainbinRollup.grainbin_id == grainbin_id)
+            .where(GrainbinRollup.period == args["period"])
+            .where(GrainbinRollup.bucket >= start)
+            .where(GrainbinRollup.bucket < end)
+            .order_by(
+                GrainbinRollup.bucket, GrainbinRollup.temphigh, GrainbinRollup.templow
+            )
+        )
+        for sensor in ("temphigh", "templow"):
+            if args.get(sensor) is not None:
+                select_stm = select_stm.where(
+                    getattr(GrainbinRollup, sensor) == args[sensor]
+                )
+
+        session = get_session()
+        return session.scalars(select_stm).all()
+
+
+@blueprint.route("/<int:grainbin_id>/series")
+class GrainbinSeries(MethodView):
+    """MethodView for the time-bucketed temperature aggregates of a Grainbin."""
+
+    @staticmethod
+    @blueprint.arguments(GrainbinSeriesArgsSchema, location="query")
+    @blueprint.response(200, GrainbinSeriesSchema(many=True))
+    def get(args, grainbin_id):
+        """Get the average, minimum, maximum and count of the temperatures of a Grainbin.
+
+        The GrainbinUpdates from start up to end are aggregated by the database
+        in buckets of a minute, hour, day, week or month. With by_sensor (the
+        default) there is a row per sensor in each bucket, otherwise the
+        temperatures of all the sensors are aggregated together. Without a
+        start, the last 30 days of hourly buckets (or the default range of the
+        bucket) are returned. Ordered by bucket and sensor, oldest first.
+        """
+
+        if Grainbin.get_by_id(grainbin_id) is None:
+            abort(404, message=f"Grainbin with id: {grainbin_id} not found.")
+
+        start, end = series_range(args)
+        session = get_session()
+        return session.execute(
+            grainbin_series(
+                session,
+                grainbin_id,
+                start,
+                end,
+                bucket=args["bucket"],
+                by_sensor=args["by_sensor"],
+            )
+        ).all()
@@ -3,6 +3,7 @@
 from flask.views import MethodView
 from flask_smorest import Blueprint
 
+from ..extensions import live_events, response_cache
 from ..settings import get_config
 
 config = get_config()
@@ -23,3 +24,23 @@ class Healthcheck(MethodView):
     def get():
         """Healthcheck endpoint."""
         return "ok"
+
+
+@blueprint.route("/cache")
+class ResponseCacheStats(MethodView):
+    """Statistics of the response cache."""
+
+    @staticmethod
+    def get():
+        """Get the size and the hit rate of each endpoint of the response cache."""
+        return response_cache.stats()
+
+
+@blueprint.route("/live")
+class LiveEventsStats(MethodView):
+    """Statistics of the live stream."""
+
+    @staticmethod
+    def get():
+        """Get the number of clients of the live stream, and of received and dropped events."""
+        return live_events.stats()
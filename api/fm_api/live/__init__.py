@@ -0,0 +1,3 @@
+"""API for the live stream of new updates."""
+
+from .views import blueprint  # noqa: F401
@@ -0,0 +1,13 @@
+"""Schema for the live stream."""
+
+from marshmallow.fields import Int, List, Str
+from marshmallow.validate import OneOf
+
+from ..base import BaseSchema
+
+
+class LiveArgsSchema(BaseSchema):
+    """Marshmallow schema for the query arguments of the live stream."""
+
+    type = Str(validate=OneOf(("device", "grainbin")))
+    id = List(Int())
@@ -0,0 +1,56 @@
+"""Views for the live stream API."""
+
+from flask import Response, current_app
+from flask.views import MethodView
+
+from fm_api.base import Blueprint
+from fm_api.events import event_stream
+from fm_api.extensions import live_events
+from fm_api.settings import get_config
+
+from .schemas import LiveArgsSchema
+
+config = get_config()
+
+blueprint = Blueprint(
+    "live",
+    "live",
+    url_prefix=f"{config.API_PREFIX}/live",
+    description="The live stream of new updates",
+)
+
+
+@blueprint.route("/")
+class LiveUpdates(MethodView):
+    """MethodView for the live stream of new device and grainbin updates."""
+
+    @staticmethod
+    @blueprint.arguments(LiveArgsSchema, location="query")
+    @blueprint.response(
+        200,
+        description="The new updates as Server-Sent Events.",
+        content_type="text/event-stream",
+    )
+    def get(args):
+        """Stream the new device and grainbin updates as Server-Sent Events.
+
+        An event is sent as soon as an update is stored, with the type of the
+        update (device or grainbin) as the event name and the id, update index,
+        timestamp and readings or temperatures of the update as its data. The
+        events can be filtered by type, and the ids of that type.
+        """
+
+        update_type = args.get("type")
+        ids = set(args.get("id", ()))
+
+        def wanted(event: dict) -> bool:
+            if update_type is not None and event["type"] != update_type:
+                return False
+            return not ids or event["id"] in ids
+
+        subscription = live_events.subscribe()
+        return Response(
+            event_stream(subscription, wanted, current_app.config["LIVE_KEEPALIVE"]),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
@@ -16,6 +16,23 @@ class Config:
 
     CORS_EXPOSE_HEADERS = ["X-Pagination"]
 
+    # The cache of the responses of the device and grainbin views. The size is
+    # the number of responses cached by each process, 0 disables the cache.
+    # A redis:// URL shares the cache between the processes instead.
+    RESPONSE_CACHE_SIZE = int(os.environ.get("FM_API_RESPONSE_CACHE_SIZE", "1024"))
+    RESPONSE_CACHE_URL = os.environ.get("FM_API_RESPONSE_CACHE_URL", "")
+    RESPONSE_CACHE_TTL = int(os.environ.get("FM_API_RESPONSE_CACHE_TTL", "3600"))
+
+    # The live stream of new updates, consumed from the fanout exchange the
+    # server publishes them to. The keepalive is the seconds between comments
+    # sent to idle clients, and the queue size the events held for each client.
+    LIVE_BROKER_URL = os.environ.get(
+        "FM_API_BROKER_URL", "amqp://fm:farm_monitor@fm_rabbitmq/farm_monitor"
+    )
+    LIVE_EXCHANGE_NAME = "live_updates"
+    LIVE_KEEPALIVE = 15
+    LIVE_QUEUE_SIZE = 100
+
     # API prefix
     API_PREFIX = os.environ.get("FM_API_PREFIX", "/api")
 
@@ -47,6 +64,8 @@ class TestConfig(Config):
 
     TESTING = True
     DEBUG = True
+    # the tests publish the live events directly
+    LIVE_BROKER_URL = ""
 
 
 def get_config(override_default=None):
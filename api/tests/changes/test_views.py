@@ -0,0 +1,303 @@
+"""Test the changes views."""
+
+import datetime as dt
+
+import pytest
+from flask import url_for
+from fm_database.models.device import DeviceUpdate, GrainbinUpdate
+from fm_database.paginate import decode_cursor, encode_cursor
+
+from fm_api.changes import views
+
+from ..factories import DeviceFactory, GrainbinFactory
+
+BASE_TIME = dt.datetime(2024, 1, 1)
+
+
+def stamped(dbsession, record):
+    """Save record as last updated at BASE_TIME."""
+
+    record.last_updated = BASE_TIME
+    dbsession.add(record)
+    dbsession.commit()
+    return record
+
+
+def add_device_updates(dbsession, device, count, last_updated):
+    """Add count updates to device, as the ingest does.
+
+    last_updated must differ from that of device, or it is set to now.
+    """
+
+    for _ in range(count):
+        device.total_updates += 1
+        update = DeviceUpdate(device.id)
+        update.timestamp = BASE_TIME + dt.timedelta(minutes=device.total_updates)
+        update.update_index = device.total_updates
+        dbsession.add(update)
+    device.last_updated = last_updated
+    dbsession.commit()
+
+
+def add_grainbin_updates(dbsession, grainbin, count, last_updated, sensors=2):
+    """Add count updates with a row per sensor to grainbin, as the ingest does."""
+
+    for _ in range(count):
+        grainbin.total_updates += 1
+        for sensor in range(sensors):
+            update = GrainbinUpdate(grainbin.id)
+            update.timestamp = BASE_TIME + dt.timedelta(minutes=grainbin.total_updates)
+            update.update_index = grainbin.total_updates
+            update.sensor_name = f"28.{sensor}"
+            dbsession.add(update)
+    grainbin.last_updated = last_updated
+    dbsession.commit()
+
+
+def get_changes(flaskclient, since=""):
+    """Return the changes since the cursor."""
+
+    rep = flaskclient.get(url_for("changes.Changes", since=since))
+    assert rep.status_code == 200
+    return rep.get_json()
+
+
+@pytest.mark.usefixtures("tables")
+class TestChanges:
+    """Test the Changes MethodView."""
+
+    @staticmethod
+    def test_changes_initial(flaskclient, dbsession):
+        """Test that the first request returns every device and grainbin, without updates."""
+
+        device = stamped(dbsession, DeviceFactory())
+        stamped(dbsession, GrainbinFactory())
+        add_device_updates(dbsession, device, 3, BASE_TIME + dt.timedelta(minutes=1))
+
+        changes = get_changes(flaskclient)
+
+        assert changes["has_more"] is False
+        assert len(changes["devices"]) == 2
+        assert len(changes["grainbins"]) == 1
+        assert changes["device_updates"] == []
+        assert changes["grainbin_updates"] == []
+
+        changes = get_changes(flaskclient, changes["cursor"])
+
+        assert changes["devices"] == []
+        assert changes["grainbins"] == []
+        assert changes["device_updates"] == []
+
+    @staticmethod
+    def test_changes_since(flaskclient, dbsession):
+        """Test that only the changed records and their new updates are returned."""
+
+        device = DeviceFactory()
+        grainbin = stamped(dbsession, GrainbinFactory(device=device))
+        other = stamped(dbsession, GrainbinFactory(device=device))
+        # adding the grainbins updated the device
+        stamped(dbsession, device)
+        add_device_updates(dbsession, device, 2, BASE_TIME + dt.timedelta(minutes=1))
+        cursor = get_changes(flaskclient)["cursor"]
+
+        later = BASE_TIME + dt.timedelta(hours=1)
+        add_device_updates(dbsession, device, 3, later)
+        add_grainbin_updates(dbsession, grainbin, 2, later)
+        changes = get_changes(flaskclient, cursor)
+
+        assert changes["has_more"] is False
+        assert [record["id"] for record in changes["devices"]] == [device.id]
+        assert [record["id"] for record in changes["grainbins"]] == [grainbin.id]
+        assert [update["update_index"] for update in changes["device_updates"]] == [
+            3,
+            4,
+            5,
+        ]
+        assert [
+            (update["update_index"], update["sensor_name"])
+            for update in changes["grainbin_updates"]
+        ] == [(1, "28.0"), (1, "28.1"), (2, "28.0"), (2, "28.1")]
+        assert other.id not in [record["id"] for record in changes["grainbins"]]
+
+        changes = get_changes(flaskclient, changes["cursor"])
+        assert changes["devices"] == []
+        assert changes["grainbin_updates"] == []
+
+    @staticmethod
+    def test_changes_constant_queries(flaskclient, dbsession, statements):
+        """Test that the number of queries does not grow with the changed records."""
+
+        # the records added after the cursor of an empty farm are all new
+        cursor = get_changes(flaskclient)["cursor"]
+        later = BASE_TIME + dt.timedelta(hours=1)
+        for _ in range(5):
+            grainbin = GrainbinFactory()
+            add_grainbin_updates(dbsession, grainbin, 2, later)
+            add_device_updates(dbsession, grainbin.device, 2, later)
+        dbsession.expunge_all()
+        statements.clear()
+        changes = get_changes(flaskclient, cursor)
+
+        assert len(changes["grainbins"]) == 5
+        assert len(changes["device_updates"]) == 10
+        assert len(changes["grainbin_updates"]) == 20
+        # the state of the devices and grainbins, the updates of each, the
+        # devices, and the grainbins with their devices
+        assert len(statements) == 6
+
+    @staticmethod
+    def test_changes_has_more(flaskclient, dbsession, monkeypatch):
+        """Test that the updates of a record are returned over several requests."""
+
+        monkeypatch.setattr(views, "CHANGES_MAX_UPDATES", 2)
+        device = stamped(dbsession, DeviceFactory())
+        cursor = get_changes(flaskclient)["cursor"]
+        add_device_updates(dbsession, device, 5, BASE_TIME + dt.timedelta(hours=1))
+
+        indexes = []
+        has_more = True
+        while has_more:
+            changes = get_changes(flaskclient, cursor)
+            cursor, has_more = changes["cursor"], changes["has_more"]
+            indexes.append(
+                [update["update_index"] for update in changes["device_updates"]]
+            )
+
+        assert indexes == [[1, 2], [3, 4], [5]]
+        assert get_changes(flaskclient, cursor)["devices"] == []
+
+    @staticmethod
+    def test_changes_grainbin_has_more(flaskclient, dbsession, monkeypatch):
+        """Test that the rows of a grainbin update are not split over two requests."""
+
+        monkeypatch.setattr(views, "CHANGES_MAX_UPDATES", 3)
+        grainbin = stamped(dbsession, GrainbinFactory())
+        cursor = get_changes(flaskclient)["cursor"]
+        add_grainbin_updates(dbsession, grainbin, 2, BASE_TIME + dt.timedelta(hours=1))
+
+        changes = get_changes(flaskclient, cursor)
+        assert changes["has_more"] is True
+        assert [update["update_index"] for update in changes["grainbin_updates"]] == [
+            1,
+            1,
+        ]
+
+        changes = get_changes(flaskclient, changes["cursor"])
+        assert changes["has_more"] is False
+        assert [update["update_index"] for update in changes["grainbin_updates"]] == [
+            2,
+            2,
+        ]
+
+    @staticmethod
+    def test_changes_older_last_updated(flaskclient, dbsession):
+        """Test that updates committed with an older last_updated are not missed."""
+
+        device = stamped(dbsession, DeviceFactory())
+        late = stamped(dbsession, DeviceFactory())
+        add_device_updates(dbsession, device, 1, BASE_TIME + dt.timedelta(hours=1))
+        cursor = get_changes(flaskclient)["cursor"]
+
+        # committed after the cursor, in a transaction started before it
+        add_device_updates(dbsession, late, 1, BASE_TIME + dt.timedelta(minutes=30))
+        changes = get_changes(flaskclient, cursor)
+
+        assert [record["id"] for record in changes["devices"]] == [late.id]
+        assert [update["device"] for update in changes["device_updates"]] == [late.id]
+
+    @staticmethod
+    def test_changes_out_of_order_ids(flaskclient, dbsession):
+        """Test that an update with a lower id stored later is returned at once."""
+
+        device = stamped(dbsession, DeviceFactory())
+        other = stamped(dbsession, DeviceFactory())
+        add_device_updates(dbsession, device, 1, BASE_TIME + dt.timedelta(minutes=1))
+        last_id = device.updates[-1].id
+        cursor = get_changes(flaskclient)["cursor"]
+
+        def add_update(record, update_id):
+            record.total_updates += 1
+            update = DeviceUpdate(record.id)
+            update.id = update_id
+            update.timestamp = BASE_TIME + dt.timedelta(hours=update_id)
+            update.update_index = record.total_updates
+            dbsession.add(update)
+            dbsession.commit()
+
+        # the ids of concurrent transactions commit out of order, or are lost
+        add_update(other, last_id + 3)
+        changes = get_changes(flaskclient, cursor)
+        assert [update["id"] for update in changes["device_updates"]] == [last_id + 3]
+
+        add_update(device, last_id + 1)
+        changes = get_changes(flaskclient, changes["cursor"])
+        assert [update["id"] for update in changes["device_updates"]] == [last_id + 1]
+
+    @staticmethod
+    def test_changes_edited(flaskclient, dbsession):
+        """Test that a record edited without new updates is returned without updates."""
+
+        device = stamped(dbsession, DeviceFactory())
+        add_device_updates(dbsession, device, 2, BASE_TIME + dt.timedelta(minutes=1))
+        cursor = get_changes(flaskclient)["cursor"]
+
+        device.name = "renamed"
+        device.last_updated = BASE_TIME + dt.timedelta(hours=1)
+        dbsession.commit()
+        changes = get_changes(flaskclient, cursor)
+
+        assert [record["name"] for record in changes["devices"]] == ["renamed"]
+        assert changes["device_updates"] == []
+
+    @staticmethod
+    def test_changes_deleted(flaskclient, dbsession):
+        """Test that the ids of the deleted devices and grainbins are returned once."""
+
+        grainbin = stamped(dbsession, GrainbinFactory())
+        device = stamped(dbsession, DeviceFactory())
+        grainbin_id, device_id = grainbin.id, device.id
+        cursor = get_changes(flaskclient)["cursor"]
+
+        dbsession.delete(grainbin)
+        dbsession.delete(device)
+        dbsession.commit()
+        changes = get_changes(flaskclient, cursor)
+
+        assert changes["deleted_devices"] == [device_id]
+        assert changes["deleted_grainbins"] == [grainbin_id]
+        changes = get_changes(flaskclient, changes["cursor"])
+        assert changes["deleted_devices"] == []
+        assert changes["deleted_grainbins"] == []
+
+    @staticmethod
+    def test_changes_cursor_size(dbsession, flaskclient):
+        """Test that the cursor does not grow with the updates of the records."""
+
+        device = stamped(dbsession, DeviceFactory())
+        cursor = get_changes(flaskclient)["cursor"]
+        add_device_updates(dbsession, device, 20, BASE_TIME + dt.timedelta(hours=1))
+
+        changes = get_changes(flaskclient, cursor)
+
+        assert len(changes["device_updates"]) == 20
+        # the number of device marks, then the mark of the device
+        assert len(decode_cursor(changes["cursor"], None)) == 4
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "since",
+        [
+            "bad",
+            encode_cursor([]),
+            encode_cursor([1, 2, 3]),
+            encode_cursor([2, 1, 2, 3]),
+            encode_cursor([-1, 1, 2, 3]),
+            encode_cursor([1, 2, 0, 10**30]),
+        ],
+    )
+    def test_changes_invalid_cursor(flaskclient, since):
+        """Test that an invalid cursor is rejected."""
+
+        rep = flaskclient.get(url_for("changes.Changes", since=since))
+
+        assert rep.status_code == 400
@@ -7,8 +7,10 @@ from flask import url_for
 from flask.testing import FlaskClient
 from fm_database.database import create_all_tables, drop_all_tables, get_session
 from fm_database.models.user import User
+from sqlalchemy import event
 
 from fm_api.app import create_app
+from fm_api.base import update_count
 from fm_api.settings import TestConfig
 
 from .factories import UserFactory
@@ -36,6 +38,8 @@ class HtmlTestClient(FlaskClient):
 def app():
     """An application for the tests."""
     _app = create_app(TestConfig)
+    # the counts are cached by statement, which is the same in every test
+    update_count.clear()
     ctx = _app.test_request_context()
     ctx.push()
 
@@ -69,6 +73,24 @@ def tables(dbsession):
     drop_all_tables()
 
 
+@pytest.fixture
+def statements(dbsession):
+    """The SQL statements run on the database during the test.
+
+    Clear the list before the requests whose statements are counted.
+    """
+    executed: list[str] = []
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        executed.append(statement)
+
+    engine = dbsession.get_bind()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield executed
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
 @pytest.fixture
 def user(tables):
     """A user for the tests."""
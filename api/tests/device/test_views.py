@@ -5,10 +5,19 @@ import json
 
 import pytest
 from flask import url_for
+from fm_database.database import engine
 from fm_database.models.device import DeviceUpdate
+from fm_database.paginate import encode_cursor
+from fm_database.rollups import add_device_rollups
+from sqlalchemy import insert
 
 from ..factories import DeviceFactory
 
+# the update totals are estimated by the query planner on PostgreSQL
+exact_totals = pytest.mark.skipif(
+    engine.dialect.name == "postgresql", reason="the totals are estimated"
+)
+
 
 @pytest.mark.usefixtures("tables")
 class TestAPIDevices:
@@ -92,6 +101,34 @@ class TestAPIDevicesById:
         assert rep.status_code == 404
         assert message["message"] == "Device with device id: 5 not found."
 
+    @staticmethod
+    def test_api_devices_by_id_conditional_get(flaskclient, auth_headers):
+        """Test that an unchanged device is not modified, and a changed one is."""
+
+        device = DeviceFactory()
+        device.save()
+
+        url = url_for("device.DevicesById", device_id=device.id)
+        rep = flaskclient.get(url, headers=auth_headers)
+        etag, last_modified = rep.headers["ETag"], rep.headers["Last-Modified"]
+        assert rep.status_code == 200
+
+        rep = flaskclient.get(url, headers={**auth_headers, "If-None-Match": etag})
+        assert rep.status_code == 304
+        assert rep.headers["ETag"] == etag
+
+        rep = flaskclient.get(
+            url,
+            headers={**auth_headers, "If-Modified-Since": last_modified},
+        )
+        assert rep.status_code == 304
+
+        device.total_updates = 1
+        device.save()
+        rep = flaskclient.get(url, headers={**auth_headers, "If-None-Match": etag})
+        assert rep.status_code == 200
+        assert rep.headers["ETag"] != etag
+
 
 @pytest.mark.usefixtures("tables")
 class TestAPIDeviceUpdates:
@@ -121,14 +158,17 @@ class TestAPIDeviceUpdates:
         assert len(fetched_device_update) == 10
 
     @staticmethod
+    @exact_totals
     def test_api_device_updates_get_multiple_devices(
         flaskclient, auth_headers, dbsession
     ):
         """Test that a device update is returned by ID. when there are multiple devices."""
 
         device_1 = DeviceFactory()
+        device_1.total_updates = 25
         device_1.save()
         device_2 = DeviceFactory()
+        device_2.total_updates = 25
         device_2.save()
 
         # create a bunch of DeviceUpdates
@@ -154,6 +194,27 @@ class TestAPIDeviceUpdates:
         assert fetched_device_update[0]["device"] == device_1.id
         assert returned_header["total"] == 25
 
+    @staticmethod
+    @exact_totals
+    def test_api_device_updates_pruned_total(flaskclient, auth_headers, dbsession):
+        """Test that the total counts the stored updates, not total_updates."""
+
+        device = DeviceFactory()
+        # 25 updates were received, but the first 20 were pruned
+        device.total_updates = 25
+        device.save()
+        for x in range(20, 25):
+            device_update = DeviceUpdate(device.id)
+            device_update.timestamp = dt.datetime(2024, 1, 1) + dt.timedelta(hours=x)
+            device_update.update_index = x
+            dbsession.add(device_update)
+        dbsession.commit()
+
+        url = url_for("device.DeviceUpdates", device_id=device.id)
+        rep = flaskclient.get(url, headers=auth_headers)
+
+        assert json.loads(rep.headers["X-Pagination"])["total"] == 5
+
     @staticmethod
     def test_api_device_updates_empty_for_no_device(flaskclient, auth_headers):
         """Test that a no DeviceUpdates is returned for non-existent device."""
@@ -166,10 +227,13 @@ class TestAPIDeviceUpdates:
         assert len(message) == 0
 
     @staticmethod
+    @exact_totals
     def test_api_device_updates_pagination_header(flaskclient, auth_headers, dbsession):
         """Test that the pagination header is present and accurate."""
 
+        # total_updates matches the stored updates here
         device = DeviceFactory()
+        device.total_updates = 25
         device.save()
 
         # create a bunch of DeviceUpdates
@@ -191,6 +255,123 @@ class TestAPIDeviceUpdates:
         assert returned_header["total"] == 25
         assert returned_header["total_pages"] == 3
 
+    @staticmethod
+    def test_api_device_updates_cursor(flaskclient, auth_headers, dbsession):
+        """Test that the cursor pages through all the updates, newest first."""
+
+        device = DeviceFactory()
+        device.save()
+
+        start = dt.datetime(2024, 1, 1)
+        for x in range(25):
+            device_update = DeviceUpdate(device.id)
+            device_update.timestamp = start + dt.timedelta(minutes=x)
+            device_update.update_index = x
+            dbsession.add(device_update)
+
+        dbsession.commit()
+
+        url = url_for("device.DeviceUpdates", device_id=device.id)
+        update_indexes = []
+        cursor = ""
+        for _ in range(3):
+            rep = flaskclient.get(
+                url, query_string={"cursor": cursor}, headers=auth_headers
+            )
+            returned_header = json.loads(rep.headers.get("X-Pagination"))
+            assert rep.status_code == 200
+            assert "total" not in returned_header
+            update_indexes += [update["update_index"] for update in rep.get_json()]
+            cursor = returned_header.get("next_cursor")
+
+        assert update_indexes == list(range(24, -1, -1))
+        assert cursor is None
+
+    @staticmethod
+    def test_api_device_updates_conditional_get(flaskclient, auth_headers, dbsession):
+        """Test that the updates are not modified until the device has a new update."""
+
+        device = DeviceFactory()
+        device.save()
+
+        url = url_for("device.DeviceUpdates", device_id=device.id)
+        etag = flaskclient.get(url, headers=auth_headers).headers["ETag"]
+        rep = flaskclient.get(url, headers={**auth_headers, "If-None-Match": etag})
+        assert rep.status_code == 304
+
+        # the ETag depends on the query arguments
+        rep = flaskclient.get(
+            url,
+            query_string={"page": 2},
+            headers={**auth_headers, "If-None-Match": etag},
+        )
+        assert rep.status_code == 200
+
+        device_update = DeviceUpdate(device.id)
+        device_update.timestamp = dt.datetime.now()
+        device_update.update_index = 0
+        dbsession.add(device_update)
+        device.total_updates = 1
+        dbsession.commit()
+
+        rep = flaskclient.get(url, headers={**auth_headers, "If-None-Match": etag})
+        assert rep.status_code == 200
+        assert len(rep.get_json()) == 1
+
+    @staticmethod
+    def test_api_device_updates_cached(flaskclient, auth_headers, dbsession):
+        """Test that the updates are cached until the device has a new update."""
+
+        device = DeviceFactory()
+        device.save()
+        url = url_for("device.DeviceUpdates", device_id=device.id)
+
+        def add_update(update_index):
+            device_update = DeviceUpdate(device.id)
+            device_update.timestamp = dt.datetime(2024, 1, 1, update_index)
+            device_update.update_index = update_index
+            dbsession.add(device_update)
+            dbsession.commit()
+
+        add_update(0)
+        device.total_updates = 1
+        device.save()
+        rep = flaskclient.get(url, headers=auth_headers)
+        assert len(rep.get_json()) == 1
+
+        # an update that is not counted yet is not seen
+        add_update(1)
+        cached = flaskclient.get(url, headers=auth_headers)
+        assert cached.get_json() == rep.get_json()
+        assert cached.headers["ETag"] == rep.headers["ETag"]
+        assert cached.headers["X-Pagination"] == rep.headers["X-Pagination"]
+        rep = flaskclient.get(
+            url, headers={**auth_headers, "If-None-Match": rep.headers["ETag"]}
+        )
+        assert rep.status_code == 304
+
+        device.total_updates = 2
+        device.save()
+        rep = flaskclient.get(url, headers=auth_headers)
+        assert len(rep.get_json()) == 2
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "cursor", ["bad", encode_cursor(["1 OR 1=1", 1]), encode_cursor([{}, []])]
+    )
+    def test_api_device_updates_cursor_invalid(flaskclient, auth_headers, cursor):
+        """Test that an invalid cursor returns a 400."""
+
+        device = DeviceFactory()
+        device.save()
+
+        url = url_for("device.DeviceUpdates", device_id=device.id)
+        rep = flaskclient.get(
+            url, query_string={"cursor": cursor}, headers=auth_headers
+        )
+
+        assert rep.status_code == 400
+
 
 @pytest.mark.usefixtures("tables")
 class TestAPIDeviceUpdatesLatest:
@@ -229,3 +410,179 @@ class TestAPIDeviceUpdatesLatest:
 
         assert rep.status_code == 404
         assert message["message"] == "Device with device id: 5 not found."
+
+
+@pytest.mark.usefixtures("tables")
+class TestAPIDeviceUpdatesExport:
+    """Test the API DeviceUpdatesExport MethodView."""
+
+    @staticmethod
+    def test_api_device_updates_export_csv(flaskclient, auth_headers, dbsession):
+        """Test that the updates of a device are exported as CSV, oldest first."""
+
+        device = DeviceFactory()
+        device.save()
+        dbsession.execute(
+            insert(DeviceUpdate),
+            [
+                {
+                    "device_id": device.id,
+                    "timestamp": dt.datetime(2024, 1, 1, hour),
+                    "update_index": hour,
+                    "interior_temp": 20.0 + hour,
+                    "uptime": dt.timedelta(hours=hour),
+                }
+                for hour in (2, 0, 1)
+            ],
+        )
+        dbsession.commit()
+
+        url = url_for("device.DeviceUpdatesExport", device_id=device.id)
+        rep = flaskclient.get(url, headers=auth_headers)
+        lines = rep.get_data(as_text=True).splitlines()
+
+        assert rep.status_code == 200
+        assert rep.mimetype == "text/csv"
+        assert lines[0].startswith("timestamp,update_index,interior_temp,")
+        assert [line.split(",")[:4] for line in lines[1:]] == [
+            ["2024-01-01T00:00:00", "0", "20.0", ""],
+            ["2024-01-01T01:00:00", "1", "21.0", ""],
+            ["2024-01-01T02:00:00", "2", "22.0", ""],
+        ]
+        assert lines[2].split(",")[5] == "3600.0"
+
+    @staticmethod
+    def test_api_device_updates_export_no_device(flaskclient, auth_headers):
+        """Test that a 404 message is returned for non-existent device."""
+
+        url = url_for("device.DeviceUpdatesExport", device_id=5)
+        rep = flaskclient.get(url, headers=auth_headers)
+
+        assert rep.status_code == 404
+        assert rep.get_json()["message"] == "Device with device id: 5 not found."
+
+
+@pytest.mark.usefixtures("tables")
+class TestAPIDeviceRollups:
+    """Test the API DeviceRollups MethodView."""
+
+    @staticmethod
+    def test_api_device_rollups_get(flaskclient, auth_headers, dbsession):
+        """Test that the hourly rollups of the device are returned."""
+
+        device = DeviceFactory().save()
+        now = dt.datetime.now()
+        add_device_rollups(dbsession, device.id, now, 20.0, None)
+        add_device_rollups(dbsession, device.id, now, 22.0, 5.0)
+        dbsession.commit()
+
+        url = url_for("device.DeviceRollups", device_id=device.id)
+        rep = flaskclient.get(url, headers=auth_headers)
+        fetched_rollups = rep.get_json()
+
+        assert rep.status_code == 200
+        assert len(fetched_rollups) == 1
+        assert fetched_rollups[0]["period"] == "hour"
+        assert fetched_rollups[0]["interior_count"] == 2
+        assert fetched_rollups[0]["interior_avg"] == 21.0
+        assert fetched_rollups[0]["exterior_avg"] == 5.0
+
+    @staticmethod
+    def test_api_device_rollups_get_no_device(flaskclient, auth_headers):
+        """Test that the route returns 404 for an incorrect device ID."""
+
+        url = url_for("device.DeviceRollups", device_id=1)
+        rep = flaskclient.get(url, headers=auth_headers)
+
+        assert rep.status_code == 404
+
+
+@pytest.mark.usefixtures("tables")
+class TestAPIDeviceSeries:
+    """Test the API DeviceSeries MethodView."""
+
+    @staticmethod
+    def test_api_device_series_get(flaskclient, auth_headers, dbsession):
+        """Test that the hourly aggregates of a column are returned."""
+
+        device = DeviceFactory().save()
+        start = dt.datetime(2024, 1, 1, 10)
+        dbsession.execute(
+            insert(DeviceUpdate),
+            [
+                {
+                    "device_id": device.id,
+                    "timestamp": start + dt.timedelta(minutes=20 * number),
+                    "update_index": number,
+                    "interior_temp": 10.0 + number,
+                    "disk_free": 100 * number,
+                }
+                for number in range(6)
+            ],
+        )
+        dbsession.commit()
+
+        url = url_for("device.DeviceSeries", device_id=device.id)
+        rep = flaskclient.get(
+            url,
+            headers=auth_headers,
+            query_string={"start": "2024-01-01T00:00:00", "end": "2024-01-02T00:00:00"},
+        )
+        series = rep.get_json()
+
+        assert rep.status_code == 200
+        assert series == [
+            {
+                "bucket": "2024-01-01T10:00:00",
+                "avg": 11.0,
+                "min": 10.0,
+                "max": 12.0,
+                "count": 3,
+            },
+            {
+                "bucket": "2024-01-01T11:00:00",
+                "avg": 14.0,
+                "min": 13.0,
+                "max": 15.0,
+                "count": 3,
+            },
+        ]
+
+        rep = flaskclient.get(
+            url,
+            headers=auth_headers,
+            query_string={
+                "start": "2024-01-01T00:00:00",
+                "end": "2024-01-02T00:00:00",
+                "bucket": "day",
+                "column": "disk_free",
+            },
+        )
+        series = rep.get_json()
+
+        assert rep.status_code == 200
+        assert len(series) == 1
+        assert series[0]["max"] == 500.0
+        assert series[0]["count"] == 6
+
+    @staticmethod
+    def test_api_device_series_invalid_column(flaskclient, auth_headers):
+        """Test that the route returns 422 for a column that can not be aggregated."""
+
+        device = DeviceFactory().save()
+
+        url = url_for("device.DeviceSeries", device_id=device.id)
+        rep = flaskclient.get(
+            url, headers=auth_headers, query_string={"column": "uptime"}
+        )
+
+        assert rep.status_code == 422
+
+    @staticmethod
+    def test_api_device_series_get_no_device(flaskclient, auth_headers):
+        """Test that the route returns 404 for an incorrect device ID."""
+
+        url = url_for("device.DeviceSeries", device_id=1)
+        rep = flaskclient.get(url, headers=auth_headers)
+
+        assert rep.status_code == 404
@@ -5,10 +5,24 @@ import json
 
 import pytest
 from flask import url_for
+from fm_database.database import engine, insert_on_conflict_do_nothing
+from fm_database.latest import add_latest_readings
 from fm_database.models.device import GrainbinUpdate
+from fm_database.paginate import encode_cursor
+from fm_database.rollups import add_grainbin_rollups
+from sqlalchemy import insert, select
 
 from ..factories import GrainbinFactory
 
+# the unique columns of a reading of a grainbin update.
+UPDATE_KEY = ["grainbin_id", "timestamp", "sensor_name"]
+
+
+# the update totals are estimated by the query planner on PostgreSQL
+exact_totals = pytest.mark.skipif(
+    engine.dialect.name == "postgresql", reason="the totals are estimated"
+)
+
 
 @pytest.mark.usefixtures("tables")
 class TestAPIGrainbins:
@@ -54,6 +68,22 @@ class TestAPIGrainbins:
 
         assert response.status_code == 404
 
+    @staticmethod
+    def test_grainbins_get_all_conditional_get(flaskclient, auth_headers):
+        """Test the grainbins are not modified until a grainbin is added."""
+
+        GrainbinFactory().save()
+
+        url = url_for("grainbin.Grainbins")
+        etag = flaskclient.get(url, headers=auth_headers).headers["ETag"]
+        rep = flaskclient.get(url, headers={**auth_headers, "If-None-Match": etag})
+        assert rep.status_code == 304
+
+        GrainbinFactory().save()
+        rep = flaskclient.get(url, headers={**auth_headers, "If-None-Match": etag})
+        assert rep.status_code == 200
+        assert len(rep.get_json()) == 2
+
 
 @pytest.mark.usefixtures("tables")
 class TestAPIGrainbinUpdates:
@@ -93,17 +123,32 @@ class TestAPIGrainbinUpdates:
         assert len(fetched_updates) == 0
 
     @staticmethod
+    @exact_totals
     def test_grainbin_updates_pagination_header(flaskclient, auth_headers, dbsession):
         """Test that the pagination header is present and acurate."""
 
-        grainbin = GrainbinFactory().save()
-
-        # create some GrainbinUpdates
-        for x in range(25):
-            grainbin_update = GrainbinUpdate(grainbin.id)
-            grainbin_update.timestamp = dt.datetime.now()
-            grainbin_update.update_index = x
-            dbsession.add(grainbin_update)
+        # the total is the update counter times the sensors, kept by the ingest
+        grainbin = GrainbinFactory()
+        grainbin.total_updates = 5
+        grainbin.save()
+
+        # create 5 GrainbinUpdates of 5 sensors
+        rows = [
+            {
+                "grainbin_id": grainbin.id,
+                "timestamp": dt.datetime(2024, 1, 1, x),
+                "update_index": x,
+                "sensor_name": f"sensor{sensor}",
+                "temperature": 20.0,
+                "temphigh": 1,
+                "templow": sensor,
+            }
+            for x in range(1, 6)
+            for sensor in range(5)
+        ]
+        insert_on_conflict_do_nothing(dbsession, GrainbinUpdate, rows, UPDATE_KEY)
+        add_latest_readings(dbsession, rows)
+        dbsession.commit()
 
         url = url_for("grainbin.GrainbinUpdates", grainbin_id=grainbin.id)
         rep = flaskclient.get(url, headers=auth_headers)
@@ -115,53 +160,155 @@ class TestAPIGrainbinUpdates:
         assert returned_header["total"] == 25
         assert returned_header["total_pages"] == 3
 
+    @staticmethod
+    def test_grainbin_updates_cached_count(flaskclient, auth_headers, statements):
+        """Test that the total is counted once, then a page is a single query."""
 
-@pytest.mark.usefixtures("tables")
-class TestAPIGrainbinUpdatesLatest:
-    """Test the API GrainbinUpdatesLatest MethodView."""
+        grainbin = GrainbinFactory().save()
+        statements.clear()
+        url = url_for("grainbin.GrainbinUpdates", grainbin_id=grainbin.id)
+        rep = flaskclient.get(url, headers=auth_headers)
+        first = len([stm for stm in statements if "FROM grainbin_update" in stm])
+        statements.clear()
+        flaskclient.get(url, headers=auth_headers, query_string={"page": 2})
+
+        assert rep.status_code == 200
+        assert first == 2
+        assert len([stm for stm in statements if "FROM grainbin_update" in stm]) == 1
 
     @staticmethod
-    def test_grainbin_updates_latest_get(flaskclient, auth_headers, dbsession):
-        """Test that the latest update is returned for a grainbin."""
+    @exact_totals
+    def test_grainbin_updates_pruned_total(flaskclient, auth_headers, dbsession):
+        """Test that the total counts the stored updates, not total_updates."""
+
+        grainbin = GrainbinFactory()
+        # 5 updates were received, but the first 3 were pruned
+        grainbin.total_updates = 5
+        grainbin.save()
+        for update_index in (4, 5):
+            for sensor_name in ("28.1", "28.2"):
+                update = GrainbinUpdate(grainbin.id)
+                update.timestamp = dt.datetime(2024, 1, 1, update_index)
+                update.update_index = update_index
+                update.sensor_name = sensor_name
+                dbsession.add(update)
+        dbsession.commit()
+
+        url = url_for("grainbin.GrainbinUpdates", grainbin_id=grainbin.id)
+        rep = flaskclient.get(url, headers=auth_headers)
+
+        assert json.loads(rep.headers["X-Pagination"])["total"] == 4
+
+    @staticmethod
+    def test_grainbin_updates_cursor(flaskclient, auth_headers, dbsession):
+        """Test that the cursor pages through the updates with the page size."""
 
         grainbin = GrainbinFactory().save()
 
-        # create some GrainbinUpdates
-        for x in range(25):
+        start = dt.datetime(2024, 1, 1)
+        for x in range(15):
             grainbin_update = GrainbinUpdate(grainbin.id)
-            grainbin_update.timestamp = dt.datetime.now()
+            grainbin_update.timestamp = start + dt.timedelta(minutes=x)
             grainbin_update.update_index = x
-            grainbin.total_updates = x
             dbsession.add(grainbin_update)
 
         dbsession.commit()
 
+        url = url_for("grainbin.GrainbinUpdates", grainbin_id=grainbin.id)
+        rep = flaskclient.get(
+            url, query_string={"cursor": "", "page_size": 8}, headers=auth_headers
+        )
+        returned_header = json.loads(rep.headers["X-Pagination"])
+
+        assert rep.status_code == 200
+        assert [update["update_index"] for update in rep.get_json()] == list(
+            range(14, 6, -1)
+        )
+        assert returned_header["page_size"] == 8
+
+        rep = flaskclient.get(
+            url,
+            query_string={"cursor": returned_header["next_cursor"], "page_size": 8},
+            headers=auth_headers,
+        )
+        returned_header = json.loads(rep.headers["X-Pagination"])
+
+        assert [update["update_index"] for update in rep.get_json()] == list(
+            range(6, -1, -1)
+        )
+        assert "next_cursor" not in returned_header
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "cursor", ["bad", encode_cursor(["1 OR 1=1", 1]), encode_cursor([{}, []])]
+    )
+    def test_grainbin_updates_cursor_invalid(flaskclient, auth_headers, cursor):
+        """Test that an invalid cursor returns a 400."""
+
+        grainbin = GrainbinFactory().save()
+
+        url = url_for("grainbin.GrainbinUpdates", grainbin_id=grainbin.id)
+        rep = flaskclient.get(
+            url, query_string={"cursor": cursor}, headers=auth_headers
+        )
+
+        assert rep.status_code == 400
+
+
+@pytest.mark.usefixtures("tables")
+class TestAPIGrainbinUpdatesLatest:
+    """Test the API GrainbinUpdatesLatest MethodView."""
+
+    @staticmethod
+    def add_readings(dbsession, grainbin, update_index, sensor_names):
+        """Add the readings of an update and its latest readings, like the ingest."""
+
+        timestamp = dt.datetime(2024, 1, 1) + dt.timedelta(hours=update_index)
+        rows = [
+            {
+                "grainbin_id": grainbin.id,
+                "timestamp": timestamp,
+                "update_index": update_index,
+                "sensor_name": sensor_name,
+                "temperature": 20.0,
+                "temphigh": 1,
+                "templow": templow,
+            }
+            for templow, sensor_name in enumerate(sensor_names)
+        ]
+        insert_on_conflict_do_nothing(dbsession, GrainbinUpdate, rows, UPDATE_KEY)
+        add_latest_readings(dbsession, [row for row in rows if "id" in row])
+        dbsession.commit()
+
+    def test_grainbin_updates_latest_get(self, flaskclient, auth_headers, dbsession):
+        """Test that the latest update is returned for a grainbin."""
+
+        grainbin = GrainbinFactory().save()
+
+        for x in range(25):
+            self.add_readings(dbsession, grainbin, x, ["28.1"])
+
         url = url_for("grainbin.GrainbinUpdatesLatest", grainbin_id=grainbin.id)
         rep = flaskclient.get(url, headers=auth_headers)
         fetched_update = rep.get_json()
 
         assert rep.status_code == 200
+        assert len(fetched_update) == 1
         assert fetched_update[0]["update_index"] == 24
+        assert fetched_update[0]["grainbin"] == grainbin.id
+        assert fetched_update[0]["sensor_name"] == "28.1"
 
-    @staticmethod
-    def test_grainbin_updates_latest_get_multiple(flaskclient, auth_headers, dbsession):
+    def test_grainbin_updates_latest_get_multiple(
+        self, flaskclient, auth_headers, dbsession
+    ):
         """Test that all the latest updates are returned for a grainbin."""
 
         grainbin = GrainbinFactory().save()
 
-        # create two GrainbinUpdates for each iteration
+        # a sensor that is not in the latest update is left out
+        self.add_readings(dbsession, grainbin, 2, ["28.1", "28.2", "28.3"])
         for x in range(5):
-            grainbin_update = GrainbinUpdate(grainbin.id)
-            grainbin_update.timestamp = dt.datetime.now()
-            grainbin_update.update_index = x
-            grainbin_update_2 = GrainbinUpdate(grainbin.id)
-            grainbin_update_2.timestamp = dt.datetime.now()
-            grainbin_update_2.update_index = x
-            grainbin.total_updates = x
-            dbsession.add(grainbin_update)
-            dbsession.add(grainbin_update_2)
-
-        dbsession.commit()
+            self.add_readings(dbsession, grainbin, x, ["28.1", "28.2"])
 
         url = url_for("grainbin.GrainbinUpdatesLatest", grainbin_id=grainbin.id)
         rep = flaskclient.get(url, headers=auth_headers)
@@ -170,6 +317,37 @@ class TestAPIGrainbinUpdatesLatest:
         assert rep.status_code == 200
         assert len(fetched_update) == 2
         assert fetched_update[0]["update_index"] == 4
+        # ordered by sensor number, highest first
+        assert [update["templow"] for update in fetched_update] == [1, 0]
+        # the ids are the ids of the grainbin updates
+        update_ids = dbsession.scalars(
+            select(GrainbinUpdate.id)
+            .where(GrainbinUpdate.grainbin_id == grainbin.id)
+            .where(GrainbinUpdate.update_index == 4)
+            .order_by(GrainbinUpdate.templow.desc())
+        ).all()
+        assert [update["id"] for update in fetched_update] == update_ids
+
+    def test_grainbin_updates_latest_conditional_get(
+        self, flaskclient, auth_headers, dbsession
+    ):
+        """Test the latest update is not modified until the grainbin has a new update."""
+
+        grainbin = GrainbinFactory().save()
+        self.add_readings(dbsession, grainbin, 1, ["28.1"])
+
+        url = url_for("grainbin.GrainbinUpdatesLatest", grainbin_id=grainbin.id)
+        etag = flaskclient.get(url, headers=auth_headers).headers["ETag"]
+        rep = flaskclient.get(url, headers={**auth_headers, "If-None-Match": etag})
+        assert rep.status_code == 304
+        assert rep.get_data() == b""
+
+        self.add_readings(dbsession, grainbin, 2, ["28.1"])
+        grainbin.total_updates = 2
+        dbsession.commit()
+        rep = flaskclient.get(url, headers={**auth_headers, "If-None-Match": etag})
+        assert rep.status_code == 200
+        assert rep.get_json()[0]["update_index"] == 2
 
     @staticmethod
     def test_grainbin_updates_latest_get_no_grainbin(flaskclient, auth_headers):
@@ -194,3 +372,481 @@ class TestAPIGrainbinUpdatesLatest:
 
         assert rep.status_code == 404
         assert rep_json["message"] == f"No updates for Grainbin with id: {grainbin.id}"
+
+
+@pytest.mark.usefixtures("tables")
+class TestAPIGrainbinsLatest:
+    """Test the API GrainbinsLatest MethodView."""
+
+    add_readings = staticmethod(TestAPIGrainbinUpdatesLatest.add_readings)
+
+    def test_grainbins_latest_get(self, flaskclient, auth_headers, dbsession):
+        """Test that every grainbin is returned with its latest readings."""
+
+        grainbins = [GrainbinFactory().save() for _ in range(3)]
+        self.add_readings(dbsession, grainbins[0], 1, ["a", "b", "c"])
+        self.add_readings(dbsession, grainbins[0], 2, ["a", "b"])
+        self.add_readings(dbsession, grainbins[2], 7, ["a"])
+
+        url = url_for("grainbin.GrainbinsLatest")
+        rep = flaskclient.get(url, headers=auth_headers)
+        overview = rep.get_json()
+
+        assert rep.status_code == 200
+        assert [item["grainbin"]["id"] for item in overview] == [
+            grainbin.id for grainbin in grainbins
+        ]
+        assert [reading["sensor_name"] for reading in overview[0]["latest"]] == [
+            "b",
+            "a",
+        ]
+        assert overview[0]["latest"][0]["update_index"] == 2
+        assert overview[1]["latest"] == []
+        assert overview[2]["latest"][0]["grainbin"] == grainbins[2].id
+
+    def test_grainbins_latest_get_device(self, flaskclient, auth_headers, dbsession):
+        """Test that the grainbins can be filtered by device."""
+
+        grainbin = GrainbinFactory().save()
+        other = GrainbinFactory().save()
+        self.add_readings(dbsession, grainbin, 1, ["a"])
+        self.add_readings(dbsession, other, 1, ["a"])
+
+        url = url_for("grainbin.GrainbinsLatest")
+        rep = flaskclient.get(
+            url, headers=auth_headers, query_string={"device": grainbin.device.id}
+        )
+        overview = rep.get_json()
+
+        assert rep.status_code == 200
+        assert len(overview) == 1
+        assert overview[0]["grainbin"]["id"] == grainbin.id
+        assert overview[0]["grainbin"]["device"] == grainbin.device.id
+        assert len(overview[0]["latest"]) == 1
+
+    def test_grainbins_latest_device_changed(
+        self, flaskclient, auth_headers, dbsession
+    ):
+        """Test that a change of the device of a grainbin changes the version."""
+
+        grainbin = GrainbinFactory().save()
+        self.add_readings(dbsession, grainbin, 1, ["a"])
+        grainbin.device.last_updated = dt.datetime(2000, 1, 1)
+        dbsession.commit()
+
+        url = url_for("grainbin.GrainbinsLatest")
+        etag = flaskclient.get(url, headers=auth_headers).headers["ETag"]
+        grainbin.device.last_updated = dt.datetime(2000, 1, 2)
+        dbsession.commit()
+        rep = flaskclient.get(url, headers={**auth_headers, "If-None-Match": etag})
+
+        assert rep.status_code == 200
+        assert rep.headers["ETag"] != etag
+
+    def test_grainbins_latest_constant_queries(
+        self, flaskclient, auth_headers, dbsession, statements
+    ):
+        """Test that the number of queries does not grow with the grainbins."""
+
+        for _ in range(10):
+            grainbin = GrainbinFactory().save()
+            self.add_readings(dbsession, grainbin, 1, ["a", "b"])
+        dbsession.expunge_all()
+        statements.clear()
+        rep = flaskclient.get(url_for("grainbin.GrainbinsLatest"), headers=auth_headers)
+
+        assert rep.status_code == 200
+        assert len(rep.get_json()) == 10
+        # the version of the grainbins, the grainbins and the latest readings
+        assert len(statements) == 3
+
+
+@pytest.mark.usefixtures("tables")
+class TestAPIGrainbinRollups:
+    """Test the API GrainbinRollups MethodView."""
+
+    @staticmethod
+    def add_readings(dbsession, grainbin):
+        """Add the rollups of two sensors, with a reading every 20 minutes."""
+
+        start = dt.datetime(2024, 1, 1, 10)
+        rows = [
+            {
+                "grainbin_id": grainbin.id,
+                "timestamp": start + dt.timedelta(minutes=20 * number),
+                "temperature": 20.0 + number,
+                "temphigh": 1,
+                "templow": sensor,
+            }
+            for number in range(6)
+            for sensor in (1, 2)
+        ]
+        add_grainbin_rollups(dbsession, rows)
+        dbsession.commit()
+
+    def test_grainbin_rollups_get(self, flaskclient, auth_headers, dbsession):
+        """Test that the hourly rollups of each sensor are returned."""
+
+        grainbin = GrainbinFactory().save()
+        self.add_readings(dbsession, grainbin)
+
+        url = url_for("grainbin.GrainbinRollups", grainbin_id=grainbin.id)
+        rep = flaskclient.get(
+            url, headers=auth_headers, query_string={"start": "2024-01-01T00:00:00"}
+        )
+        fetched_rollups = rep.get_json()
+
+        assert rep.status_code == 200
+        assert len(fetched_rollups) == 4
+        assert fetched_rollups[0]["bucket"] == "2024-01-01T10:00:00"
+        assert fetched_rollups[0]["temperature_count"] == 3
+        assert fetched_rollups[0]["temperature_min"] == 20.0
+        assert fetched_rollups[0]["temperature_max"] == 22.0
+        assert fetched_rollups[0]["temperature_avg"] == 21.0
+
+    def test_grainbin_rollups_get_daily_sensor(
+        self, flaskclient, auth_headers, dbsession
+    ):
+        """Test that the daily rollups can be filtered by sensor."""
+
+        grainbin = GrainbinFactory().save()
+        self.add_readings(dbsession, grainbin)
+
+        url = url_for("grainbin.GrainbinRollups", grainbin_id=grainbin.id)
+        rep = flaskclient.get(
+            url,
+            headers=auth_headers,
+            query_string={
+                "period": "day",
+                "start": "2024-01-01T00:00:00",
+                "end": "2024-01-02T00:00:00",
+                "templow": 2,
+            },
+        )
+        fetched_rollups = rep.get_json()
+
+        assert rep.status_code == 200
+        assert len(fetched_rollups) == 1
+        assert fetched_rollups[0]["templow"] == 2
+        assert fetched_rollups[0]["temperature_count"] == 6
+
+    @staticmethod
+    def test_grainbin_rollups_get_invalid_period(flaskclient, auth_headers):
+        """Test that the route returns 422 for an unknown period."""
+
+        grainbin = GrainbinFactory().save()
+
+        url = url_for("grainbin.GrainbinRollups", grainbin_id=grainbin.id)
+        rep = flaskclient.get(
+            url, headers=auth_headers, query_string={"period": "week"}
+        )
+
+        assert rep.status_code == 422
+
+    @staticmethod
+    def test_grainbin_rollups_get_no_grainbin(flaskclient, auth_headers):
+        """Test that the route returns 404 for an incorrect grainbin ID."""
+
+        url = url_for("grainbin.GrainbinRollups", grainbin_id=1)
+        rep = flaskclient.get(url, headers=auth_headers)
+
+        assert rep.status_code == 404
+
+
+@pytest.mark.usefixtures("tables")
+class TestAPIGrainbinUpdatesExport:
+    """Test the API GrainbinUpdatesExport MethodView."""
+
+    @staticmethod
+    def add_updates(dbsession, grainbin, count):
+        """Add count updates of two sensors, one every hour."""
+
+        rows = [
+            {
+                "grainbin_id": grainbin.id,
+                "timestamp": dt.datetime(2024, 1, 1) + dt.timedelta(hours=number),
+                "update_index": number,
+                "sensor_name": f"sensor{sensor}",
+                "temperature": 20.0 + sensor,
+                "temphigh": 1,
+                "templow": sensor,
+            }
+            for number in range(count)
+            for sensor in (1, 2)
+        ]
+        dbsession.execute(insert(GrainbinUpdate), rows)
+        dbsession.commit()
+
+    def test_grainbin_updates_export_csv(
+        self, flaskclient, auth_headers, dbsession, monkeypatch
+    ):
+        """Test that all the updates are streamed as CSV, a chunk per batch of rows."""
+
+        monkeypatch.setattr("fm_api.export.EXPORT_YIELD_PER", 4)
+        grainbin = GrainbinFactory().save()
+        self.add_updates(dbsession, grainbin, 5)
+
+        url = url_for("grainbin.GrainbinUpdatesExport", grainbin_id=grainbin.id)
+        rep = flaskclient.get(url, headers=auth_headers, buffered=False)
+        chunks = list(rep.response)
+        lines = b"".join(chunks).decode().splitlines()
+
+        assert rep.status_code == 200
+        assert rep.mimetype == "text/csv"
+        assert rep.headers["Content-Disposition"] == (
+            f"attachment; filename=grainbin_{grainbin.id}_updates.csv"
+        )
+        assert "Content-Length" not in rep.headers
+        # the header, then 10 rows in batches of 4
+        assert len(chunks) == 4
+        assert lines[0].split(",") == [
+            "timestamp",
+            "update_index",
+            "sensor_name",
+            "temphigh",
+            "templow",
+            "temperature",
+        ]
+        assert len(lines) == 11
+        assert lines[1] == "2024-01-01T00:00:00,0,sensor1,1,1,21.0"
+        assert lines[-1] == "2024-01-01T04:00:00,4,sensor2,1,2,22.0"
+
+    def test_grainbin_updates_export_ndjson(self, flaskclient, auth_headers, dbsession):
+        """Test that the updates from start up to end are exported as NDJSON."""
+
+        grainbin = GrainbinFactory().save()
+        self.add_updates(dbsession, grainbin, 5)
+
+        url = url_for("grainbin.GrainbinUpdatesExport", grainbin_id=grainbin.id)
+        rep = flaskclient.get(
+            url,
+            headers=auth_headers,
+            query_string={
+                "format": "ndjson",
+                "start": "2024-01-01T01:00:00",
+                "end": "2024-01-01T03:00:00",
+            },
+        )
+        rows = [json.loads(line) for line in rep.get_data(as_text=True).splitlines()]
+
+        assert rep.status_code == 200
+        assert rep.mimetype == "application/x-ndjson"
+        assert [(row["update_index"], row["sensor_name"]) for row in rows] == [
+            (1, "sensor1"),
+            (1, "sensor2"),
+            (2, "sensor1"),
+            (2, "sensor2"),
+        ]
+        assert rows[0]["timestamp"] == "2024-01-01T01:00:00"
+
+    @staticmethod
+    def test_grainbin_updates_export_invalid_format(flaskclient, auth_headers):
+        """Test that a 422 message is returned for an unknown format."""
+
+        grainbin = GrainbinFactory().save()
+
+        url = url_for("grainbin.GrainbinUpdatesExport", grainbin_id=grainbin.id)
+        rep = flaskclient.get(url, headers=auth_headers, query_string={"format": "xml"})
+
+        assert rep.status_code == 422
+
+    @staticmethod
+    def test_grainbin_updates_export_no_grainbin(flaskclient, auth_headers):
+        """Test that a 404 message is returned for non-existent grainbin."""
+
+        url = url_for("grainbin.GrainbinUpdatesExport", grainbin_id=5)
+        rep = flaskclient.get(url, headers=auth_headers)
+
+        assert rep.status_code == 404
+        assert rep.get_json()["message"] == "Grainbin with id: 5 not found."
+
+
+@pytest.mark.usefixtures("tables")
+class TestAPIGrainbinUpdatesDownsampled:
+    """Test the API GrainbinUpdatesDownsampled MethodView."""
+
+    @staticmethod
+    def add_updates(dbsession, grainbin, count):
+        """Add count updates of two sensors, one every 5 minutes."""
+
+        start = dt.datetime(2024, 1, 1)
+        rows = [
+            {
+                "grainbin_id": grainbin.id,
+                "timestamp": start + dt.timedelta(minutes=5 * number),
+                "update_index": number,
+                "sensor_name": f"sensor{sensor}",
+                "temperature": 20.0 + (number % 7) + sensor,
+                "temphigh": 1,
+                "templow": sensor,
+            }
+            for number in range(count)
+            for sensor in (1, 2)
+        ]
+        dbsession.execute(insert(GrainbinUpdate), rows)
+        dbsession.commit()
+
+    def test_grainbin_updates_downsampled_get(
+        self, flaskclient, auth_headers, dbsession
+    ):
+        """Test that each sensor is reduced to max_points readings."""
+
+        grainbin = GrainbinFactory().save()
+        self.add_updates(dbsession, grainbin, 300)
+
+        url = url_for("grainbin.GrainbinUpdatesDownsampled", grainbin_id=grainbin.id)
+        rep = flaskclient.get(
+            url,
+            headers=auth_headers,
+            query_string={"start": "2024-01-01T00:00:00", "max_points": 50},
+        )
+        series = rep.get_json()
+
+        assert rep.status_code == 200
+        assert [sensor["sensor_name"] for sensor in series] == ["sensor1", "sensor2"]
+        assert len(series[0]["timestamps"]) == 50
+        assert len(series[0]["temperatures"]) == 50
+        assert series[0]["timestamps"][0] == "2024-01-01T00:00:00"
+        assert series[0]["timestamps"][-1] == "2024-01-02T00:55:00"
+        assert max(series[1]["temperatures"]) == 28.0
+
+    def test_grainbin_updates_downsampled_window(
+        self, flaskclient, auth_headers, dbsession
+    ):
+        """Test that only the updates from start up to end are used."""
+
+        grainbin = GrainbinFactory().save()
+        self.add_updates(dbsession, grainbin, 30)
+
+        url = url_for("grainbin.GrainbinUpdatesDownsampled", grainbin_id=grainbin.id)
+        rep = flaskclient.get(
+            url,
+            headers=auth_headers,
+            query_string={
+                "start": "2024-01-01T01:00:00",
+                "end": "2024-01-01T02:00:00",
+            },
+        )
+        series = rep.get_json()
+
+        assert rep.status_code == 200
+        assert series[0]["timestamps"][0] == "2024-01-01T01:00:00"
+        assert len(series[0]["timestamps"]) == 12
+
+    @staticmethod
+    def test_grainbin_updates_downsampled_invalid_max_points(flaskclient, auth_headers):
+        """Test that the route returns 422 for too few points."""
+
+        grainbin = GrainbinFactory().save()
+
+        url = url_for("grainbin.GrainbinUpdatesDownsampled", grainbin_id=grainbin.id)
+        rep = flaskclient.get(url, headers=auth_headers, query_string={"max_points": 2})
+
+        assert rep.status_code == 422
+
+    @staticmethod
+    def test_grainbin_updates_downsampled_no_grainbin(flaskclient, auth_headers):
+        """Test that the route returns 404 for an incorrect grainbin ID."""
+
+        url = url_for("grainbin.GrainbinUpdatesDownsampled", grainbin_id=1)
+        rep = flaskclient.get(url, headers=auth_headers)
+
+        assert rep.status_code == 404
+
+
+@pytest.mark.usefixtures("tables")
+class TestAPIGrainbinSeries:
+    """Test the API GrainbinSeries MethodView."""
+
+    @staticmethod
+    def add_updates(dbsession, grainbin):
+        """Add 6 updates of two sensors, one every 20 minutes."""
+
+        start = dt.datetime(2024, 1, 1, 10)
+        rows = [
+            {
+                "grainbin_id": grainbin.id,
+                "timestamp": start + dt.timedelta(minutes=20 * number),
+                "update_index": number,
+                "sensor_name": f"sensor{sensor}",
+                "temperature": 20.0 + number + sensor,
+                "temphigh": 1,
+                "templow": sensor,
+            }
+            for number in range(6)
+            for sensor in (1, 2)
+        ]
+        dbsession.execute(insert(GrainbinUpdate), rows)
+        dbsession.commit()
+
+    def test_grainbin_series_get(self, flaskclient, auth_headers, dbsession):
+        """Test that the hourly aggregates of each sensor are returned."""
+
+        grainbin = GrainbinFactory().save()
+        self.add_updates(dbsession, grainbin)
+
+        url = url_for("grainbin.GrainbinSeries", grainbin_id=grainbin.id)
+        rep = flaskclient.get(
+            url, headers=auth_headers, query_string={"start": "2024-01-01T00:00:00"}
+        )
+        series = rep.get_json()
+
+        assert rep.status_code == 200
+        assert len(series) == 4
+        assert series[0] == {
+            "bucket": "2024-01-01T10:00:00",
+            "temphigh": 1,
+            "templow": 1,
+            "avg": 22.0,
+            "min": 21.0,
+            "max": 23.0,
+            "count": 3,
+        }
+        assert series[1]["templow"] == 2
+
+    def test_grainbin_series_get_whole_bin(self, flaskclient, auth_headers, dbsession):
+        """Test that the temperatures of all the sensors can be aggregated together."""
+
+        grainbin = GrainbinFactory().save()
+        self.add_updates(dbsession, grainbin)
+
+        url = url_for("grainbin.GrainbinSeries", grainbin_id=grainbin.id)
+        rep = flaskclient.get(
+            url,
+            headers=auth_headers,
+            query_string={
+                "start": "2024-01-01T00:00:00",
+                "bucket": "day",
+                "by_sensor": "false",
+            },
+        )
+        series = rep.get_json()
+
+        assert rep.status_code == 200
+        assert len(series) == 1
+        assert "templow" not in series[0]
+        assert series[0]["count"] == 12
+        assert series[0]["min"] == 21.0
+        assert series[0]["max"] == 27.0
+
+    @staticmethod
+    def test_grainbin_series_invalid_bucket(flaskclient, auth_headers):
+        """Test that the route returns 422 for an unknown bucket."""
+
+        grainbin = GrainbinFactory().save()
+
+        url = url_for("grainbin.GrainbinSeries", grainbin_id=grainbin.id)
+        rep = flaskclient.get(
+            url, headers=auth_headers, query_string={"bucket": "year"}
+        )
+
+        assert rep.status_code == 422
+
+    @staticmethod
+    def test_grainbin_series_get_no_grainbin(flaskclient, auth_headers):
+        """Test that the route returns 404 for an incorrect grainbin ID."""
+
+        url = url_for("grainbin.GrainbinSeries", grainbin_id=1)
+        rep = flaskclient.get(url, headers=auth_headers)
+
+        assert rep.status_code == 404
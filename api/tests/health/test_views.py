@@ -3,6 +3,8 @@
 import pytest
 from flask import url_for
 
+from ..factories import DeviceFactory
+
 
 @pytest.mark.usefixtures("tables")
 class TestAPIHealth:
@@ -27,3 +29,38 @@ class TestAPIHealth:
 
         assert rep.status_code == 404
         assert reply["status"] == "Not Found"
+
+    @staticmethod
+    def test_api_health_cache(flaskclient):
+        """Test the hit rate of the response cache."""
+
+        device = DeviceFactory()
+        device.save()
+        url = url_for("device.DevicesById", device_id=device.id)
+        flaskclient.get(url)
+        flaskclient.get(url)
+
+        rep = flaskclient.get(url_for("health.ResponseCacheStats"))
+        stats = rep.get_json()
+
+        assert rep.status_code == 200
+        assert stats["size"] == 1
+        assert stats["endpoints"]["device.DevicesById"] == {
+            "hits": 1,
+            "misses": 1,
+            "hit_rate": 0.5,
+        }
+
+    @staticmethod
+    def test_api_health_live(flaskclient):
+        """Test the statistics of the live stream."""
+
+        rep = flaskclient.get(url_for("health.LiveEventsStats"))
+
+        assert rep.status_code == 200
+        assert rep.get_json() == {
+            "subscribers": 0,
+            "received": 0,
+            "dropped": 0,
+            "consuming": False,
+        }
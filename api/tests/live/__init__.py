@@ -0,0 +1 @@
+"""Tests for the live stream API."""
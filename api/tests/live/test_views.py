@@ -0,0 +1,65 @@
+"""Test the live stream views."""
+
+import json
+
+from flask import url_for
+
+from fm_api.extensions import live_events
+
+
+def read_events(response, count: int) -> list[tuple[str, dict]]:
+    """Return the next count events of a streamed response, skipping comments."""
+
+    events: list[tuple[str, dict]] = []
+    chunks = iter(response.response)
+    while len(events) < count:
+        chunk = next(chunks)
+        chunk = chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+        if chunk.startswith("event:"):
+            name, data = chunk.strip().split("\n")
+            events.append((name.removeprefix("event: "), json.loads(data[6:])))
+    response.close()
+    return events
+
+
+class TestLiveUpdates:
+    """Test the LiveUpdates view."""
+
+    @staticmethod
+    def test_live_updates(app, flaskclient):
+        """Test that the published events are streamed."""
+
+        app.config["LIVE_KEEPALIVE"] = 0
+        rep = flaskclient.get(url_for("live.LiveUpdates"), buffered=False)
+        live_events.publish({"type": "device", "id": 1, "update_index": 3})
+        live_events.publish({"type": "grainbin", "id": 2, "update_index": 4})
+
+        assert rep.status_code == 200
+        assert rep.mimetype == "text/event-stream"
+        assert rep.headers["Cache-Control"] == "no-cache"
+        assert read_events(rep, 2) == [
+            ("device", {"type": "device", "id": 1, "update_index": 3}),
+            ("grainbin", {"type": "grainbin", "id": 2, "update_index": 4}),
+        ]
+        assert live_events.stats()["subscribers"] == 0
+
+    @staticmethod
+    def test_live_updates_filtered(app, flaskclient):
+        """Test that only the events of the type and ids are streamed."""
+
+        app.config["LIVE_KEEPALIVE"] = 0
+        url = url_for("live.LiveUpdates", type="grainbin", id=[2, 3])
+        rep = flaskclient.get(url, buffered=False)
+        live_events.publish({"type": "device", "id": 2})
+        live_events.publish({"type": "grainbin", "id": 1})
+        live_events.publish({"type": "grainbin", "id": 3})
+
+        assert read_events(rep, 1) == [("grainbin", {"type": "grainbin", "id": 3})]
+
+    @staticmethod
+    def test_live_updates_wrong_type(flaskclient):
+        """Test that an unknown type is rejected."""
+
+        rep = flaskclient.get(url_for("live.LiveUpdates", type="sensor"))
+
+        assert rep.status_code == 422
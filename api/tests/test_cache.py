@@ -0,0 +1,96 @@
+"""Test the response cache."""
+
+from fm_api.cache import CachedResponse, MemoryBackend, ResponseCache
+
+
+def cached_response(body: bytes) -> CachedResponse:
+    """Return a cached response with body."""
+    return CachedResponse(status=200, headers=[("ETag", '"1"')], body=body)
+
+
+class TestMemoryBackend:
+    """Test the in process LRU cache of responses."""
+
+    @staticmethod
+    def test_evicts_least_recently_used():
+        """Test that the least recently used response is evicted when full."""
+
+        backend = MemoryBackend(2)
+        backend.set("a", cached_response(b"a"))
+        backend.set("b", cached_response(b"b"))
+        assert backend.get("a").body == b"a"
+
+        backend.set("c", cached_response(b"c"))
+
+        assert len(backend) == 2
+        assert backend.get("b") is None
+        assert backend.get("a").body == b"a"
+        assert backend.get("c").body == b"c"
+
+    @staticmethod
+    def test_expires(monkeypatch):
+        """Test that a response is not returned after its ttl."""
+
+        now = [100.0]
+        monkeypatch.setattr("fm_api.cache.time.monotonic", lambda: now[0])
+        backend = MemoryBackend(2, ttl=60)
+        backend.set("a", cached_response(b"a"))
+
+        now[0] += 59
+        assert backend.get("a").body == b"a"
+        now[0] += 1
+        assert backend.get("a") is None
+        assert len(backend) == 0
+
+    @staticmethod
+    def test_disabled():
+        """Test that a max_size of 0 caches nothing."""
+
+        backend = MemoryBackend(0)
+        backend.set("a", cached_response(b"a"))
+
+        assert backend.get("a") is None
+        assert len(backend) == 0
+
+
+class TestResponseCache:
+    """Test the response cache extension."""
+
+    @staticmethod
+    def test_make_key():
+        """Test that the key changes with the version."""
+
+        key = ResponseCache.make_key("device.DevicesById", [("device_id", 1)], (3,))
+
+        assert key == ResponseCache.make_key(
+            "device.DevicesById", [("device_id", 1)], (3,)
+        )
+        assert key != ResponseCache.make_key(
+            "device.DevicesById", [("device_id", 1)], (4,)
+        )
+
+    @staticmethod
+    def test_stats(app):
+        """Test the hit/miss counters of each endpoint, and clear."""
+
+        cache = ResponseCache()
+        cache.init_app(app)
+        cache.set("a", cached_response(b"a"))
+        cache.get("device.Devices", "a")
+        cache.get("device.Devices", "b")
+        cache.get("grainbin.Grainbins", "a")
+
+        stats = cache.stats()
+
+        assert stats["backend"] == "memory"
+        assert stats["size"] == 1
+        assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (2, 1, 0.667)
+        assert stats["endpoints"]["device.Devices"] == {
+            "hits": 1,
+            "misses": 1,
+            "hit_rate": 0.5,
+        }
+
+        cache.clear()
+        stats = cache.stats()
+        assert (stats["size"], stats["hits"], stats["endpoints"]) == (0, 0, {})
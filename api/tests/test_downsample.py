@@ -0,0 +1,61 @@
+"""Test the downsampling of time series."""
+
+import datetime as dt
+
+import numpy as np
+import pytest
+
+from fm_api.downsample import downsample_readings, lttb
+
+
+def test_lttb_keeps_short_series():
+    """Test that every point is kept when there are no more than max_points."""
+
+    x = np.arange(10.0)
+
+    assert lttb(x, x, 10).tolist() == list(range(10))
+    assert lttb(x[:2], x[:2], 5).tolist() == [0, 1]
+
+
+def test_lttb_keeps_first_last_and_peaks():
+    """Test that the first and last points and the peaks are kept."""
+
+    x = np.arange(1000.0)
+    y = np.zeros(1000)
+    y[123] = 10.0
+    y[789] = -10.0
+
+    kept = lttb(x, y, 20)
+
+    assert len(kept) == 20
+    assert kept[0] == 0
+    assert kept[-1] == 999
+    assert np.all(np.diff(kept) > 0)
+    assert {123, 789} <= set(kept.tolist())
+
+
+def test_lttb_invalid_max_points():
+    """Test that fewer than 3 points raises a ValueError."""
+
+    with pytest.raises(ValueError):
+        lttb(np.arange(10.0), np.arange(10.0), 2)
+
+
+def test_downsample_readings():
+    """Test that the readings are grouped by sensor and downsampled."""
+
+    start = dt.datetime(2024, 1, 1)
+    rows = [
+        (start + dt.timedelta(minutes=number), float(number), 1, sensor, f"s{sensor}")
+        for number in range(100)
+        for sensor in (10, 2)
+    ]
+    rows.append((start, None, 1, 3, "s3"))
+
+    series = downsample_readings(rows, 10)
+
+    assert [sensor["templow"] for sensor in series] == [2, 10]
+    assert len(series[0]["timestamps"]) == 10
+    assert series[0]["timestamps"][0] == start
+    assert series[0]["timestamps"][-1] == start + dt.timedelta(minutes=99)
+    assert series[0]["temperatures"][-1] == 99.0
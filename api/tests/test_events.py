@@ -0,0 +1,88 @@
+"""Test the live events."""
+
+import pytest
+
+from fm_api.events import Subscription, _LiveState, event_stream
+from fm_api.extensions import live_events
+
+
+def live_state(queue_size: int = 10) -> _LiveState:
+    """Return the live events of an app without a broker."""
+    return _LiveState(
+        broker_url="", exchange_name="live_updates", queue_size=queue_size
+    )
+
+
+class TestLiveState:
+    """Test the fan out of the events to the subscribers."""
+
+    @staticmethod
+    def test_fan_out():
+        """Test that every subscriber gets every event."""
+
+        state = live_state()
+        first = Subscription(state)
+        second = Subscription(state)
+
+        state.fan_out({"type": "device", "id": 1})
+
+        assert first.get(0) == {"type": "device", "id": 1}
+        assert second.get(0) == {"type": "device", "id": 1}
+        assert first.get(0) is None
+
+    @staticmethod
+    def test_fan_out_full_queue():
+        """Test that the events that do not fit the queue of a subscriber are dropped."""
+
+        state = live_state(queue_size=1)
+        slow = Subscription(state)
+        state.fan_out({"id": 1})
+        state.fan_out({"id": 2})
+
+        assert state.received == 2
+        assert state.dropped == 1
+        assert slow.get(0) == {"id": 1}
+
+    @staticmethod
+    def test_close():
+        """Test that a closed subscription gets no more events."""
+
+        state = live_state()
+        subscription = Subscription(state)
+        subscription.close()
+        state.fan_out({"id": 1})
+
+        assert not state.subscribers
+        assert subscription.get(0) is None
+
+
+@pytest.mark.usefixtures("app")
+def test_subscribe_without_broker():
+    """Test that no consumer is started without a broker URL."""
+
+    live_events.subscribe()
+    live_events.publish({"id": 1})
+
+    assert live_events.stats() == {
+        "subscribers": 1,
+        "received": 1,
+        "dropped": 0,
+        "consuming": False,
+    }
+
+
+def test_event_stream():
+    """Test the Server-Sent Events of the wanted events, with a keepalive comment."""
+
+    state = live_state()
+    subscription = Subscription(state)
+    stream = event_stream(subscription, lambda event: event["id"] == 1, keepalive=0)
+    state.fan_out({"type": "device", "id": 2})
+    state.fan_out({"type": "device", "id": 1})
+
+    assert next(stream) == "retry: 5000\n\n"
+    assert next(stream) == 'event: device\ndata: {"type": "device", "id": 1}\n\n'
+    assert next(stream) == ": keepalive\n\n"
+
+    stream.close()
+    assert not state.subscribers
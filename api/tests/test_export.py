@@ -0,0 +1,37 @@
+"""Test the streaming exports of the update history."""
+
+import datetime as dt
+import json
+
+from fm_api.export import csv_chunks, ndjson_chunks
+
+COLUMNS = ["timestamp", "uptime", "temperature"]
+BATCHES = [
+    [(dt.datetime(2024, 1, 1, 12), dt.timedelta(minutes=1), 20.5)],
+    [(dt.datetime(2024, 1, 1, 13), None, None), (dt.datetime(2024, 1, 1, 14), None, 2)],
+]
+
+
+def test_csv_chunks():
+    """Test the header and a chunk for each batch of rows."""
+
+    chunks = list(csv_chunks(COLUMNS, BATCHES))
+
+    assert chunks == [
+        "timestamp,uptime,temperature\r\n",
+        "2024-01-01T12:00:00,60.0,20.5\r\n",
+        "2024-01-01T13:00:00,,\r\n2024-01-01T14:00:00,,2\r\n",
+    ]
+
+
+def test_ndjson_chunks():
+    """Test an object per row and a chunk for each batch of rows."""
+
+    chunks = list(ndjson_chunks(COLUMNS, BATCHES))
+
+    assert len(chunks) == 2
+    assert [json.loads(line) for line in "".join(chunks).splitlines()] == [
+        {"timestamp": "2024-01-01T12:00:00", "uptime": 60.0, "temperature": 20.5},
+        {"timestamp": "2024-01-01T13:00:00", "uptime": None, "temperature": None},
+        {"timestamp": "2024-01-01T14:00:00", "uptime": None, "temperature": 2},
+    ]
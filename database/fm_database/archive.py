@@ -0,0 +1,320 @@
+"""
+Columnar archive of old grainbin and device updates.
+
+Rows of grainbin_update and device_update that are older than a cutoff are
+copied into Parquet files, one file per table, device and month:
+
+    <ARCHIVE_DIR>/grainbin_update/<device_id>/2024-06.parquet
+    <ARCHIVE_DIR>/device_update/<device_id>/2024-06.parquet
+
+The rows are streamed from the database one month at a time, sorted by device
+so only the rows of one device and month are held in memory. Sensor names are
+dictionary encoded, temperatures are stored as float32 and the files are
+compressed with zstd, so the archive takes a fraction of the disk space of
+the database rows and their indexes.
+
+Archiving is idempotent. When a month file already exists the new rows are
+merged into it, so the rows of a month can be archived over several runs and
+rows that were archived already are skipped.
+
+The archive is read without a database with read_grainbin_updates and
+read_device_updates. Only the files of the months in the requested range are
+opened, and the row group statistics skip the rows of other grainbins.
+
+The archive needs pyarrow (pip install fm_database[archive]).
+"""
+
+import os
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from datetime import datetime
+from glob import glob
+from itertools import groupby
+from operator import attrgetter
+from typing import Any
+
+from sqlalchemy import Connection, Engine, func, select
+
+from .models.device import Device, DeviceUpdate, Grainbin, GrainbinUpdate
+from .settings import get_config
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = pc = ds = pq = None
+
+ARCHIVE_TABLES = ("grainbin_update", "device_update")
+ARCHIVE_COMPRESSION = "zstd"
+
+# the columns each file is sorted by, after the device it belongs to.
+_SORT_COLUMNS = {
+    "grainbin_update": ("grainbin_id", "timestamp", "id"),
+    "device_update": ("timestamp", "id"),
+}
+
+
+@dataclass
+class ArchiveResult:
+    """The outcome of archiving the old rows of a table."""
+
+    table: str
+    rows: int = 0
+    files: list[str] = field(default_factory=list)
+
+    @property
+    def size(self) -> int:
+        """Return the size in bytes of the files that were written."""
+
+        return sum(os.path.getsize(path) for path in self.files)
+
+
+def require_pyarrow() -> None:
+    """Raise an ImportError when pyarrow is not installed."""
+
+    if pa is None:
+        raise ImportError(
+            "The archive needs pyarrow, install it with 'pip install fm_database[archive]'"
+        )
+
+
+def archive_schema(table: str) -> Any:
+    """Return the Arrow schema of the archive files of a table."""
+
+    require_pyarrow()
+    if table == "grainbin_update":
+        return pa.schema(
+            [
+                ("id", pa.int64()),
+                ("grainbin_id", pa.int32()),
+                ("timestamp", pa.timestamp("us")),
+                ("update_index", pa.int32()),
+                ("sensor_name", pa.dictionary(pa.int16(), pa.string())),
+                ("temperature", pa.float32()),
+                ("temphigh", pa.int16()),
+                ("templow", pa.int16()),
+            ]
+        )
+    if table == "device_update":
+        return pa.schema(
+            [
+                ("id", pa.int64()),
+                ("device_id", pa.int32()),
+                ("timestamp", pa.timestamp("us")),
+                ("update_index", pa.int32()),
+                ("interior_temp", pa.float32()),
+                ("exterior_temp", pa.float32()),
+                ("device_temp", pa.float32()),
+                ("uptime", pa.duration("s")),
+                ("load_avg", pa.int32()),
+                ("disk_total", pa.int64()),
+                ("disk_used", pa.int64()),
+                ("disk_free", pa.int64()),
+            ]
+        )
+    raise ValueError(f"table '{table}' can not be archived")
+
+
+def _archive_select(table: str):
+    """Return the select of the rows of a table, with the device they belong to."""
+
+    if table == "grainbin_update":
+        model: Any = GrainbinUpdate
+        statement = (
+            select(Device.device_id.label("device"))
+            .join(Grainbin, Grainbin.device_id_str == Device.device_id)
+            .join(GrainbinUpdate, GrainbinUpdate.grainbin_id == Grainbin.id)
+        )
+    else:
+        model = DeviceUpdate
+        statement = select(Device.device_id.label("device")).join(
+            DeviceUpdate, DeviceUpdate.device_id == Device.id
+        )
+    columns = [getattr(model, name) for name in archive_schema(table).names]
+    order = [getattr(model, name) for name in _SORT_COLUMNS[table]]
+    return model.timestamp, statement.add_columns(*columns).order_by(
+        Device.device_id, *order
+    )
+
+
+def archive_months(start: datetime, end: datetime) -> list[datetime]:
+    """Return the start of each month from the month of start up to end."""
+
+    month = start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    months = []
+    while month < end:
+        months.append(month)
+        month = _next_month(month)
+    return months
+
+
+def _next_month(month: datetime) -> datetime:
+    """Return the start of the month after month."""
+
+    if month.month == 12:
+        return month.replace(year=month.year + 1, month=1)
+    return month.replace(month=month.month + 1)
+
+
+def archive_path(archive_dir: str, table: str, device: str, month: datetime) -> str:
+    """Return the path of the archive file of a table, device and month."""
+
+    return os.path.join(archive_dir, table, device, f"{month:%Y-%m}.parquet")
+
+
+def archive_table(
+    bind: Engine,
+    table: str,
+    cutoff: datetime,
+    *,
+    archive_dir: str | None = None,
+    batch_size: int | None = None,
+) -> ArchiveResult:
+    """Copy the rows of a table from before cutoff into the archive.
+
+    The rows are read batch_size at a time (default: ARCHIVE_BATCH_SIZE) and
+    written to the archive_dir (default: ARCHIVE_DIR). The rows stay in the
+    database, they are deleted by the retention prune.
+    """
+
+    require_pyarrow()
+    config = get_config()
+    archive_dir = archive_dir or config.ARCHIVE_DIR
+    column = _archive_select(table)[0]
+    result = ArchiveResult(table)
+
+    with bind.connect() as connection:
+        connection.execution_options(yield_per=batch_size or config.ARCHIVE_BATCH_SIZE)
+        first = connection.scalar(select(func.min(column)).where(column < cutoff))
+        for month in archive_months(first, cutoff) if first is not None else []:
+            end = min(_next_month(month), cutoff)
+            for path, rows in _archive_month(
+                connection, table, month, end, archive_dir
+            ):
+                result.rows += rows
+                result.files.append(path)
+    return result
+
+
+def _archive_month(
+    connection: Connection, table: str, month: datetime, end: datetime, archive_dir: str
+) -> Iterator[tuple[str, int]]:
+    """Archive the rows of a table from month up to end, one device at a time.
+
+    Yields the path of each file and the number of rows that were added to it.
+    """
+
+    column, statement = _archive_select(table)
+    rows = connection.execute(statement.where(column >= month, column < end))
+    for device, device_rows in groupby(rows, key=attrgetter("device")):
+        path = archive_path(archive_dir, table, device, month)
+        yield path, _write_month(path, table, [row._asdict() for row in device_rows])
+
+
+def _write_month(path: str, table: str, rows: list[dict]) -> int:
+    """Merge rows into the archive file at path. Returns the number of new rows."""
+
+    schema = archive_schema(table)
+    new = pa.Table.from_pylist(rows, schema=schema)
+    if os.path.exists(path):
+        existing = pq.read_table(path, schema=schema)
+        new = new.filter(pc.invert(pc.is_in(new["id"], value_set=existing["id"])))
+        merged = pa.concat_tables([existing, new])
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        merged = new
+    merged = merged.sort_by([(name, "ascending") for name in _SORT_COLUMNS[table]])
+
+    # the file is replaced in one step, so a failed write never loses rows
+    temporary = f"{path}.tmp"
+    pq.write_table(
+        merged.unify_dictionaries().combine_chunks(),
+        temporary,
+        compression=ARCHIVE_COMPRESSION,
+    )
+    os.replace(temporary, path)
+    return len(new)
+
+
+def _read_archive(
+    table: str,
+    pattern: str,
+    condition: Any,
+    *,
+    start: datetime | None,
+    end: datetime | None,
+    archive_dir: str | None,
+) -> Any:
+    """Return the archived rows of the files matching pattern from start up to end."""
+
+    require_pyarrow()
+    archive_dir = archive_dir or get_config().ARCHIVE_DIR
+    schema = archive_schema(table)
+    paths = []
+    for path in sorted(glob(os.path.join(archive_dir, table, pattern, "*.parquet"))):
+        month = datetime.strptime(os.path.basename(path), "%Y-%m.parquet")
+        if (end is None or month < end) and (
+            start is None or _next_month(month) > start
+        ):
+            paths.append(path)
+    if not paths:
+        return schema.empty_table()
+
+    timestamp = ds.field("timestamp")
+    if start is not None:
+        condition = condition & (timestamp >= pa.scalar(start, pa.timestamp("us")))
+    if end is not None:
+        condition = condition & (timestamp < pa.scalar(end, pa.timestamp("us")))
+    rows = ds.dataset(paths, schema=schema, format="parquet").to_table(filter=condition)
+    return rows.sort_by([(name, "ascending") for name in _SORT_COLUMNS[table]])
+
+
+def read_grainbin_updates(
+    grainbin_id: int,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    *,
+    device: str | None = None,
+    archive_dir: str | None = None,
+) -> Any:
+    """Return the archived updates of a grainbin from start up to end.
+
+    The rows are returned as a pyarrow Table sorted by timestamp (use
+    to_pylist() or to_pandas() to read them). Passing the device the grainbin
+    belongs to only reads the files of that device.
+    """
+
+    require_pyarrow()
+    return _read_archive(
+        "grainbin_update",
+        device or "*",
+        ds.field("grainbin_id") == grainbin_id,
+        start=start,
+        end=end,
+        archive_dir=archive_dir,
+    )
+
+
+def read_device_updates(
+    device: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    *,
+    archive_dir: str | None = None,
+) -> Any:
+    """Return the archived updates of a device from start up to end.
+
+    The rows are returned as a pyarrow Table sorted by timestamp.
+    """
+
+    require_pyarrow()
+    return _read_archive(
+        "device_update",
+        device,
+        ds.scalar(True),
+        start=start,
+        end=end,
+        archive_dir=archive_dir,
+    )
@@ -2,8 +2,15 @@
 """Main command line interface entry point."""
 import click
 
+from .database import archive_commands
 from .database import commands as database_commands
-from .database import update_commands
+from .database import (
+    load_commands,
+    partition_commands,
+    retention_commands,
+    rollup_commands,
+    update_commands,
+)
 from .testing import commands as testing_commands
 
 
@@ -18,3 +25,13 @@ entry_point.add_command(testing_commands.lint)
 entry_point.add_command(update_commands.update)
 
 entry_point.add_command(database_commands.create)
+
+entry_point.add_command(load_commands.load)
+
+entry_point.add_command(partition_commands.partition)
+
+entry_point.add_command(rollup_commands.rollup)
+
+entry_point.add_command(retention_commands.retention)
+
+entry_point.add_command(archive_commands.archive)
@@ -0,0 +1,102 @@
+"""Click commands for the columnar archive of old updates."""
+
+from datetime import datetime
+
+import click
+
+from fm_database.archive import (
+    ARCHIVE_TABLES,
+    archive_table,
+    read_grainbin_updates,
+    require_pyarrow,
+)
+from fm_database.database import engine
+from fm_database.retention import get_policies
+
+archive_dir_option = click.option(
+    "--archive-dir",
+    type=click.Path(file_okay=False),
+    help="Directory of the archive (default: ARCHIVE_DIR).",
+)
+
+
+@click.group()
+def archive():
+    """Command group for archive commands."""
+
+    try:
+        require_pyarrow()
+    except ImportError as error:
+        raise click.ClickException(str(error)) from error
+
+
+@archive.command()
+@click.option(
+    "--table",
+    "tables",
+    type=click.Choice(ARCHIVE_TABLES),
+    multiple=True,
+    help="Only archive this table. Can be repeated (default: all tables).",
+)
+@click.option(
+    "--before",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="Archive the rows from before this day (default: the retention cutoff).",
+)
+@archive_dir_option
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    help="Number of rows read from the database at a time (default: ARCHIVE_BATCH_SIZE).",
+)
+def export(tables, before, archive_dir, batch_size):
+    """Copy old grainbin and device updates into the archive.
+
+    Without --before the rows that the retention prune would delete are
+    archived. The rows stay in the database.
+    """
+
+    now = datetime.now()
+    cutoffs = {policy.table: policy.cutoff(now) for policy in get_policies()}
+    for table in tables or ARCHIVE_TABLES:
+        cutoff = before or cutoffs.get(table)
+        if cutoff is None:
+            click.echo(f"{table} has no retention policy, use --before")
+            continue
+        result = archive_table(
+            engine, table, cutoff, archive_dir=archive_dir, batch_size=batch_size
+        )
+        bytes_per_row = result.size / result.rows if result.rows else 0
+        click.echo(
+            f"{table}: {result.rows} rows from before {cutoff:%Y-%m-%d} archived in "
+            f"{len(result.files)} files, {result.size:,} bytes "
+            f"({bytes_per_row:.1f} bytes/row)"
+        )
+
+
+@archive.command()
+@click.argument("grainbin_id", type=int)
+@click.option(
+    "--start",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="First day (YYYY-MM-DD) of the readings.",
+)
+@click.option(
+    "--end",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="Day (YYYY-MM-DD) after the last day of the readings.",
+)
+@click.option("--device", help="Only read the files of the device of the grainbin.")
+@archive_dir_option
+def grainbin(grainbin_id, start, end, device, archive_dir):
+    """Print the archived readings of a grainbin as CSV."""
+
+    rows = read_grainbin_updates(
+        grainbin_id, start, end, device=device, archive_dir=archive_dir
+    )
+    columns = ("timestamp", "sensor_name", "temphigh", "templow", "temperature")
+    click.echo(",".join(columns))
+    for row in rows.select(columns).to_pylist():
+        click.echo(
+            ",".join("" if row[name] is None else str(row[name]) for name in columns)
+        )
@@ -10,6 +10,7 @@ from fm_database.database import Base, create_all_tables, drop_all_tables, get_s
 # pylint: disable=unused-import
 from fm_database.models.device import Device  # noqa: F401
 from fm_database.models.message import Message  # noqa: F401
+from fm_database.models.rollup import GrainbinRollup  # noqa: F401
 from fm_database.models.system import SystemSetup  # noqa: F401
 from fm_database.models.user import User  # noqa: F401
 from fm_database.settings import get_config
@@ -0,0 +1,123 @@
+"""Click commands for bulk loading updates into the database."""
+
+import datetime as dt
+import time
+
+import click
+from sqlalchemy import delete
+
+from fm_database.database import get_session
+from fm_database.loader import GrainbinRecord, load_grainbin_updates
+from fm_database.models.device import Device, Grainbin, GrainbinUpdate
+
+BENCHMARK_DEVICE_ID = "fm-load-benchmark"
+
+
+@click.group()
+def load():
+    """Command group for bulk load commands."""
+
+
+@load.command()
+@click.option(
+    "--rows",
+    default=1000000,
+    show_default=True,
+    help="Number of grainbin_update rows to write with each method.",
+)
+@click.option(
+    "--sensors",
+    default=10,
+    show_default=True,
+    help="Number of sensor readings (rows) in each grainbin update.",
+)
+@click.option(
+    "--skip-orm",
+    default=False,
+    is_flag=True,
+    help="Only run the loader and skip the session.add comparison.",
+)
+def benchmark(rows, sensors, skip_orm):
+    """Compare the bulk loader with session.add for grainbin updates.
+
+    A temporary device and grainbin are created for the benchmark and
+    deleted, along with all of the rows that were written, when it is done.
+    """
+
+    session = get_session()
+    device = Device(BENCHMARK_DEVICE_ID, "0.0", "0.0")
+    grainbin = Grainbin(BENCHMARK_DEVICE_ID, 1)
+    session.add_all([device, grainbin])
+    session.commit()
+    grainbin_id = grainbin.id
+    count = rows // sensors
+
+    try:
+        start = time.perf_counter()
+        result = load_grainbin_updates(session, _records(count, sensors))
+        _report("loader", result.rows, time.perf_counter() - start)
+
+        if not skip_orm:
+            # the same rows again would conflict with the unique constraint.
+            _delete_updates(session, grainbin_id)
+            start = time.perf_counter()
+            written = _add_updates(session, grainbin_id, count, sensors)
+            _report("session.add", written, time.perf_counter() - start)
+    finally:
+        session.rollback()
+        _delete_updates(session, grainbin_id)
+        session.execute(delete(Grainbin).where(Grainbin.id == grainbin_id))
+        session.execute(delete(Device).where(Device.device_id == BENCHMARK_DEVICE_ID))
+        session.commit()
+
+
+def _delete_updates(session, grainbin_id):
+    """Delete the grainbin updates written by the benchmark."""
+
+    session.execute(
+        delete(GrainbinUpdate).where(GrainbinUpdate.grainbin_id == grainbin_id)
+    )
+    session.commit()
+
+
+def _records(count, sensors):
+    """Yield count benchmark records with sensors readings each."""
+
+    timestamp = dt.datetime(2020, 1, 1)
+    for number in range(count):
+        yield GrainbinRecord(
+            BENCHMARK_DEVICE_ID,
+            1,
+            timestamp + dt.timedelta(minutes=number),
+            [(f"28.{sensor:010d}", 20.5, 30, 10) for sensor in range(sensors)],
+        )
+
+
+def _add_updates(session, grainbin_id, count, sensors, commit_every=1000):
+    """Write the same rows as the loader by adding an ORM object per row."""
+
+    timestamp = dt.datetime(2020, 1, 1)
+    written = 0
+    for number in range(count):
+        for sensor in range(sensors):
+            grainbin_update = GrainbinUpdate(grainbin_id)
+            grainbin_update.timestamp = timestamp + dt.timedelta(minutes=number)
+            grainbin_update.update_index = number + 1
+            grainbin_update.sensor_name = f"28.{sensor:010d}"
+            grainbin_update.temperature = 20.5
+            grainbin_update.temphigh = 30
+            grainbin_update.templow = 10
+            session.add(grainbin_update)
+            written += 1
+        if (number + 1) % commit_every == 0:
+            session.commit()
+    session.commit()
+    return written
+
+
+def _report(label, rows, elapsed):
+    """Print the rows/sec of a benchmark run."""
+
+    click.echo(
+        f"{label}: {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/sec)"
+    )
@@ -0,0 +1,128 @@
+"""Click commands for the maintenance of the monthly update partitions."""
+
+from datetime import date
+
+import click
+
+from fm_database.database import engine
+from fm_database.partitions import (
+    PARTITION_MONTHS_AHEAD,
+    PARTITIONED_TABLES,
+    add_months,
+    count_default_rows,
+    create_partitions,
+    detach_partitions,
+    is_partitioned,
+    list_partitions,
+    month_start,
+)
+
+table_option = click.option(
+    "--table",
+    "tables",
+    type=click.Choice(PARTITIONED_TABLES),
+    multiple=True,
+    help="Only maintain this table. Can be repeated (default: all tables).",
+)
+
+
+def _check_partitioned(connection, tables):
+    """Raise an error unless every table is partitioned."""
+
+    for table in tables:
+        if not is_partitioned(connection, table):
+            raise click.ClickException(
+                f"{table} is not partitioned. Partitions need PostgreSQL and "
+                "the database to be upgraded to the latest migration."
+            )
+
+
+@click.group()
+def partition():
+    """Command group for partition maintenance commands."""
+
+
+@partition.command(name="list")
+@table_option
+def list_(tables):
+    """List the monthly partitions of the update tables."""
+
+    with engine.connect() as connection:
+        _check_partitioned(connection, tables or PARTITIONED_TABLES)
+        for table in tables or PARTITIONED_TABLES:
+            click.echo(f"{table}:")
+            for table_partition in list_partitions(connection, table):
+                click.echo(
+                    f"  {table_partition.name}: "
+                    f"{table_partition.start} to {table_partition.end}"
+                )
+            click.echo(
+                f"  default partition rows: {count_default_rows(connection, table)}"
+            )
+
+
+@partition.command()
+@table_option
+@click.option(
+    "--months-ahead",
+    default=PARTITION_MONTHS_AHEAD,
+    show_default=True,
+    help="Number of months after the current month to create partitions for.",
+)
+@click.option(
+    "--start",
+    type=click.DateTime(formats=["%Y-%m"]),
+    help="First month (YYYY-MM) to create a partition for (default: this month).",
+)
+def create(tables, months_ahead, start):
+    """Create the monthly partitions up to months-ahead months from now.
+
+    Rows of those months in the default partition are moved into the new
+    partitions.
+    """
+
+    first = month_start(start or date.today())
+    last = add_months(month_start(date.today()), months_ahead)
+    months = (last.year - first.year) * 12 + last.month - first.month + 1
+
+    with engine.begin() as connection:
+        _check_partitioned(connection, tables or PARTITIONED_TABLES)
+        for table in tables or PARTITIONED_TABLES:
+            created = create_partitions(connection, table, first, months)
+            for name in created:
+                click.echo(f"created {name}")
+            if not created:
+                click.echo(f"{table}: all partitions already exist")
+
+
+@partition.command()
+@table_option
+@click.option(
+    "--older-than-months",
+    type=click.IntRange(min=1),
+    required=True,
+    help="Detach the partitions of months that ended more than this many months ago.",
+)
+@click.option(
+    "--drop",
+    default=False,
+    is_flag=True,
+    help="Drop the detached partitions. Their rows are deleted.",
+)
+def detach(tables, older_than_months, drop):
+    """Detach (and optionally drop) the partitions of old months.
+
+    Detached partitions are kept as separate tables unless --drop is given.
+    """
+
+    before = add_months(month_start(date.today()), -older_than_months)
+
+    with engine.begin() as connection:
+        _check_partitioned(connection, tables or PARTITIONED_TABLES)
+        for table in tables or PARTITIONED_TABLES:
+            detached = detach_partitions(connection, table, before, drop)
+            action = "dropped" if drop else "detached"
+            for name in detached:
+                click.echo(f"{action} {name}")
+            if not detached:
+                click.echo(f"{table}: no partitions before {before}")
@@ -0,0 +1,122 @@
+"""Click commands for the retention of historical rows."""
+
+from datetime import datetime
+
+import click
+
+from fm_database.archive import require_pyarrow
+from fm_database.database import engine
+from fm_database.retention import (
+    RETENTION_COLUMNS,
+    PruneResult,
+    count_expired,
+    get_policies,
+    prune,
+)
+
+table_option = click.option(
+    "--table",
+    "tables",
+    type=click.Choice(list(RETENTION_COLUMNS)),
+    multiple=True,
+    help="Only use the policy of this table. Can be repeated (default: all tables).",
+)
+keep_days_option = click.option(
+    "--keep-days",
+    type=click.IntRange(min=1),
+    help="Keep this many days of rows instead of the configured number of days.",
+)
+
+
+def _policies(tables, keep_days):
+    """Return the policies of tables, with keep_days instead of the configured days."""
+
+    override = {table: keep_days for table in RETENTION_COLUMNS} if keep_days else {}
+    return [
+        policy
+        for policy in get_policies(override)
+        if not tables or policy.table in tables
+    ]
+
+
+def _report_progress(result: PruneResult) -> None:
+    """Print the rows deleted from a table so far."""
+
+    click.echo(
+        f"  {result.table}: {result.deleted} rows deleted in {result.batches} batches "
+        f"({result.rows_per_second:,.0f} rows/sec)"
+    )
+
+
+@click.group()
+def retention():
+    """Command group for retention commands."""
+
+
+@retention.command()
+@table_option
+@keep_days_option
+def policies(tables, keep_days):
+    """List the retention policies and the number of rows they would delete."""
+
+    now = datetime.now()
+    for policy in _policies(tables, keep_days):
+        click.echo(
+            f"{policy.table}: keep {policy.keep_days} days, "
+            f"{count_expired(engine, policy, now)} rows before "
+            f"{policy.cutoff(now):%Y-%m-%d %H:%M}"
+        )
+
+
+@retention.command(name="prune")
+@table_option
+@keep_days_option
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    help="Number of rows deleted in each transaction (default: RETENTION_BATCH_SIZE).",
+)
+@click.option(
+    "--pause",
+    type=click.FloatRange(min=0),
+    help="Seconds to wait between batches (default: RETENTION_BATCH_PAUSE).",
+)
+@click.option(
+    "--archive/--no-archive",
+    default=None,
+    help="Copy the grainbin and device updates into the archive before they are "
+    "deleted (default: RETENTION_ARCHIVE).",
+)
+def prune_(tables, keep_days, batch_size, pause, archive):
+    """Delete the rows that are older than the retention policies keep.
+
+    Rows are deleted in batches, each in its own transaction. On PostgreSQL the
+    monthly partitions that only hold expired rows are dropped first.
+    """
+
+    if archive:
+        try:
+            require_pyarrow()
+        except ImportError as error:
+            raise click.ClickException(str(error)) from error
+
+    now = datetime.now()
+    for policy in _policies(tables, keep_days):
+        click.echo(f"pruning {policy.table}, keeping {policy.keep_days} days")
+        result = prune(
+            engine,
+            policy,
+            now=now,
+            batch_size=batch_size,
+            pause=pause,
+            progress=_report_progress,
+            archive=archive,
+        )
+        if result.archived:
+            click.echo(f"  archived {result.archived} rows before the prune")
+        for name in result.dropped_partitions:
+            click.echo(f"  dropped partition {name}")
+        click.echo(
+            f"{policy.table}: {result.deleted} rows deleted in {result.elapsed:.2f}s "
+            f"({result.rows_per_second:,.0f} rows/sec)"
+        )
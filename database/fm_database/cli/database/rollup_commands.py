@@ -0,0 +1,62 @@
+"""Click commands for the hourly and daily rollups."""
+
+from datetime import date, datetime, timedelta
+
+import click
+
+from fm_database.database import get_session
+from fm_database.rollups import rebuild_rollup_chunk, rollup_chunks
+
+
+@click.group()
+def rollup():
+    """Command group for rollup commands."""
+
+
+@rollup.command()
+@click.option(
+    "--start",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    required=True,
+    help="First day (YYYY-MM-DD) to rebuild the rollups of.",
+)
+@click.option(
+    "--end",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="Last day (YYYY-MM-DD) to rebuild the rollups of (default: today).",
+)
+@click.option(
+    "--chunk-days",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of days rebuilt and committed at a time.",
+)
+def rebuild(start, end, chunk_days):
+    """Recompute the hourly and daily rollups of a range of days.
+
+    The rollups are computed again from the grainbin and device updates. Each
+    chunk of days is committed on its own.
+    """
+
+    end = (end or datetime.combine(date.today(), datetime.min.time())) + timedelta(
+        days=1
+    )
+    if end <= start:
+        raise click.UsageError("The end day is before the start day.")
+
+    session = get_session()
+    total = skipped = 0
+    for chunk_start, chunk_end in rollup_chunks(start, end, chunk_days):
+        chunk_end = min(chunk_end, end)
+        result = rebuild_rollup_chunk(session, chunk_start, chunk_end)
+        session.commit()
+        total += result.written
+        skipped += result.skipped
+        click.echo(
+            f"{chunk_start:%Y-%m-%d} to {chunk_end:%Y-%m-%d}: "
+            f"{result.written} rollups"
+        )
+    click.echo(f"done, {total} rollups written")
+    if skipped:
+        click.echo(f"{skipped} readings without a sensor position were skipped")
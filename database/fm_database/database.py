@@ -1,11 +1,22 @@
 # -*- coding: utf-8 -*-
 """Database module, including the SQLAlchemy database object and DB-related utilities."""
-from typing import Any, Self
-
-from sqlalchemy import ForeignKey, String, create_engine
+from typing import Any, Self, Sequence, TypeVar
+
+from sqlalchemy import (
+    ColumnElement,
+    Connection,
+    ForeignKey,
+    String,
+    Table,
+    create_engine,
+    inspect,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import (
     DeclarativeBase,
     Mapped,
+    Session,
     mapped_column,
     scoped_session,
     sessionmaker,
@@ -15,7 +26,10 @@ from typing_extensions import Annotated
 from .settings import get_config
 
 config = get_config()  # pylint: disable=invalid-name
-engine = create_engine(config.SQLALCHEMY_DATABASE_URI)
+engine = create_engine(
+    config.SQLALCHEMY_DATABASE_URI,
+    insertmanyvalues_page_size=config.SQLALCHEMY_INSERTMANYVALUES_PAGE_SIZE,
+)
 db_session = scoped_session(sessionmaker(bind=engine))
 
 
@@ -101,7 +115,8 @@ class Model(CRUDMixin, Base):
 class SurrogatePK(Model):  # pylint: disable=too-few-public-methods
     """A mixin that adds a surrogate integer 'primary key' column named ``id`` to any declarative-mapped class."""
 
-    __table_args__ = {"extend_existing": True}
+    # Any, as in DeclarativeBase, so that models can set a tuple of constraints
+    __table_args__: Any = {"extend_existing": True}
     __abstract__ = True
 
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -119,6 +134,124 @@ class SurrogatePK(Model):  # pylint: disable=too-few-public-methods
         return None
 
 
+ModelT = TypeVar("ModelT", bound="Model")
+
+
+def dialect_name(executor: Session | Connection) -> str:
+    """Return the name of the database dialect of a session or connection."""
+
+    if isinstance(executor, Connection):
+        return executor.dialect.name
+    return executor.get_bind().dialect.name
+
+
+def _dialect_insert(executor: Session | Connection, model: type[Model] | Table):
+    """Return an insert for model, or a table, that supports ON CONFLICT clauses."""
+
+    dialect = dialect_name(executor)
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    raise NotImplementedError(f"ON CONFLICT is not supported on {dialect}")
+
+
+def upsert(
+    session: Session,
+    instance: ModelT,
+    index_elements: Sequence[str],
+    set_: dict[str, Any] | None = None,
+) -> ModelT:
+    """Insert instance, or update the row it conflicts with, in one statement.
+
+    Runs ``INSERT ... ON CONFLICT (index_elements) DO UPDATE SET ... RETURNING``
+    with the column values that are set on the transient instance. On a conflict
+    the existing row is updated with set_, whose values may be SQL expressions
+    of the existing row (eg. ``Model.total_updates + 1``). Without set_ the
+    existing row is returned unchanged. Returns the persistent object for the
+    inserted or updated row. Concurrent callers never raise an IntegrityError
+    for the conflicting key. Only PostgreSQL and SQLite are supported.
+    """
+
+    model = type(instance)
+    state = inspect(instance)
+    values = {
+        attr.key: state.dict[attr.key]
+        for attr in state.mapper.column_attrs
+        if attr.key in state.dict
+    }
+    if not set_:
+        # a no-op update, so the existing row is returned.
+        set_ = {index_elements[0]: getattr(model, index_elements[0])}
+
+    statement = (
+        _dialect_insert(session, model)
+        .values(values)
+        .on_conflict_do_update(index_elements=index_elements, set_=set_)
+        .returning(model)
+    )
+    row: ModelT = session.scalars(
+        statement, execution_options={"populate_existing": True}
+    ).one()
+    return row
+
+
+def insert_on_conflict_do_nothing(
+    executor: Session | Connection,
+    model: type[Model],
+    rows: list[dict[str, Any]],
+    index_elements: Sequence[str],
+) -> int:
+    """Insert rows, skipping the rows that conflict on index_elements.
+
+    Runs ``INSERT ... ON CONFLICT (index_elements) DO NOTHING RETURNING id``
+    with rows as an executemany. The id of each inserted row is set in its
+    dict. Returns the number of rows that were inserted.
+    """
+
+    if not rows:
+        return 0
+    table = model.__table__
+    statement = (
+        _dialect_insert(executor, model)
+        .on_conflict_do_nothing(index_elements=index_elements)
+        .returning(table.c.id, *(table.c[name] for name in index_elements))
+    )
+    # the skipped rows return nothing, so the rows are matched by their key
+    by_key = {tuple(row[name] for name in index_elements): row for row in rows}
+    inserted = executor.execute(statement, rows).all()
+    for record_id, *key in inserted:
+        by_key[tuple(key)]["id"] = record_id
+    return len(inserted)
+
+
+def allocate_update_index(
+    executor: Session | Connection,
+    model: type[Model],
+    record_id: int,
+    *criteria: ColumnElement[bool],
+    count: int = 1,
+    **values: Any,
+) -> int | None:
+    """Atomically reserve the next count update indexes of a record.
+
+    ``total_updates`` of the record is incremented in the database with a single
+    ``UPDATE ... SET total_updates = total_updates + count RETURNING`` statement,
+    so concurrent writers always get distinct indexes. Any values are set in the
+    same statement. Returns the last reserved index, or None if no row with
+    record_id matches the extra criteria.
+    """
+
+    total_updates = model.total_updates  # type: ignore[attr-defined]
+    return executor.execute(
+        update(model)
+        .where(model.id == record_id)  # type: ignore[attr-defined]
+        .where(*criteria)
+        .values(total_updates=total_updates + count, **values)
+        .returning(total_updates)
+    ).scalar_one_or_none()
+
+
 def reference_col(tablename, nullable=False, pk_name="id", **kwargs) -> Mapped[Any]:
     """Column that adds primary key foreign key reference.
 
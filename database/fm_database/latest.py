@@ -0,0 +1,160 @@
+"""
+Latest reading of each grainbin sensor.
+
+grainbin_latest_reading holds one row per grainbin sensor with its most
+recent reading. The ingest upserts the readings of each new grainbin update
+in the same transaction as the update, so the latest readings of a grainbin
+are read from a handful of rows, however long the history in grainbin_update
+is.
+
+Each latest reading keeps the id of its grainbin_update row in update_id, so
+it can be returned as that update.
+
+The latest update of a grainbin is the one with the highest update_index, as
+the index is allocated in the order the updates arrive. A reading with a
+lower update_index (a message that arrived late) never replaces a newer one.
+"""
+
+from collections.abc import Iterable
+from typing import Any
+
+from sqlalchemy import Connection, Select, Table, and_, func, select
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.sql.elements import ColumnElement
+
+from .database import _dialect_insert
+from .models.device import GrainbinLatestReading, GrainbinUpdate
+
+LATEST_READING_KEY = ("grainbin_id", "sensor_name")
+# the columns that are replaced by a newer reading.
+LATEST_READING_COLUMNS = (
+    "timestamp",
+    "update_index",
+    "temperature",
+    "temphigh",
+    "templow",
+)
+
+
+def add_latest_readings(
+    executor: Session | Connection, rows: Iterable[dict[str, Any]]
+) -> int:
+    """Upsert grainbin_update rows into the latest readings of their sensors.
+
+    rows are the values of new grainbin_update rows, with their id. Readings
+    without a sensor name are skipped. Returns the number of readings that
+    were upserted.
+    """
+
+    # the same sensor can only be upserted once in a statement
+    readings = {
+        (row["grainbin_id"], row["sensor_name"]): {
+            "grainbin_id": row["grainbin_id"],
+            "sensor_name": row["sensor_name"],
+            "update_id": row["id"],
+            **{name: row[name] for name in LATEST_READING_COLUMNS},
+        }
+        for row in rows
+        if row["sensor_name"] is not None
+    }
+    if not readings:
+        return 0
+
+    statement = _dialect_insert(executor, GrainbinLatestReading)
+    statement = statement.on_conflict_do_update(
+        index_elements=LATEST_READING_KEY,
+        set_={
+            name: getattr(statement.excluded, name)
+            for name in ("update_id", *LATEST_READING_COLUMNS)
+        },
+        where=GrainbinLatestReading.update_index <= statement.excluded.update_index,
+    )
+    executor.execute(statement, list(readings.values()))
+    return len(readings)
+
+
+def add_latest_readings_from(executor: Session | Connection, source: Table) -> int:
+    """Upsert the newest reading of each grainbin sensor in source.
+
+    source is a table with the columns of grainbin_update, eg. the staging
+    table of a bulk load, whose rows are stored in grainbin_update. The
+    newest reading of each sensor is picked with a window function, and its
+    grainbin_update row, with its id, is upserted like add_latest_readings
+    does. Returns the number of readings that were upserted.
+    """
+
+    # pylint: disable=not-callable
+    newest = (
+        func.row_number()
+        .over(
+            partition_by=(source.c.grainbin_id, source.c.sensor_name),
+            order_by=source.c.update_index.desc(),
+        )
+        .label("newest")
+    )
+    readings = (
+        select(source.c.grainbin_id, source.c.timestamp, source.c.sensor_name, newest)
+        .where(source.c.sensor_name.is_not(None))
+        .subquery()
+    )
+    updates: Table = GrainbinUpdate.__table__  # type: ignore[assignment]
+    rows = executor.execute(
+        select(updates)
+        .join(
+            readings,
+            and_(
+                updates.c.grainbin_id == readings.c.grainbin_id,
+                updates.c.timestamp == readings.c.timestamp,
+                updates.c.sensor_name == readings.c.sensor_name,
+            ),
+        )
+        .where(readings.c.newest == 1)
+    )
+    return add_latest_readings(executor, [dict(row) for row in rows.mappings()])
+
+
+def select_latest_readings(
+    grainbin_id: int,
+) -> Select[tuple[GrainbinLatestReading]]:
+    """Return the select of the readings of the latest update of a grainbin.
+
+    Sensors that were not part of the latest update are left out. Ordered by
+    templow (the sensor number), highest first.
+    """
+
+    latest_index = (
+        select(func.max(GrainbinLatestReading.update_index))
+        .where(GrainbinLatestReading.grainbin_id == grainbin_id)
+        .scalar_subquery()
+    )
+    return (
+        select(GrainbinLatestReading)
+        .where(GrainbinLatestReading.grainbin_id == grainbin_id)
+        .where(GrainbinLatestReading.update_index == latest_index)
+        .order_by(GrainbinLatestReading.templow.desc())
+    )
+
+
+def select_all_latest_readings(
+    *where: ColumnElement[bool],
+) -> Select[tuple[GrainbinLatestReading]]:
+    """Return the select of the readings of the latest update of every grainbin.
+
+    The latest update of each grainbin is found with a window function, so
+    the readings of any number of grainbins are selected in one query. where
+    filters the readings, eg. ``GrainbinLatestReading.grainbin_id.in_(ids)``.
+    Ordered by grainbin_id, then templow (the sensor number), highest first.
+    """
+
+    latest_index = (
+        func.max(GrainbinLatestReading.update_index)
+        .over(partition_by=GrainbinLatestReading.grainbin_id)
+        .label("latest_index")
+    )
+    readings = select(GrainbinLatestReading, latest_index).where(*where).subquery()
+    reading = aliased(GrainbinLatestReading, readings)
+    return (
+        select(reading)
+        .where(readings.c.update_index == readings.c.latest_index)
+        .order_by(readings.c.grainbin_id, readings.c.templow.desc())
+    )
@@ -0,0 +1,500 @@
+"""Streaming bulk loader for GrainbinUpdate and DeviceUpdate rows.
+
+Used for backfills and replays where ORM inserts are too slow. Records are read
+from an iterable (usually a generator) and written as they are produced, so the
+full set of rows is never held in memory.
+
+On PostgreSQL (psycopg2) the rows are streamed with ``COPY ... FROM STDIN``.
+On other databases (eg. the SQLite test database) the rows are inserted with
+executemany in chunks of ``chunk_size`` rows.
+
+The ``grainbin_id`` and ``device_id`` foreign keys are resolved through a lookup
+map that is loaded once at the start. Records for an unknown device or grainbin
+are skipped and counted. The records must not be produced by queries on the
+session that is loading them, as its connection is busy while the load runs.
+
+Each record is one update and gets the next ``update_index`` of its device or
+grainbin. Indexes are reserved in blocks of ``block_size`` with
+``allocate_update_index``. On PostgreSQL the reservations are committed straight
+away on a separate connection, so the device and grainbin rows are not locked
+for the length of the load. Unused indexes of the last block are given back once
+the load is committed, as long as no other writer has reserved an index since.
+
+The rows are streamed into a temporary staging table, and moved into
+grainbin_update or device_update with ``INSERT ... SELECT ... ON CONFLICT DO
+NOTHING``. grainbin_update and device_update are unique on (grainbin_id,
+timestamp, sensor_name) and (device_id, timestamp), so the rows that are stored
+already, eg. of a re-run or an overlapping file, are skipped and counted
+instead of failing the load. Their update indexes are left unused.
+
+In the same transaction as the rows, the inserted rows are added to the hourly
+and daily rollups, and the newest reading of each grainbin sensor is upserted
+into grainbin_latest_reading. Note that the loaded updates get indexes above
+the existing ones, so a replay of old readings becomes the 'latest' update of
+its device or grainbin.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Sequence
+
+from sqlalchemy import (
+    Column,
+    Connection,
+    MetaData,
+    Table,
+    delete,
+    insert,
+    select,
+    true,
+    update,
+)
+from sqlalchemy.orm import Session
+
+from .database import _dialect_insert, allocate_update_index
+from .latest import add_latest_readings_from
+from .models.device import Device, DeviceUpdate, Grainbin, GrainbinUpdate
+from .rollups import add_device_rollups_from, add_grainbin_rollups_from
+
+GRAINBIN_UPDATE_COLUMNS = (
+    "grainbin_id",
+    "timestamp",
+    "update_index",
+    "sensor_name",
+    "temperature",
+    "temphigh",
+    "templow",
+)
+
+DEVICE_UPDATE_COLUMNS = (
+    "device_id",
+    "timestamp",
+    "update_index",
+    "interior_temp",
+    "exterior_temp",
+    "device_temp",
+    "uptime",
+    "load_avg",
+    "disk_total",
+    "disk_used",
+    "disk_free",
+)
+
+# the unique columns of a grainbin_update and a device_update row.
+GRAINBIN_UPDATE_KEY = ("grainbin_id", "timestamp", "sensor_name")
+DEVICE_UPDATE_KEY = ("device_id", "timestamp")
+
+
+class GrainbinRecord(NamedTuple):
+    """A grainbin update to load.
+
+    Each sensor is a ``(sensor_name, temperature, temphigh, templow)`` tuple.
+    """
+
+    device_id: str
+    bus_number: int
+    timestamp: datetime
+    sensors: Sequence[tuple[str | None, float | None, int | None, int | None]]
+
+
+class DeviceRecord(NamedTuple):
+    """A device update to load."""
+
+    device_id: str
+    timestamp: datetime
+    interior_temp: float | None = None
+    exterior_temp: float | None = None
+    device_temp: float | None = None
+    uptime: timedelta | None = None
+    load_avg: int | None = None
+    disk_total: int | None = None
+    disk_used: int | None = None
+    disk_free: int | None = None
+
+
+@dataclass
+class LoadResult:
+    """The outcome of a load."""
+
+    # rows that were inserted
+    rows: int = 0
+    updates: int = 0
+    # records of an unknown device or grainbin
+    skipped: int = 0
+    # rows that were stored already
+    duplicates: int = 0
+    # inserted readings without a sensor position, left out of the rollups
+    skipped_readings: int = 0
+
+
+class UpdateIndexAllocator:
+    """Allocate ``update_index`` values for a Device or Grainbin in blocks.
+
+    The blocks are reserved on connection. If it is an autocommit connection
+    each reservation is committed straight away, otherwise the reservations are
+    part of the transaction of the connection.
+    """
+
+    def __init__(
+        self, connection: Connection, model: type[Device] | type[Grainbin], block_size
+    ):
+        """Create the allocator. Blocks are reserved using connection."""
+
+        self.connection = connection
+        self.model = model
+        self.block_size = max(1, block_size)
+        # record id -> [first reserved, next to use, end of the current block]
+        self._ranges: dict[int, list[int]] = {}
+
+    def next_index(self, record_id: int) -> int:
+        """Return the next update_index for record_id."""
+
+        reserved = self._ranges.get(record_id)
+        if reserved is None or reserved[1] > reserved[2]:
+            end = self._reserve(record_id, self.block_size)
+            if reserved is None or reserved[2] != end - self.block_size:
+                # first block, or another writer reserved indexes in between.
+                reserved = [end - self.block_size + 1, end - self.block_size + 1, end]
+                self._ranges[record_id] = reserved
+            else:
+                reserved[2] = end
+
+        index = reserved[1]
+        reserved[1] += 1
+        return index
+
+    def release(self) -> None:
+        """Give back the unused indexes of the last block of each record."""
+
+        for record_id, (_, next_index, end) in self._ranges.items():
+            self._compare_and_set(record_id, end, next_index - 1)
+        self._ranges.clear()
+
+    def rollback(self) -> None:
+        """Give back all the indexes that were reserved."""
+
+        for record_id, (first, _, end) in self._ranges.items():
+            self._compare_and_set(record_id, end, first - 1)
+        self._ranges.clear()
+
+    def _reserve(self, record_id: int, count: int) -> int:
+        """Reserve count indexes and return the last one."""
+
+        end = allocate_update_index(self.connection, self.model, record_id, count=count)
+        if end is None:
+            raise LookupError(f"{self.model.__name__} {record_id} does not exist.")
+        return end
+
+    def _compare_and_set(self, record_id: int, expected: int, value: int) -> None:
+        """Set total_updates to value if nobody changed it since it was expected."""
+
+        model = self.model
+        self.connection.execute(
+            update(model)
+            .where(model.id == record_id)
+            .where(model.total_updates == expected)
+            .values(total_updates=value)
+        )
+
+
+def load_grainbin_updates(
+    session: Session,
+    records: Iterable[GrainbinRecord],
+    block_size: int = 1000,
+    chunk_size: int = 10000,
+) -> LoadResult:
+    """Load grainbin updates into the grainbin_update table and commit them."""
+
+    lookup = {
+        (device_id, bus_number): grainbin_id
+        for grainbin_id, device_id, bus_number in session.execute(
+            select(Grainbin.id, Grainbin.device_id_str, Grainbin.bus_number)
+        )
+    }
+    result = LoadResult()
+
+    def rows(allocator: UpdateIndexAllocator) -> Iterator[tuple]:
+        for record in records:
+            grainbin_id = lookup.get((record.device_id, record.bus_number))
+            if grainbin_id is None:
+                result.skipped += 1
+                continue
+            result.updates += 1
+            update_index = allocator.next_index(grainbin_id)
+            for sensor_name, temperature, temphigh, templow in record.sensors:
+                yield (
+                    grainbin_id,
+                    record.timestamp,
+                    update_index,
+                    sensor_name,
+                    temperature,
+                    temphigh,
+                    templow,
+                )
+
+    def after_insert(staging: Table) -> None:
+        result.skipped_readings = add_grainbin_rollups_from(session, staging).skipped
+        add_latest_readings_from(session, staging)
+
+    count, result.rows = _load(
+        session,
+        GrainbinUpdate.__table__,  # type: ignore[arg-type]
+        GRAINBIN_UPDATE_COLUMNS,
+        GRAINBIN_UPDATE_KEY,
+        Grainbin,
+        rows,
+        block_size,
+        chunk_size,
+        after_insert=after_insert,
+    )
+    result.duplicates = count - result.rows
+    return result
+
+
+def load_device_updates(
+    session: Session,
+    records: Iterable[DeviceRecord],
+    block_size: int = 1000,
+    chunk_size: int = 10000,
+) -> LoadResult:
+    """Load device updates into the device_update table and commit them."""
+
+    lookup = dict(session.execute(select(Device.device_id, Device.id)).tuples().all())
+    result = LoadResult()
+
+    def rows(allocator: UpdateIndexAllocator) -> Iterator[tuple]:
+        for record in records:
+            device_id = lookup.get(record.device_id)
+            if device_id is None:
+                result.skipped += 1
+                continue
+            result.updates += 1
+            yield (
+                device_id,
+                record.timestamp,
+                allocator.next_index(device_id),
+                *record[2:],
+            )
+
+    count, result.rows = _load(
+        session,
+        DeviceUpdate.__table__,  # type: ignore[arg-type]
+        DEVICE_UPDATE_COLUMNS,
+        DEVICE_UPDATE_KEY,
+        Device,
+        rows,
+        block_size,
+        chunk_size,
+        after_insert=lambda staging: add_device_rollups_from(session, staging),
+    )
+    result.duplicates = count - result.rows
+    return result
+
+
+def _load(  # pylint: disable=too-many-arguments,too-many-locals
+    session: Session,
+    table: Table,
+    columns: tuple[str, ...],
+    key: tuple[str, ...],
+    model: type[Device] | type[Grainbin],
+    rows,
+    block_size: int,
+    chunk_size: int,
+    *,
+    after_insert: Callable[[Table], Any] | None = None,
+) -> tuple[int, int]:
+    """Write the rows to table in one transaction.
+
+    The rows are written to a staging table, and inserted into table unless
+    a row with the same key is stored already. after_insert is called with
+    the staging table, which then only holds the inserted rows, in the same
+    transaction. Returns the number of rows that were loaded and inserted.
+    """
+
+    connection = session.connection()
+    use_copy = _supports_copy(connection)
+    if use_copy:
+        allocation_connection = connection.engine.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        )
+    else:
+        allocation_connection = connection
+    allocator = UpdateIndexAllocator(allocation_connection, model, block_size)
+    staging = _staging_table(table, columns)
+
+    try:
+        staging.create(connection)
+        if use_copy:
+            count = _copy_rows(connection, staging, columns, rows(allocator))
+        else:
+            count = _insert_rows(session, staging, columns, rows(allocator), chunk_size)
+            # the reservations are part of the same transaction as the rows
+            allocator.release()
+        inserted = _insert_staged_rows(session, table, staging, columns, key)
+        if after_insert is not None:
+            after_insert(staging)
+        staging.drop(connection)
+        session.commit()
+    except BaseException:
+        session.rollback()
+        if use_copy:
+            allocator.rollback()
+            allocation_connection.close()
+        raise
+
+    if use_copy:
+        allocator.release()
+        allocation_connection.close()
+    return count, inserted
+
+
+def _staging_table(table: Table, columns: tuple[str, ...]) -> Table:
+    """Return a temporary table with the columns of table, without constraints."""
+
+    return Table(
+        f"{table.name}_load",
+        MetaData(),
+        *(Column(name, table.c[name].type) for name in columns),
+        prefixes=["TEMPORARY"],
+    )
+
+
+def _insert_staged_rows(
+    session: Session,
+    table: Table,
+    staging: Table,
+    columns: tuple[str, ...],
+    key: tuple[str, ...],
+) -> int:
+    """Insert the staged rows into table, skipping the rows that are stored already.
+
+    The staged rows that were not inserted are deleted from staging. A staged
+    row was inserted if table has a row with its key and update_index, as the
+    indexes of a load were not used by any stored row. Returns the number of
+    rows that were inserted.
+    """
+
+    # the WHERE tells SQLite that ON CONFLICT is not a join constraint
+    statement = (
+        _dialect_insert(session, table)
+        .from_select(columns, select(*staging.c).where(true()))
+        .on_conflict_do_nothing(index_elements=key)
+    )
+    inserted: int = session.execute(statement).rowcount
+    stored = (
+        select(table.c.id)
+        .where(*(table.c[name] == staging.c[name] for name in (*key, "update_index")))
+        .exists()
+    )
+    session.execute(delete(staging).where(~stored))
+    return inserted
+
+
+def _supports_copy(connection: Connection) -> bool:
+    """Return True if rows can be streamed with COPY on this connection."""
+
+    dialect = connection.dialect
+    return dialect.name == "postgresql" and dialect.driver == "psycopg2"
+
+
+def _insert_rows(
+    session: Session,
+    table: Table,
+    columns: tuple[str, ...],
+    rows: Iterator[tuple],
+    chunk_size: int,
+) -> int:
+    """Insert the rows with executemany, chunk_size rows at a time."""
+
+    count = 0
+    while chunk := [dict(zip(columns, row)) for row in islice(rows, chunk_size)]:
+        session.execute(insert(table), chunk)
+        count += len(chunk)
+    return count
+
+
+def _copy_rows(
+    connection: Connection,
+    table: Table,
+    columns: tuple[str, ...],
+    rows: Iterator[tuple],
+) -> int:
+    """Stream the rows to table with COPY FROM STDIN."""
+
+    stream = CopyStream(rows)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN", stream
+        )
+    finally:
+        cursor.close()
+    return stream.count
+
+
+class CopyStream:
+    """A file-like object that reads rows from an iterator in COPY text format.
+
+    copy_expert only calls read and readline, so it does not subclass
+    io.TextIOBase, whose readline is typed as returning bytes.
+    """
+
+    def __init__(self, rows: Iterator[tuple]):
+        """Create the stream."""
+        self._rows = rows
+        self._buffer = ""
+        self.count = 0
+
+    def read(self, size: int | None = -1) -> str:
+        """Return up to size characters, producing more lines as needed."""
+
+        lines = [self._buffer]
+        length = len(self._buffer)
+        while size is None or size < 0 or length < size:
+            try:
+                row = next(self._rows)
+            except StopIteration:
+                break
+            line = copy_line(row)
+            lines.append(line)
+            length += len(line)
+            self.count += 1
+
+        data = "".join(lines)
+        if size is None or size < 0:
+            self._buffer = ""
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+    def readline(self, size: int | None = -1) -> str:
+        """Return the next line."""
+        return self.read(size)
+
+
+def copy_line(row: Sequence[Any]) -> str:
+    """Return a row as a line in the PostgreSQL COPY text format."""
+
+    return "\t".join(_copy_value(value) for value in row) + "\n"
+
+
+def _copy_value(value: Any) -> str:
+    """Return a value in the PostgreSQL COPY text format."""
+
+    if value is None:
+        return "\\N"
+    if isinstance(value, str):
+        return (
+            value.replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+        )
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, timedelta):
+        return f"{value.total_seconds()} seconds"
+    return str(value)
@@ -2,10 +2,12 @@
 """Device models."""
 from datetime import datetime, timedelta
 
+from sqlalchemy import ForeignKey, Index, UniqueConstraint, desc, event
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 
 from ..database import SurrogatePK, reference_col, str7, str10, str20, str50
+from ..partitions import create_initial_partitions, partitioned_by_month
 
 # https://github.com/pylint-dev/pylint/issues/8138
 # can be removed once upstream issue in pylint is fixed
@@ -13,11 +15,31 @@ from ..database import SurrogatePK, reference_col, str7, str10, str20, str50
 
 
 class GrainbinUpdate(SurrogatePK):
-    """Table to hold Grainbin update data."""
+    """Table to hold Grainbin update data.
+
+    Partitioned by month of the timestamp on PostgreSQL.
+    """
 
     __tablename__ = "grainbin_update"
+    __table_args__ = (
+        UniqueConstraint(
+            "grainbin_id",
+            "timestamp",
+            "sensor_name",
+            name="uq_grainbin_update_grainbin_id_timestamp_sensor_name",
+        ),
+        Index("ix_grainbin_update_timestamp", "timestamp", postgresql_using="brin"),
+        # the keyset pagination of the updates of a grainbin, newest first
+        Index(
+            "ix_grainbin_update_grainbin_id_update_index",
+            "grainbin_id",
+            desc("update_index"),
+            desc("id"),
+        ),
+        {"extend_existing": True, **partitioned_by_month()},
+    )
 
-    timestamp: Mapped[datetime] = mapped_column(index=True)
+    timestamp: Mapped[datetime]
     update_index: Mapped[int] = mapped_column(index=True)
 
     temperature: Mapped[float | None]
@@ -41,10 +63,65 @@ class GrainbinUpdate(SurrogatePK):
         )
 
 
+class GrainbinLatestReading(SurrogatePK):
+    """The most recent reading of each sensor of a grainbin.
+
+    Has the same columns as GrainbinUpdate, with one row per sensor that is
+    replaced by each newer reading. update_id is the id of the GrainbinUpdate
+    of the reading.
+    """
+
+    __tablename__ = "grainbin_latest_reading"
+    __table_args__ = (
+        UniqueConstraint(
+            "grainbin_id",
+            "sensor_name",
+            name="uq_grainbin_latest_reading_grainbin_id_sensor_name",
+        ),
+        {"extend_existing": True},
+    )
+
+    timestamp: Mapped[datetime]
+    update_index: Mapped[int]
+    # not a foreign key, as the partitioned grainbin_update has no unique id
+    update_id: Mapped[int]
+
+    temperature: Mapped[float | None]
+    temphigh: Mapped[int | None]  # cable number
+    templow: Mapped[int | None]  # sensor number
+    sensor_name: Mapped[str20]
+
+    # the latest readings are deleted with their grainbin
+    grainbin_id: Mapped[int] = mapped_column(
+        ForeignKey("grainbin.id", ondelete="CASCADE")
+    )
+    grainbin: Mapped["Grainbin"] = relationship()
+
+    def __init__(self, grainbin_id: int, sensor_name: str) -> None:
+        """Create an instance."""
+
+        self.grainbin_id = grainbin_id
+        self.sensor_name = sensor_name
+
+    def __repr__(self) -> str:
+        """Represent a GrainbinLatestReading as a string."""
+
+        return (
+            f"GrainbinLatestReading for Grainbin {self.grainbin_id} "
+            f"sensor {self.sensor_name}"
+        )
+
+
 class Grainbin(SurrogatePK):
     """A grainbin."""
 
     __tablename__ = "grainbin"
+    __table_args__ = (
+        UniqueConstraint(
+            "device_id_str", "bus_number", name="uq_grainbin_device_id_str_bus_number"
+        ),
+        {"extend_existing": True},
+    )
 
     creation_time: Mapped[datetime] = mapped_column(default=func.now())
     last_updated: Mapped[datetime] = mapped_column(
@@ -88,11 +165,28 @@ class Grainbin(SurrogatePK):
 
 
 class DeviceUpdate(SurrogatePK):
-    """Table to hold Device Update data."""
+    """Table to hold Device Update data.
+
+    Partitioned by month of the timestamp on PostgreSQL.
+    """
 
     __tablename__ = "device_update"
+    __table_args__ = (
+        UniqueConstraint(
+            "device_id", "timestamp", name="uq_device_update_device_id_timestamp"
+        ),
+        Index("ix_device_update_timestamp", "timestamp", postgresql_using="brin"),
+        # the keyset pagination of the updates of a device, newest first
+        Index(
+            "ix_device_update_device_id_update_index",
+            "device_id",
+            desc("update_index"),
+            desc("id"),
+        ),
+        {"extend_existing": True, **partitioned_by_month()},
+    )
 
-    timestamp: Mapped[datetime] = mapped_column(index=True)
+    timestamp: Mapped[datetime]
     update_index: Mapped[int] = mapped_column(index=True)
 
     interior_temp: Mapped[float | None]
@@ -181,3 +275,7 @@ class Device(SurrogatePK):
     def __repr__(self):
         """Represent the device as a string."""
         return f"<Device: {self.name}>"
+
+
+event.listen(GrainbinUpdate.__table__, "after_create", create_initial_partitions)
+event.listen(DeviceUpdate.__table__, "after_create", create_initial_partitions)
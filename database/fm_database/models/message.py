@@ -23,7 +23,7 @@ class Message(SurrogatePK):
     destination: Mapped[str20]
     classification: Mapped[str20]
 
-    created_at: Mapped[datetime] = mapped_column(default=func.now())
+    created_at: Mapped[datetime] = mapped_column(default=func.now(), index=True)
     valid_from: Mapped[datetime | None]
     valid_to: Mapped[datetime | None]
 
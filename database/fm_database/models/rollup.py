@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Rollup models.
+
+The rollups hold the count, minimum, maximum and sum of the temperatures of
+an hour or a day, so charts of long time ranges do not read every update.
+"""
+from datetime import datetime
+
+from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..database import SurrogatePK, str5
+
+
+def _average(total: float | None, count: int) -> float | None:
+    """Return the average of count values that add up to total."""
+
+    if total is None or not count:
+        return None
+    return total / count
+
+
+class GrainbinRollup(SurrogatePK):
+    """Hourly and daily temperatures of a grainbin sensor.
+
+    A sensor is identified by its cable (temphigh) and sensor (templow) number.
+    """
+
+    __tablename__ = "grainbin_rollup"
+    __table_args__ = (
+        UniqueConstraint(
+            "grainbin_id",
+            "period",
+            "bucket",
+            "temphigh",
+            "templow",
+            name="uq_grainbin_rollup_grainbin_id_period_bucket_temphigh_templow",
+        ),
+        {"extend_existing": True},
+    )
+
+    period: Mapped[str5]  # 'hour' or 'day'
+    bucket: Mapped[datetime]  # start of the hour or day
+    temphigh: Mapped[int]  # cable number
+    templow: Mapped[int]  # sensor number
+
+    temperature_count: Mapped[int] = mapped_column(default=0)
+    temperature_min: Mapped[float]
+    temperature_max: Mapped[float]
+    temperature_sum: Mapped[float]
+
+    # the rollups are deleted with their grainbin
+    grainbin_id: Mapped[int] = mapped_column(
+        ForeignKey("grainbin.id", ondelete="CASCADE")
+    )
+
+    @property
+    def temperature_avg(self) -> float | None:
+        """Return the average temperature of the bucket."""
+
+        return _average(self.temperature_sum, self.temperature_count)
+
+    def __repr__(self) -> str:
+        """Represent a GrainbinRollup as a string."""
+
+        return (
+            f"GrainbinRollup for Grainbin {self.grainbin_id} "
+            f"{self.period} {self.bucket}"
+        )
+
+
+class DeviceRollup(SurrogatePK):
+    """Hourly and daily interior and exterior temperatures of a device."""
+
+    __tablename__ = "device_rollup"
+    __table_args__ = (
+        UniqueConstraint(
+            "device_id",
+            "period",
+            "bucket",
+            name="uq_device_rollup_device_id_period_bucket",
+        ),
+        {"extend_existing": True},
+    )
+
+    period: Mapped[str5]  # 'hour' or 'day'
+    bucket: Mapped[datetime]  # start of the hour or day
+
+    interior_count: Mapped[int] = mapped_column(default=0)
+    interior_min: Mapped[float | None]
+    interior_max: Mapped[float | None]
+    interior_sum: Mapped[float | None]
+
+    exterior_count: Mapped[int] = mapped_column(default=0)
+    exterior_min: Mapped[float | None]
+    exterior_max: Mapped[float | None]
+    exterior_sum: Mapped[float | None]
+
+    # the rollups are deleted with their device
+    device_id: Mapped[int] = mapped_column(ForeignKey("device.id", ondelete="CASCADE"))
+
+    @property
+    def interior_avg(self) -> float | None:
+        """Return the average interior temperature of the bucket."""
+
+        return _average(self.interior_sum, self.interior_count)
+
+    @property
+    def exterior_avg(self) -> float | None:
+        """Return the average exterior temperature of the bucket."""
+
+        return _average(self.exterior_sum, self.exterior_count)
+
+    def __repr__(self) -> str:
+        """Represent a DeviceRollup as a string."""
+
+        return f"DeviceRollup for Device {self.device_id} {self.period} {self.bucket}"
@@ -1,16 +1,32 @@
 """Module to add pagination to the database.
 
 Inspired/taken from https://github.com/pallets-eco/flask-sqlalchemy/blob/main/src/flask_sqlalchemy/pagination.py
+
+Pagination pages with ``LIMIT/OFFSET``, so the database reads and skips every
+row before the page. The total is counted by a count provider: an exact
+``COUNT(*)`` by default, or a cheaper denormalized counter (scalar_count),
+planner estimate (estimated_count) or cached count (CachedCount). KeysetPagination pages with an
+opaque cursor that holds the key of the last item of the previous page, so
+each page starts with an index lookup no matter how deep it is.
 """
 
 from __future__ import annotations
 
+import base64
+import binascii
+import json
+import threading
+import time
+from collections.abc import Sequence
 from math import ceil
-from typing import Any, Iterator
+from typing import Any, Callable, Hashable, Iterator
 
 import sqlalchemy as sa
 import sqlalchemy.orm as sa_orm
 
+# returns the total number of items of a select statement, or None if unknown
+CountProvider = Callable[[sa_orm.Session, sa.sql.Select[Any]], int | None]
+
 
 def paginate(
     session: sa_orm.Session,
@@ -18,7 +34,7 @@ def paginate(
     page: int | None = None,
     per_page: int | None = None,
     max_per_page: int | None = None,
-    count: bool = True,
+    count: bool | CountProvider = True,
 ) -> Pagination:
     """Apply an offset and limit to a select statment based on the current page and number of items per page.
 
@@ -37,7 +53,8 @@ def paginate(
         user-provided value. Use ``None`` for no limit. Defaults to 100.
     :param count: Calculate the total number of values by issuing an extra count
         query. For very complex queries this may be inaccurate or slow, so it can be
-        disabled and set manually if necessary.
+        disabled and set manually if necessary, or a cheaper count provider
+        (eg. :func:`scalar_count`) can be given.
     """
     return Pagination(
         select=select,
@@ -63,7 +80,8 @@ class Pagination:
         user-provided value. Use ``None`` for no limit. Defaults to 100.
     :param count: Calculate the total number of values by issuing an extra count
         query. For very complex queries this may be inaccurate or slow, so it can be
-        disabled and set manually if necessary.
+        disabled and set manually if necessary, or a cheaper count provider
+        (eg. :func:`scalar_count`) can be given.
     """
 
     def __init__(
@@ -73,7 +91,7 @@ class Pagination:
         page: int | None = None,
         per_page: int | None = None,
         max_per_page: int | None = 100,
-        count: bool = True,
+        count: bool | CountProvider = True,
     ) -> None:
         """Initiate the class."""
 
@@ -103,7 +121,9 @@ class Pagination:
         equivalent to iterating over the items.
         """
 
-        if count:
+        if callable(count):
+            total = count(session, select)
+        elif count:
             total = self._query_count()
         else:
             total = None
@@ -156,13 +176,7 @@ class Pagination:
 
         :meta private:
         """
-        select = self.select
-        sub = select.options(sa_orm.lazyload("*")).order_by(None).subquery()
-        # pylint: disable=not-callable
-        out = self.session.execute(sa.select(sa.func.count()).select_from(sub)).scalar()
-        if out is None:
-            return 0
-        return out
+        return exact_count(self.session, self.select)
 
     @property
     def first(self) -> int:
@@ -306,3 +320,225 @@ class Pagination:
         """Iterate over the items on the current page."""
 
         yield from self.items
+
+
+def exact_count(session: sa_orm.Session, select: sa.sql.Select[Any]) -> int:
+    """Count the items of a select statement with ``COUNT(*)``.
+
+    Reads every matching row, so it is exact but slow on big tables.
+    """
+
+    sub = select.options(sa_orm.lazyload("*")).order_by(None).subquery()
+    # pylint: disable=not-callable
+    out = session.execute(sa.select(sa.func.count()).select_from(sub)).scalar()
+    if out is None:
+        return 0
+    return out
+
+
+def scalar_count(statement: sa.sql.Select[Any]) -> CountProvider:
+    """Return a count provider that reads the total from a denormalized counter.
+
+    statement selects the counter, eg.
+    ``select(Device.total_updates).where(Device.id == device_id)``. It is run
+    instead of counting the paginated select, and a missing row counts as 0.
+    """
+
+    def count(session: sa_orm.Session, select: sa.sql.Select[Any]) -> int:
+        # pylint: disable=unused-argument
+        return session.execute(statement).scalar() or 0
+
+    return count
+
+
+def estimated_count(session: sa_orm.Session, select: sa.sql.Select[Any]) -> int | None:
+    """Estimate the items of a select statement from the query planner.
+
+    On PostgreSQL the estimate is the ``Plan Rows`` of ``EXPLAIN``, which
+    plans the query without reading the rows. It is as accurate as the last
+    ``ANALYZE`` of the tables. Other databases have no estimate and are
+    counted exactly.
+    """
+
+    bind = session.get_bind()
+    if bind.dialect.name != "postgresql":
+        return exact_count(session, select)
+
+    compiled = select.order_by(None).compile(
+        dialect=bind.dialect, compile_kwargs={"literal_binds": True}
+    )
+    plan = (
+        session.connection()
+        .exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")
+        .scalar()
+    )
+    if plan is None:
+        return None
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class CachedCount:
+    """A count provider that caches the counts of another one for ttl seconds.
+
+    Counts are cached per select statement and its parameters, so repeated
+    requests for the pages of the same items are counted once per ttl. The
+    cache holds at most max_size counts and is thread safe.
+    """
+
+    def __init__(
+        self,
+        provider: CountProvider = exact_count,
+        ttl: float = 60.0,
+        max_size: int = 1024,
+    ) -> None:
+        """Create the cache."""
+
+        self.provider = provider
+        self.ttl = ttl
+        self.max_size = max_size
+        self._counts: dict[Hashable, tuple[float, int | None]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(
+        self, session: sa_orm.Session, select: sa.sql.Select[Any]
+    ) -> int | None:
+        """Return the cached count of select, counting it when it expired."""
+
+        compiled = select.compile()
+        key = (str(compiled), repr(sorted(compiled.params.items())))
+        now = time.monotonic()
+        with self._lock:
+            cached = self._counts.get(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        total = self.provider(session, select)
+        with self._lock:
+            if len(self._counts) >= self.max_size:
+                # drop the expired counts, or all of them if none expired
+                self._counts = {
+                    key: value for key, value in self._counts.items() if value[0] > now
+                }
+                if len(self._counts) >= self.max_size:
+                    self._counts.clear()
+            self._counts[key] = (now + self.ttl, total)
+        return total
+
+    def clear(self) -> None:
+        """Remove all cached counts."""
+
+        with self._lock:
+            self._counts.clear()
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Return the opaque cursor of the integer key values of an item."""
+
+    data = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, length: int | None) -> list[Any]:
+    """Return the integer key values of a cursor that has length values.
+
+    A cursor can have any number of values if length is None.
+
+    Raises a ValueError if the cursor is not valid, so a cursor edited by a
+    client never passes anything but integers to the query.
+    """
+
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(data)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as error:
+        raise ValueError(f"invalid cursor '{cursor}'") from error
+    if not isinstance(values, list) or length not in (None, len(values)):
+        raise ValueError(f"invalid cursor '{cursor}'")
+    # bool is a subclass of int, but true and false are not key values
+    if any(not isinstance(value, int) or isinstance(value, bool) for value in values):
+        raise ValueError(f"invalid cursor '{cursor}'")
+    return values
+
+
+class KeysetPagination:
+    """Page through a select statement with a cursor on its key columns.
+
+    The items are ordered by the integer key columns, which must be unique
+    together (eg. ``(update_index, id)``). The cursor of the next page holds
+    the key of the last item on the page, and the page after a cursor is
+    selected with ``WHERE (key columns) < (cursor values)`` (``>`` in
+    ascending order), so with an index on the key columns every page is as
+    fast as the first one.
+    There are no page numbers and the total is not counted.
+
+    :param session: The ``session`` to use for the query.
+    :param select: The ``select`` statement to paginate, without an order.
+    :param key: The columns to order and page by, eg.
+        ``(DeviceUpdate.update_index, DeviceUpdate.id)``.
+    :param cursor: The cursor of the page, ``next_cursor`` of the previous page.
+        ``None`` or an empty string for the first page.
+    :param per_page: The maximum number of items on a page. Defaults to 20.
+    :param max_per_page: The maximum allowed value for ``per_page``. Defaults to 100.
+    :param descending: Order the items by the key columns in descending order.
+    """
+
+    def __init__(
+        self,
+        session: sa_orm.Session,
+        select: sa.sql.Select[Any],
+        key: Sequence[Any],
+        *,
+        cursor: str | None = None,
+        per_page: int | None = None,
+        max_per_page: int | None = 100,
+        descending: bool = True,
+    ) -> None:
+        """Initiate the class.
+
+        Raises a ValueError if the cursor is not valid.
+        """
+
+        self.per_page: int = Pagination._prepare_page_args(
+            per_page=per_page, max_per_page=max_per_page
+        )[1]
+        """The maximum number of items on a page."""
+
+        self.key = list(key)
+        self.cursor = cursor or None
+        """The cursor of the current page, or ``None`` for the first page."""
+
+        if descending:
+            select = select.order_by(*(column.desc() for column in self.key))
+        else:
+            select = select.order_by(*(column.asc() for column in self.key))
+        if self.cursor is not None:
+            values = sa.tuple_(*decode_cursor(self.cursor, len(self.key)))
+            columns = sa.tuple_(*self.key)
+            select = select.where(columns < values if descending else columns > values)
+
+        # one more item than the page holds tells if there is a next page
+        items = list(
+            session.execute(select.limit(self.per_page + 1)).unique().scalars()
+        )
+
+        self.has_next: bool = len(items) > self.per_page
+        """``True`` if there are items after this page."""
+
+        self.items: list[Any] = items[: self.per_page]
+        """The items on the current page."""
+
+    @property
+    def next_cursor(self) -> str | None:
+        """The cursor of the next page, or ``None`` if this is the last page."""
+
+        if not self.has_next:
+            return None
+        last = self.items[-1]
+        return encode_cursor([getattr(last, column.key) for column in self.key])
+
+    def __iter__(self) -> Iterator[Any]:
+        """Iterate over the items on the current page."""
+
+        yield from self.items
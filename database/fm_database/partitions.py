@@ -0,0 +1,262 @@
+"""
+Monthly range partitions of the update tables.
+
+On PostgreSQL grainbin_update and device_update are partitioned by range of
+their timestamp, with one partition per month (named like
+grainbin_update_2024_06) and a default partition that holds rows outside of
+the created months. Queries on a timestamp range only scan the partitions of
+the matching months, and old months are removed by detaching (and dropping)
+their partition instead of deleting rows.
+
+New partitions are created ahead of time with the 'fm_database partition
+create' command. Rows that arrived in the default partition for a month are
+moved into that month's partition when it is created, while writes to the
+table wait.
+
+SQLite has no partitions, so the tables are plain tables there.
+"""
+
+import re
+from datetime import date, datetime
+from typing import NamedTuple
+
+from sqlalchemy import Connection, PrimaryKeyConstraint, Table, text
+from sqlalchemy.ext.compiler import compiles
+
+# the partitioned tables and the column they are partitioned on.
+PARTITIONED_TABLES = ("grainbin_update", "device_update")
+PARTITION_COLUMN = "timestamp"
+# number of months after the current month that partitions are created for.
+PARTITION_MONTHS_AHEAD = 3
+
+
+class Partition(NamedTuple):
+    """A monthly partition that holds the rows from start up to end."""
+
+    name: str
+    start: date
+    end: date
+
+
+def partitioned_by_month(column: str = PARTITION_COLUMN) -> dict:
+    """Return the table arguments of a table partitioned by range of column."""
+
+    return {"postgresql_partition_by": f"RANGE ({column})"}
+
+
+def month_start(value: date | datetime) -> date:
+    """Return the first day of the month of value."""
+
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    """Return the first day of the month that is months after month."""
+
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    """Return the name of the partition of table for month."""
+
+    return f"{table}_{month:%Y_%m}"
+
+
+def default_partition_name(table: str) -> str:
+    """Return the name of the default partition of table."""
+
+    return f"{table}_default"
+
+
+def is_partition_name(name: str) -> bool:
+    """Return True if name is the name of a partition of a partitioned table."""
+
+    return any(
+        re.match(rf"^{table}_(\d{{4}}_\d{{2}}|default)$", name)
+        for table in PARTITIONED_TABLES
+    )
+
+
+def is_partitioned(connection: Connection, table: str) -> bool:
+    """Return True if table is a partitioned table."""
+
+    if connection.dialect.name != "postgresql":
+        return False
+    return bool(
+        connection.scalar(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                "WHERE partrelid = to_regclass(:table))"
+            ),
+            {"table": table},
+        )
+    )
+
+
+def list_partitions(connection: Connection, table: str) -> list[Partition]:
+    """Return the monthly partitions attached to table, oldest first."""
+
+    names = connection.scalars(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(:table)"
+        ),
+        {"table": table},
+    )
+    pattern = re.compile(rf"^{re.escape(table)}_(\d{{4}})_(\d{{2}})$")
+    partitions = []
+    for name in names:
+        match = pattern.match(name)
+        if match is None:
+            continue
+        start = date(int(match.group(1)), int(match.group(2)), 1)
+        partitions.append(Partition(name, start, add_months(start, 1)))
+    return sorted(partitions, key=lambda partition: partition.start)
+
+
+def count_default_rows(connection: Connection, table: str) -> int:
+    """Return the number of rows in the default partition of table."""
+
+    count = connection.scalar(
+        text(f"SELECT count(*) FROM {default_partition_name(table)}")
+    )
+    return int(count or 0)
+
+
+def create_default_partition(connection: Connection, table: str) -> None:
+    """Create the default partition of table if it does not exist."""
+
+    connection.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {default_partition_name(table)} "
+            f"PARTITION OF {table} DEFAULT"
+        )
+    )
+
+
+def create_partition(connection: Connection, table: str, month: date) -> bool:
+    """Create the partition of table for month.
+
+    Rows of the month in the default partition are moved to the new partition.
+    The default partition stays attached while they are moved, but the table is
+    locked against writes (SHARE ROW EXCLUSIVE) until the transaction of
+    connection ends, so inserts wait for the move instead of failing. Reads are
+    not blocked. Returns False if the partition already exists.
+    """
+
+    month = month_start(month)
+    name = partition_name(table, month)
+    if connection.scalar(text("SELECT to_regclass(:name)"), {"name": name}):
+        return False
+
+    default = default_partition_name(table)
+    bounds = {"start": month, "end": add_months(month, 1)}
+    for_values = f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+    in_month = f"{PARTITION_COLUMN} >= :start AND {PARTITION_COLUMN} < :end"
+    has_default = connection.scalar(
+        text("SELECT to_regclass(:name)"), {"name": default}
+    )
+    move_rows = has_default and connection.scalar(
+        text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_month})"), bounds
+    )
+
+    if not move_rows:
+        connection.execute(
+            text(f"CREATE TABLE {name} PARTITION OF {table} {for_values}")
+        )
+        return True
+
+    # a partition can not be attached while the default partition holds rows
+    # of its month, so they are moved into the new table before it is attached.
+    connection.execute(text(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE"))
+    connection.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)"))
+    connection.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {default} WHERE {in_month} RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ),
+        bounds,
+    )
+    connection.execute(
+        text(f"ALTER TABLE {table} ATTACH PARTITION {name} {for_values}")
+    )
+    return True
+
+
+def create_partitions(
+    connection: Connection, table: str, start: date, months: int
+) -> list[str]:
+    """Create the partitions of table for months months from start.
+
+    Returns the names of the partitions that were created.
+    """
+
+    created = []
+    month = month_start(start)
+    for _ in range(months):
+        if create_partition(connection, table, month):
+            created.append(partition_name(table, month))
+        month = add_months(month, 1)
+    return created
+
+
+def detach_partitions(
+    connection: Connection, table: str, before: date, drop: bool = False
+) -> list[str]:
+    """Detach the partitions of table that only hold rows from before before.
+
+    Detached partitions are kept as tables unless drop is True.
+    Returns the names of the detached partitions.
+    """
+
+    detached = []
+    for partition in list_partitions(connection, table):
+        if partition.end > before:
+            break
+        connection.execute(
+            text(f"ALTER TABLE {table} DETACH PARTITION {partition.name}")
+        )
+        if drop:
+            connection.execute(text(f"DROP TABLE {partition.name}"))
+        detached.append(partition.name)
+    return detached
+
+
+def create_initial_partitions(target: Table, connection: Connection, **_kw) -> None:
+    """Create the default partition and the coming months of a new partitioned table.
+
+    Listens to the after_create event of the partitioned models' tables.
+    """
+
+    if connection.dialect.name != "postgresql":
+        return
+    if not target.dialect_options["postgresql"]["partition_by"]:
+        return
+    create_default_partition(connection, target.name)
+    create_partitions(connection, target.name, date.today(), PARTITION_MONTHS_AHEAD + 1)
+
+
+@compiles(PrimaryKeyConstraint, "postgresql")
+def _compile_partitioned_primary_key(constraint, compiler, **kw) -> str:
+    """Add the partition column to the primary key of a partitioned table.
+
+    PostgreSQL needs the partition column in the primary key of a partitioned
+    table. The models keep id as their only primary key, so it autoincrements
+    on SQLite and records are still looked up by id.
+    """
+
+    columns = [column.name for column in constraint.columns]
+    if (
+        not constraint.table.dialect_options["postgresql"]["partition_by"]
+        or PARTITION_COLUMN in columns
+    ):
+        return str(compiler.visit_primary_key_constraint(constraint, **kw))
+
+    preparer = compiler.preparer
+    columns.append(PARTITION_COLUMN)
+    ddl = ""
+    if constraint.name is not None:
+        ddl += f"CONSTRAINT {preparer.format_constraint(constraint)} "
+    return ddl + f"PRIMARY KEY ({', '.join(preparer.quote(name) for name in columns)})"
@@ -0,0 +1,231 @@
+"""
+Retention of the historical update and message tables.
+
+Each table has a policy with the number of days its rows are kept. Older rows
+are deleted in small batches, each one in its own short transaction, with a
+pause between batches. A batch finds its rows with the index on the time
+column (``DELETE ... WHERE (id, timestamp) IN (SELECT ... LIMIT n)``), so no
+batch scans or locks the whole table, and autovacuum can reclaim the space of
+earlier batches while the prune runs.
+
+On PostgreSQL the monthly partitions of grainbin_update and device_update that
+only hold expired rows are dropped first, which removes a whole month without
+deleting any rows. The rest of the expired rows are deleted in batches.
+
+Pruning the updates of a grainbin or device bumps its last_updated, so its
+version, and the ETags and cached API responses keyed by it, change as well.
+
+The rollups are not pruned, so the hourly and daily temperatures outlive the
+raw readings they were computed from. With archive (or RETENTION_ARCHIVE) the
+expired grainbin and device updates are copied into the columnar archive
+before they are deleted (see fm_database.archive).
+"""
+
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, NamedTuple
+
+from sqlalchemy import Delete, Engine, delete, func, select, tuple_, update
+
+from .archive import ARCHIVE_TABLES, archive_table
+from .models.device import Device, DeviceUpdate, Grainbin, GrainbinUpdate
+from .models.message import Message
+from .partitions import detach_partitions, is_partitioned
+from .settings import get_config
+
+# the tables that can be pruned and the indexed column holding the time of each row.
+RETENTION_COLUMNS = {
+    "grainbin_update": GrainbinUpdate.timestamp,
+    "device_update": DeviceUpdate.timestamp,
+    "message": Message.created_at,
+}
+
+# the record that the rows of a table belong to, and the column referencing it.
+RETENTION_PARENTS: dict[str, tuple[type[Grainbin] | type[Device], Any]] = {
+    "grainbin_update": (Grainbin, GrainbinUpdate.grainbin_id),
+    "device_update": (Device, DeviceUpdate.device_id),
+}
+
+
+class RetentionPolicy(NamedTuple):
+    """Keep the rows of table that are at most keep_days old."""
+
+    table: str
+    keep_days: int
+
+    def cutoff(self, now: datetime) -> datetime:
+        """Return the time before which rows are deleted."""
+
+        return now - timedelta(days=self.keep_days)
+
+
+@dataclass
+class PruneResult:
+    """The progress or outcome of pruning a table."""
+
+    table: str
+    deleted: int = 0
+    batches: int = 0
+    # time spent deleting, without the pauses between batches
+    elapsed: float = 0.0
+    # number of rows copied into the archive before the prune
+    archived: int = 0
+    dropped_partitions: list[str] = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        """Return the number of rows deleted per second."""
+
+        return self.deleted / self.elapsed if self.elapsed else 0.0
+
+
+def get_policies(keep_days: dict[str, int] | None = None) -> list[RetentionPolicy]:
+    """Return the retention policies of the configured tables.
+
+    keep_days overrides the configured number of days of some tables.
+    """
+
+    days = {**get_config().RETENTION_DAYS, **(keep_days or {})}
+    return [
+        RetentionPolicy(table, days[table])
+        for table in RETENTION_COLUMNS
+        if table in days
+    ]
+
+
+def count_expired(bind: Engine, policy: RetentionPolicy, now: datetime) -> int:
+    """Return the number of rows of the table that the policy would delete."""
+
+    column = RETENTION_COLUMNS[policy.table]
+    with bind.connect() as connection:
+        # pylint: disable=not-callable
+        count = connection.scalar(
+            select(func.count()).where(column < policy.cutoff(now))
+        )
+    return int(count or 0)
+
+
+def prune(
+    bind: Engine,
+    policy: RetentionPolicy,
+    *,
+    now: datetime | None = None,
+    batch_size: int | None = None,
+    pause: float | None = None,
+    progress: Callable[[PruneResult], None] | None = None,
+    archive: bool | None = None,
+) -> PruneResult:
+    """Delete the rows of a table that are older than its policy keeps.
+
+    Rows are deleted batch_size at a time, and each batch is committed before
+    the next one starts after a pause of pause seconds. progress is called with
+    the result so far after each batch. When archive is set the rows are
+    copied into the archive first. batch_size, pause and archive default to
+    the configured RETENTION_BATCH_SIZE, RETENTION_BATCH_PAUSE and
+    RETENTION_ARCHIVE. The last_updated of the grainbins or devices whose
+    updates were pruned is bumped once all the rows are deleted.
+    """
+
+    config = get_config()
+    batch_size = batch_size or config.RETENTION_BATCH_SIZE
+    pause = config.RETENTION_BATCH_PAUSE if pause is None else pause
+    cutoff = policy.cutoff(now or datetime.now())
+    result = PruneResult(policy.table)
+    parents = _expired_parents(bind, policy.table, cutoff)
+    if config.RETENTION_ARCHIVE if archive is None else archive:
+        result.archived = _archive_expired(bind, policy.table, cutoff)
+    result.dropped_partitions = _drop_expired_partitions(bind, policy.table, cutoff)
+
+    statement = _delete_batch(policy.table, cutoff, batch_size)
+
+    while True:
+        start = time.perf_counter()
+        with bind.begin() as connection:
+            deleted = connection.execute(statement).rowcount
+        result.elapsed += time.perf_counter() - start
+        result.deleted += deleted
+        result.batches += 1
+        if progress is not None:
+            progress(result)
+        if deleted < batch_size:
+            _touch_parents(bind, policy.table, parents)
+            return result
+        time.sleep(pause)
+
+
+def _delete_batch(table: str, cutoff: datetime, batch_size: int) -> Delete:
+    """Return the statement that deletes up to batch_size rows from before cutoff."""
+
+    column = RETENTION_COLUMNS[table]
+    model = column.class_
+    expired = select(model.id, column).where(column < cutoff).limit(batch_size)
+    # the outer condition lets PostgreSQL skip the partitions of later months
+    return (
+        delete(model)
+        .where(column < cutoff)
+        .where(tuple_(model.id, column).in_(expired))
+    )
+
+
+def _expired_parents(bind: Engine, table: str, cutoff: datetime) -> list[int]:
+    """Return the ids of the records that rows of table from before cutoff belong to.
+
+    Each record is looked up in the unique index of its updates, which starts
+    with the reference to the record and the timestamp.
+    """
+
+    if table not in RETENTION_PARENTS:
+        return []
+    parent, reference = RETENTION_PARENTS[table]
+    column = RETENTION_COLUMNS[table]
+    expired = select(reference).where(reference == parent.id).where(column < cutoff)
+    with bind.connect() as connection:
+        return list(connection.scalars(select(parent.id).where(expired.exists())))
+
+
+def _touch_parents(bind: Engine, table: str, ids: list[int]) -> None:
+    """Bump the last_updated of the records whose rows of table were pruned."""
+
+    if not ids:
+        return
+    parent, _ = RETENTION_PARENTS[table]
+    with bind.begin() as connection:
+        connection.execute(
+            update(parent)
+            .where(parent.id.in_(ids))
+            .values(last_updated=func.now())  # pylint: disable=not-callable
+        )
+
+
+def _archive_expired(bind: Engine, table: str, cutoff: datetime) -> int:
+    """Copy the rows of table from before cutoff into the archive."""
+
+    if table not in ARCHIVE_TABLES:
+        return 0
+    return archive_table(bind, table, cutoff).rows
+
+
+def _drop_expired_partitions(bind: Engine, table: str, cutoff: datetime) -> list[str]:
+    """Drop the partitions of table that only hold rows from before cutoff."""
+
+    with bind.begin() as connection:
+        if not is_partitioned(connection, table):
+            return []
+        return detach_partitions(connection, table, cutoff.date(), drop=True)
+
+
+def prune_all(
+    bind: Engine,
+    policies: list[RetentionPolicy] | None = None,
+    **options,
+) -> list[PruneResult]:
+    """Prune every table with a policy, one table at a time.
+
+    options are passed to prune.
+    """
+
+    return [
+        prune(bind, policy, **options)
+        for policy in (get_policies() if policies is None else policies)
+    ]
@@ -0,0 +1,436 @@
+"""
+Hourly and daily rollups of the grainbin and device temperatures.
+
+The rollup tables hold the count, minimum, maximum and sum of the
+temperatures in each hour and day. The ingest tasks add every new update to
+its hour and day with an upsert, so the rollups are always current. The sum
+and count are stored instead of the average, so new values can be added to a
+bucket without reading it first.
+
+A bulk load adds the rows of its staging table to the rollups with
+add_grainbin_rollups_from and add_device_rollups_from, which aggregate and
+upsert the rows in one statement.
+
+The rollups of a time range are recomputed from the update tables with
+rebuild_rollups, one chunk of days at a time, eg. after the rollups were lost.
+
+A grainbin rollup belongs to a sensor position (temphigh and templow), so a
+reading without a position cannot be rolled up. These readings are counted
+and reported as skipped instead.
+"""
+
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timedelta
+from typing import Any, NamedTuple
+
+from sqlalchemy import Connection, Select, Table, delete, func, literal, or_, select
+from sqlalchemy.orm import Session
+
+from .database import _dialect_insert, dialect_name
+from .models.device import DeviceUpdate, GrainbinUpdate
+from .models.rollup import DeviceRollup, GrainbinRollup
+from .series import bucket_expression
+
+# the rollup periods, from the shortest to the longest.
+ROLLUP_PERIODS = ("hour", "day")
+
+GRAINBIN_ROLLUP_KEY = ("grainbin_id", "period", "bucket", "temphigh", "templow")
+DEVICE_ROLLUP_KEY = ("device_id", "period", "bucket")
+
+GRAINBIN_UPDATE: Table = GrainbinUpdate.__table__  # type: ignore[assignment]
+DEVICE_UPDATE: Table = DeviceUpdate.__table__  # type: ignore[assignment]
+
+
+class RollupResult(NamedTuple):
+    """The number of rollups written and of readings that were skipped."""
+
+    written: int
+    # readings with a temperature but without a sensor position
+    skipped: int
+
+
+def bucket_start(timestamp: datetime, period: str) -> datetime:
+    """Return the start of the hour or day that timestamp is in."""
+
+    if period == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if period == "day":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"unknown rollup period '{period}'")
+
+
+def add_grainbin_rollups(
+    executor: Session | Connection, rows: Iterable[dict[str, Any]]
+) -> RollupResult:
+    """Add grainbin_update rows to the hourly and daily grainbin rollups.
+
+    rows are the values of new grainbin_update rows. Readings without a
+    temperature are left out, and readings without a sensor position are
+    skipped. The readings of each bucket are combined before they are
+    written, so each rollup is upserted once. Returns the number of rollups
+    that were upserted and of readings that were skipped.
+    """
+
+    buckets: dict[tuple, list] = {}
+    skipped = 0
+    for row in rows:
+        if row["temperature"] is None:
+            continue
+        if None in (row["temphigh"], row["templow"]):
+            skipped += 1
+            continue
+        temperature = float(row["temperature"])
+        for period in ROLLUP_PERIODS:
+            key = (
+                row["grainbin_id"],
+                period,
+                bucket_start(row["timestamp"], period),
+                row["temphigh"],
+                row["templow"],
+            )
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [1, temperature, temperature, temperature]
+            else:
+                bucket[0] += 1
+                bucket[1] = min(bucket[1], temperature)
+                bucket[2] = max(bucket[2], temperature)
+                bucket[3] += temperature
+
+    values = [
+        {
+            **dict(zip(GRAINBIN_ROLLUP_KEY, key)),
+            "temperature_count": count,
+            "temperature_min": minimum,
+            "temperature_max": maximum,
+            "temperature_sum": total,
+        }
+        for key, (count, minimum, maximum, total) in buckets.items()
+    ]
+    written = _upsert_rollups(
+        executor, GrainbinRollup, GRAINBIN_ROLLUP_KEY, values, ("temperature",)
+    )
+    return RollupResult(written, skipped)
+
+
+def add_device_rollups(
+    executor: Session | Connection,
+    device_id: int,
+    timestamp: datetime,
+    interior_temp: float | None,
+    exterior_temp: float | None,
+) -> int:
+    """Add the temperatures of a device update to the device rollups.
+
+    Returns the number of rollups that were upserted.
+    """
+
+    if interior_temp is None and exterior_temp is None:
+        return 0
+
+    values = []
+    for period in ROLLUP_PERIODS:
+        row: dict[str, Any] = {
+            "device_id": device_id,
+            "period": period,
+            "bucket": bucket_start(timestamp, period),
+        }
+        for name, value in (("interior", interior_temp), ("exterior", exterior_temp)):
+            row[f"{name}_count"] = 0 if value is None else 1
+            for statistic in ("min", "max", "sum"):
+                row[f"{name}_{statistic}"] = value
+        values.append(row)
+    return _upsert_rollups(
+        executor, DeviceRollup, DEVICE_ROLLUP_KEY, values, ("interior", "exterior")
+    )
+
+
+def _upsert_rollups(
+    executor: Session | Connection,
+    model: type[GrainbinRollup] | type[DeviceRollup],
+    index_elements: tuple[str, ...],
+    values: list[dict[str, Any]],
+    measurements: tuple[str, ...],
+) -> int:
+    """Insert the rollups, or merge them into the rollups that exist."""
+
+    if not values:
+        return 0
+
+    statement = _dialect_insert(executor, model)
+    statement = statement.on_conflict_do_update(
+        index_elements=index_elements,
+        set_=_merge_set(executor, model, statement, measurements),
+    )
+    executor.execute(statement, values)
+    return len(values)
+
+
+def _merge_set(
+    executor: Session | Connection,
+    model: type[GrainbinRollup] | type[DeviceRollup],
+    statement: Any,
+    measurements: tuple[str, ...],
+) -> dict[str, Any]:
+    """Return the SET clause that merges the excluded rollup into the current one."""
+
+    set_ = {}
+    for measurement in measurements:
+        for statistic in ("count", "min", "max", "sum"):
+            name = f"{measurement}_{statistic}"
+            set_[name] = _merge(
+                executor,
+                statistic,
+                getattr(model, name),
+                getattr(statement.excluded, name),
+            )
+    return set_
+
+
+def _merge(
+    executor: Session | Connection,
+    statistic: str,
+    current: Any,
+    new: Any,
+) -> Any:
+    """Return the SQL expression that merges a new statistic into the current one.
+
+    Either value may be NULL when a device did not report a temperature.
+    """
+
+    if statistic == "count":
+        return current + new
+    if statistic == "sum":
+        return func.coalesce(current + new, current, new)
+    # least and greatest are called min and max by SQLite
+    if dialect_name(executor) == "postgresql":
+        name = "least" if statistic == "min" else "greatest"
+    else:
+        name = statistic
+    return getattr(func, name)(func.coalesce(current, new), func.coalesce(new, current))
+
+
+def rollup_chunks(
+    start: datetime, end: datetime, chunk_days: int = 1
+) -> Iterator[tuple[datetime, datetime]]:
+    """Yield the ranges of whole days, chunk_days long, that cover start to end."""
+
+    if chunk_days < 1:
+        raise ValueError("chunk_days must be at least 1")
+    chunk_start = bucket_start(start, "day")
+    while chunk_start < end:
+        chunk_end = chunk_start + timedelta(days=chunk_days)
+        yield chunk_start, chunk_end
+        chunk_start = chunk_end
+
+
+def rebuild_rollup_chunk(
+    session: Session, start: datetime, end: datetime
+) -> RollupResult:
+    """Recompute the rollups of the buckets from start up to end.
+
+    start and end must be the start of a day. The rollups of the range are
+    deleted and computed again from the update tables, in the transaction of
+    session. Returns the number of rollups that were written and of grainbin
+    readings that were skipped.
+    """
+
+    written = 0
+    for model in (GrainbinRollup, DeviceRollup):
+        session.execute(
+            delete(model).where(model.bucket >= start).where(model.bucket < end)
+        )
+    for period in ROLLUP_PERIODS:
+        for model, index_elements, aggregate, source in (
+            (GrainbinRollup, GRAINBIN_ROLLUP_KEY, _grainbin_aggregate, GRAINBIN_UPDATE),
+            (DeviceRollup, DEVICE_ROLLUP_KEY, _device_aggregate, DEVICE_UPDATE),
+        ):
+            query = aggregate(session, period, source, *_in_range(source, start, end))
+            columns = list(query.selected_columns.keys())
+            statement = _dialect_insert(session, model).from_select(columns, query)
+            # a rollup that an ingest task wrote since the delete is replaced
+            statement = statement.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={
+                    name: getattr(statement.excluded, name)
+                    for name in columns
+                    if name not in index_elements
+                },
+            )
+            result = session.execute(statement)
+            written += result.rowcount
+    skipped = _skipped_grainbin_readings(
+        session, GRAINBIN_UPDATE, *_in_range(GRAINBIN_UPDATE, start, end)
+    )
+    return RollupResult(written, skipped)
+
+
+def rebuild_rollups(
+    session: Session, start: datetime, end: datetime, chunk_days: int = 1
+) -> RollupResult:
+    """Recompute the rollups of the days from start to end, a chunk at a time.
+
+    Each chunk is committed on its own, so a long range does not hold one
+    large transaction open. Returns the number of rollups that were written
+    and of grainbin readings that were skipped.
+    """
+
+    written = skipped = 0
+    for chunk_start, chunk_end in rollup_chunks(start, end, chunk_days):
+        result = rebuild_rollup_chunk(session, chunk_start, chunk_end)
+        session.commit()
+        written += result.written
+        skipped += result.skipped
+    return RollupResult(written, skipped)
+
+
+def add_grainbin_rollups_from(
+    executor: Session | Connection, source: Table
+) -> RollupResult:
+    """Add all the rows of source to the hourly and daily grainbin rollups.
+
+    source is a table with the columns of grainbin_update, eg. the staging
+    table of a bulk load. Its readings are combined per bucket in the
+    database and merged into the rollups like add_grainbin_rollups does.
+    Returns the number of rollups that were upserted and of readings that
+    were skipped.
+    """
+
+    written = _add_rollups_from(
+        executor,
+        GrainbinRollup,
+        GRAINBIN_ROLLUP_KEY,
+        ("temperature",),
+        [_grainbin_aggregate(executor, period, source) for period in ROLLUP_PERIODS],
+    )
+    return RollupResult(written, _skipped_grainbin_readings(executor, source))
+
+
+def add_device_rollups_from(executor: Session | Connection, source: Table) -> int:
+    """Add all the rows of source to the hourly and daily device rollups.
+
+    source is a table with the columns of device_update. Returns the number
+    of rollups that were upserted.
+    """
+
+    return _add_rollups_from(
+        executor,
+        DeviceRollup,
+        DEVICE_ROLLUP_KEY,
+        ("interior", "exterior"),
+        [_device_aggregate(executor, period, source) for period in ROLLUP_PERIODS],
+    )
+
+
+def _add_rollups_from(
+    executor: Session | Connection,
+    model: type[GrainbinRollup] | type[DeviceRollup],
+    index_elements: tuple[str, ...],
+    measurements: tuple[str, ...],
+    queries: list[Select],
+) -> int:
+    """Merge the rollups selected by queries into the rollups that exist."""
+
+    written = 0
+    for query in queries:
+        columns = list(query.selected_columns.keys())
+        statement = _dialect_insert(executor, model).from_select(columns, query)
+        statement = statement.on_conflict_do_update(
+            index_elements=index_elements,
+            set_=_merge_set(executor, model, statement, measurements),
+        )
+        written += executor.execute(statement).rowcount
+    return written
+
+
+def _in_range(source: Table, start: datetime, end: datetime) -> list[Any]:
+    """Return the where clauses of the rows of source from start up to end."""
+
+    return [source.c.timestamp >= start, source.c.timestamp < end]
+
+
+def _skipped_grainbin_readings(
+    executor: Session | Connection, source: Table, *where: Any
+) -> int:
+    """Return the number of readings of source without a sensor position."""
+
+    # pylint: disable=not-callable
+    count = executor.scalar(
+        select(func.count())
+        .select_from(source)
+        .where(*where)
+        .where(source.c.temperature.is_not(None))
+        .where(or_(source.c.temphigh.is_(None), source.c.templow.is_(None)))
+    )
+    return int(count or 0)
+
+
+def _bucket_expression(
+    executor: Session | Connection, period: str, timestamp: Any
+) -> Any:
+    """Return the SQL expression of the start of the bucket of timestamp."""
+
+    return bucket_expression(dialect_name(executor), period, timestamp)
+
+
+def _grainbin_aggregate(
+    executor: Session | Connection, period: str, source: Table, *where: Any
+) -> Select:
+    """Return the query of the grainbin rollups of period of the rows of source."""
+
+    bucket = _bucket_expression(executor, period, source.c.timestamp)
+    temperature = source.c.temperature
+    # pylint: disable=not-callable
+    return (
+        select(
+            source.c.grainbin_id,
+            literal(period).label("period"),
+            bucket.label("bucket"),
+            source.c.temphigh,
+            source.c.templow,
+            func.count(temperature).label("temperature_count"),
+            func.min(temperature).label("temperature_min"),
+            func.max(temperature).label("temperature_max"),
+            func.sum(temperature).label("temperature_sum"),
+        )
+        .where(*where)
+        .where(temperature.is_not(None))
+        .where(source.c.temphigh.is_not(None))
+        .where(source.c.templow.is_not(None))
+        .group_by(source.c.grainbin_id, bucket, source.c.temphigh, source.c.templow)
+    )
+
+
+def _device_aggregate(
+    executor: Session | Connection, period: str, source: Table, *where: Any
+) -> Select:
+    """Return the query of the device rollups of period of the rows of source."""
+
+    bucket = _bucket_expression(executor, period, source.c.timestamp)
+    columns: list[Any] = [
+        source.c.device_id,
+        literal(period).label("period"),
+        bucket.label("bucket"),
+    ]
+    for name in ("interior", "exterior"):
+        temperature = source.c[f"{name}_temp"]
+        # pylint: disable=not-callable
+        columns.extend(
+            [
+                func.count(temperature).label(f"{name}_count"),
+                func.min(temperature).label(f"{name}_min"),
+                func.max(temperature).label(f"{name}_max"),
+                func.sum(temperature).label(f"{name}_sum"),
+            ]
+        )
+    return (
+        select(*columns)
+        .where(*where)
+        .where(
+            or_(
+                source.c.interior_temp.is_not(None),
+                source.c.exterior_temp.is_not(None),
+            )
+        )
+        .group_by(source.c.device_id, bucket)
+    )
@@ -0,0 +1,159 @@
+"""
+Time-bucketed aggregates of the device and grainbin updates.
+
+The queries group the updates of a time range into buckets (eg. each hour)
+and aggregate a column in each bucket, so the database returns one row per
+bucket instead of every update. Buckets are computed with ``date_trunc`` on
+PostgreSQL and ``strftime`` on SQLite, and start at the whole minute, hour,
+day, week (Monday) or month.
+
+Unlike the rollups, any bucket size and numeric column can be aggregated, but
+the updates of the range are read on every query.
+"""
+
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import DateTime, Select, func, select, type_coerce
+from sqlalchemy.orm import Session
+
+from .database import dialect_name
+from .models.device import DeviceUpdate, GrainbinUpdate
+
+# the buckets, from the shortest to the longest.
+SERIES_BUCKETS = ("minute", "hour", "day", "week", "month")
+SERIES_AGGREGATES = ("avg", "min", "max", "count")
+
+# the columns of DeviceUpdate that can be aggregated.
+DEVICE_SERIES_COLUMNS = (
+    "interior_temp",
+    "exterior_temp",
+    "device_temp",
+    "load_avg",
+    "disk_total",
+    "disk_used",
+    "disk_free",
+)
+
+# the start of a bucket as it is stored by SQLite, with the modifiers of the date.
+_SQLITE_BUCKETS: dict[str, tuple[str, ...]] = {
+    "minute": ("%Y-%m-%d %H:%M:00.000000",),
+    "hour": ("%Y-%m-%d %H:00:00.000000",),
+    "day": ("%Y-%m-%d 00:00:00.000000",),
+    # the next Sunday, or the day itself on a Sunday, less 6 days is the Monday
+    "week": ("%Y-%m-%d 00:00:00.000000", "weekday 0", "-6 days"),
+    "month": ("%Y-%m-01 00:00:00.000000",),
+}
+
+
+def bucket_expression(dialect: str, bucket: str, timestamp: Any) -> Any:
+    """Return the SQL expression of the start of the bucket of timestamp.
+
+    Raises a ValueError for an unknown bucket.
+    """
+
+    if bucket not in SERIES_BUCKETS:
+        raise ValueError(f"unknown series bucket '{bucket}'")
+    if dialect == "postgresql":
+        return func.date_trunc(bucket, timestamp)
+    sqlite_format, *modifiers = _SQLITE_BUCKETS[bucket]
+    return type_coerce(func.strftime(sqlite_format, timestamp, *modifiers), DateTime)
+
+
+def series_select(
+    session: Session,
+    column: Any,
+    start: datetime,
+    end: datetime,
+    *,
+    bucket: str = "hour",
+    aggregates: tuple[str, ...] = SERIES_AGGREGATES,
+    group_by: tuple[Any, ...] = (),
+) -> Select:
+    """Return the query of the aggregates of column in each bucket from start to end.
+
+    The bucket is one of SERIES_BUCKETS and the aggregates are some of
+    SERIES_AGGREGATES, or a ValueError is raised.
+
+    column is a column of an update model, eg. ``DeviceUpdate.interior_temp``.
+    The rows have a ``bucket`` and a column per aggregate, named after the
+    aggregate, and are ordered by bucket and the group_by columns. Values that
+    are null are not aggregated, and buckets without a value are left out.
+    """
+
+    for aggregate in aggregates:
+        if aggregate not in SERIES_AGGREGATES:
+            raise ValueError(f"unknown series aggregate '{aggregate}'")
+
+    model = column.class_
+    bucket_start = bucket_expression(dialect_name(session), bucket, model.timestamp)
+    return (
+        select(
+            bucket_start.label("bucket"),
+            *group_by,
+            *(
+                getattr(func, aggregate)(column).label(aggregate)
+                for aggregate in aggregates
+            ),
+        )
+        .where(model.timestamp >= start)
+        .where(model.timestamp < end)
+        .where(column.is_not(None))
+        .group_by(bucket_start, *group_by)
+        .order_by(bucket_start, *group_by)
+    )
+
+
+def device_series(
+    session: Session,
+    device_id: int,
+    column: str,
+    start: datetime,
+    end: datetime,
+    *,
+    bucket: str = "hour",
+    aggregates: tuple[str, ...] = SERIES_AGGREGATES,
+) -> Select:
+    """Return the query of the aggregates of a DeviceUpdate column of a device.
+
+    Raises a ValueError for a column that can not be aggregated.
+    """
+
+    if column not in DEVICE_SERIES_COLUMNS:
+        raise ValueError(f"unknown device series column '{column}'")
+    return series_select(
+        session,
+        getattr(DeviceUpdate, column),
+        start,
+        end,
+        bucket=bucket,
+        aggregates=aggregates,
+    ).where(DeviceUpdate.device_id == device_id)
+
+
+def grainbin_series(
+    session: Session,
+    grainbin_id: int,
+    start: datetime,
+    end: datetime,
+    *,
+    bucket: str = "hour",
+    aggregates: tuple[str, ...] = SERIES_AGGREGATES,
+    by_sensor: bool = True,
+) -> Select:
+    """Return the query of the aggregates of the temperatures of a grainbin.
+
+    With by_sensor there is a row per sensor (temphigh and templow) in each
+    bucket, otherwise the temperatures of all the sensors are aggregated.
+    """
+
+    group_by = (GrainbinUpdate.temphigh, GrainbinUpdate.templow) if by_sensor else ()
+    return series_select(
+        session,
+        GrainbinUpdate.temperature,
+        start,
+        end,
+        bucket=bucket,
+        aggregates=aggregates,
+        group_by=group_by,
+    ).where(GrainbinUpdate.grainbin_id == grainbin_id)
@@ -21,12 +21,19 @@ fileConfig(config.config_file_name)
 # add your model's MetaData object here
 # for 'autogenerate' support
 from fm_database.database import Base
-from fm_database.models.device import Device, Grainbin, DeviceUpdate, GrainbinUpdate
+from fm_database.models.device import Device, Grainbin, DeviceUpdate, GrainbinLatestReading, GrainbinUpdate
 from fm_database.models.message import Message
+from fm_database.models.rollup import DeviceRollup, GrainbinRollup
 from fm_database.models.system import Hardware, SystemSetup, Wifi, Interface, Software
 from fm_database.models.user import User, Role
+from fm_database.partitions import is_partition_name
 target_metadata = Base.metadata
 
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Leave the partitions, which 'fm_database partition' manages, out of autogenerate."""
+    return not (type_ == 'table' and reflected and is_partition_name(name))
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -47,7 +54,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=target_metadata, literal_binds=True)
+        url=url, target_metadata=target_metadata, literal_binds=True,
+        include_object=include_object)
 
     with context.begin_transaction():
         context.run_migrations()
@@ -68,7 +76,8 @@ def run_migrations_online():
     with connectable.connect() as connection:
         context.configure(
             connection=connection,
-            target_metadata=target_metadata
+            target_metadata=target_metadata,
+            include_object=include_object
         )
 
         with context.begin_transaction():
@@ -0,0 +1,76 @@
+"""unique grainbin device_id_str and bus_number
+
+Revision ID: 7c1e5a2b9f43
+Revises: 2d2cb1d0819e
+Create Date: 2024-06-02 10:12:31.408214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1e5a2b9f43'
+down_revision = '2d2cb1d0819e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # merge duplicate grainbins (created by concurrent workers) into the oldest
+    # one before adding the unique constraint. The update_index of the updates
+    # of each duplicate is offset by the updates of the grainbins before it, so
+    # the moved updates follow those of the grainbin they are merged into.
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE grainbin_merge AS
+        SELECT id, keep_id,
+            COALESCE(SUM(updates) OVER (
+                PARTITION BY keep_id ORDER BY id
+                ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0) AS offset_by,
+            SUM(updates) OVER (PARTITION BY keep_id) AS total_updates
+        FROM (
+            SELECT grainbin.id,
+                MIN(grainbin.id) OVER (
+                    PARTITION BY device_id_str, bus_number) AS keep_id,
+                GREATEST(total_updates, COALESCE(MAX(update_index), 0)) AS updates
+            FROM grainbin
+                LEFT JOIN grainbin_update ON grainbin_update.grainbin_id = grainbin.id
+            GROUP BY grainbin.id
+        ) AS grainbin_updates
+        """
+    )
+    op.execute(
+        """
+        UPDATE grainbin_update
+        SET grainbin_id = grainbin_merge.keep_id,
+            update_index = update_index + grainbin_merge.offset_by
+        FROM grainbin_merge
+        WHERE grainbin_update.grainbin_id = grainbin_merge.id
+            AND grainbin_merge.id <> grainbin_merge.keep_id
+        """
+    )
+    op.execute(
+        """
+        UPDATE grainbin SET total_updates = grainbin_merge.total_updates
+        FROM grainbin_merge
+        WHERE grainbin.id = grainbin_merge.id
+            AND grainbin_merge.id = grainbin_merge.keep_id
+            AND grainbin_merge.keep_id IN
+                (SELECT keep_id FROM grainbin_merge WHERE id <> keep_id)
+        """
+    )
+    op.execute("DROP TABLE grainbin_merge")
+    op.execute(
+        """
+        DELETE FROM grainbin WHERE id NOT IN
+            (SELECT MIN(id) FROM grainbin GROUP BY device_id_str, bus_number)
+        """
+    )
+    op.create_unique_constraint(
+        'uq_grainbin_device_id_str_bus_number', 'grainbin', ['device_id_str', 'bus_number']
+    )
+
+
+def downgrade():
+    op.drop_constraint('uq_grainbin_device_id_str_bus_number', 'grainbin', type_='unique')
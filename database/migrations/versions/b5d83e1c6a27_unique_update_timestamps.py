@@ -0,0 +1,62 @@
+"""unique device and grainbin update timestamps
+
+e9b3d0614f90 removed the unique index on the timestamp alone, as the updates
+of different devices, and every sensor reading of a grainbin update, share a
+timestamp. These constraints are scoped to the device, and to the grainbin and
+sensor, so they only reject a second copy of the same reading (a redelivered
+message).
+
+Revision ID: b5d83e1c6a27
+Revises: 7c1e5a2b9f43
+Create Date: 2024-06-09 14:45:02.113587
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d83e1c6a27'
+down_revision = '7c1e5a2b9f43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # remove the duplicate rows stored for redelivered messages, keeping the
+    # first copy, before adding the unique constraints. Readings without a
+    # sensor name are left alone, as NULLs never conflict.
+    op.execute(
+        """
+        DELETE FROM grainbin_update AS duplicate
+        USING grainbin_update AS first
+        WHERE duplicate.grainbin_id = first.grainbin_id
+            AND duplicate.timestamp = first.timestamp
+            AND duplicate.sensor_name = first.sensor_name
+            AND duplicate.id > first.id
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM device_update AS duplicate
+        USING device_update AS first
+        WHERE duplicate.device_id = first.device_id
+            AND duplicate.timestamp = first.timestamp
+            AND duplicate.id > first.id
+        """
+    )
+    op.create_unique_constraint(
+        'uq_grainbin_update_grainbin_id_timestamp_sensor_name',
+        'grainbin_update',
+        ['grainbin_id', 'timestamp', 'sensor_name'],
+    )
+    op.create_unique_constraint(
+        'uq_device_update_device_id_timestamp', 'device_update', ['device_id', 'timestamp']
+    )
+
+
+def downgrade():
+    op.drop_constraint('uq_device_update_device_id_timestamp', 'device_update', type_='unique')
+    op.drop_constraint(
+        'uq_grainbin_update_grainbin_id_timestamp_sensor_name', 'grainbin_update', type_='unique'
+    )
@@ -0,0 +1,127 @@
+"""partition grainbin_update and device_update by month
+
+Revision ID: c3f8a1d4e6b2
+Revises: b5d83e1c6a27
+Create Date: 2024-06-16 09:21:47.530118
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f8a1d4e6b2'
+down_revision = 'b5d83e1c6a27'
+branch_labels = None
+depends_on = None
+
+# number of months after the current month that partitions are created for.
+MONTHS_AHEAD = 3
+
+
+def grainbin_update_columns():
+    return [
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('grainbin_update_id_seq'::regclass)"), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('update_index', sa.Integer(), nullable=False),
+        sa.Column('temperature', sa.Float(), nullable=True),
+        sa.Column('temphigh', sa.Integer(), nullable=True),
+        sa.Column('templow', sa.Integer(), nullable=True),
+        sa.Column('sensor_name', sa.String(length=20), nullable=True),
+        sa.Column('grainbin_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['grainbin_id'], ['grainbin.id'], ),
+        sa.UniqueConstraint('grainbin_id', 'timestamp', 'sensor_name', name='uq_grainbin_update_grainbin_id_timestamp_sensor_name'),
+    ]
+
+
+def device_update_columns():
+    return [
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('device_update_id_seq'::regclass)"), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('update_index', sa.Integer(), nullable=False),
+        sa.Column('interior_temp', sa.Float(), nullable=True),
+        sa.Column('exterior_temp', sa.Float(), nullable=True),
+        sa.Column('device_temp', sa.Float(), nullable=True),
+        sa.Column('uptime', sa.Interval(), nullable=True),
+        sa.Column('load_avg', sa.Integer(), nullable=True),
+        sa.Column('disk_total', sa.Integer(), nullable=True),
+        sa.Column('disk_used', sa.Integer(), nullable=True),
+        sa.Column('disk_free', sa.Integer(), nullable=True),
+        sa.Column('device_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['device_id'], ['device.id'], ),
+        sa.UniqueConstraint('device_id', 'timestamp', name='uq_device_update_device_id_timestamp'),
+    ]
+
+
+TABLES = {
+    'grainbin_update': (grainbin_update_columns, 'uq_grainbin_update_grainbin_id_timestamp_sensor_name'),
+    'device_update': (device_update_columns, 'uq_device_update_device_id_timestamp'),
+}
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_partitions(table, old_table):
+    """Create the default partition and a partition for every month with rows."""
+
+    op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+    today = date.today()
+    first = op.get_bind().scalar(sa.text(f'SELECT min(timestamp) FROM {old_table}')) or today
+    month = date(first.year, first.month, 1)
+    last = add_months(date(today.year, today.month, 1), MONTHS_AHEAD)
+    while month <= last:
+        end = add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE {table}_{month:%Y_%m} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month}') TO ('{end}')"
+        )
+        month = end
+
+
+def rename_for_copy(table, new_name, unique_name):
+    # the index and constraint names are reused by the new table
+    op.rename_table(table, new_name)
+    op.drop_constraint(unique_name, new_name, type_='unique')
+    op.drop_index(f'ix_{table}_timestamp', table_name=new_name)
+    op.drop_index(f'ix_{table}_update_index', table_name=new_name)
+    op.execute(f'ALTER TABLE {new_name} RENAME CONSTRAINT {table}_pkey TO {new_name}_pkey')
+
+
+def copy_rows(table, old_table, columns):
+    names = ', '.join(column.name for column in columns if isinstance(column, sa.Column))
+    op.execute(f'INSERT INTO {table} ({names}) SELECT {names} FROM {old_table}')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+    op.drop_table(old_table)
+
+
+def upgrade():
+    # partitioned tables can not be created from existing tables, so each table
+    # is copied into a new partitioned table.
+    for table, (columns, unique_name) in TABLES.items():
+        old_table = f'{table}_unpartitioned'
+        rename_for_copy(table, old_table, unique_name)
+        op.create_table(
+            table,
+            *columns(),
+            sa.PrimaryKeyConstraint('id', 'timestamp'),
+            postgresql_partition_by='RANGE (timestamp)',
+        )
+        op.create_index(f'ix_{table}_timestamp', table, ['timestamp'], unique=False, postgresql_using='brin')
+        op.create_index(f'ix_{table}_update_index', table, ['update_index'], unique=False)
+        create_partitions(table, old_table)
+        copy_rows(table, old_table, columns())
+
+
+def downgrade():
+    for table, (columns, unique_name) in TABLES.items():
+        old_table = f'{table}_partitioned'
+        rename_for_copy(table, old_table, unique_name)
+        op.create_table(table, *columns(), sa.PrimaryKeyConstraint('id'))
+        op.create_index(f'ix_{table}_timestamp', table, ['timestamp'], unique=False)
+        op.create_index(f'ix_{table}_update_index', table, ['update_index'], unique=False)
+        copy_rows(table, old_table, columns())
@@ -16,5 +16,6 @@ setup(
         "psycopg2",
         "alembic>=1.13",
     ],
+    extras_require={"archive": ["pyarrow>=14"]},
     entry_points={"console_scripts": ["fm_database = fm_database.cli.cli:entry_point"]},
 )
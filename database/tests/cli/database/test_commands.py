@@ -4,8 +4,13 @@ import pytest
 from click.testing import CliRunner
 from sqlalchemy import select
 
+from fm_database.cli.database.archive_commands import archive
 from fm_database.cli.database.commands import create_default_user
-from fm_database.database import get_session
+from fm_database.cli.database.load_commands import benchmark
+from fm_database.cli.database.partition_commands import create
+from fm_database.cli.database.retention_commands import prune_
+from fm_database.cli.database.rollup_commands import rebuild
+from fm_database.database import engine, get_session
 from fm_database.models.user import User
 
 
@@ -51,3 +56,89 @@ class TestSetupCommands:
         assert user.username == "Bob"
         assert bool(user.check_password("myprecious"))
         assert bool(user.is_admin)
+
+
+@pytest.mark.usefixtures("tables")
+def test_partition_create_needs_postgresql():
+    """Test that the partition commands fail on a database without partitions."""
+
+    if engine.dialect.name == "postgresql":
+        pytest.skip("the tables are partitioned on PostgreSQL")
+
+    runner = CliRunner()
+    result = runner.invoke(create)
+
+    assert result.exit_code == 1
+    assert "grainbin_update is not partitioned" in result.output
+
+
+@pytest.mark.usefixtures("tables")
+def test_rollup_rebuild():
+    """Test that the rollups of every chunk of days are rebuilt."""
+
+    runner = CliRunner()
+    result = runner.invoke(
+        rebuild, ["--start", "2024-01-01", "--end", "2024-01-03", "--chunk-days", "2"]
+    )
+
+    assert not result.exception
+    assert "2024-01-01 to 2024-01-03: 0 rollups" in result.output
+    assert "2024-01-03 to 2024-01-04: 0 rollups" in result.output
+
+
+def test_rollup_rebuild_end_before_start():
+    """Test that the rebuild fails if the end day is before the start day."""
+
+    runner = CliRunner()
+    result = runner.invoke(rebuild, ["--start", "2024-01-03", "--end", "2024-01-01"])
+
+    assert result.exit_code == 2
+    assert "The end day is before the start day." in result.output
+
+
+@pytest.mark.usefixtures("tables")
+def test_retention_prune():
+    """Test that the prune reports each table it prunes."""
+
+    runner = CliRunner()
+    result = runner.invoke(
+        prune_, ["--table", "message", "--keep-days", "7", "--pause", "0"]
+    )
+
+    assert not result.exception
+    assert "pruning message, keeping 7 days" in result.output
+    assert "message: 0 rows deleted" in result.output
+    assert "grainbin_update" not in result.output
+
+
+@pytest.mark.usefixtures("tables")
+def test_archive_export(tmp_path):
+    """Test that the export reports each table and the reader prints CSV."""
+
+    pytest.importorskip("pyarrow")
+    runner = CliRunner()
+    result = runner.invoke(
+        archive,
+        ["export", "--before", "2024-01-01", "--archive-dir", str(tmp_path)],
+    )
+
+    assert not result.exception
+    assert "grainbin_update: 0 rows from before 2024-01-01 archived" in result.output
+    assert "device_update: 0 rows" in result.output
+
+    result = runner.invoke(archive, ["grainbin", "1", "--archive-dir", str(tmp_path)])
+
+    assert not result.exception
+    assert result.output == "timestamp,sensor_name,temphigh,templow,temperature\n"
+
+
+@pytest.mark.usefixtures("tables")
+def test_load_benchmark():
+    """Test that the loader and session.add both write the benchmark rows."""
+
+    runner = CliRunner()
+    result = runner.invoke(benchmark, ["--rows", "20", "--sensors", "2"])
+
+    assert not result.exception
+    assert "loader: 20 rows" in result.output
+    assert "session.add: 20 rows" in result.output
@@ -0,0 +1,185 @@
+"""Tests for the archive module."""
+
+import datetime as dt
+import os
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from fm_database.archive import (
+    archive_months,
+    archive_table,
+    read_device_updates,
+    read_grainbin_updates,
+)
+from fm_database.database import engine
+from fm_database.models.device import DeviceUpdate, GrainbinUpdate
+from fm_database.retention import RetentionPolicy, prune
+from fm_database.settings import TestConfig
+
+from .factories import GrainbinFactory
+
+pa = pytest.importorskip("pyarrow")
+
+START = dt.datetime(2024, 1, 30)
+
+
+def add_readings(dbsession, grainbin, days):
+    """Add the readings of two sensors of a grainbin, every 6 hours for days."""
+
+    rows = [
+        {
+            "grainbin_id": grainbin.id,
+            "timestamp": START + dt.timedelta(hours=6 * number),
+            "update_index": number,
+            "sensor_name": f"28.{sensor}",
+            "temperature": 20.5 + sensor,
+            "temphigh": 1,
+            "templow": sensor,
+        }
+        for number in range(4 * days)
+        for sensor in (1, 2)
+    ]
+    dbsession.execute(insert(GrainbinUpdate), rows)
+    dbsession.commit()
+
+
+def test_archive_months():
+    """Test that the months cover the whole range."""
+
+    assert archive_months(dt.datetime(2024, 11, 15), dt.datetime(2025, 1, 2)) == [
+        dt.datetime(2024, 11, 1),
+        dt.datetime(2024, 12, 1),
+        dt.datetime(2025, 1, 1),
+    ]
+
+
+@pytest.mark.usefixtures("tables")
+class TestArchive:
+    """Tests for archiving and reading the updates."""
+
+    @staticmethod
+    def test_archive_grainbin_updates(dbsession, tmp_path):
+        """Test that the rows are archived per device and month, and read back."""
+
+        grainbin = GrainbinFactory()
+        other = GrainbinFactory()
+        dbsession.commit()
+        add_readings(dbsession, grainbin, 4)
+        add_readings(dbsession, other, 1)
+        archive_dir = str(tmp_path)
+
+        # the cutoff is in the middle of the readings of grainbin
+        result = archive_table(
+            engine,
+            "grainbin_update",
+            dt.datetime(2024, 2, 2),
+            archive_dir=archive_dir,
+            batch_size=5,
+        )
+
+        assert result.rows == 3 * 4 * 2 + 1 * 4 * 2
+        assert sorted(os.path.relpath(path, archive_dir) for path in result.files) == [
+            os.path.join("grainbin_update", grainbin.device_id_str, "2024-01.parquet"),
+            os.path.join("grainbin_update", grainbin.device_id_str, "2024-02.parquet"),
+            os.path.join("grainbin_update", other.device_id_str, "2024-01.parquet"),
+        ]
+        rows = read_grainbin_updates(
+            grainbin.id,
+            dt.datetime(2024, 1, 31),
+            dt.datetime(2024, 2, 1, 12),
+            archive_dir=archive_dir,
+        )
+        assert rows.num_rows == 6 * 2
+        assert rows.schema.field("sensor_name").type == pa.dictionary(
+            pa.int16(), pa.string()
+        )
+        first = rows.to_pylist()[0]
+        assert first["timestamp"] == dt.datetime(2024, 1, 31)
+        assert (first["sensor_name"], first["temperature"]) == ("28.1", 21.5)
+
+    @staticmethod
+    def test_archive_is_idempotent(dbsession, tmp_path):
+        """Test that archiving again only adds the rows that are not archived."""
+
+        grainbin = GrainbinFactory()
+        dbsession.commit()
+        add_readings(dbsession, grainbin, 4)
+        archive_dir = str(tmp_path)
+
+        first = archive_table(
+            engine, "grainbin_update", dt.datetime(2024, 2, 1), archive_dir=archive_dir
+        )
+        second = archive_table(
+            engine, "grainbin_update", dt.datetime(2024, 2, 1), archive_dir=archive_dir
+        )
+        third = archive_table(
+            engine, "grainbin_update", dt.datetime(2024, 2, 3), archive_dir=archive_dir
+        )
+
+        assert (first.rows, second.rows, third.rows) == (16, 0, 16)
+        rows = read_grainbin_updates(
+            grainbin.id, device=grainbin.device_id_str, archive_dir=archive_dir
+        )
+        assert rows.column("update_index").to_pylist() == sorted(list(range(16)) * 2)
+
+    @staticmethod
+    def test_archive_device_updates(dbsession, tmp_path):
+        """Test that the device updates are archived and read back."""
+
+        grainbin = GrainbinFactory()
+        dbsession.commit()
+        for number in range(3):
+            update = DeviceUpdate(grainbin.device.id)
+            update.timestamp = START + dt.timedelta(days=number)
+            update.update_index = number
+            update.interior_temp = 10.25
+            update.uptime = dt.timedelta(hours=number)
+            dbsession.add(update)
+        dbsession.commit()
+
+        result = archive_table(
+            engine, "device_update", dt.datetime(2024, 3, 1), archive_dir=str(tmp_path)
+        )
+        rows = read_device_updates(
+            grainbin.device_id_str,
+            dt.datetime(2024, 1, 31),
+            archive_dir=str(tmp_path),
+        ).to_pylist()
+
+        assert result.rows == 3
+        assert [row["update_index"] for row in rows] == [1, 2]
+        assert rows[1]["uptime"] == dt.timedelta(hours=2)
+        assert rows[1]["interior_temp"] == 10.25
+        assert rows[1]["exterior_temp"] is None
+
+    @staticmethod
+    def test_read_missing_archive(tmp_path):
+        """Test that an archive without files returns no rows."""
+
+        rows = read_grainbin_updates(1, archive_dir=str(tmp_path))
+
+        assert rows.num_rows == 0
+
+    @staticmethod
+    def test_prune_archives_first(dbsession, tmp_path, monkeypatch):
+        """Test that a prune with archive copies the rows before deleting them."""
+
+        monkeypatch.setattr(TestConfig, "ARCHIVE_DIR", str(tmp_path))
+        grainbin = GrainbinFactory()
+        dbsession.commit()
+        add_readings(dbsession, grainbin, 4)
+
+        result = prune(
+            engine,
+            RetentionPolicy("grainbin_update", 30),
+            now=dt.datetime(2024, 3, 3),
+            pause=0,
+            archive=True,
+        )
+
+        assert (result.archived, result.deleted) == (24, 24)
+        # pylint: disable=not-callable
+        assert dbsession.scalar(select(func.count(GrainbinUpdate.id))) == 8
+        rows = read_grainbin_updates(grainbin.id, archive_dir=str(tmp_path))
+        assert rows.num_rows == 24
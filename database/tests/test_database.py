@@ -0,0 +1,107 @@
+"""Tests for the database module."""
+
+import pytest
+from sqlalchemy import func, select
+
+from fm_database.database import allocate_update_index, upsert
+from fm_database.models.device import Device, Grainbin
+
+from .factories import DeviceFactory, GrainbinFactory
+
+
+@pytest.mark.usefixtures("tables")
+class TestAllocateUpdateIndex:
+    """Tests for the allocate_update_index function."""
+
+    @staticmethod
+    def test_allocate_update_index(dbsession):
+        """Test that each call returns the next index and sets the values."""
+
+        grainbin = GrainbinFactory()
+        grainbin.save()
+
+        first = allocate_update_index(dbsession, Grainbin, grainbin.id)
+        second = allocate_update_index(
+            dbsession, Grainbin, grainbin.id, average_temp="20.5"
+        )
+        dbsession.commit()
+
+        assert (first, second) == (1, 2)
+        assert grainbin.total_updates == 2
+        assert grainbin.average_temp == "20.5"
+
+    @staticmethod
+    def test_allocate_update_index_count(dbsession):
+        """Test that a block of indexes is reserved and the last one returned."""
+
+        grainbin = GrainbinFactory()
+        grainbin.total_updates = 5
+        grainbin.save()
+
+        assert allocate_update_index(dbsession, Grainbin, grainbin.id, count=10) == 15
+
+    @staticmethod
+    def test_allocate_update_index_no_match(dbsession):
+        """Test that None is returned when no row matches the criteria."""
+
+        grainbin = GrainbinFactory(bus_number=1)
+        grainbin.save()
+
+        update_index = allocate_update_index(
+            dbsession, Grainbin, grainbin.id, Grainbin.bus_number == 2
+        )
+        dbsession.commit()
+
+        assert update_index is None
+        assert grainbin.total_updates == 0
+
+
+@pytest.mark.usefixtures("tables")
+class TestUpsert:
+    """Tests for the upsert function."""
+
+    @staticmethod
+    def test_upsert_inserts_new_row(dbsession):
+        """Test that a new row is inserted and returned as a persistent object."""
+
+        device = upsert(dbsession, Device("new_device", "v1", "v2"), ["device_id"])
+        dbsession.commit()
+
+        assert device.id is not None
+        assert device.software_version == "v2"
+        assert device.total_updates == 0
+        assert dbsession.scalar(select(Device).where(Device.id == device.id)) is device
+
+    @staticmethod
+    def test_upsert_returns_existing_row(dbsession):
+        """Test that the existing row is returned unchanged without set_."""
+
+        existing = DeviceFactory(device_id="my_device", hardware_version="v1")
+        dbsession.commit()
+
+        device = upsert(dbsession, Device("my_device", "v9", "v9"), ["device_id"])
+
+        # pylint: disable=not-callable
+        assert device.id == existing.id
+        assert device.hardware_version == "v1"
+        assert dbsession.scalar(select(func.count()).select_from(Device)) == 1
+
+    @staticmethod
+    def test_upsert_updates_existing_row(dbsession):
+        """Test that set_ is applied to the existing row."""
+
+        grainbin = GrainbinFactory(bus_number=1)
+        grainbin.total_updates = 4
+        dbsession.commit()
+
+        new = Grainbin(grainbin.device_id_str, 1)
+        upserted = upsert(
+            dbsession,
+            new,
+            ["device_id_str", "bus_number"],
+            {"total_updates": Grainbin.total_updates + 1, "average_temp": "20.0"},
+        )
+
+        assert upserted.id == grainbin.id
+        assert upserted.total_updates == 5
+        assert upserted.average_temp == "20.0"
@@ -0,0 +1,116 @@
+"""Tests for the latest module."""
+
+import datetime as dt
+
+import pytest
+
+from fm_database.latest import (
+    add_latest_readings,
+    select_all_latest_readings,
+    select_latest_readings,
+)
+from fm_database.models.device import GrainbinLatestReading
+
+from .factories import GrainbinFactory
+
+
+def reading_rows(grainbin_id, update_index, sensor_names, temperature=20.0):
+    """Return the grainbin_update rows of an update, with made up ids."""
+
+    return [
+        {
+            "id": 100 * update_index + templow,
+            "grainbin_id": grainbin_id,
+            "timestamp": dt.datetime(2024, 1, 1) + dt.timedelta(hours=update_index),
+            "update_index": update_index,
+            "sensor_name": sensor_name,
+            "temperature": temperature,
+            "temphigh": 1,
+            "templow": templow,
+        }
+        for templow, sensor_name in enumerate(sensor_names)
+    ]
+
+
+@pytest.mark.usefixtures("tables")
+class TestLatestReadings:
+    """Tests for the latest readings of the grainbin sensors."""
+
+    @staticmethod
+    def test_add_latest_readings(dbsession):
+        """Test that newer readings replace older ones, and older ones are ignored."""
+
+        grainbin = GrainbinFactory()
+        dbsession.commit()
+
+        assert (
+            add_latest_readings(dbsession, reading_rows(grainbin.id, 1, ["a", "b"]))
+            == 2
+        )
+        add_latest_readings(dbsession, reading_rows(grainbin.id, 3, ["a", "b"], 30.0))
+        # a late message with an older update
+        add_latest_readings(dbsession, reading_rows(grainbin.id, 2, ["a", "b"], 25.0))
+        dbsession.commit()
+
+        readings = dbsession.scalars(select_latest_readings(grainbin.id)).all()
+        assert [reading.sensor_name for reading in readings] == ["b", "a"]
+        assert {
+            (reading.update_index, reading.temperature) for reading in readings
+        } == {(3, 30.0)}
+        assert [reading.update_id for reading in readings] == [301, 300]
+
+    @staticmethod
+    def test_add_latest_readings_skips_missing_sensor(dbsession):
+        """Test that readings without a sensor name are skipped."""
+
+        grainbin = GrainbinFactory()
+        dbsession.commit()
+
+        rows = reading_rows(grainbin.id, 1, [None, "a", "a"])
+
+        assert add_latest_readings(dbsession, rows) == 1
+        assert add_latest_readings(dbsession, rows[:1]) == 0
+
+    @staticmethod
+    def test_select_latest_readings(dbsession):
+        """Test that only the sensors of the latest update of the grainbin are selected."""
+
+        grainbin = GrainbinFactory()
+        other = GrainbinFactory()
+        dbsession.commit()
+        add_latest_readings(dbsession, reading_rows(grainbin.id, 1, ["a", "b", "c"]))
+        add_latest_readings(dbsession, reading_rows(grainbin.id, 2, ["a", "b"]))
+        add_latest_readings(dbsession, reading_rows(other.id, 5, ["a"]))
+        dbsession.commit()
+
+        readings = dbsession.scalars(select_latest_readings(grainbin.id)).all()
+
+        assert [reading.sensor_name for reading in readings] == ["b", "a"]
+        assert dbsession.scalars(select_latest_readings(100)).all() == []
+
+    @staticmethod
+    def test_select_all_latest_readings(dbsession):
+        """Test that the sensors of the latest update of every grainbin are selected."""
+
+        grainbin = GrainbinFactory()
+        other = GrainbinFactory()
+        empty = GrainbinFactory()
+        dbsession.commit()
+        add_latest_readings(dbsession, reading_rows(grainbin.id, 1, ["a", "b", "c"]))
+        add_latest_readings(dbsession, reading_rows(grainbin.id, 2, ["a", "b"]))
+        add_latest_readings(dbsession, reading_rows(other.id, 5, ["a"]))
+        dbsession.commit()
+
+        readings = dbsession.scalars(select_all_latest_readings()).all()
+
+        assert [(reading.grainbin_id, reading.sensor_name) for reading in readings] == [
+            (grainbin.id, "b"),
+            (grainbin.id, "a"),
+            (other.id, "a"),
+        ]
+        filtered = dbsession.scalars(
+            select_all_latest_readings(
+                GrainbinLatestReading.grainbin_id.in_([other.id, empty.id])
+            )
+        ).all()
+        assert [reading.grainbin_id for reading in filtered] == [other.id]
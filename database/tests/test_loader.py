@@ -0,0 +1,270 @@
+"""Tests for the loader module."""
+
+import datetime as dt
+
+import pytest
+from sqlalchemy import select
+
+from fm_database.loader import (
+    DeviceRecord,
+    GrainbinRecord,
+    UpdateIndexAllocator,
+    copy_line,
+    load_device_updates,
+    load_grainbin_updates,
+)
+from fm_database.models.device import (
+    Device,
+    DeviceUpdate,
+    Grainbin,
+    GrainbinLatestReading,
+    GrainbinUpdate,
+)
+from fm_database.models.rollup import DeviceRollup, GrainbinRollup
+
+from .factories import DeviceFactory, GrainbinFactory
+
+TIMESTAMP = dt.datetime(2024, 1, 1, 12, 0, 0)
+
+
+def grainbin_records(grainbin: Grainbin, count: int, sensors: int = 3):
+    """Return count records for grainbin with a reading for each sensor."""
+
+    # read the attributes now, the generator runs while the load is in progress.
+    device_id, bus_number = grainbin.device_id_str, grainbin.bus_number
+    return (
+        GrainbinRecord(
+            device_id=device_id,
+            bus_number=bus_number,
+            timestamp=TIMESTAMP + dt.timedelta(minutes=number),
+            sensors=[(f"28.{sensor}", 20.5, 1, sensor) for sensor in range(sensors)],
+        )
+        for number in range(count)
+    )
+
+
+@pytest.mark.usefixtures("tables")
+class TestLoadGrainbinUpdates:
+    """Tests for the load_grainbin_updates function."""
+
+    @staticmethod
+    def test_load_grainbin_updates(dbsession):
+        """Test that a row is loaded for each sensor reading of each record."""
+
+        grainbin = GrainbinFactory()
+        grainbin.save()
+
+        result = load_grainbin_updates(
+            dbsession, grainbin_records(grainbin, 5), block_size=2, chunk_size=4
+        )
+
+        updates = dbsession.scalars(
+            select(GrainbinUpdate).order_by(GrainbinUpdate.id)
+        ).all()
+        assert result.rows == 15
+        assert result.updates == 5
+        assert result.skipped == 0
+        assert len(updates) == 15
+        assert [update.update_index for update in updates[::3]] == [1, 2, 3, 4, 5]
+        assert updates[0].timestamp == TIMESTAMP
+
+    @staticmethod
+    def test_load_grainbin_updates_latest_readings(dbsession):
+        """Test that the newest loaded reading of each sensor is the latest reading."""
+
+        grainbin = GrainbinFactory()
+        grainbin.save()
+        grainbin_id = grainbin.id
+
+        load_grainbin_updates(
+            dbsession, grainbin_records(grainbin, 5), block_size=2, chunk_size=4
+        )
+
+        readings = dbsession.scalars(
+            select(GrainbinLatestReading).order_by(GrainbinLatestReading.sensor_name)
+        ).all()
+        assert [reading.sensor_name for reading in readings] == ["28.0", "28.1", "28.2"]
+        assert {reading.grainbin_id for reading in readings} == {grainbin_id}
+        assert {reading.update_index for reading in readings} == {5}
+        assert {reading.timestamp for reading in readings} == {
+            TIMESTAMP + dt.timedelta(minutes=4)
+        }
+        update_ids = dbsession.scalars(
+            select(GrainbinUpdate.id)
+            .where(GrainbinUpdate.update_index == 5)
+            .order_by(GrainbinUpdate.sensor_name)
+        ).all()
+        assert [reading.update_id for reading in readings] == update_ids
+
+    @staticmethod
+    def test_load_grainbin_updates_rollups(dbsession):
+        """Test that the loaded readings are added to the rollups."""
+
+        grainbin = GrainbinFactory()
+        grainbin.save()
+
+        load_grainbin_updates(dbsession, grainbin_records(grainbin, 5))
+
+        rollups = dbsession.scalars(
+            select(GrainbinRollup)
+            .where(GrainbinRollup.period == "hour")
+            .order_by(GrainbinRollup.templow)
+        ).all()
+        assert [rollup.templow for rollup in rollups] == [0, 1, 2]
+        assert {rollup.bucket for rollup in rollups} == {TIMESTAMP}
+        assert {rollup.temperature_count for rollup in rollups} == {5}
+        assert {rollup.temperature_sum for rollup in rollups} == {5 * 20.5}
+
+    @staticmethod
+    def test_load_grainbin_updates_duplicates(dbsession):
+        """Test that a re-run skips the stored rows and loads the new ones."""
+
+        grainbin = GrainbinFactory()
+        grainbin.save()
+        load_grainbin_updates(dbsession, grainbin_records(grainbin, 3))
+
+        result = load_grainbin_updates(dbsession, grainbin_records(grainbin, 5))
+
+        updates = dbsession.scalars(select(GrainbinUpdate)).all()
+        rollup = dbsession.scalars(
+            select(GrainbinRollup).where(GrainbinRollup.period == "day")
+        ).first()
+        assert result.rows == 6
+        assert result.duplicates == 9
+        assert len(updates) == 15
+        assert rollup is not None
+        assert rollup.temperature_count == 5
+
+    @staticmethod
+    def test_load_grainbin_updates_releases_unused_indexes(dbsession):
+        """Test that total_updates matches the last index that was used."""
+
+        grainbin = GrainbinFactory()
+        grainbin.total_updates = 10
+        grainbin.save()
+
+        load_grainbin_updates(dbsession, grainbin_records(grainbin, 3), block_size=100)
+
+        dbsession.refresh(grainbin)
+        assert grainbin.total_updates == 13
+
+    @staticmethod
+    def test_load_grainbin_updates_unknown_grainbin(dbsession):
+        """Test that records for an unknown grainbin are skipped."""
+
+        grainbin = GrainbinFactory()
+        grainbin.save()
+        unknown = GrainbinRecord("unknown", 1, TIMESTAMP, [("28.1", 20.0, 1, 1)])
+
+        result = load_grainbin_updates(
+            dbsession, [unknown, *grainbin_records(grainbin, 1)]
+        )
+
+        assert result.skipped == 1
+        assert result.updates == 1
+        assert result.rows == 3
+
+
+@pytest.mark.usefixtures("tables")
+class TestLoadDeviceUpdates:
+    """Tests for the load_device_updates function."""
+
+    @staticmethod
+    def test_load_device_updates(dbsession):
+        """Test that a row is loaded for each device record."""
+
+        device = DeviceFactory()
+        device.save()
+        device_id = device.device_id
+        records = (
+            DeviceRecord(
+                device_id=device_id,
+                timestamp=TIMESTAMP + dt.timedelta(minutes=number),
+                interior_temp=20.0,
+                uptime=dt.timedelta(hours=1),
+            )
+            for number in range(4)
+        )
+
+        result = load_device_updates(dbsession, records, block_size=3)
+
+        updates = dbsession.scalars(
+            select(DeviceUpdate).order_by(DeviceUpdate.update_index)
+        ).all()
+        dbsession.refresh(device)
+        assert result.rows == 4
+        assert [update.update_index for update in updates] == [1, 2, 3, 4]
+        assert updates[0].uptime == dt.timedelta(hours=1)
+        assert device.total_updates == 4
+
+    @staticmethod
+    def test_load_device_updates_duplicates(dbsession):
+        """Test that a duplicate within a load is skipped and left out of the rollups."""
+
+        device = DeviceFactory()
+        device.save()
+        records = [
+            DeviceRecord(device_id=device.device_id, timestamp=TIMESTAMP),
+            DeviceRecord(device_id=device.device_id, timestamp=TIMESTAMP),
+            DeviceRecord(
+                device_id=device.device_id,
+                timestamp=TIMESTAMP + dt.timedelta(minutes=1),
+                interior_temp=22.0,
+            ),
+        ]
+
+        result = load_device_updates(dbsession, records)
+
+        rollup = dbsession.scalars(
+            select(DeviceRollup).where(DeviceRollup.period == "hour")
+        ).one()
+        assert result.rows == 2
+        assert result.duplicates == 1
+        assert dbsession.scalars(select(DeviceUpdate)).all()[0].update_index == 1
+        assert rollup.interior_count == 1
+        assert rollup.interior_sum == 22.0
+
+    @staticmethod
+    def test_load_device_updates_unknown_device(dbsession):
+        """Test that records for an unknown device are skipped."""
+
+        device = DeviceFactory()
+        device.save()
+        records = [
+            DeviceRecord(device_id="unknown", timestamp=TIMESTAMP),
+            DeviceRecord(device_id=device.device_id, timestamp=TIMESTAMP),
+        ]
+
+        result = load_device_updates(dbsession, records)
+
+        assert result.skipped == 1
+        assert result.updates == 1
+        assert result.rows == 1
+
+
+@pytest.mark.usefixtures("tables")
+def test_update_index_allocator_blocks(dbsession):
+    """Test that indexes are handed out from blocks and released."""
+
+    device = DeviceFactory()
+    device.save()
+
+    allocator = UpdateIndexAllocator(dbsession.connection(), Device, block_size=2)
+    indexes = [allocator.next_index(device.id) for _ in range(3)]
+    reserved = dbsession.scalar(select(Device.total_updates))
+    allocator.release()
+    released = dbsession.scalar(select(Device.total_updates))
+
+    assert indexes == [1, 2, 3]
+    assert reserved == 4
+    assert released == 3
+
+
+def test_copy_line():
+    """Test that values are written in the COPY text format."""
+
+    line = copy_line(
+        (1, TIMESTAMP, None, "a\tb\\c", 20.5, dt.timedelta(minutes=1), True)
+    )
+
+    assert line == "1\t2024-01-01 12:00:00\t\\N\ta\\tb\\\\c\t20.5\t60.0 seconds\tTrue\n"
@@ -1,11 +1,20 @@
 """Tests for the paginate class and method."""
 
 import pytest
-from sqlalchemy import select
+from sqlalchemy import func, select
 
 from fm_database.database import create_all_tables, drop_all_tables
 from fm_database.models.user import User
-from fm_database.paginate import paginate
+from fm_database.paginate import (
+    CachedCount,
+    KeysetPagination,
+    decode_cursor,
+    encode_cursor,
+    estimated_count,
+    exact_count,
+    paginate,
+    scalar_count,
+)
 
 from .factories import UserFactory
 
@@ -211,3 +220,140 @@ def test_paginate_iterate(dbsession):
     users = paginate(dbsession, select_stmt, per_page=1)
     for user in users:
         assert user.id == users.page
+
+
+@pytest.mark.usefixtures("setup_users")
+def test_paginate_count_provider(dbsession):
+    """Test that the total is taken from a count provider."""
+
+    select_stmt = select(User).order_by(User.id)
+    users = paginate(dbsession, select_stmt, count=lambda session, select: 1000)
+    assert users.total == 1000
+    assert users.pages == 50
+
+
+@pytest.mark.usefixtures("setup_users")
+def test_exact_count(dbsession):
+    """Test that exact_count counts the items of the select."""
+
+    assert exact_count(dbsession, select(User).where(User.id > 20)) == 5
+
+
+@pytest.mark.usefixtures("setup_users")
+def test_scalar_count(dbsession):
+    """Test that scalar_count reads the total from its statement."""
+
+    # pylint: disable=not-callable
+    count = scalar_count(select(func.max(User.id)).where(User.id < 11))
+    assert count(dbsession, select(User)) == 10
+    assert scalar_count(select(User.id).where(User.id > 100))(dbsession, None) == 0
+
+
+@pytest.mark.usefixtures("setup_users")
+def test_estimated_count(dbsession):
+    """Test that estimated_count estimates the items of the select."""
+
+    estimate = estimated_count(dbsession, select(User).where(User.id > 20))
+    if dbsession.get_bind().dialect.name == "postgresql":
+        assert estimate >= 1
+    else:
+        assert estimate == 5
+
+
+@pytest.mark.usefixtures("setup_users")
+def test_cached_count(dbsession):
+    """Test that CachedCount counts each select once until it expires."""
+
+    counted = []
+
+    def provider(session, select_stmt):
+        counted.append(select_stmt)
+        return exact_count(session, select_stmt)
+
+    count = CachedCount(provider, ttl=60)
+    assert count(dbsession, select(User).where(User.id > 20)) == 5
+    assert count(dbsession, select(User).where(User.id > 20)) == 5
+    assert count(dbsession, select(User).where(User.id > 10)) == 15
+    assert len(counted) == 2
+
+    count.clear()
+    assert count(dbsession, select(User).where(User.id > 20)) == 5
+    assert len(counted) == 3
+
+    expired = CachedCount(provider, ttl=0)
+    expired(dbsession, select(User))
+    expired(dbsession, select(User))
+    assert len(counted) == 5
+
+
+def test_cursor_round_trip():
+    """Test that a cursor decodes to the values it was encoded from."""
+
+    cursor = encode_cursor([12, 345])
+    assert "=" not in cursor
+    assert decode_cursor(cursor, 2) == [12, 345]
+    assert decode_cursor(encode_cursor([1, 2, 3]), None) == [1, 2, 3]
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor",
+        encode_cursor([1]),
+        "e30",
+        encode_cursor(["a", 1]),
+        encode_cursor([1.5, 1]),
+        encode_cursor([True, 1]),
+        encode_cursor([{"id": 1}, None]),
+    ],
+)
+def test_decode_cursor_invalid(cursor):
+    """Test that an invalid cursor raises a ValueError."""
+
+    with pytest.raises(ValueError, match="invalid cursor"):
+        decode_cursor(cursor, 2)
+
+
+@pytest.mark.usefixtures("setup_users")
+def test_keyset_paginate(dbsession):
+    """Test that the cursors page through all the items, newest first."""
+
+    select_stmt = select(User)
+    users = KeysetPagination(dbsession, select_stmt, (User.id,), per_page=10)
+    assert [user.id for user in users] == list(range(25, 15, -1))
+    assert users.has_next
+
+    users = KeysetPagination(
+        dbsession, select_stmt, (User.id,), cursor=users.next_cursor, per_page=10
+    )
+    assert [user.id for user in users] == list(range(15, 5, -1))
+
+    users = KeysetPagination(
+        dbsession, select_stmt, (User.id,), cursor=users.next_cursor, per_page=10
+    )
+    assert [user.id for user in users] == list(range(5, 0, -1))
+    assert not users.has_next
+    assert users.next_cursor is None
+
+
+@pytest.mark.usefixtures("setup_users")
+def test_keyset_paginate_ascending(dbsession):
+    """Test that the cursor pages in ascending order."""
+
+    users = KeysetPagination(
+        dbsession,
+        select(User).where(User.id > 20),
+        (User.id,),
+        cursor=encode_cursor([22]),
+        descending=False,
+    )
+    assert [user.id for user in users] == [23, 24, 25]
+    assert users.per_page == 20
+
+
+@pytest.mark.usefixtures("setup_users")
+def test_keyset_paginate_invalid_cursor(dbsession):
+    """Test that an invalid cursor raises a ValueError."""
+
+    with pytest.raises(ValueError):
+        KeysetPagination(dbsession, select(User), (User.id,), cursor="bad")
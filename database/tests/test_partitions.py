@@ -0,0 +1,129 @@
+"""Tests for the partitions module.
+
+The partition tests only run when the tests use a PostgreSQL database.
+"""
+
+import datetime as dt
+
+import pytest
+from sqlalchemy import event, func, select, text
+
+from fm_database.database import engine
+from fm_database.models.device import GrainbinUpdate
+from fm_database.partitions import (
+    add_months,
+    create_partitions,
+    detach_partitions,
+    is_partition_name,
+    list_partitions,
+    month_start,
+    partition_name,
+)
+
+from .factories import GrainbinFactory
+
+postgresql_only = pytest.mark.skipif(
+    engine.dialect.name != "postgresql", reason="partitions need PostgreSQL"
+)
+
+
+def test_month_arithmetic():
+    """Test the month helpers across the end of a year."""
+
+    assert month_start(dt.datetime(2024, 12, 31, 23, 59)) == dt.date(2024, 12, 1)
+    assert add_months(dt.date(2024, 12, 1), 1) == dt.date(2025, 1, 1)
+    assert add_months(dt.date(2024, 1, 1), -13) == dt.date(2022, 12, 1)
+
+
+def test_partition_names():
+    """Test the naming of the monthly and default partitions."""
+
+    assert partition_name("grainbin_update", dt.date(2024, 6, 1)) == (
+        "grainbin_update_2024_06"
+    )
+    assert is_partition_name("grainbin_update_2024_06")
+    assert is_partition_name("device_update_default")
+    assert not is_partition_name("grainbin_update")
+    assert not is_partition_name("grainbin_update_unpartitioned")
+
+
+def add_reading(dbsession, grainbin, timestamp):
+    """Add a grainbin update reading at timestamp."""
+
+    update = GrainbinUpdate(grainbin.id)
+    update.timestamp = timestamp
+    update.update_index = 1
+    dbsession.add(update)
+    dbsession.commit()
+
+
+def partition_of(dbsession, timestamp) -> str:
+    """Return the name of the partition that holds the reading at timestamp."""
+
+    name: str = dbsession.scalar(
+        select(text("tableoid::regclass::text"))
+        .select_from(GrainbinUpdate)
+        .where(GrainbinUpdate.timestamp == timestamp)
+    )
+    return name
+
+
+@postgresql_only
+@pytest.mark.usefixtures("tables")
+class TestPartitions:
+    """Tests for the monthly partitions on PostgreSQL."""
+
+    @staticmethod
+    def test_rows_are_moved_from_the_default_partition(dbsession):
+        """Test that creating a partition moves its rows out of the default."""
+
+        grainbin = GrainbinFactory()
+        grainbin.save()
+        timestamp = dt.datetime(2020, 3, 15)
+        other_month = dt.datetime(2020, 7, 1)
+        add_reading(dbsession, grainbin, timestamp)
+        add_reading(dbsession, grainbin, other_month)
+        assert partition_of(dbsession, timestamp) == "grainbin_update_default"
+        dbsession.commit()
+
+        statements: list[str] = []
+        with engine.begin() as connection:
+            event.listen(
+                connection,
+                "before_cursor_execute",
+                lambda *args: statements.append(args[2]),
+            )
+            created = create_partitions(
+                connection, "grainbin_update", dt.date(2020, 2, 1), 2
+            )
+        dbsession.commit()
+
+        assert created == ["grainbin_update_2020_02", "grainbin_update_2020_03"]
+        assert partition_of(dbsession, timestamp) == "grainbin_update_2020_03"
+        assert partition_of(dbsession, other_month) == "grainbin_update_default"
+        # the default partition stays attached, so other months can be inserted
+        assert not [statement for statement in statements if "DETACH" in statement]
+
+    @staticmethod
+    def test_detach_partitions(dbsession):
+        """Test that only partitions that end before the date are detached."""
+
+        grainbin = GrainbinFactory()
+        grainbin.save()
+        dbsession.commit()
+        with engine.begin() as connection:
+            create_partitions(connection, "grainbin_update", dt.date(2020, 1, 1), 3)
+        add_reading(dbsession, grainbin, dt.datetime(2020, 1, 10))
+        add_reading(dbsession, grainbin, dt.datetime(2020, 2, 10))
+
+        with engine.begin() as connection:
+            detached = detach_partitions(
+                connection, "grainbin_update", dt.date(2020, 2, 1), drop=True
+            )
+            remaining = list_partitions(connection, "grainbin_update")
+        dbsession.commit()
+
+        # pylint: disable=not-callable
+        assert detached == ["grainbin_update_2020_01"]
+        assert remaining[0].name == "grainbin_update_2020_02"
+        assert dbsession.scalar(select(func.count()).select_from(GrainbinUpdate)) == 1
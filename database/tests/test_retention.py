@@ -0,0 +1,149 @@
+"""Tests for the retention module."""
+
+import datetime as dt
+
+import pytest
+from sqlalchemy import select
+
+from fm_database.database import engine
+from fm_database.models.device import GrainbinUpdate
+from fm_database.models.message import Message
+from fm_database.partitions import create_partitions
+from fm_database.retention import (
+    RetentionPolicy,
+    count_expired,
+    get_policies,
+    prune,
+    prune_all,
+)
+from fm_database.settings import TestConfig
+
+from .factories import GrainbinFactory
+
+NOW = dt.datetime(2024, 6, 1, 12, 0)
+
+postgresql_only = pytest.mark.skipif(
+    engine.dialect.name != "postgresql", reason="partitions need PostgreSQL"
+)
+
+
+def add_readings(dbsession, days_old):
+    """Add a grainbin with a reading for each number of days before NOW."""
+
+    grainbin = GrainbinFactory()
+    dbsession.commit()
+    for update_index, days in enumerate(days_old):
+        update = GrainbinUpdate(grainbin.id)
+        update.timestamp = NOW - dt.timedelta(days=days)
+        update.update_index = update_index
+        dbsession.add(update)
+    dbsession.commit()
+    return grainbin
+
+
+def test_get_policies(monkeypatch):
+    """Test that the policies follow the settings and the overrides."""
+
+    monkeypatch.setattr(TestConfig, "RETENTION_DAYS", {"grainbin_update": 180})
+
+    assert get_policies() == [RetentionPolicy("grainbin_update", 180)]
+    assert get_policies({"message": 7}) == [
+        RetentionPolicy("grainbin_update", 180),
+        RetentionPolicy("message", 7),
+    ]
+
+
+@pytest.mark.usefixtures("tables")
+class TestPrune:
+    """Tests for pruning the rows of a table."""
+
+    @staticmethod
+    def test_prune_in_batches(dbsession):
+        """Test that the expired rows are deleted in batches with progress reports."""
+
+        add_readings(dbsession, [1, 10, 31, 32, 33, 34, 35])
+        policy = RetentionPolicy("grainbin_update", 30)
+        reports = []
+
+        assert count_expired(engine, policy, NOW) == 5
+        result = prune(
+            engine,
+            policy,
+            now=NOW,
+            batch_size=2,
+            pause=0,
+            progress=lambda result: reports.append(result.deleted),
+        )
+
+        assert result.deleted == 5
+        assert result.batches == 3
+        assert reports == [2, 4, 5]
+        assert result.rows_per_second > 0
+        dbsession.expire_all()
+        indexes = dbsession.scalars(select(GrainbinUpdate.update_index)).all()
+        assert sorted(indexes) == [0, 1]
+
+    @staticmethod
+    def test_prune_nothing_expired(dbsession):
+        """Test that a prune without expired rows takes a single batch."""
+
+        add_readings(dbsession, [1, 2])
+
+        result = prune(engine, RetentionPolicy("grainbin_update", 30), now=NOW, pause=0)
+
+        assert result.deleted == 0
+        assert result.batches == 1
+        assert result.rows_per_second == 0.0
+
+    @staticmethod
+    def test_prune_bumps_last_updated(dbsession):
+        """Test that only the grainbins with pruned updates get a new version."""
+
+        pruned = add_readings(dbsession, [1, 40])
+        kept = add_readings(dbsession, [1, 2])
+        for grainbin in (pruned, kept):
+            grainbin.last_updated = dt.datetime(2000, 1, 1)
+        dbsession.commit()
+
+        prune(engine, RetentionPolicy("grainbin_update", 30), now=NOW, pause=0)
+
+        dbsession.expire_all()
+        assert pruned.last_updated > dt.datetime(2000, 1, 1)
+        assert kept.last_updated == dt.datetime(2000, 1, 1)
+
+    @staticmethod
+    def test_prune_all(dbsession):
+        """Test that every table with a policy is pruned."""
+
+        add_readings(dbsession, [1, 200])
+        message = Message("source", "destination", "test")
+        message.created_at = NOW - dt.timedelta(days=60)
+        dbsession.add(message)
+        dbsession.commit()
+
+        results = prune_all(engine, now=NOW, pause=0)
+
+        assert {result.table: result.deleted for result in results} == {
+            "grainbin_update": 1,
+            "device_update": 0,
+            "message": 1,
+        }
+
+
+@postgresql_only
+@pytest.mark.usefixtures("tables")
+def test_prune_drops_expired_partitions(dbsession):
+    """Test that the partitions of expired months are dropped instead of deleted."""
+
+    with engine.begin() as connection:
+        create_partitions(connection, "grainbin_update", dt.date(2024, 1, 1), 3)
+    # 2024-01-03, 2024-02-02 and 2024-03-03
+    add_readings(dbsession, [150, 120, 90])
+
+    # the cutoff is 2024-02-12
+    result = prune(engine, RetentionPolicy("grainbin_update", 110), now=NOW, pause=0)
+
+    assert result.dropped_partitions == ["grainbin_update_2024_01"]
+    assert result.deleted == 1
+    dbsession.expire_all()
+    assert dbsession.scalars(select(GrainbinUpdate.update_index)).all() == [2]
@@ -0,0 +1,197 @@
+"""Tests for the rollups module."""
+
+import datetime as dt
+
+import pytest
+from sqlalchemy import insert, select
+
+from fm_database.models.device import DeviceUpdate, GrainbinUpdate
+from fm_database.models.rollup import DeviceRollup, GrainbinRollup
+from fm_database.rollups import (
+    add_device_rollups,
+    add_grainbin_rollups,
+    bucket_start,
+    rebuild_rollups,
+    rollup_chunks,
+)
+
+from .factories import GrainbinFactory
+
+START = dt.datetime(2024, 1, 1, 10, 0)
+
+
+def test_bucket_start():
+    """Test the start of the hour and day buckets."""
+
+    timestamp = dt.datetime(2024, 1, 1, 10, 35, 12, 500)
+
+    assert bucket_start(timestamp, "hour") == dt.datetime(2024, 1, 1, 10)
+    assert bucket_start(timestamp, "day") == dt.datetime(2024, 1, 1)
+    with pytest.raises(ValueError):
+        bucket_start(timestamp, "week")
+
+
+def test_rollup_chunks():
+    """Test that the chunks are whole days that cover the range."""
+
+    chunks = list(
+        rollup_chunks(dt.datetime(2024, 1, 1, 12), dt.datetime(2024, 1, 4, 1), 2)
+    )
+
+    assert chunks == [
+        (dt.datetime(2024, 1, 1), dt.datetime(2024, 1, 3)),
+        (dt.datetime(2024, 1, 3), dt.datetime(2024, 1, 5)),
+    ]
+
+
+def grainbin_rows(grainbin_id, count):
+    """Return the rows of two sensors, one reading every 25 minutes from START."""
+
+    return [
+        {
+            "grainbin_id": grainbin_id,
+            "timestamp": START + dt.timedelta(minutes=25 * number),
+            "update_index": number,
+            "sensor_name": f"28.{sensor}",
+            "temperature": 20.0 + number,
+            "temphigh": 1,
+            "templow": sensor,
+        }
+        for number in range(count)
+        for sensor in (1, 2)
+    ]
+
+
+def grainbin_rollups(dbsession):
+    """Return the statistics of the grainbin rollups."""
+
+    dbsession.expire_all()
+    return [
+        (
+            rollup.period,
+            rollup.bucket,
+            rollup.templow,
+            rollup.temperature_count,
+            rollup.temperature_min,
+            rollup.temperature_max,
+            rollup.temperature_sum,
+        )
+        for rollup in dbsession.scalars(
+            select(GrainbinRollup).order_by(
+                GrainbinRollup.period, GrainbinRollup.bucket, GrainbinRollup.templow
+            )
+        )
+    ]
+
+
+@pytest.mark.usefixtures("tables")
+class TestRollups:
+    """Tests for the incremental and rebuilt rollups."""
+
+    @staticmethod
+    def test_add_grainbin_rollups(dbsession):
+        """Test that readings are merged into the hour and day of each sensor."""
+
+        grainbin = GrainbinFactory()
+        dbsession.commit()
+
+        # the readings arrive one update at a time
+        for row in grainbin_rows(grainbin.id, 6):
+            add_grainbin_rollups(dbsession, [row])
+        dbsession.commit()
+
+        rollups = grainbin_rollups(dbsession)
+        assert len(rollups) == 8
+        assert rollups[0] == ("day", dt.datetime(2024, 1, 1), 1, 6, 20.0, 25.0, 135.0)
+        assert rollups[2] == ("hour", START, 1, 3, 20.0, 22.0, 63.0)
+
+    @staticmethod
+    def test_add_grainbin_rollups_skips_missing_values(dbsession):
+        """Test that readings without a temperature or sensor are left out."""
+
+        grainbin = GrainbinFactory()
+        dbsession.commit()
+        rows = grainbin_rows(grainbin.id, 2)
+        rows[0]["temperature"] = None
+        rows[1]["templow"] = None
+
+        # only the reading without a sensor position is counted as skipped
+        assert add_grainbin_rollups(dbsession, rows) == (4, 1)
+        assert add_grainbin_rollups(dbsession, rows[:2]) == (0, 1)
+
+    @staticmethod
+    def test_add_device_rollups(dbsession):
+        """Test that a missing temperature does not change its statistics."""
+
+        grainbin = GrainbinFactory()
+        dbsession.commit()
+        device_id = grainbin.device.id
+
+        add_device_rollups(dbsession, device_id, START, 5.0, None)
+        add_device_rollups(dbsession, device_id, START, 7.0, 3.0)
+        add_device_rollups(dbsession, device_id, START, None, None)
+        dbsession.commit()
+
+        rollup = dbsession.scalars(
+            select(DeviceRollup).where(DeviceRollup.period == "hour")
+        ).one()
+        assert (rollup.interior_count, rollup.interior_avg) == (2, 6.0)
+        assert (rollup.interior_min, rollup.interior_max) == (5.0, 7.0)
+        assert (rollup.exterior_count, rollup.exterior_avg) == (1, 3.0)
+
+    @staticmethod
+    def test_rebuild_rollups(dbsession):
+        """Test that a rebuild recomputes the same rollups as the ingest."""
+
+        grainbin = GrainbinFactory()
+        dbsession.commit()
+        rows = grainbin_rows(grainbin.id, 6)
+        dbsession.execute(insert(GrainbinUpdate), rows)
+        add_grainbin_rollups(dbsession, rows)
+        for number in range(3):
+            timestamp = START + dt.timedelta(minutes=40 * number)
+            update = DeviceUpdate(grainbin.device.id)
+            update.timestamp = timestamp
+            update.update_index = number
+            update.interior_temp = 10.0 + number
+            dbsession.add(update)
+            add_device_rollups(
+                dbsession, grainbin.device.id, timestamp, 10.0 + number, None
+            )
+        dbsession.commit()
+        expected = grainbin_rollups(dbsession)
+
+        # a rollup that is wrong is corrected by the rebuild
+        rollup = dbsession.scalars(select(GrainbinRollup)).first()
+        rollup.temperature_count = 100
+        dbsession.commit()
+
+        written = rebuild_rollups(dbsession, START, START + dt.timedelta(hours=3))
+
+        assert written == (8 + 3, 0)
+        assert grainbin_rollups(dbsession) == expected
+        device_rollup = dbsession.scalars(
+            select(DeviceRollup).where(DeviceRollup.period == "day")
+        ).one()
+        assert device_rollup.interior_count == 3
+        assert device_rollup.interior_avg == 11.0
+        assert device_rollup.exterior_count == 0
+        assert device_rollup.exterior_avg is None
+
+    @staticmethod
+    def test_rebuild_rollups_counts_readings_without_a_sensor(dbsession):
+        """Test that the rebuild counts the readings it cannot roll up."""
+
+        grainbin = GrainbinFactory()
+        dbsession.commit()
+        rows = grainbin_rows(grainbin.id, 3)
+        rows[0]["temphigh"] = None
+        rows[3]["templow"] = None
+        rows[4]["temperature"] = None
+        dbsession.execute(insert(GrainbinUpdate), rows)
+        dbsession.commit()
+
+        result = rebuild_rollups(dbsession, START, START + dt.timedelta(hours=3))
+
+        assert result.skipped == 2
+        assert sum(rollup[3] for rollup in grainbin_rollups(dbsession)) == 2 * 3
@@ -0,0 +1,134 @@
+"""Tests for the series module."""
+
+import datetime as dt
+
+import pytest
+from sqlalchemy import insert, select
+
+from fm_database.models.device import DeviceUpdate, GrainbinUpdate
+from fm_database.series import (
+    SERIES_BUCKETS,
+    bucket_expression,
+    device_series,
+    grainbin_series,
+)
+
+from .factories import DeviceFactory, GrainbinFactory
+
+START = dt.datetime(2024, 1, 1, 10, 0)
+
+
+@pytest.mark.usefixtures("tables")
+class TestSeries:
+    """Tests for the time-bucketed aggregates of the updates."""
+
+    @staticmethod
+    def test_bucket_expression(dbsession):
+        """Test the start of each bucket of a timestamp on a Wednesday."""
+
+        timestamp = dt.datetime(2024, 7, 17, 10, 35, 12, 500)
+        dialect = dbsession.get_bind().dialect.name
+        buckets = {
+            bucket: dbsession.scalar(
+                select(bucket_expression(dialect, bucket, timestamp))
+            )
+            for bucket in SERIES_BUCKETS
+        }
+
+        assert buckets == {
+            "minute": dt.datetime(2024, 7, 17, 10, 35),
+            "hour": dt.datetime(2024, 7, 17, 10),
+            "day": dt.datetime(2024, 7, 17),
+            "week": dt.datetime(2024, 7, 15),
+            "month": dt.datetime(2024, 7, 1),
+        }
+        with pytest.raises(ValueError):
+            bucket_expression(dialect, "year", timestamp)
+
+    @staticmethod
+    def test_device_series(dbsession):
+        """Test the hourly aggregates of a device column."""
+
+        device = DeviceFactory()
+        other = DeviceFactory()
+        dbsession.commit()
+        rows = [
+            {
+                "device_id": device_id,
+                "timestamp": START + dt.timedelta(minutes=20 * number),
+                "update_index": number,
+                "interior_temp": None if number == 1 else 10.0 + number,
+            }
+            for number in range(6)
+            for device_id in (device.id, other.id)
+        ]
+        dbsession.execute(insert(DeviceUpdate), rows)
+        dbsession.commit()
+
+        series = dbsession.execute(
+            device_series(
+                dbsession,
+                device.id,
+                "interior_temp",
+                START,
+                START + dt.timedelta(days=1),
+            )
+        ).all()
+
+        assert [tuple(row) for row in series] == [
+            (START, 11.0, 10.0, 12.0, 2),
+            (START + dt.timedelta(hours=1), 14.0, 13.0, 15.0, 3),
+        ]
+        with pytest.raises(ValueError):
+            device_series(dbsession, device.id, "uptime", START, START)
+
+    @staticmethod
+    def test_grainbin_series(dbsession):
+        """Test the daily aggregates of a grainbin, by sensor and for the bin."""
+
+        grainbin = GrainbinFactory()
+        dbsession.commit()
+        rows = [
+            {
+                "grainbin_id": grainbin.id,
+                "timestamp": START + dt.timedelta(hours=10 * number),
+                "update_index": number,
+                "sensor_name": f"28.{sensor}",
+                "temperature": 20.0 + number + sensor,
+                "temphigh": 1,
+                "templow": sensor,
+            }
+            for number in range(4)
+            for sensor in (1, 2)
+        ]
+        dbsession.execute(insert(GrainbinUpdate), rows)
+        dbsession.commit()
+        end = START + dt.timedelta(days=7)
+
+        by_sensor = dbsession.execute(
+            grainbin_series(
+                dbsession, grainbin.id, START, end, bucket="day", aggregates=("max",)
+            )
+        ).all()
+        whole_bin = dbsession.execute(
+            grainbin_series(dbsession, grainbin.id, START, end, by_sensor=False)
+        ).all()
+
+        day = dt.datetime(2024, 1, 1)
+        assert [tuple(row) for row in by_sensor] == [
+            (day, 1, 1, 22.0),
+            (day, 1, 2, 23.0),
+            (day + dt.timedelta(days=1), 1, 1, 24.0),
+            (day + dt.timedelta(days=1), 1, 2, 25.0),
+        ]
+        assert len(whole_bin) == 4
+        assert whole_bin[0].bucket == START
+        assert whole_bin[0].avg == 21.5
+        assert whole_bin[0].count == 2
+
+    @staticmethod
+    def test_series_invalid_aggregate(dbsession):
+        """Test that an unknown aggregate raises a ValueError."""
+
+        with pytest.raises(ValueError):
+            grainbin_series(dbsession, 1, START, START, aggregates=("median",))
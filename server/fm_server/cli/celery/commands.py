@@ -1,13 +1,86 @@
 """Click commands for Celery."""
 
-from subprocess import run
+import datetime as dt
+import os
+import shlex
+import socket
+import statistics
+import time
+from subprocess import DEVNULL, Popen, run
 
 import click
+from celery.result import ResultSet
+from fm_database.database import get_session
+from fm_database.models.device import Device, Grainbin, GrainbinUpdate
+from sqlalchemy import delete, select
 
+from fm_server.celery_runner import app
+from fm_server.settings import CeleryConfig, get_config
 
-@click.command()
-def run_worker():
-    """Run the Celery worker."""
+WORKER_POOLS = ["prefork", "threads", "solo"]
+
+BENCHMARK_DEVICE_ID = "fm-worker-benchmark"
+BENCHMARK_QUEUE = "benchmark"
+# run-worker options of the configurations benchmarked by default.
+BENCHMARK_CONFIGURATIONS = (
+    "--pool solo",
+    "--pool prefork --concurrency 4",
+    "--pool prefork --concurrency 4 --prefetch-multiplier 1 --acks-late",
+    "--pool threads --concurrency 16",
+)
+
+
+# pylint: disable=unused-argument
+def parse_queues(ctx, param, value: str | None) -> list[str] | None:
+    """Split a comma separated list of queues and check that each one exists."""
+
+    if value is None:
+        return None
+    queues = [queue.strip() for queue in value.split(",") if queue.strip()]
+    known_queues = [queue.name for queue in CeleryConfig.task_queues]
+    for queue in queues:
+        if queue not in known_queues:
+            raise click.BadParameter(
+                f"unknown queue '{queue}', choose from {', '.join(known_queues)}"
+            )
+    return queues
+
+
+# run-worker options and the settings they default to.
+WORKER_SETTINGS = {
+    "queues": "CELERY_WORKER_QUEUES",
+    "prefetch_multiplier": "CELERY_WORKER_PREFETCH_MULTIPLIER",
+    "pool": "CELERY_WORKER_POOL",
+    "concurrency": "CELERY_WORKER_CONCURRENCY",
+    "autoscale_min": "CELERY_WORKER_AUTOSCALE_MIN",
+    "autoscale_max": "CELERY_WORKER_AUTOSCALE_MAX",
+    "max_tasks_per_child": "CELERY_WORKER_MAX_TASKS_PER_CHILD",
+    "beat": "CELERY_WORKER_BEAT",
+}
+
+
+def build_worker_command(
+    hostname: str | None = None, acks_late: bool | None = None, **options
+) -> tuple[list[str], dict[str, str]]:
+    """Return the celery worker command and its environment.
+
+    options are the run-worker options; those that are None are taken from the
+    settings.
+    """
+
+    config = get_config()
+
+    for option, setting in WORKER_SETTINGS.items():
+        if options.get(option) is None:
+            options[option] = getattr(config, setting)
+    pool = options["pool"]
+    concurrency = options["concurrency"]
+
+    # the buffered ingest mode needs many tasks waiting on the buffer at once
+    if config.INGEST_MODE == "buffered" and pool is None:
+        pool = "threads"
+        if concurrency is None:
+            concurrency = config.INGEST_WORKER_THREADS
 
     celery_worker_command = [
         "celery",
@@ -16,6 +89,274 @@ def run_worker():
         "worker",
         "-l",
         "INFO",
+        "--queues",
+        ",".join(options["queues"]),
+        "--prefetch-multiplier",
+        str(options["prefetch_multiplier"]),
+    ]
+
+    optional_options = {
+        # each worker needs a unique node name when several run on one host
+        "--hostname": hostname,
+        "--pool": pool,
+        "--concurrency": concurrency,
+        "--max-tasks-per-child": options["max_tasks_per_child"],
+    }
+    for name, value in optional_options.items():
+        if value is not None:
+            celery_worker_command.extend([name, str(value)])
+
+    celery_worker_command.extend(
+        _autoscale_option(pool, options["autoscale_min"], options["autoscale_max"])
+    )
+    if options["beat"]:
+        celery_worker_command.append("--beat")
+
+    # acks_late is read by CeleryConfig when the worker starts
+    worker_env = dict(os.environ)
+    if acks_late is not None:
+        worker_env["FM_SERVER_CELERY_ACKS_LATE"] = str(acks_late).lower()
+
+    return celery_worker_command, worker_env
+
+
+def _autoscale_option(
+    pool: str | None, autoscale_min: int | None, autoscale_max: int | None
+) -> list[str]:
+    """Return the celery autoscale option, or an empty list if it is not set."""
+
+    if autoscale_min is None and autoscale_max is None:
+        return []
+    if autoscale_min is None or autoscale_max is None:
+        raise click.UsageError("Autoscaling needs both a minimum and a maximum.")
+    if autoscale_min > autoscale_max:
+        raise click.UsageError(
+            "The autoscale minimum is larger than the autoscale maximum."
+        )
+    if pool not in (None, "prefork"):
+        raise click.UsageError("Autoscaling is only supported by the prefork pool.")
+    return ["--autoscale", f"{autoscale_max},{autoscale_min}"]
+
+
+@click.command()
+@click.option(
+    "-Q",
+    "--queues",
+    callback=parse_queues,
+    help="Comma separated list of queues to consume (default: all queues).",
+)
+@click.option(
+    "--prefetch-multiplier",
+    type=click.IntRange(min=1),
+    help="Number of messages each worker process reserves at a time.",
+)
+@click.option("-n", "--hostname", help="Node name of the worker, e.g. 'ingest@%h'.")
+@click.option("-P", "--pool", type=click.Choice(WORKER_POOLS), help="Worker pool.")
+@click.option(
+    "-c",
+    "--concurrency",
+    type=click.IntRange(min=1),
+    help="Number of worker processes or threads.",
+)
+@click.option(
+    "--autoscale-min",
+    type=click.IntRange(min=0),
+    help="Minimum number of prefork processes when autoscaling.",
+)
+@click.option(
+    "--autoscale-max",
+    type=click.IntRange(min=1),
+    help="Maximum number of prefork processes when autoscaling.",
+)
+@click.option(
+    "--max-tasks-per-child",
+    type=click.IntRange(min=1),
+    help="Replace a prefork process after it has run this many tasks.",
+)
+@click.option(
+    "--acks-late/--no-acks-late",
+    default=None,
+    help="Acknowledge messages after the task has run.",
+)
+@click.option(
+    "-B/--no-beat",
+    "--beat",
+    default=None,
+    help="Run the scheduler of the periodic tasks. Enable on one worker only.",
+)
+def run_worker(**options):
+    """Run the Celery worker.
+
+    Options that are not given are read from the FM_SERVER_CELERY_* settings.
+    """
+
+    celery_worker_command, worker_env = build_worker_command(**options)
+
+    run(celery_worker_command, check=True, env=worker_env)
+
+
+@click.command()
+@click.option(
+    "--messages",
+    default=500,
+    show_default=True,
+    help="Number of grainbin updates sent to each configuration.",
+)
+@click.option(
+    "--sensors",
+    default=12,
+    show_default=True,
+    help="Number of sensor readings in each grainbin update.",
+)
+@click.option(
+    "--configuration",
+    "configurations",
+    multiple=True,
+    help="run-worker options of a configuration, e.g. '--pool threads -c 8'. "
+    "Can be repeated (default: a set of common configurations).",
+)
+def benchmark_worker(messages, sensors, configurations):
+    """Benchmark worker configurations with a synthetic grainbin workload.
+
+    A worker is started on a private queue for each configuration and sent the
+    same number of grainbin updates. The throughput and the latency between
+    sending a task and receiving its result are printed. Needs the broker and
+    the database. A temporary device is created for the benchmark and deleted,
+    along with all of the rows that were written, when it is done.
+    """
+
+    session = get_session()
+    session.add(Device(BENCHMARK_DEVICE_ID, "0.0", "0.0"))
+    session.commit()
+
+    try:
+        for number, configuration in enumerate(
+            configurations or BENCHMARK_CONFIGURATIONS
+        ):
+            # every update needs its own timestamp, or it is dropped as a duplicate
+            created_at = dt.datetime(2020, 1, 1) + dt.timedelta(days=number)
+            latencies, elapsed, failed = _benchmark_configuration(
+                configuration, messages, sensors, created_at
+            )
+            summary = summarise_latencies(latencies, elapsed)
+            click.echo(
+                f"{configuration}: {len(latencies)} tasks in {elapsed:.2f}s "
+                f"({summary['throughput']:,.1f} tasks/sec), "
+                f"p50 {summary['p50_ms']:.1f} ms, p99 {summary['p99_ms']:.1f} ms, "
+                f"{failed} failed"
+            )
+    finally:
+        session.rollback()
+        grainbin_ids = select(Grainbin.id).where(
+            Grainbin.device_id_str == BENCHMARK_DEVICE_ID
+        )
+        session.execute(
+            delete(GrainbinUpdate).where(GrainbinUpdate.grainbin_id.in_(grainbin_ids))
+        )
+        session.execute(
+            delete(Grainbin).where(Grainbin.device_id_str == BENCHMARK_DEVICE_ID)
+        )
+        session.execute(delete(Device).where(Device.device_id == BENCHMARK_DEVICE_ID))
+        session.commit()
+
+
+def summarise_latencies(latencies: list[float], elapsed: float) -> dict:
+    """Return the throughput and the p50 and p99 latency in milliseconds."""
+
+    if not latencies:
+        return {"throughput": 0.0, "p50_ms": 0.0, "p99_ms": 0.0}
+    if len(latencies) == 1:
+        percentiles = latencies * 99
+    else:
+        percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": percentiles[49] * 1000,
+        "p99_ms": percentiles[98] * 1000,
+    }
+
+
+def benchmark_info(sensors: int, created_at: dt.datetime) -> dict:
+    """Return a synthetic grainbin update message of the benchmark device."""
+
+    sensor_data = [
+        {
+            "sensor_name": f"28.{sensor:010d}",
+            "temperature": "20.5",
+            "temphigh": "30",
+            "templow": "10",
+        }
+        for sensor in range(sensors)
     ]
+    return {
+        "created_at": created_at.isoformat(sep=" "),
+        "name": f"{BENCHMARK_DEVICE_ID}.01",
+        "bus_number": "1",
+        "bus_number_string": "bus.1",
+        "sensor_names": [sensor["sensor_name"] for sensor in sensor_data],
+        "sensor_data": sensor_data,
+        "average_temp": "20.5",
+    }
+
+
+def _benchmark_configuration(configuration, messages, sensors, created_at):
+    """Run the workload against one worker configuration.
+
+    Returns the task latencies, the elapsed time and the number of failed tasks.
+    """
+
+    hostname = f"fm-benchmark@{socket.gethostname()}"
+    context = run_worker.make_context("run-worker", shlex.split(configuration))
+    options = {
+        **context.params,
+        "queues": [BENCHMARK_QUEUE],
+        "hostname": hostname,
+        "beat": False,
+    }
+    celery_worker_command, worker_env = build_worker_command(**options)
+
+    with Popen(celery_worker_command, env=worker_env, stdout=DEVNULL) as worker:
+        try:
+            _wait_for_worker(worker, hostname)
+            return _send_workload(messages, sensors, created_at)
+        finally:
+            worker.terminate()
+
+
+def _send_workload(messages, sensors, created_at):
+    """Send the grainbin updates and wait for all of their results."""
+
+    sent_at = {}
+    results = []
+    start = time.perf_counter()
+    for number in range(messages):
+        info = benchmark_info(sensors, created_at + dt.timedelta(minutes=number))
+        result = app.send_task("grainbin.update", args=[info], queue=BENCHMARK_QUEUE)
+        sent_at[result.id] = time.perf_counter()
+        results.append(result)
+
+    latencies = []
+    failed = 0
+
+    def on_result(task_id, value):
+        nonlocal failed
+        latencies.append(time.perf_counter() - sent_at[task_id])
+        if value is not True:
+            failed += 1
+
+    ResultSet(results).join_native(
+        callback=on_result, propagate=False, timeout=messages * 10
+    )
+    return latencies, time.perf_counter() - start, failed
+
+
+def _wait_for_worker(worker, hostname, timeout=60):
+    """Wait until the benchmark worker answers a ping."""
 
-    run(celery_worker_command, check=True)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if worker.poll() is not None:
+            raise click.ClickException("The benchmark worker exited on start up.")
+        if app.control.ping(destination=[hostname], timeout=1):
+            return
+    raise click.ClickException("The benchmark worker did not start.")
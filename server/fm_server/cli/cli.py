@@ -17,6 +17,7 @@ def entry_point():
 entry_point.add_command(device_commands.device)
 
 entry_point.add_command(celery_commands.run_worker)
+entry_point.add_command(celery_commands.benchmark_worker)
 
 entry_point.add_command(manage_commands.run)
 entry_point.add_command(setup_commands.first_setup)
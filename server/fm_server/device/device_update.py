@@ -21,70 +21,184 @@ info: {
 """
 
 from celery.utils.log import get_task_logger
-from fm_database.database import get_session
+from fm_database.database import (
+    allocate_update_index,
+    get_session,
+    insert_on_conflict_do_nothing,
+    upsert,
+)
 from fm_database.models.device import Device, DeviceUpdate
+from fm_database.rollups import add_device_rollups
 from pydantic import ValidationError
-from sqlalchemy import select
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from fm_server.ingest.buffer import get_ingest_buffer
+from fm_server.ingest.cache import get_device_cache
+from fm_server.ingest.dedup import get_recent_device_updates
+from fm_server.ingest.live import device_event, queue_live_event
+from fm_server.settings import get_config
 
 from .info_model import DeviceUpdate as DeviceUpdateModel
+from .info_model import validate_device_update
 
 LOGGER = get_task_logger("fm.device.tasks")
 
+# the unique columns that identify a device in an upsert.
+DEVICE_KEY = ["device_id"]
+# the unique columns that identify a device update.
+DEVICE_UPDATE_KEY = ["device_id", "timestamp"]
+
 
 def process_device_update(info: dict) -> bool:
-    """Process a device update."""
+    """Process a device update.
 
-    session = get_session()
+    In the default 'immediate' ingest mode the update is committed in its own
+    transaction. In the 'buffered' ingest mode the update is handed to the
+    ingest buffer and this blocks until the batch it is part of is committed.
+    An update that was stored recently (a redelivered message) is skipped.
+    """
 
     try:
-        update_data = DeviceUpdateModel.model_validate(info)
+        update_data = validate_device_update(info)
     except ValidationError as error:
         LOGGER.error(f"Invalid device update: {str(error)}")
         return False
 
-    device = get_or_create_device(
-        update_data.id,
-        update_data.data.hardware_version,
-        update_data.data.software_version,
-    )
+    recent_updates = get_recent_device_updates()
+    key = (update_data.id, update_data.created_at)
+    if recent_updates.seen(key):
+        LOGGER.info(f"Skipping duplicate device update {key}")
+        return True
 
-    device.hardware_version = update_data.data.hardware_version
-    device.software_version = update_data.data.software_version
-    device.grainbin_count = update_data.data.grainbin_count
-    device.last_update_received = update_data.created_at
-    device.total_updates += 1
-    session.add(device)
+    if get_config().INGEST_MODE == "buffered":
+        saved = get_ingest_buffer().submit(save_device_update, update_data, 1)
+    else:
+        session = get_session()
+        saved = save_device_update(session, update_data)
+        session.commit()
+
+    if saved:
+        recent_updates.add(key)
+    return saved
+
+
+def save_device_update(session: Session, update_data: DeviceUpdateModel) -> bool:
+    """Add a validated device update to the session without committing it.
+
+    The update_index is allocated with one atomic UPDATE of the device, so
+    concurrent workers never give two updates the same index. If the primary
+    key of the device is cached, no lookup query is needed. Otherwise the device
+    is created or updated with a single upsert statement.
+    """
+
+    values = {
+        "hardware_version": update_data.data.hardware_version,
+        "software_version": update_data.data.software_version,
+        "grainbin_count": update_data.data.grainbin_count,
+        "last_update_received": update_data.created_at,
+    }
+
+    cache = get_device_cache()
+    device_pk = cache.get(update_data.id)
+    update_index = None
+    if device_pk is not None:
+        update_index = allocate_update_index(
+            session, Device, device_pk, Device.device_id == update_data.id, **values
+        )
+        if update_index is None:
+            # the device was deleted or re-keyed by another process.
+            cache.invalidate(update_data.id)
+
+    if device_pk is None or update_index is None:
+        # create the device, or update it, and allocate the index in one statement.
+        device = Device(
+            update_data.id,
+            update_data.data.hardware_version,
+            update_data.data.software_version,
+        )
+        for key, value in values.items():
+            setattr(device, key, value)
+        device.total_updates = 1
+        device = upsert(
+            session,
+            device,
+            DEVICE_KEY,
+            {
+                **values,
+                "total_updates": Device.total_updates + 1,
+                # the ORM onupdate does not apply to ON CONFLICT DO UPDATE
+                "last_updated": func.now(),  # pylint: disable=not-callable
+            },
+        )
+        device_pk, update_index = device.id, device.total_updates
+        cache.set(update_data.id, device_pk)
+
+    temperatures = {
+        "interior_temp": update_data.data.interior_temp,
+        "exterior_temp": update_data.data.exterior_temp,
+    }
+    inserted = insert_on_conflict_do_nothing(
+        session,
+        DeviceUpdate,
+        [
+            {
+                "device_id": device_pk,
+                "timestamp": update_data.created_at,
+                "update_index": update_index,
+                **temperatures,
+            }
+        ],
+        DEVICE_UPDATE_KEY,
+    )
+    if not inserted:
+        # the update is stored already, the message was delivered again.
+        allocate_update_index(session, Device, device_pk, count=-1)
+        LOGGER.info(f"Skipping duplicate device update for device {update_data.id}")
+    else:
+        add_device_rollups(
+            session,
+            device_pk,
+            update_data.created_at,
+            update_data.data.interior_temp,
+            update_data.data.exterior_temp,
+        )
+        queue_live_event(
+            session,
+            device_event(
+                device_pk,
+                update_data.id,
+                update_index,
+                update_data.created_at,
+                temperatures,
+            ),
+        )
+        LOGGER.debug(f"New update {update_index} saved for device {update_data.id}")
 
-    new_device_update = DeviceUpdate(device.id)
-    new_device_update.timestamp = update_data.created_at
-    new_device_update.update_index = device.total_updates
-    new_device_update.interior_temp = update_data.data.interior_temp
-    new_device_update.exterior_temp = update_data.data.exterior_temp
+    return True
 
-    session.add(new_device_update)
-    session.commit()
 
-    LOGGER.debug(f"New update saved for device. {new_device_update}")
+def get_device_pk(session: Session, device_id: str) -> int | None:
+    """Return the primary key of a device, using the device cache."""
 
-    return True
+    cache = get_device_cache()
+    device_pk = cache.get(device_id)
+    if device_pk is None:
+        device_pk = session.scalar(
+            select(Device.id).where(Device.device_id == device_id)
+        )
+        if device_pk is not None:
+            cache.set(device_id, device_pk)
+    return device_pk
 
 
 def get_or_create_device(
     device_id: str, hardware_version: str, software_version: str
 ) -> Device:
-    """Get or create a device."""
-
-    session = get_session()
+    """Get or create a device with a single upsert statement."""
 
-    device = session.scalars(
-        select(Device).where(Device.device_id == device_id)
-    ).one_or_none()
-
-    if device is None:
-        LOGGER.debug(f"Creating new device {device_id}")
-        device = Device(device_id, hardware_version, software_version)
-        device.save()
-    else:
-        LOGGER.debug(f"Found existing device {device_id}")
+    device = Device(device_id, hardware_version, software_version)
+    device = upsert(get_session(), device, DEVICE_KEY)
+    LOGGER.debug(f"Got or created device {device_id}")
 
     return device
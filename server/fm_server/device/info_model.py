@@ -14,12 +14,15 @@ info: {
         "last_updated": "2020-01-01 00:00:00",
     },
 }
+
+validate_device_update() validates the decoded dictionary that the Celery task
+receives.
 """
 
 import logging
 from datetime import datetime
 
-from pydantic import BaseModel, ValidationInfo, field_validator
+from pydantic import BaseModel, TypeAdapter, ValidationInfo, field_validator
 
 LOGGER = logging.getLogger("fm.device.info_model")
 
@@ -55,3 +58,16 @@ class DeviceUpdate(BaseModel):
     id: str
     created_at: datetime
     data: DeviceUpdateData
+
+
+# building a validator is expensive, so the adapter is created once.
+_DEVICE_UPDATE_ADAPTER = TypeAdapter(DeviceUpdate)
+
+
+def validate_device_update(data: dict) -> DeviceUpdate:
+    """Validate a device update from the decoded message.
+
+    Raises a pydantic ValidationError if the update is not valid.
+    """
+
+    return _DEVICE_UPDATE_ADAPTER.validate_python(data)
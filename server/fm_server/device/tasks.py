@@ -9,13 +9,14 @@ from fm_database.models.message import Message
 
 from fm_server.celery_runner import app
 from fm_server.device.rabbitmq_messages import get_device_status
+from fm_server.ingest.routing import IngestTask
 
 from .device_update import process_device_update
 
 LOGGER = get_task_logger("fm.device.tasks")
 
 
-@app.task(name="device.update")
+@app.task(name="device.update", base=IngestTask)
 def device_update(info):
     """Celery task for device update messages."""
 
@@ -22,78 +22,224 @@ info: {
 """
 
 from celery.utils.log import get_task_logger
-from fm_database.database import get_session
-from fm_database.models.device import Device, Grainbin, GrainbinUpdate
+from fm_database.database import (
+    allocate_update_index,
+    get_session,
+    insert_on_conflict_do_nothing,
+    upsert,
+)
+from fm_database.latest import add_latest_readings
+from fm_database.models.device import Grainbin, GrainbinUpdate
+from fm_database.rollups import add_grainbin_rollups
 from pydantic import ValidationError
-from sqlalchemy import select
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from fm_server.device.device_update import get_device_pk
+from fm_server.ingest.buffer import get_ingest_buffer
+from fm_server.ingest.cache import get_grainbin_cache
+from fm_server.ingest.dedup import get_recent_grainbin_updates
+from fm_server.ingest.live import grainbin_event, queue_live_event
+from fm_server.settings import get_config
 
 from .info_model import GrainbinUpdate as GrainbinUpdateModel
+from .info_model import LeanGrainbinUpdate, validate_grainbin_update
 
 LOGGER = get_task_logger("fm.grainbin.tasks")
 
+# the unique columns that identify a grainbin in an upsert.
+GRAINBIN_KEY = ["device_id_str", "bus_number"]
+# a validated grainbin update, either the full model or the lean tuple.
+GrainbinUpdateData = GrainbinUpdateModel | LeanGrainbinUpdate
+
+# the unique columns that identify a reading of a grainbin update.
+GRAINBIN_UPDATE_KEY = ["grainbin_id", "timestamp", "sensor_name"]
+
 
 def process_grainbin_update(info: dict) -> bool:
-    """Process a grainbin update."""
+    """Process a grainbin update.
+
+    The update is validated in lean mode, so the sensor readings are plain
+    tuples that are turned straight into grainbin_update rows.
+
+    In the default 'immediate' ingest mode the update is committed in its own
+    transaction. In the 'buffered' ingest mode the update is handed to the
+    ingest buffer and this blocks until the batch it is part of is committed.
+    An update that was stored recently (a redelivered message) is skipped.
+    """
 
     try:
-        update_data = GrainbinUpdateModel.model_validate(info)
+        update_data = validate_grainbin_update(info, lean=True)
     except ValidationError as error:
         LOGGER.error(f"Invalid grainbin update: {str(error)}")
         return False
 
-    session = get_session()
+    recent_updates = get_recent_grainbin_updates()
+    key = (update_data.device_id, update_data.bus_number, update_data.created_at)
+    if recent_updates.seen(key):
+        LOGGER.info(f"Skipping duplicate grainbin update {key}")
+        return True
 
-    # Confirm the device exists
-    device = (
-        session.query(Device).filter_by(device_id=update_data.device_id).one_or_none()
-    )
-    if device is None:
-        LOGGER.error(f"Device '{update_data.device_id}' not found.")
-        session.close()
-        return False
+    if get_config().INGEST_MODE == "buffered":
+        saved = get_ingest_buffer().submit(
+            save_grainbin_update, update_data, len(update_data.sensor_data)
+        )
+    else:
+        session = get_session()
+        saved = save_grainbin_update(session, update_data)
+        if saved:
+            session.commit()
+        else:
+            session.close()
+
+    if saved:
+        recent_updates.add(key)
+    return saved
+
+
+def save_grainbin_update(session: Session, update_data: GrainbinUpdateData) -> bool:
+    """Add a validated grainbin update to the session without committing it.
+
+    The update_index is allocated with one atomic UPDATE of the grainbin, so
+    concurrent workers never give two updates the same index. If the primary
+    key of the grainbin is cached, no lookup queries are needed. Otherwise the
+    grainbin is created or updated with a single upsert statement.
+    """
+
+    cache = get_grainbin_cache()
+    key = (update_data.device_id, update_data.bus_number)
+    grainbin_id = cache.get(key)
+    update_index = None
+    if grainbin_id is not None:
+        update_index = allocate_update_index(
+            session,
+            Grainbin,
+            grainbin_id,
+            Grainbin.device_id_str == update_data.device_id,
+            Grainbin.bus_number == update_data.bus_number,
+            average_temp=update_data.average_temp,
+        )
+        if update_index is None:
+            # the grainbin was deleted or re-keyed by another process.
+            cache.invalidate(key)
+
+    if grainbin_id is None or update_index is None:
+        # Confirm the device exists
+        if get_device_pk(session, update_data.device_id) is None:
+            LOGGER.error(f"Device '{update_data.device_id}' not found.")
+            return False
+
+        # create the grainbin, or update it, and allocate the index in one statement.
+        grainbin = new_grainbin(
+            update_data.device_id, update_data.bus_number, update_data.bus_number_string
+        )
+        grainbin.total_updates = 1
+        grainbin.average_temp = update_data.average_temp
+        grainbin = upsert(
+            session,
+            grainbin,
+            GRAINBIN_KEY,
+            {
+                "total_updates": Grainbin.total_updates + 1,
+                "average_temp": update_data.average_temp,
+                # the ORM onupdate does not apply to ON CONFLICT DO UPDATE
+                "last_updated": func.now(),  # pylint: disable=not-callable
+            },
+        )
+        grainbin_id, update_index = grainbin.id, grainbin.total_updates
+        cache.set(key, grainbin_id)
+
+    rows = grainbin_update_rows(grainbin_id, update_index, update_data)
+    inserted = add_grainbin_readings(session, rows)
+    if rows and not inserted:
+        # every reading is stored already, the message was delivered again.
+        allocate_update_index(session, Grainbin, grainbin_id, count=-1)
+        LOGGER.info(f"Skipping duplicate grainbin update for grainbin {grainbin_id}")
+    else:
+        # only the readings that were inserted have an id
+        inserted_rows = [row for row in rows if "id" in row]
+        add_grainbin_rollups(session, inserted_rows)
+        add_latest_readings(session, inserted_rows)
+        queue_live_event(
+            session,
+            grainbin_event(grainbin_id, update_data.device_id, update_index, rows),
+        )
 
-    grainbin = get_or_create_grainbin(
-        update_data.device_id, update_data.bus_number, update_data.bus_number_string
-    )
-    session.add(grainbin)
+    return True
 
-    grainbin.total_updates += 1
-    grainbin.average_temp = update_data.average_temp
 
-    for sensor in update_data.sensor_data:
-        grainbin_update = GrainbinUpdate(grainbin.id)
-        grainbin_update.timestamp = update_data.created_at
-        grainbin_update.update_index = grainbin.total_updates
-        grainbin_update.sensor_name = sensor.sensor_name
-        grainbin_update.temperature = sensor.temperature
-        grainbin_update.temphigh = sensor.temphigh
-        grainbin_update.templow = sensor.templow
+def grainbin_update_rows(
+    grainbin_id: int, update_index: int, update_data: GrainbinUpdateData
+) -> list[dict]:
+    """Return the grainbin_update rows for each sensor reading of an update."""
+
+    return [
+        {
+            "grainbin_id": grainbin_id,
+            "timestamp": update_data.created_at,
+            "update_index": update_index,
+            "sensor_name": sensor.sensor_name,
+            "temperature": sensor.temperature,
+            "temphigh": sensor.temphigh,
+            "templow": sensor.templow,
+        }
+        for sensor in update_data.sensor_data
+    ]
+
+
+def add_grainbin_readings(
+    session: Session, rows: list[dict], use_orm: bool = False
+) -> int:
+    """Add the grainbin_update rows of the sensor readings of an update.
+
+    By default the rows are written with a single Core level ``insert`` that is
+    executed with a list of parameters (executemany). On PostgreSQL this is
+    batched into multi-row INSERT statements (insertmanyvalues), and no ORM
+    objects are created or tracked by the session. Readings that are stored
+    already are skipped, and the id of each inserted row is set in its dict.
+    Returns the number of rows written.
+
+    If use_orm is True, a GrainbinUpdate ORM object is added to the session for
+    each row instead, the previous behaviour that the benchmarks compare with.
+    """
+
+    if use_orm:
+        grainbin_updates = []
+        for row in rows:
+            grainbin_update = GrainbinUpdate(row["grainbin_id"])
+            for key, value in row.items():
+                setattr(grainbin_update, key, value)
+            grainbin_updates.append(grainbin_update)
+        session.add_all(grainbin_updates)
+        LOGGER.debug("Added %s grainbin updates", len(grainbin_updates))
+        return len(grainbin_updates)
+
+    inserted: int = insert_on_conflict_do_nothing(
+        session, GrainbinUpdate, rows, GRAINBIN_UPDATE_KEY
+    )
+    if rows:
+        LOGGER.debug(
+            "Inserted %s grainbin updates for grainbin %s",
+            inserted,
+            rows[0]["grainbin_id"],
+        )
+    return inserted
 
-        LOGGER.debug(f"New grainbin update: {grainbin_update}")
-        session.add(grainbin_update)
 
-    session.commit()
+def new_grainbin(device_id: str, bus_number: int, bus_number_string: str) -> Grainbin:
+    """Return a new, transient grainbin."""
 
-    return True
+    grainbin = Grainbin(device_id_str=device_id, bus_number=bus_number)
+    grainbin.bus_number_string = bus_number_string
+    return grainbin
 
 
 def get_or_create_grainbin(
-    device_id: None | str, bus_number: int, bus_number_string: str
+    device_id: str, bus_number: int, bus_number_string: str
 ) -> Grainbin:
-    """Get or create a grainbin."""
-
-    session = get_session()
-    grainbin = session.scalars(
-        select(Grainbin)
-        .where(Grainbin.device_id_str == device_id)
-        .where(Grainbin.bus_number == bus_number)
-    ).one_or_none()
-
-    if grainbin is None:
-        grainbin = Grainbin(device_id_str=device_id, bus_number=bus_number)
-        grainbin.bus_number_string = bus_number_string
-        LOGGER.debug(f"Creating new grainbin: {grainbin}")
-        grainbin.save()
-    else:
-        LOGGER.debug(f"Found existing grainbin: {grainbin}")
+    """Get or create a grainbin with a single upsert statement."""
+
+    grainbin = new_grainbin(device_id, bus_number, bus_number_string)
+    grainbin = upsert(get_session(), grainbin, GRAINBIN_KEY)
+    LOGGER.debug(f"Got or created grainbin: {grainbin}")
     return grainbin
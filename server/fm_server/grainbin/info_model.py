@@ -15,12 +15,25 @@ info: {
     ],
     average_temp: "21.0",
 }
+
+validate_grainbin_update() validates the decoded dictionary that the Celery task
+receives. With lean=True the sensor readings are returned as plain tuples
+instead of a pydantic model per sensor, and the redundant sensor_names list is
+not validated.
 """
 
 import logging
 from datetime import datetime
+from typing import Literal, NamedTuple
 
-from pydantic import BaseModel, ValidationInfo, computed_field, field_validator
+from pydantic import (
+    BaseModel,
+    TypeAdapter,
+    ValidationInfo,
+    computed_field,
+    field_validator,
+)
+from typing_extensions import TypedDict
 
 LOGGER = logging.getLogger("fm.grainbin.info_model")
 
@@ -60,8 +73,95 @@ class GrainbinUpdate(BaseModel):
     sensor_data: list[GrainbinUpdateSensorData]
     average_temp: str
 
-    @computed_field  # type: ignore[misc]
+    @computed_field  # type: ignore[prop-decorator]
     @property
     def device_id(self) -> str:
         """Return the device_id."""
         return self.name.split(".")[0]
+
+
+class SensorReading(NamedTuple):
+    """A sensor reading of a lean grainbin update."""
+
+    sensor_name: str
+    temperature: float | None
+    temphigh: int
+    templow: int
+
+
+class LeanGrainbinUpdate(NamedTuple):
+    """A grainbin update validated in lean mode.
+
+    Has the same attributes as GrainbinUpdate (except sensor_names), so either
+    can be stored by the grainbin_update module.
+    """
+
+    created_at: datetime
+    name: str
+    device_id: str
+    bus_number: int
+    bus_number_string: str
+    sensor_data: list[SensorReading]
+    average_temp: str
+
+
+class _SensorDataDict(TypedDict):
+    """The sensor data of a message, validated without a model per sensor."""
+
+    sensor_name: str
+    temperature: float | Literal["U"] | None
+    temphigh: int
+    templow: int
+
+
+class _GrainbinUpdateDict(TypedDict):
+    """A grainbin update message, without the redundant sensor_names."""
+
+    created_at: datetime
+    name: str
+    bus_number: int
+    bus_number_string: str
+    sensor_data: list[_SensorDataDict]
+    average_temp: str
+
+
+# building a validator is expensive, so the adapters are created once.
+_GRAINBIN_UPDATE_ADAPTER = TypeAdapter(GrainbinUpdate)
+_LEAN_GRAINBIN_UPDATE_ADAPTER = TypeAdapter(_GrainbinUpdateDict)
+
+
+def validate_grainbin_update(
+    data: dict, lean: bool = False
+) -> GrainbinUpdate | LeanGrainbinUpdate:
+    """Validate a grainbin update from the decoded message.
+
+    Returns a GrainbinUpdate, or a LeanGrainbinUpdate if lean is True.
+    Raises a pydantic ValidationError if the update is not valid.
+    """
+
+    if not lean:
+        return _GRAINBIN_UPDATE_ADAPTER.validate_python(data)
+
+    update = _LEAN_GRAINBIN_UPDATE_ADAPTER.validate_python(data)
+
+    sensor_data = [
+        SensorReading(
+            sensor["sensor_name"],
+            None if sensor["temperature"] == "U" else sensor["temperature"],
+            sensor["temphigh"],
+            sensor["templow"],
+        )
+        for sensor in update["sensor_data"]
+    ]
+    if any(sensor.temperature is None for sensor in sensor_data):
+        LOGGER.warning(f"{update['name']} has temperatures of 'U'. Setting to None.")
+
+    return LeanGrainbinUpdate(
+        created_at=update["created_at"],
+        name=update["name"],
+        device_id=update["name"].split(".")[0],
+        bus_number=update["bus_number"],
+        bus_number_string=update["bus_number_string"],
+        sensor_data=sensor_data,
+        average_temp=update["average_temp"],
+    )
@@ -3,13 +3,14 @@
 from celery.utils.log import get_task_logger
 
 from fm_server.celery_runner import app
+from fm_server.ingest.routing import IngestTask
 
 from .grainbin_update import process_grainbin_update
 
 LOGGER = get_task_logger("fm.grainbin.tasks")
 
 
-@app.task(name="grainbin.update")
+@app.task(name="grainbin.update", base=IngestTask)
 def grainbin_update(info):
     """Celery task for grainbin update messages."""
 
@@ -0,0 +1 @@
+"""Shared infrastructure for storing device and grainbin updates."""
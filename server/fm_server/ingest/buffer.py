@@ -0,0 +1,255 @@
+"""
+Write-behind buffer for device and grainbin updates.
+
+Used by the 'buffered' ingest mode. Each update task validates its message and
+submits it to the buffer of its worker process. A flusher thread saves all the
+updates that are waiting in the buffer in one transaction, every
+INGEST_FLUSH_INTERVAL_MS milliseconds or once INGEST_FLUSH_ROWS rows are
+waiting, whichever comes first.
+
+submit() blocks until the batch the update is part of has been committed, so
+with late acknowledgement the message is only acked after its data is stored.
+The worker must run a thread pool (eg. '--pool threads') so that many tasks can
+wait on the buffer at the same time.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from fm_database.database import get_session
+from sqlalchemy.orm import Session
+
+from fm_server.settings import get_config
+
+LOGGER = logging.getLogger("fm.ingest.buffer")
+
+SaveFunction = Callable[[Session, Any], bool]
+
+
+@dataclass
+class PendingUpdate:
+    """An update that is waiting in the buffer to be saved."""
+
+    save_function: SaveFunction
+    update_data: Any
+    rows: int
+    enqueued_at: float = field(default_factory=time.monotonic)
+    done: threading.Event = field(default_factory=threading.Event)
+    result: bool = False
+    error: BaseException | None = None
+
+
+@dataclass
+class PendingBatch:
+    """The updates waiting in the buffer, and their number of rows."""
+
+    updates: list[PendingUpdate] = field(default_factory=list)
+    rows: int = 0
+
+
+@dataclass
+class FlushStats:
+    """The number of flushes and their size and latency."""
+
+    count: int = 0
+    updates: int = 0
+    last_size: int = 0
+    last_latency_ms: float = 0.0
+    max_latency_ms: float = 0.0
+    total_latency_ms: float = 0.0
+
+    def record(self, size: int, latency_ms: float) -> None:
+        """Add a flush of size updates that took latency_ms."""
+
+        self.count += 1
+        self.updates += size
+        self.last_size = size
+        self.last_latency_ms = latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        self.total_latency_ms += latency_ms
+
+
+class IngestBuffer:
+    """Bounded in-process buffer that saves updates in batched transactions."""
+
+    def __init__(
+        self,
+        flush_interval_ms: int,
+        flush_rows: int,
+        max_rows: int,
+        session_factory: Callable[[], Session] = get_session,
+    ):
+        """Create the buffer. The flusher thread is started on the first submit."""
+
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_rows = flush_rows
+        self.max_rows = max(max_rows, flush_rows)
+        self._session_factory = session_factory
+
+        self._pending = PendingBatch()
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+        self.flush_stats = FlushStats()
+
+    @property
+    def depth(self) -> int:
+        """The number of updates waiting in the buffer."""
+        return len(self._pending.updates)
+
+    @property
+    def depth_rows(self) -> int:
+        """The number of rows waiting in the buffer."""
+        return self._pending.rows
+
+    def stats(self) -> dict:
+        """Return the buffer depth and flush latency statistics."""
+
+        with self._condition:
+            flush_stats = self.flush_stats
+            return {
+                "depth": self.depth,
+                "depth_rows": self.depth_rows,
+                "max_rows": self.max_rows,
+                "flush_count": flush_stats.count,
+                "flushed_updates": flush_stats.updates,
+                "last_flush_size": flush_stats.last_size,
+                "last_flush_latency_ms": round(flush_stats.last_latency_ms, 3),
+                "max_flush_latency_ms": round(flush_stats.max_latency_ms, 3),
+                "avg_flush_latency_ms": (
+                    round(flush_stats.total_latency_ms / flush_stats.count, 3)
+                    if flush_stats.count
+                    else 0.0
+                ),
+            }
+
+    def submit(self, save_function: SaveFunction, update_data: Any, rows: int) -> bool:
+        """Add an update to the buffer and wait until it has been committed.
+
+        save_function is called with the session of the flusher thread and the
+        update_data. It must add the update to the session without committing.
+        Returns the return value of save_function. Exceptions raised while
+        saving the update are raised again here.
+        """
+
+        pending = PendingUpdate(save_function, update_data, rows)
+
+        with self._condition:
+            self._start()
+            # the buffer is bounded. Wait for a flush if it is full.
+            while self._pending.updates and self._pending.rows + rows > self.max_rows:
+                self._condition.wait()
+            self._pending.updates.append(pending)
+            self._pending.rows += rows
+            self._condition.notify_all()
+
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def close(self) -> None:
+        """Flush any waiting updates and stop the flusher thread."""
+
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _start(self) -> None:
+        """Start the flusher thread if it is not running. Hold the condition lock."""
+
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name="fm-ingest-flusher", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        """Flusher thread. Wait for a batch to be ready and save it."""
+
+        while True:
+            with self._condition:
+                while not self._pending.updates and not self._stopping:
+                    self._condition.wait()
+                if not self._pending.updates:
+                    return
+                deadline = self._pending.updates[0].enqueued_at + self.flush_interval
+                while self._pending.rows < self.flush_rows and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending.updates
+                self._pending = PendingBatch()
+                self._condition.notify_all()
+
+            self._flush(batch)
+
+    def _flush(self, batch: list[PendingUpdate]) -> None:
+        """Save a batch of updates in one transaction."""
+
+        start = time.perf_counter()
+        session = self._session_factory()
+        try:
+            for pending in batch:
+                pending.result = pending.save_function(session, pending.update_data)
+            session.commit()
+        # pylint: disable=broad-exception-caught
+        except Exception as error:  # noqa: B902
+            session.rollback()
+            LOGGER.warning(
+                f"Batch of {len(batch)} updates failed ({error}). "
+                "Saving each update in its own transaction."
+            )
+            self._flush_individually(session, batch)
+        finally:
+            session.close()
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        with self._condition:
+            self.flush_stats.record(len(batch), latency_ms)
+        LOGGER.debug("Flushed %s updates in %.1f ms", len(batch), latency_ms)
+
+        for pending in batch:
+            pending.done.set()
+
+    @staticmethod
+    def _flush_individually(session: Session, batch: list[PendingUpdate]) -> None:
+        """Save each update of a failed batch so one bad update does not fail the rest."""
+
+        for pending in batch:
+            try:
+                pending.result = pending.save_function(session, pending.update_data)
+                session.commit()
+            # pylint: disable=broad-exception-caught
+            except Exception as error:  # noqa: B902
+                session.rollback()
+                pending.result = False
+                pending.error = error
+
+
+_INGEST_BUFFER: IngestBuffer | None = None
+_INGEST_BUFFER_LOCK = threading.Lock()
+
+
+def get_ingest_buffer() -> IngestBuffer:
+    """Return the ingest buffer of this worker process, creating it when needed."""
+
+    global _INGEST_BUFFER  # pylint: disable=global-statement
+
+    with _INGEST_BUFFER_LOCK:
+        if _INGEST_BUFFER is None:
+            config = get_config()
+            _INGEST_BUFFER = IngestBuffer(
+                flush_interval_ms=config.INGEST_FLUSH_INTERVAL_MS,
+                flush_rows=config.INGEST_FLUSH_ROWS,
+                max_rows=config.INGEST_BUFFER_MAX_ROWS,
+            )
+        return _INGEST_BUFFER
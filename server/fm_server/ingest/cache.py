@@ -0,0 +1,201 @@
+"""
+Primary key caches for the ingest path.
+
+Every update names its device by device_id and its grainbin by
+(device_id, bus_number). These keys almost never change, so each worker
+process keeps a bounded LRU cache of the primary keys they resolve to:
+
+    device cache:   device_id -> Device.id
+    grainbin cache: (device_id, bus_number) -> Grainbin.id
+
+Entries are invalidated when a Device or Grainbin is deleted or re-keyed
+through the ORM in this process. Changes made by other processes (eg. the API)
+are not seen here. Code that uses a cached key must therefore check it while
+writing (eg. an UPDATE that matches on both the primary key and the key) and
+invalidate the entry if no row matched.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+from fm_database.models.device import Device, Grainbin
+from sqlalchemy import event, inspect
+
+from fm_server.settings import get_config
+
+
+class KeyCache:
+    """A thread safe, bounded LRU cache of primary keys with hit/miss counters."""
+
+    def __init__(self, name: str, max_size: int):
+        """Create the cache. A max_size of 0 disables the cache."""
+
+        self.name = name
+        self.max_size = max(0, max_size)
+        self._entries: OrderedDict[Hashable, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        """Return the number of cached entries."""
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> int | None:
+        """Return the primary key cached for key, or None."""
+
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: int) -> None:
+        """Cache the primary key for key, evicting the least recently used entry."""
+
+        if self.max_size == 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Remove the entry for key."""
+
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def invalidate_matching(self, predicate: Callable[[Hashable], bool]) -> None:
+        """Remove every entry whose key matches predicate."""
+
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters."""
+
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+
+    def stats(self) -> dict:
+        """Return the size and hit/miss counters of the cache."""
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+_CACHES: dict[str, KeyCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def _get_cache(name: str) -> KeyCache:
+    """Return the named cache of this worker process, creating it when needed."""
+
+    with _CACHES_LOCK:
+        if name not in _CACHES:
+            _CACHES[name] = KeyCache(name, get_config().INGEST_KEY_CACHE_SIZE)
+        return _CACHES[name]
+
+
+def get_device_cache() -> KeyCache:
+    """Return the device_id -> Device.id cache."""
+    return _get_cache("device")
+
+
+def get_grainbin_cache() -> KeyCache:
+    """Return the (device_id, bus_number) -> Grainbin.id cache."""
+    return _get_cache("grainbin")
+
+
+def key_cache_stats() -> dict:
+    """Return the statistics of all the key caches."""
+
+    return {
+        "device": get_device_cache().stats(),
+        "grainbin": get_grainbin_cache().stats(),
+    }
+
+
+def clear_key_caches() -> None:
+    """Remove all entries from the key caches and reset their counters."""
+
+    get_device_cache().clear()
+    get_grainbin_cache().clear()
+
+
+def _old_value(target, attribute: str):
+    """Return the value of attribute before the current flush, if it changed."""
+
+    history = inspect(target).attrs[attribute].history
+    if history.deleted:
+        return history.deleted[0]
+    return None
+
+
+def _invalidate_device(device_id: str) -> None:
+    """Invalidate a device and all of its grainbins."""
+
+    get_device_cache().invalidate(device_id)
+    get_grainbin_cache().invalidate_matching(
+        lambda key: isinstance(key, tuple) and key[0] == device_id
+    )
+
+
+# pylint: disable=unused-argument
+@event.listens_for(Device, "after_delete")
+def _device_deleted(mapper, connection, target: Device) -> None:
+    """Invalidate the cache entries of a deleted device."""
+
+    _invalidate_device(target.device_id)
+
+
+@event.listens_for(Device, "after_update")
+def _device_updated(mapper, connection, target: Device) -> None:
+    """Invalidate the cache entries of a device whose device_id changed."""
+
+    old_device_id = _old_value(target, "device_id")
+    if old_device_id is not None:
+        _invalidate_device(old_device_id)
+
+
+@event.listens_for(Grainbin, "after_delete")
+def _grainbin_deleted(mapper, connection, target: Grainbin) -> None:
+    """Invalidate the cache entry of a deleted grainbin."""
+
+    get_grainbin_cache().invalidate((target.device_id_str, target.bus_number))
+
+
+@event.listens_for(Grainbin, "after_update")
+def _grainbin_updated(mapper, connection, target: Grainbin) -> None:
+    """Invalidate the cache entry of a grainbin whose key changed."""
+
+    old_device_id = _old_value(target, "device_id_str")
+    old_bus_number = _old_value(target, "bus_number")
+    if old_device_id is not None or old_bus_number is not None:
+        get_grainbin_cache().invalidate(
+            (
+                old_device_id if old_device_id is not None else target.device_id_str,
+                old_bus_number if old_bus_number is not None else target.bus_number,
+            )
+        )
@@ -0,0 +1,32 @@
+"""
+Celery remote control commands for the ingest path.
+
+Imported by the Celery worker (see CeleryConfig.imports). The statistics of
+every worker can be read with:
+
+    celery --app fm_server.celery_runner inspect ingest_stats
+"""
+
+from celery.worker.control import inspect_command
+
+from fm_server.settings import get_config
+
+from .buffer import get_ingest_buffer
+from .cache import key_cache_stats
+from .dedup import recent_keys_stats
+
+
+# pylint: disable=unused-argument
+@inspect_command()
+def ingest_stats(state) -> dict:
+    """Return the ingest statistics of this worker."""
+
+    config = get_config()
+    stats: dict = {
+        "ingest_mode": config.INGEST_MODE,
+        "key_cache": key_cache_stats(),
+        "recent_updates": recent_keys_stats(),
+    }
+    if config.INGEST_MODE == "buffered":
+        stats["buffer"] = get_ingest_buffer().stats()
+    return stats
@@ -0,0 +1,113 @@
+"""
+Recent update filter for the ingest path.
+
+When a worker dies while it runs a task, the message is delivered again and
+the same update is processed a second time. The database rejects the second
+copy with a unique constraint on the natural key of each update:
+
+    device_update:   (device_id, timestamp)
+    grainbin_update: (grainbin_id, timestamp, sensor_name)
+
+Each worker process also remembers the keys of the updates it stored most
+recently, so most duplicates are dropped before they reach the database.
+A key is only remembered once its update has been committed.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Hashable
+
+from fm_server.settings import get_config
+
+
+class RecentKeys:
+    """A thread safe, bounded set of the most recently stored update keys."""
+
+    def __init__(self, name: str, max_size: int):
+        """Create the filter. A max_size of 0 disables the filter."""
+
+        self.name = name
+        self.max_size = max(0, max_size)
+        self._keys: OrderedDict[Hashable, None] = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def __len__(self) -> int:
+        """Return the number of remembered keys."""
+        return len(self._keys)
+
+    def seen(self, key: Hashable) -> bool:
+        """Return True, and count a rejected duplicate, if key was stored recently."""
+
+        with self._lock:
+            if key in self._keys:
+                self.rejected += 1
+                return True
+            return False
+
+    def add(self, key: Hashable) -> None:
+        """Remember key, forgetting the oldest key when full."""
+
+        if self.max_size == 0:
+            return
+        with self._lock:
+            self._keys[key] = None
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.max_size:
+                self._keys.popitem(last=False)
+
+    def clear(self) -> None:
+        """Forget all keys and reset the counter."""
+
+        with self._lock:
+            self._keys.clear()
+            self.rejected = 0
+
+    def stats(self) -> dict:
+        """Return the size and number of rejected duplicates."""
+
+        with self._lock:
+            return {
+                "size": len(self._keys),
+                "max_size": self.max_size,
+                "rejected": self.rejected,
+            }
+
+
+_FILTERS: dict[str, RecentKeys] = {}
+_FILTERS_LOCK = threading.Lock()
+
+
+def _get_filter(name: str) -> RecentKeys:
+    """Return the named filter of this worker process, creating it when needed."""
+
+    with _FILTERS_LOCK:
+        if name not in _FILTERS:
+            _FILTERS[name] = RecentKeys(name, get_config().INGEST_DEDUP_SIZE)
+        return _FILTERS[name]
+
+
+def get_recent_device_updates() -> RecentKeys:
+    """Return the (device_id, created_at) filter of device updates."""
+    return _get_filter("device")
+
+
+def get_recent_grainbin_updates() -> RecentKeys:
+    """Return the (device_id, bus_number, created_at) filter of grainbin updates."""
+    return _get_filter("grainbin")
+
+
+def recent_keys_stats() -> dict:
+    """Return the statistics of all the recent update filters."""
+
+    return {
+        "device": get_recent_device_updates().stats(),
+        "grainbin": get_recent_grainbin_updates().stats(),
+    }
+
+
+def clear_recent_keys() -> None:
+    """Forget all the recent update keys and reset their counters."""
+
+    get_recent_device_updates().clear()
+    get_recent_grainbin_updates().clear()
@@ -0,0 +1,127 @@
+"""
+Live events of the stored device and grainbin updates.
+
+The API streams new updates to dashboards as they are stored. Each update
+saved by the ingest path queues a compact event in the session it is saved
+with, and the events of a session are published to the RabbitMQ fanout
+exchange RABBITMQ_LIVE_EXCHANGE_NAME once the session commits. So an event is
+only published once its update is stored, in both ingest modes, and the events
+of a rolled back transaction are dropped.
+
+Events are best effort: they are not persisted, and an event that can not be
+published is logged and dropped.
+"""
+
+import logging
+from datetime import datetime
+from typing import Any
+
+from kombu import Exchange
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from fm_server.celery_runner import app
+from fm_server.settings import get_config
+
+LOGGER = logging.getLogger("fm.ingest.live")
+
+# the key of the queued events in Session.info
+_EVENTS_KEY = "live_events"
+
+
+def live_exchange() -> Exchange:
+    """Return the fanout exchange of the live events."""
+
+    return Exchange(
+        get_config().RABBITMQ_LIVE_EXCHANGE_NAME, type="fanout", durable=False
+    )
+
+
+def device_event(
+    device_pk: int,
+    device_id: str,
+    update_index: int,
+    timestamp: datetime,
+    values: dict[str, Any],
+) -> dict:
+    """Return the live event of a device update."""
+
+    return {
+        "type": "device",
+        "id": device_pk,
+        "device_id": device_id,
+        "update_index": update_index,
+        "timestamp": timestamp.isoformat(),
+        **values,
+    }
+
+
+def grainbin_event(
+    grainbin_id: int, device_id: str, update_index: int, rows: list[dict]
+) -> dict:
+    """Return the live event of a grainbin update from its grainbin_update rows."""
+
+    return {
+        "type": "grainbin",
+        "id": grainbin_id,
+        "device_id": device_id,
+        "update_index": update_index,
+        "timestamp": rows[0]["timestamp"].isoformat() if rows else None,
+        "readings": [
+            {
+                "sensor_name": row["sensor_name"],
+                "temperature": row["temperature"],
+                "temphigh": row["temphigh"],
+                "templow": row["templow"],
+            }
+            for row in rows
+        ],
+    }
+
+
+def queue_live_event(session: Session, live_event: dict) -> None:
+    """Queue an event to be published when session commits."""
+
+    if get_config().LIVE_EVENTS:
+        session.info.setdefault(_EVENTS_KEY, []).append(live_event)
+
+
+def publish_live_events(events: list[dict]) -> None:
+    """Publish events to the live exchange with a pooled broker connection."""
+
+    exchange = live_exchange()
+    try:
+        with app.producer_or_acquire() as producer:
+            for live_event in events:
+                producer.publish(
+                    live_event,
+                    exchange=exchange,
+                    routing_key="",
+                    serializer="json",
+                    declare=[exchange],
+                    retry=True,
+                    retry_policy={"max_retries": 1},
+                )
+    # pylint: disable=broad-exception-caught
+    except Exception as error:  # noqa: B902
+        LOGGER.warning(f"Could not publish {len(events)} live events ({error})")
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed_events(session: Session) -> None:
+    """Publish the events queued in a session once it has committed."""
+
+    events = session.info.pop(_EVENTS_KEY, None)
+    if events:
+        publish_live_events(events)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_rolled_back_events(session: Session, previous_transaction) -> None:
+    """Drop the events queued in a session that was rolled back.
+
+    The events are kept when only a savepoint was rolled back.
+    """
+
+    if not previous_transaction.nested:
+        session.info.pop(_EVENTS_KEY, None)
@@ -0,0 +1,34 @@
+"""
+Forwarding of the ingest tasks that devices publish to the default queue.
+
+The task routes of CeleryConfig only apply to the tasks that are sent with
+the server configuration. Devices publish every task, control and ingest
+alike, to the default 'celery' queue, so a device.create would wait behind a
+backlog of updates on that queue.
+
+The device and grainbin update tasks use IngestTask as their base. When one
+of them is delivered from the default queue, it is republished with the task
+routes of the server, ie. to the 'ingest' queue, instead of being processed.
+A worker that consumes the 'celery' queue then only forwards the updates
+ahead of a control task, which is much faster than storing them, and the
+updates are processed by the workers that consume the 'ingest' queue.
+"""
+
+from celery import Task
+from celery.utils.log import get_task_logger
+
+LOGGER = get_task_logger("fm.ingest.routing")
+
+
+class IngestTask(Task):  # pylint: disable=abstract-method
+    """A task that moves to its routed queue when it arrives on the default queue."""
+
+    def __call__(self, *args, **kwargs):
+        """Run the task, or forward it if it was delivered from the default queue."""
+
+        delivery_info = self.request.delivery_info or {}
+        if delivery_info.get("routing_key") == self.app.conf.task_default_queue:
+            LOGGER.debug(f"Forwarding {self.name} from the default queue")
+            self.apply_async(args, kwargs)
+            return None
+        return super().__call__(*args, **kwargs)
@@ -0,0 +1 @@
+"""Periodic database maintenance tasks."""
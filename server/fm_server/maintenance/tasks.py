@@ -0,0 +1,42 @@
+"""Maintenance tasks module.
+
+The tasks are run on a schedule by Celery beat (see CeleryConfig.beat_schedule).
+"""
+
+from celery.utils.log import get_task_logger
+from fm_database.database import engine
+from fm_database.retention import PruneResult, prune_all
+
+from fm_server.celery_runner import app
+from fm_server.settings import get_config
+
+LOGGER = get_task_logger("fm.maintenance.tasks")
+
+
+def log_progress(result: PruneResult) -> None:
+    """Log the rows deleted from a table so far."""
+
+    LOGGER.debug(
+        f"{result.table}: {result.deleted} rows deleted in {result.batches} "
+        f"batches ({result.rows_per_second:,.0f} rows/sec)"
+    )
+
+
+@app.task(name="maintenance.prune", soft_time_limit=get_config().RETENTION_TIME_LIMIT)
+def prune_old_rows():
+    """Celery task that deletes the rows older than the retention policies keep.
+
+    Each batch is committed, so a prune that runs out of time carries on where
+    it stopped on its next run.
+    """
+
+    deleted = {}
+    for result in prune_all(engine, progress=log_progress):
+        for name in result.dropped_partitions:
+            LOGGER.info(f"Dropped partition {name}")
+        LOGGER.info(
+            f"Pruned {result.deleted} rows from {result.table} in "
+            f"{result.elapsed:.1f}s ({result.rows_per_second:,.0f} rows/sec)"
+        )
+        deleted[result.table] = result.deleted
+    return deleted
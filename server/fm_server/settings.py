@@ -5,7 +5,9 @@
 import logging
 import os
 
+from celery.schedules import crontab
 from environs import Env
+from kombu import Queue
 
 env = Env()
 env.read_env()
@@ -18,7 +20,12 @@ class CeleryConfig:
     broker_url = "amqp://fm:farm_monitor@fm_rabbitmq/farm_monitor"
 
     # List of modules to import when the Celery worker starts.
-    imports = ("fm_server.device.tasks", "fm_server.grainbin.tasks")
+    imports = (
+        "fm_server.device.tasks",
+        "fm_server.grainbin.tasks",
+        "fm_server.ingest.control",
+        "fm_server.maintenance.tasks",
+    )
 
     # Using the database to store task state and results.
     result_backend = "rpc://"
@@ -28,6 +35,44 @@ class CeleryConfig:
     # retry forever
     broker_connection_max_retries = None
 
+    # Control tasks and ingest tasks use separate queues, so a control message is
+    # not stuck behind a backlog of updates. Devices do not use these routes and
+    # publish every task to the default 'celery' queue; the updates that arrive
+    # there are forwarded to the ingest queue (see fm_server.ingest.routing).
+    # The control and ingest queues support message priorities (0-10).
+    task_default_queue = "celery"
+    task_queues = (
+        Queue("control", routing_key="control", queue_arguments={"x-max-priority": 10}),
+        Queue("ingest", routing_key="ingest", queue_arguments={"x-max-priority": 10}),
+        Queue("celery", routing_key="celery"),
+    )
+    task_routes = {
+        "device.create": {"queue": "control", "priority": 9},
+        "device.update": {"queue": "ingest", "priority": 5},
+        "grainbin.update": {"queue": "ingest", "priority": 5},
+        "maintenance.prune": {"queue": "celery"},
+    }
+
+    # Periodic tasks, sent by the Celery beat scheduler of the one worker that
+    # is started with 'fm_server run-worker --beat'. Old rows are pruned daily
+    # at FM_SERVER_RETENTION_HOUR o'clock.
+    beat_schedule = {
+        "prune-old-rows": {
+            "task": "maintenance.prune",
+            "schedule": crontab(
+                hour=env.int("FM_SERVER_RETENTION_HOUR", default=3), minute=0
+            ),
+        },
+    }
+
+    # Acknowledge messages after the task has run instead of when it starts. The
+    # default is on in the 'buffered' ingest mode, where an update task only
+    # returns once the batch it is part of is committed.
+    task_acks_late = env.bool(
+        "FM_SERVER_CELERY_ACKS_LATE",
+        default=env.str("FM_SERVER_INGEST_MODE", default="immediate") == "buffered",
+    )
+
 
 class Config:
     """Base configuration."""
@@ -61,6 +106,67 @@ class Config:
     RABBITMQ_MESSAGES_EXCHANGE_NAME = "device_messages"
     RABBITMQ_MESSAGES_EXCHANGE_TYPE = "topic"
 
+    # The fanout exchange the stored device and grainbin updates are published
+    # to, for the live stream of the API.
+    RABBITMQ_LIVE_EXCHANGE_NAME = "live_updates"
+    LIVE_EVENTS = env.bool("FM_SERVER_LIVE_EVENTS", default=True)
+
+    # How the worker stores device and grainbin updates. Either 'immediate'
+    # (each update is committed in its own transaction) or 'buffered' (updates
+    # are held in an in-process buffer and committed together in one transaction).
+    INGEST_MODE = env.str("FM_SERVER_INGEST_MODE", default="immediate")
+    # The buffer is flushed every INGEST_FLUSH_INTERVAL_MS milliseconds or when it
+    # holds INGEST_FLUSH_ROWS rows, whichever comes first.
+    INGEST_FLUSH_INTERVAL_MS = env.int(
+        "FM_SERVER_INGEST_FLUSH_INTERVAL_MS", default=250
+    )
+    INGEST_FLUSH_ROWS = env.int("FM_SERVER_INGEST_FLUSH_ROWS", default=1000)
+    # Maximum number of rows held in the buffer. Further updates wait until the
+    # buffer is flushed.
+    INGEST_BUFFER_MAX_ROWS = env.int("FM_SERVER_INGEST_BUFFER_MAX_ROWS", default=5000)
+    # Number of worker threads used in 'buffered' mode. Each thread holds one
+    # update while it waits for the buffer to be flushed.
+    INGEST_WORKER_THREADS = env.int("FM_SERVER_INGEST_WORKER_THREADS", default=64)
+    # The queues a worker consumes and how many messages each worker process
+    # reserves at a time. Both can be overridden with run-worker options. A
+    # prefetch multiplier of 1 lets priorities take effect on a busy queue.
+    CELERY_WORKER_QUEUES = env.list(
+        "FM_SERVER_CELERY_WORKER_QUEUES", default=["control", "ingest", "celery"]
+    )
+    CELERY_WORKER_PREFETCH_MULTIPLIER = env.int(
+        "FM_SERVER_CELERY_WORKER_PREFETCH_MULTIPLIER", default=4
+    )
+    # The worker pool ('prefork', 'threads' or 'solo') and its size. Unset values
+    # use the Celery defaults (a prefork pool with a process per CPU), except in
+    # the 'buffered' ingest mode which uses a pool of INGEST_WORKER_THREADS threads.
+    # Autoscaling (prefork only) is enabled when both limits are set.
+    CELERY_WORKER_POOL = env.str("FM_SERVER_CELERY_WORKER_POOL", default=None)
+    CELERY_WORKER_CONCURRENCY = env.int(
+        "FM_SERVER_CELERY_WORKER_CONCURRENCY", default=None
+    )
+    CELERY_WORKER_AUTOSCALE_MIN = env.int(
+        "FM_SERVER_CELERY_WORKER_AUTOSCALE_MIN", default=None
+    )
+    CELERY_WORKER_AUTOSCALE_MAX = env.int(
+        "FM_SERVER_CELERY_WORKER_AUTOSCALE_MAX", default=None
+    )
+    # Replace a prefork worker process after it has run this many tasks.
+    CELERY_WORKER_MAX_TASKS_PER_CHILD = env.int(
+        "FM_SERVER_CELERY_WORKER_MAX_TASKS_PER_CHILD", default=None
+    )
+    # Run the Celery beat scheduler of the periodic tasks in the worker. Enable
+    # it on one worker only, or the periodic tasks are sent more than once.
+    CELERY_WORKER_BEAT = env.bool("FM_SERVER_CELERY_WORKER_BEAT", default=False)
+    # Number of seconds the daily prune of old rows may run. A prune that is
+    # stopped carries on with the next run.
+    RETENTION_TIME_LIMIT = env.int("FM_SERVER_RETENTION_TIME_LIMIT", default=3600)
+    # Number of device and grainbin primary keys each worker process keeps in its
+    # LRU caches. Set to 0 to disable the caches.
+    INGEST_KEY_CACHE_SIZE = env.int("FM_SERVER_INGEST_KEY_CACHE_SIZE", default=4096)
+    # Number of recently stored update keys each worker process remembers to drop
+    # redelivered messages before they reach the database. Set to 0 to disable.
+    INGEST_DEDUP_SIZE = env.int("FM_SERVER_INGEST_DEDUP_SIZE", default=10000)
+
 
 class DevConfig(Config):
     """Development configuration."""
@@ -84,6 +190,7 @@ class TestConfig(Config):
 
     DEBUG = True
     TESTING = True
+    LIVE_EVENTS = False
 
 
 def get_config(override_default=None):
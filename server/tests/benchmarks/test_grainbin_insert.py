@@ -0,0 +1,89 @@
+"""Micro-benchmark for inserting the sensor readings of grainbin updates.
+
+Compares adding an ORM object per reading (the previous behaviour) with the
+Core level executemany insert of add_grainbin_readings, which
+process_grainbin_update stores the readings with. Run with
+``pytest -s tests/benchmarks`` to see the rows/sec for each path. The number of
+messages can be increased with the FM_SERVER_BENCHMARK_MESSAGES env variable.
+"""
+
+import datetime as dt
+import os
+import time
+
+import pytest
+from fm_database.models.device import GrainbinUpdate
+from sqlalchemy import func, select
+
+from fm_server.grainbin.grainbin_update import (
+    add_grainbin_readings,
+    grainbin_update_rows,
+)
+from fm_server.grainbin.info_model import GrainbinUpdate as GrainbinUpdateModel
+
+from ..factories import GrainbinFactory
+
+MESSAGES = int(os.environ.get("FM_SERVER_BENCHMARK_MESSAGES", 20))
+CABLES = 6
+SENSORS_PER_CABLE = 12
+
+
+def build_update(
+    grainbin_info: dict,
+    created_at: dt.datetime,
+    sensors_per_cable: int = SENSORS_PER_CABLE,
+) -> GrainbinUpdateModel:
+    """Build a validated grainbin update with a reading for every sensor."""
+
+    sensor_data = [
+        {
+            "sensor_name": f"28.{cable:02d}{sensor:010d}",
+            "temperature": "20.5",
+            "temphigh": str(cable),
+            "templow": str(sensor),
+        }
+        for cable in range(CABLES)
+        for sensor in range(sensors_per_cable)
+    ]
+    return GrainbinUpdateModel.model_validate(
+        dict(
+            grainbin_info,
+            created_at=created_at.isoformat(sep=" "),
+            sensor_names=[sensor["sensor_name"] for sensor in sensor_data],
+            sensor_data=sensor_data,
+        )
+    )
+
+
+@pytest.mark.usefixtures("tables")
+@pytest.mark.parametrize("use_orm", [True, False], ids=["orm", "bulk"])
+def test_benchmark_add_grainbin_readings(dbsession, grainbin_info, use_orm):
+    """Print the rows/sec for adding the readings of a 6 x 12 sensor bin."""
+
+    grainbin = GrainbinFactory()
+    dbsession.commit()
+    # each update needs its own timestamp, or its readings are duplicates.
+    updates = [
+        build_update(
+            grainbin_info, dt.datetime(2020, 1, 1) + dt.timedelta(minutes=number)
+        )
+        for number in range(MESSAGES)
+    ]
+
+    start = time.perf_counter()
+    for update_index, update_data in enumerate(updates, start=1):
+        add_grainbin_readings(
+            dbsession,
+            grainbin_update_rows(grainbin.id, update_index, update_data),
+            use_orm,
+        )
+        dbsession.commit()
+    elapsed = time.perf_counter() - start
+
+    rows = MESSAGES * CABLES * SENSORS_PER_CABLE
+    label = "orm" if use_orm else "bulk"
+    print(f"\n{label}: {rows} rows in {elapsed:.3f}s ({rows / elapsed:,.0f} rows/sec)")
+
+    # pylint: disable=not-callable
+    stored = dbsession.scalar(select(func.count()).select_from(GrainbinUpdate))
+    assert stored == rows
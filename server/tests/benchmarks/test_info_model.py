@@ -0,0 +1,64 @@
+"""Micro-benchmark for validating grainbin update messages.
+
+Compares GrainbinUpdate.model_validate on the decoded dictionary (the previous
+behaviour) with validate_grainbin_update in full and lean mode. Run with
+``pytest -s tests/benchmarks`` to see the microseconds per message (best of 3
+runs) for each path.
+"""
+
+import os
+import timeit
+from functools import partial
+from typing import Any, Callable
+
+import pytest
+
+from fm_server.grainbin.info_model import GrainbinUpdate, validate_grainbin_update
+
+MESSAGES = int(os.environ.get("FM_SERVER_BENCHMARK_MESSAGES", 20)) * 10
+
+
+def build_info(grainbin_info: dict, sensors: int) -> dict:
+    """Build a grainbin update message with a reading for every sensor."""
+
+    sensor_data = [
+        {
+            "sensor_name": f"28.{sensor:010d}",
+            "temperature": "20.5",
+            "temphigh": "50",
+            "templow": "10",
+        }
+        for sensor in range(sensors)
+    ]
+    return dict(
+        grainbin_info,
+        sensor_names=[sensor["sensor_name"] for sensor in sensor_data],
+        sensor_data=sensor_data,
+    )
+
+
+PATHS: dict[str, Callable[[dict], Any]] = {
+    "model_validate": GrainbinUpdate.model_validate,
+    "adapter": validate_grainbin_update,
+    "lean": lambda info: validate_grainbin_update(info, lean=True),
+}
+
+
+@pytest.mark.parametrize("sensors", [10, 50, 100, 200])
+def test_benchmark_validate_grainbin_update(grainbin_info, sensors):
+    """Print the microseconds per message for each validation path."""
+
+    info = build_info(grainbin_info, sensors)
+    expected = GrainbinUpdate.model_validate(info)
+
+    print(f"\n{sensors} sensors:")
+    for label, validate in PATHS.items():
+        elapsed = min(timeit.repeat(partial(validate, info), number=MESSAGES, repeat=3))
+        print(f"  {label}: {elapsed / MESSAGES * 1e6:,.1f} us/message")
+
+        update = validate(info)
+
+        assert update.created_at == expected.created_at
+        assert [sensor.temperature for sensor in update.sensor_data] == [
+            sensor.temperature for sensor in expected.sensor_data
+        ]
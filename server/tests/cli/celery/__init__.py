@@ -0,0 +1 @@
+"""Tests for the celery cli module."""
@@ -0,0 +1,233 @@
+"""Test the celery commands module."""
+
+import pytest
+from click.testing import CliRunner
+from fm_database.models.device import Device
+from sqlalchemy import select
+
+from fm_server.celery_runner import app
+from fm_server.cli.celery import commands
+from fm_server.cli.celery.commands import (
+    BENCHMARK_DEVICE_ID,
+    benchmark_worker,
+    run_worker,
+    summarise_latencies,
+)
+from fm_server.settings import TestConfig
+
+
+@pytest.fixture(name="worker_command")
+def fixture_worker_command(monkeypatch):
+    """Capture the celery worker command instead of running it."""
+
+    captured: list[tuple[list[str], dict]] = []
+    monkeypatch.setattr(
+        commands, "run", lambda command, check, env: captured.append((command, env))
+    )
+    return captured
+
+
+def option(command: list[str], name: str) -> str:
+    """Return the value of an option of the worker command."""
+    return command[command.index(name) + 1]
+
+
+def test_run_worker_defaults(worker_command):
+    """Test that by default the worker consumes every queue."""
+
+    result = CliRunner().invoke(run_worker)
+
+    assert not result.exception
+    command, _ = worker_command[0]
+    assert option(command, "--queues") == "control,ingest,celery"
+    assert option(command, "--prefetch-multiplier") == "4"
+    assert "--hostname" not in command
+    assert "--pool" not in command
+    assert "--autoscale" not in command
+    assert "--beat" not in command
+
+
+def test_run_worker_queues(worker_command):
+    """Test that a worker can be dedicated to the control queue."""
+
+    result = CliRunner().invoke(
+        run_worker,
+        ["-Q", "control", "--prefetch-multiplier", "1", "-n", "control@%h"],
+    )
+
+    assert not result.exception
+    command, _ = worker_command[0]
+    assert option(command, "--queues") == "control"
+    assert option(command, "--prefetch-multiplier") == "1"
+    assert option(command, "--hostname") == "control@%h"
+
+
+def test_run_worker_unknown_queue(worker_command):
+    """Test that an unknown queue is rejected."""
+
+    result = CliRunner().invoke(run_worker, ["-Q", "ingest,readings"])
+
+    assert result.exit_code == 2
+    assert "unknown queue 'readings'" in result.output
+    assert not worker_command
+
+
+def test_run_worker_pool_options(worker_command):
+    """Test that the pool, autoscale and acks_late options are passed on."""
+
+    result = CliRunner().invoke(
+        run_worker,
+        [
+            "--pool",
+            "prefork",
+            "--autoscale-min",
+            "1",
+            "--autoscale-max",
+            "4",
+            "--max-tasks-per-child",
+            "100",
+            "--acks-late",
+        ],
+    )
+
+    assert not result.exception
+    command, env = worker_command[0]
+    assert option(command, "--pool") == "prefork"
+    assert option(command, "--autoscale") == "4,1"
+    assert option(command, "--max-tasks-per-child") == "100"
+    assert env["FM_SERVER_CELERY_ACKS_LATE"] == "true"
+
+
+def test_run_worker_settings(worker_command, monkeypatch):
+    """Test that options that are not given are read from the settings."""
+
+    monkeypatch.setattr(TestConfig, "CELERY_WORKER_POOL", "threads")
+    monkeypatch.setattr(TestConfig, "CELERY_WORKER_CONCURRENCY", 8)
+
+    result = CliRunner().invoke(run_worker, ["--concurrency", "2"])
+
+    assert not result.exception
+    command, env = worker_command[0]
+    assert option(command, "--pool") == "threads"
+    assert option(command, "--concurrency") == "2"
+    assert "FM_SERVER_CELERY_ACKS_LATE" not in env
+
+
+def test_run_worker_beat(worker_command, monkeypatch):
+    """Test that the beat scheduler runs in a worker when it is enabled."""
+
+    result = CliRunner().invoke(run_worker, ["--beat"])
+    monkeypatch.setattr(TestConfig, "CELERY_WORKER_BEAT", True)
+    result_setting = CliRunner().invoke(run_worker)
+    result_disabled = CliRunner().invoke(run_worker, ["--no-beat"])
+
+    assert not result.exception
+    assert not result_setting.exception
+    assert not result_disabled.exception
+    assert "--beat" in worker_command[0][0]
+    assert "--beat" in worker_command[1][0]
+    assert "--beat" not in worker_command[2][0]
+
+
+def test_run_worker_buffered_mode(worker_command, monkeypatch):
+    """Test that the buffered ingest mode defaults to a thread pool."""
+
+    monkeypatch.setattr(TestConfig, "INGEST_MODE", "buffered")
+
+    result = CliRunner().invoke(run_worker)
+
+    assert not result.exception
+    command, _ = worker_command[0]
+    assert option(command, "--pool") == "threads"
+    assert option(command, "--concurrency") == str(TestConfig.INGEST_WORKER_THREADS)
+
+
+@pytest.mark.parametrize(
+    "arguments, message",
+    [
+        (["--autoscale-max", "4"], "needs both a minimum and a maximum"),
+        (["--autoscale-min", "5", "--autoscale-max", "4"], "minimum is larger"),
+        (
+            ["-P", "threads", "--autoscale-min", "1", "--autoscale-max", "4"],
+            "only supported by the prefork pool",
+        ),
+    ],
+)
+def test_run_worker_invalid_autoscale(worker_command, arguments, message):
+    """Test that invalid autoscale options are rejected."""
+
+    result = CliRunner().invoke(run_worker, arguments)
+
+    assert result.exit_code == 2
+    assert message in result.output
+    assert not worker_command
+
+
+def test_summarise_latencies():
+    """Test the throughput and latency percentiles of a benchmark run."""
+
+    latencies = [number / 1000 for number in range(1, 101)]
+
+    summary = summarise_latencies(latencies, 2.0)
+
+    assert summary["throughput"] == 50
+    assert summary["p50_ms"] == pytest.approx(50.5)
+    assert summary["p99_ms"] == pytest.approx(99.01)
+
+
+@pytest.mark.usefixtures("tables")
+def test_benchmark_worker(dbsession, monkeypatch):
+    """Test that each configuration is reported and the device is removed."""
+
+    configurations = []
+
+    def benchmark_configuration(configuration, _messages, _sensors, created_at):
+        configurations.append((configuration, created_at))
+        device = dbsession.scalar(
+            select(Device).where(Device.device_id == BENCHMARK_DEVICE_ID)
+        )
+        assert device is not None
+        return [0.01, 0.02], 1.0, 0
+
+    monkeypatch.setattr(commands, "_benchmark_configuration", benchmark_configuration)
+
+    result = CliRunner().invoke(
+        benchmark_worker,
+        ["--configuration", "-P solo", "--configuration", "-P threads -c 8"],
+    )
+
+    assert not result.exception
+    assert "-P solo: 2 tasks in 1.00s (2.0 tasks/sec)" in result.output
+    assert "-P threads -c 8: 2 tasks" in result.output
+    # each configuration gets its own update timestamps
+    assert configurations[0][1] != configurations[1][1]
+    dbsession.expire_all()
+    assert dbsession.scalar(select(Device)) is None
+
+
+@pytest.mark.parametrize(
+    "task_name, queue, priority",
+    [
+        ("device.create", "control", 9),
+        ("device.update", "ingest", 5),
+        ("grainbin.update", "ingest", 5),
+    ],
+)
+def test_task_routes(task_name, queue, priority):
+    """Test that control and ingest tasks are routed to their own queues."""
+
+    route = app.amqp.router.route({}, task_name)
+
+    assert route["queue"].name == queue
+    assert route["priority"] == priority
+
+
+def test_prune_schedule():
+    """Test that old rows are pruned daily from the default queue."""
+
+    schedule = app.conf.beat_schedule["prune-old-rows"]
+    route = app.amqp.router.route({}, schedule["task"])
+
+    assert schedule["task"] == "maintenance.prune"
+    assert schedule["schedule"].hour == {3}
+    assert route["queue"].name == "celery"
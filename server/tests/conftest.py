@@ -9,6 +9,9 @@ from fm_database.models.system import SystemSetup
 from fm_database.models.user import User
 from sqlalchemy.orm import Session
 
+from fm_server.ingest.cache import clear_key_caches
+from fm_server.ingest.dedup import clear_recent_keys
+
 
 @pytest.fixture(scope="session")
 def dbsession() -> Iterator[Session]:
@@ -24,6 +27,55 @@ def tables(dbsession):
     yield
     dbsession.close()
     drop_all_tables()
+    # cached primary keys and update keys refer to rows that no longer exist.
+    clear_key_caches()
+    clear_recent_keys()
+
+
+@pytest.fixture
+def grainbin_info() -> dict:
+    """A grainbin update message for bus 1 of my_device_id, with two sensors."""
+
+    return {
+        "created_at": "2020-01-01 00:00:00",
+        "name": "my_device_id.01",
+        "bus_number": "1",
+        "bus_number_string": "bus.1",
+        "sensor_names": ["28.1234567890", "28.1234567891"],
+        "sensor_data": [
+            {
+                "sensor_name": "28.1234567890",
+                "temperature": "20.0",
+                "temphigh": "1",
+                "templow": "1",
+            },
+            {
+                "sensor_name": "28.1234567891",
+                "temperature": "21.0",
+                "temphigh": "1",
+                "templow": "2",
+            },
+        ],
+        "average_temp": "20.5",
+    }
+
+
+@pytest.fixture
+def device_info() -> dict:
+    """A device update message for my_device_id."""
+
+    return {
+        "id": "my_device_id",
+        "created_at": "2020-01-01 00:00:00",
+        "data": {
+            "hardware_version": "1.0.0",
+            "software_version": "1.0.0",
+            "grainbin_count": "1",
+            "interior_temp": "20.0",
+            "exterior_temp": "20.0",
+            "last_updated": "2020-01-01 00:00:00",
+        },
+    }
 
 
 @pytest.fixture
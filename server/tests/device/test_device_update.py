@@ -1,43 +1,34 @@
 """Tests for the device_update file."""
 
+import datetime as dt
+
 import pytest
 from fm_database.models.device import Device
-from sqlalchemy import select
+from fm_database.models.rollup import DeviceRollup
+from sqlalchemy import select, update
 
 from fm_server.device.device_update import get_or_create_device, process_device_update
 from fm_server.device.info_model import DeviceUpdate
+from fm_server.ingest.cache import clear_key_caches
 
 
 @pytest.mark.usefixtures("tables")
 class TestProcessDeviceUpdate:
     """Tests for the process_device_update function."""
 
-    info = {
-        "id": "device_id",
-        "created_at": "2020-01-01 00:00:00",
-        "data": {
-            "hardware_version": "1.0.0",
-            "software_version": "1.0.0",
-            "grainbin_count": "1",
-            "interior_temp": "20.0",
-            "exterior_temp": "20.0",
-            "last_updated": "2020-01-01 00:00:00",
-        },
-    }
-
-    def test_process_device_update(self):
+    def test_process_device_update(self, device_info):
         """Test the process_device_update function properly handles normal input."""
 
-        return_code = process_device_update(self.info)
+        return_code = process_device_update(device_info)
 
         assert return_code is True
 
-    def test_process_device_update_new_device(self, dbsession):
+    def test_process_device_update_new_device(self, dbsession, device_info):
         """Test the process_device_update function correctly creates a new device."""
 
-        process_device_update(self.info)
+        process_device_update(device_info)
 
-        update_data = DeviceUpdate.model_validate(self.info)
+        update_data = DeviceUpdate.model_validate(device_info)
 
         device = dbsession.scalars(
             select(Device).where(Device.device_id == update_data.id)
@@ -51,22 +42,58 @@ class TestProcessDeviceUpdate:
         assert device.last_update_received == update_data.data.last_updated
         assert device.total_updates == 1
 
-    def test_process_device_update_existing_device(self, dbsession):
+    def test_process_device_update_existing_device(self, dbsession, device_info):
         """Test the process_device_update function correctly updates an existing device."""
 
-        process_device_update(self.info)
+        process_device_update(device_info)
 
         device = dbsession.scalars(
-            select(Device).where(Device.device_id == "device_id")
+            select(Device).where(Device.device_id == "my_device_id")
         ).one_or_none()
         assert isinstance(device, Device)
         assert device.total_updates == 1
 
-        process_device_update(self.info)
+        process_device_update(dict(device_info, created_at="2020-01-01 00:01:00"))
 
         assert device.total_updates == 2
 
-    def test_process_device_update_invalid_temperatures(self, dbsession):
+    def test_process_device_update_key_cache_miss(self, dbsession, device_info):
+        """Test that last_updated moves when the device is updated by the upsert."""
+
+        process_device_update(device_info)
+        old = dt.datetime(2020, 1, 1)
+        dbsession.execute(update(Device).values(last_updated=old))
+        dbsession.commit()
+        clear_key_caches()
+
+        process_device_update(dict(device_info, created_at="2020-01-01 00:01:00"))
+
+        device = dbsession.scalars(select(Device)).one()
+        dbsession.refresh(device)
+        assert device.total_updates == 2
+        assert device.last_updated > old
+
+    def test_process_device_update_rollups(self, dbsession, device_info):
+        """Test the process_device_update function adds the temperatures to the rollups."""
+
+        process_device_update(device_info)
+        info = dict(device_info, created_at="2020-01-01 00:01:00")
+        info["data"] = dict(
+            device_info["data"], interior_temp="24.0", exterior_temp="U"
+        )
+        process_device_update(info)
+
+        rollup = dbsession.scalars(
+            select(DeviceRollup).where(DeviceRollup.period == "hour")
+        ).one()
+        assert rollup.interior_count == 2
+        assert rollup.interior_min == 20.0
+        assert rollup.interior_max == 24.0
+        assert rollup.interior_avg == 22.0
+        assert rollup.exterior_count == 1
+        assert rollup.exterior_avg == 20.0
+
+    def test_process_device_update_invalid_temperatures(self, dbsession, device_info):
         """Test the process_device_update function correctly handles invalid temperatures.
 
         The invalid temperature that can occur is the string 'U' which indicates
@@ -74,13 +101,13 @@ class TestProcessDeviceUpdate:
         should be set to None.
         """
 
-        self.info["data"]["interior_temp"] = "U"  # type: ignore[index]
-        self.info["data"]["exterior_temp"] = "U"  # type: ignore[index]
+        device_info["data"]["interior_temp"] = "U"
+        device_info["data"]["exterior_temp"] = "U"
 
-        return_code = process_device_update(self.info)
+        return_code = process_device_update(device_info)
 
         device = dbsession.scalars(
-            select(Device).where(Device.device_id == "device_id")
+            select(Device).where(Device.device_id == "my_device_id")
         ).one_or_none()
 
         assert isinstance(device, Device)
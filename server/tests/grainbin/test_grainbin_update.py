@@ -1,14 +1,22 @@
 """Tests for the grainbin_update module."""
 
+import datetime as dt
+
 import pytest
-from fm_database.models.device import Device, Grainbin
-from sqlalchemy import select
+from fm_database.database import engine
+from fm_database.models.device import Device, Grainbin, GrainbinLatestReading
+from fm_database.models.device import GrainbinUpdate as GrainbinUpdateDB
+from fm_database.models.rollup import GrainbinRollup
+from sqlalchemy import event, select, update
 
 from fm_server.grainbin.grainbin_update import (
+    add_grainbin_readings,
     get_or_create_grainbin,
+    grainbin_update_rows,
     process_grainbin_update,
 )
 from fm_server.grainbin.info_model import GrainbinUpdate
+from fm_server.ingest.cache import clear_key_caches
 
 from ..factories import DeviceFactory, GrainbinFactory
 
@@ -88,9 +96,82 @@ class TestProcessGrainbinUpdate:
         assert isinstance(grainbin, Grainbin)
         assert grainbin.total_updates == 1
 
+        process_grainbin_update(dict(self.info, created_at="2020-01-01 00:01:00"))
+
+        assert grainbin.total_updates == 2
+
+    def test_process_grainbin_update_key_cache_miss(self, dbsession):
+        """Test that last_updated moves when the grainbin is updated by the upsert."""
+
+        DeviceFactory(device_id="my_device_id")
         process_grainbin_update(self.info)
+        old = dt.datetime(2020, 1, 1)
+        dbsession.execute(update(Grainbin).values(last_updated=old))
+        dbsession.commit()
+        clear_key_caches()
 
+        process_grainbin_update(dict(self.info, created_at="2020-01-01 00:01:00"))
+
+        grainbin = dbsession.scalars(select(Grainbin)).one()
+        dbsession.refresh(grainbin)
         assert grainbin.total_updates == 2
+        assert grainbin.last_updated > old
+
+    def test_process_grainbin_update_rollups(self, dbsession):
+        """Test the process_grainbin_update function adds the readings to the rollups."""
+
+        DeviceFactory(device_id="my_device_id")
+
+        process_grainbin_update(self.info)
+        process_grainbin_update(dict(self.info, created_at="2020-01-01 00:30:00"))
+        process_grainbin_update(dict(self.info, created_at="2020-01-01 01:00:00"))
+
+        rollups = dbsession.scalars(
+            select(GrainbinRollup).order_by(
+                GrainbinRollup.period, GrainbinRollup.bucket
+            )
+        ).all()
+        assert [(rollup.period, rollup.bucket.hour) for rollup in rollups] == [
+            ("day", 0),
+            ("hour", 0),
+            ("hour", 1),
+        ]
+        day, first_hour, _ = rollups
+        assert day.temperature_count == 9
+        assert first_hour.temperature_count == 6
+        assert first_hour.temperature_min == 20.0
+        assert first_hour.temperature_max == 22.0
+        assert first_hour.temperature_avg == pytest.approx(21.0)
+        assert (first_hour.temphigh, first_hour.templow) == (50, 10)
+
+    def test_process_grainbin_update_latest_readings(self, dbsession):
+        """Test the process_grainbin_update function keeps the latest reading of each sensor."""
+
+        DeviceFactory(device_id="my_device_id")
+
+        process_grainbin_update(self.info)
+        later = dict(self.info, created_at="2020-01-01 00:30:00")
+        later["sensor_data"] = [
+            dict(sensor, temperature="30.0") for sensor in self.info["sensor_data"]
+        ]
+        process_grainbin_update(later)
+        # a redelivered first update does not replace the newer readings
+        process_grainbin_update(dict(self.info))
+
+        readings = dbsession.scalars(
+            select(GrainbinLatestReading).order_by(GrainbinLatestReading.sensor_name)
+        ).all()
+        assert [reading.sensor_name for reading in readings] == self.info[
+            "sensor_names"
+        ]
+        assert {reading.update_index for reading in readings} == {2}
+        assert {reading.temperature for reading in readings} == {30.0}
+        update_ids = dbsession.scalars(
+            select(GrainbinUpdateDB.id)
+            .where(GrainbinUpdateDB.update_index == 2)
+            .order_by(GrainbinUpdateDB.sensor_name)
+        ).all()
+        assert [reading.update_id for reading in readings] == update_ids
 
     def test_process_grainbin_update_no_device(self, caplog):
         """Test the process_grainbin_update function correctly handles a grainbin with no device."""
@@ -100,6 +181,56 @@ class TestProcessGrainbinUpdate:
         assert return_value is False
         assert "Device 'my_device_id' not found" in caplog.text
 
+    def test_process_grainbin_update_first_contact(self, dbsession):
+        """Test that a new grainbin costs one statement besides the readings and rollups.
+
+        The rollups and latest readings of the readings are one statement each.
+        """
+
+        DeviceFactory(device_id="my_device_id")
+        dbsession.commit()
+        # the device is looked up once, then cached.
+        process_grainbin_update(self.info)
+
+        statements: list[str] = []
+
+        # pylint: disable=unused-argument,too-many-arguments
+        def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            for bus_number in range(2, 12):
+                info = dict(
+                    self.info,
+                    bus_number=str(bus_number),
+                    bus_number_string=f"bus.{bus_number}",
+                )
+                assert process_grainbin_update(info) is True
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+        upserts = [
+            statement
+            for statement in statements
+            if statement.startswith("INSERT INTO grainbin ")
+        ]
+        rollups = [
+            statement
+            for statement in statements
+            if statement.startswith("INSERT INTO grainbin_rollup ")
+        ]
+        assert len(upserts) == 10
+        latest = [
+            statement
+            for statement in statements
+            if statement.startswith("INSERT INTO grainbin_latest_reading ")
+        ]
+        assert len(rollups) == 10
+        assert len(latest) == 10
+        assert len(statements) == 40
+        assert len(dbsession.scalars(select(Grainbin)).all()) == 11
+
     def test_process_grainbin_update_invalid_temperature(self, dbsession):
         """Test the process_grainbin_update function correctly handles invalid temperature data."""
 
@@ -115,9 +246,11 @@ class TestProcessGrainbinUpdate:
 
         assert return_value is True
         assert isinstance(grainbin, Grainbin)
-        assert grainbin.updates[0].temperature is None
-        assert grainbin.updates[1].temperature == 21.0
-        assert grainbin.updates[2].temperature == 22.0
+        # the updates relationship is not ordered, so order them as inserted
+        updates = sorted(grainbin.updates, key=lambda update: update.id)
+        assert updates[0].temperature is None
+        assert updates[1].temperature == 21.0
+        assert updates[2].temperature == 22.0
 
 
 @pytest.mark.usefixtures("tables")
@@ -147,3 +280,56 @@ class TestGetOrCreateGrainbin:
 
         assert device.device_id == grainbin.device_id_str
         assert retrieved.id == grainbin.id
+
+
+@pytest.mark.usefixtures("tables")
+class TestAddGrainbinReadings:
+    """Tests for the add_grainbin_readings function."""
+
+    update_data = GrainbinUpdate.model_validate(TestProcessGrainbinUpdate.info)
+
+    def test_add_grainbin_readings_bulk(self, dbsession):
+        """Test the default path inserts a row per sensor without ORM objects."""
+
+        grainbin = GrainbinFactory()
+
+        rows = grainbin_update_rows(grainbin.id, 1, self.update_data)
+        returned = add_grainbin_readings(dbsession, rows)
+        dbsession.commit()
+
+        updates = dbsession.scalars(
+            select(GrainbinUpdateDB).where(GrainbinUpdateDB.grainbin_id == grainbin.id)
+        ).all()
+
+        assert returned == 3
+        assert not dbsession.new
+        assert len(updates) == 3
+        assert {update.sensor_name for update in updates} == set(
+            self.update_data.sensor_names
+        )
+        assert all(update.update_index == 1 for update in updates)
+
+    def test_add_grainbin_readings_duplicate(self, dbsession):
+        """Test that readings that are stored already are skipped."""
+
+        grainbin = GrainbinFactory()
+        rows = grainbin_update_rows(grainbin.id, 1, self.update_data)
+        add_grainbin_readings(dbsession, rows)
+
+        assert add_grainbin_readings(dbsession, rows) == 0
+
+    def test_add_grainbin_readings_use_orm(self, dbsession):
+        """Test that an ORM object is added per row when requested."""
+
+        grainbin = GrainbinFactory()
+
+        rows = grainbin_update_rows(grainbin.id, 1, self.update_data)
+        returned = add_grainbin_readings(dbsession, rows, use_orm=True)
+        added = [
+            update for update in dbsession.new if isinstance(update, GrainbinUpdateDB)
+        ]
+        dbsession.commit()
+
+        assert returned == 3
+        assert len(added) == 3
+        assert all(update.id is not None for update in added)
@@ -5,8 +5,15 @@
 # mypy: disable-error-code="arg-type,list-item"
 
 import pytest
+from pydantic import ValidationError
 
-from fm_server.grainbin.info_model import GrainbinUpdate, GrainbinUpdateSensorData
+from fm_server.grainbin.info_model import (
+    GrainbinUpdate,
+    GrainbinUpdateSensorData,
+    LeanGrainbinUpdate,
+    SensorReading,
+    validate_grainbin_update,
+)
 
 
 class TestGrainbinUpdateSensorDataModel:
@@ -73,3 +80,42 @@ class TestGrainbinUpdateDataModel:
         )
 
         assert data.device_id == "my_device_id"
+
+
+class TestValidateGrainbinUpdate:
+    """Test the validate_grainbin_update function."""
+
+    @staticmethod
+    def test_validate_grainbin_update(grainbin_info):
+        """Test that the update is validated into the model."""
+
+        update = validate_grainbin_update(grainbin_info)
+
+        assert update == GrainbinUpdate.model_validate(grainbin_info)
+
+    @staticmethod
+    def test_validate_grainbin_update_lean(grainbin_info):
+        """Test that lean mode gives the same values as plain tuples."""
+
+        grainbin_info["sensor_data"][1]["temperature"] = "U"
+        update = validate_grainbin_update(grainbin_info, lean=True)
+        model = GrainbinUpdate.model_validate(grainbin_info)
+
+        assert isinstance(update, LeanGrainbinUpdate)
+        assert update.device_id == model.device_id == "my_device_id"
+        assert update.created_at == model.created_at
+        assert update.bus_number == model.bus_number == 1
+        assert update.average_temp == model.average_temp
+        assert update.sensor_data == [
+            SensorReading("28.1234567890", 20.0, 1, 1),
+            SensorReading("28.1234567891", None, 1, 2),
+        ]
+
+    @staticmethod
+    def test_validate_grainbin_update_lean_invalid(grainbin_info):
+        """Test that lean mode still rejects an invalid temperature."""
+
+        grainbin_info["sensor_data"][0]["temperature"] = "invalid"
+
+        with pytest.raises(ValidationError):
+            validate_grainbin_update(grainbin_info, lean=True)
@@ -0,0 +1,120 @@
+"""Tests for the ingest buffer module."""
+
+import threading
+
+import pytest
+from fm_database.models.device import Device, DeviceUpdate
+from sqlalchemy import func, select
+
+from fm_server.device.device_update import process_device_update, save_device_update
+from fm_server.device.info_model import DeviceUpdate as DeviceUpdateModel
+from fm_server.ingest.buffer import IngestBuffer
+from fm_server.settings import get_config
+
+
+def device_updates(device_info: dict, count: int) -> list[DeviceUpdateModel]:
+    """Return validated device updates for count devices."""
+
+    return [
+        DeviceUpdateModel.model_validate(dict(device_info, id=f"device_{number}"))
+        for number in range(count)
+    ]
+
+
+def submit_in_threads(buffer: IngestBuffer, save_function, updates: list) -> list:
+    """Submit each update from its own thread and return the results."""
+
+    results: list = [None] * len(updates)
+
+    def submit(position, update_data):
+        try:
+            results[position] = buffer.submit(save_function, update_data, 1)
+        # pylint: disable=broad-exception-caught
+        except Exception as error:  # noqa: B902
+            results[position] = error
+
+    threads = [
+        threading.Thread(target=submit, args=(position, update_data))
+        for position, update_data in enumerate(updates)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@pytest.mark.usefixtures("tables")
+class TestIngestBuffer:
+    """Tests for the IngestBuffer class."""
+
+    def test_submit_flushes_on_interval(self, dbsession, device_info):
+        """Test that updates waiting together are saved in a single flush."""
+
+        buffer = IngestBuffer(flush_interval_ms=500, flush_rows=100, max_rows=100)
+        updates = device_updates(device_info, 5)
+
+        results = submit_in_threads(buffer, save_device_update, updates)
+        buffer.close()
+
+        # pylint: disable=not-callable
+        stored = dbsession.scalar(select(func.count()).select_from(DeviceUpdate))
+        assert results == [True] * 5
+        assert stored == 5
+        assert buffer.flush_stats.count == 1
+        assert buffer.stats()["flushed_updates"] == 5
+        assert buffer.stats()["depth"] == 0
+
+    def test_submit_flushes_on_rows(self, device_info):
+        """Test that the buffer is flushed once flush_rows rows are waiting."""
+
+        buffer = IngestBuffer(flush_interval_ms=60_000, flush_rows=2, max_rows=2)
+        updates = device_updates(device_info, 4)
+
+        results = submit_in_threads(buffer, save_device_update, updates)
+        buffer.close()
+
+        assert results == [True] * 4
+        assert buffer.flush_stats.count == 2
+        assert buffer.flush_stats.last_latency_ms > 0
+
+    def test_submit_failing_update(self, dbsession, device_info):
+        """Test that a failing update does not fail the rest of the batch."""
+
+        def save_or_fail(session, update_data):
+            if update_data.id == "device_1":
+                raise ValueError("bad update")
+            return save_device_update(session, update_data)
+
+        buffer = IngestBuffer(flush_interval_ms=500, flush_rows=100, max_rows=100)
+        updates = device_updates(device_info, 3)
+
+        results = submit_in_threads(buffer, save_or_fail, updates)
+        buffer.close()
+
+        assert results[0] is True
+        assert isinstance(results[1], ValueError)
+        assert results[2] is True
+        assert dbsession.scalars(select(Device.device_id)).all() == [
+            "device_0",
+            "device_2",
+        ]
+
+
+@pytest.mark.usefixtures("tables")
+def test_process_device_update_buffered(dbsession, monkeypatch, device_info):
+    """Test that process_device_update uses the ingest buffer in buffered mode."""
+
+    buffer = IngestBuffer(flush_interval_ms=10, flush_rows=100, max_rows=100)
+    monkeypatch.setattr(get_config(), "INGEST_MODE", "buffered")
+    monkeypatch.setattr(
+        "fm_server.device.device_update.get_ingest_buffer", lambda: buffer
+    )
+
+    return_code = process_device_update(device_info)
+    buffer.close()
+
+    device = dbsession.scalars(select(Device)).one()
+    assert return_code is True
+    assert device.total_updates == 1
+    assert buffer.flush_stats.count == 1
@@ -0,0 +1,171 @@
+"""Tests for the ingest key cache module."""
+
+from contextlib import contextmanager
+
+import pytest
+from fm_database.database import engine
+from fm_database.models.device import Device, Grainbin, GrainbinUpdate
+from sqlalchemy import delete, event, func, select
+
+from fm_server.grainbin.grainbin_update import process_grainbin_update
+from fm_server.ingest.cache import (
+    KeyCache,
+    get_device_cache,
+    get_grainbin_cache,
+    key_cache_stats,
+)
+
+from ..factories import DeviceFactory, GrainbinFactory
+
+LATER = "2020-01-01 00:01:00"
+
+
+@contextmanager
+def count_selects():
+    """Count the SELECT statements executed in the block."""
+
+    statements: list[str] = []
+
+    # pylint: disable=unused-argument,too-many-arguments
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+class TestKeyCache:
+    """Tests for the KeyCache class."""
+
+    @staticmethod
+    def test_key_cache_hits_and_misses():
+        """Test that lookups are counted as hits and misses."""
+
+        cache = KeyCache("test", 10)
+        assert cache.get("a") is None
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    @staticmethod
+    def test_key_cache_evicts_least_recently_used():
+        """Test that the least recently used entry is evicted when full."""
+
+        cache = KeyCache("test", 2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert len(cache) == 2
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+
+    @staticmethod
+    def test_key_cache_disabled():
+        """Test that nothing is cached when the size is 0."""
+
+        cache = KeyCache("test", 0)
+        cache.set("a", 1)
+
+        assert cache.get("a") is None
+
+
+@pytest.mark.usefixtures("tables")
+class TestIngestKeyCache:
+    """Tests for the key caches in the ingest path."""
+
+    @staticmethod
+    def test_steady_state_needs_no_lookup_queries(dbsession, grainbin_info):
+        """Test that a cached grainbin update runs no SELECT statements."""
+
+        DeviceFactory(device_id="my_device_id")
+        dbsession.commit()
+        process_grainbin_update(grainbin_info)
+
+        with count_selects() as statements:
+            assert (
+                process_grainbin_update(dict(grainbin_info, created_at=LATER)) is True
+            )
+
+        grainbin = dbsession.scalars(select(Grainbin)).one()
+        assert not statements
+        assert grainbin.total_updates == 2
+        assert key_cache_stats()["grainbin"]["hits"] == 1
+
+    @staticmethod
+    def test_deleted_grainbin_is_invalidated(dbsession, grainbin_info):
+        """Test that deleting a grainbin with the ORM removes it from the cache."""
+
+        DeviceFactory(device_id="my_device_id")
+        dbsession.commit()
+        process_grainbin_update(grainbin_info)
+
+        grainbin = dbsession.scalars(select(Grainbin)).one()
+        dbsession.execute(
+            delete(GrainbinUpdate).where(GrainbinUpdate.grainbin_id == grainbin.id)
+        )
+        grainbin.delete()
+
+        assert get_grainbin_cache().get(("my_device_id", 1)) is None
+
+    @staticmethod
+    def test_rekeyed_grainbin_is_invalidated(dbsession):
+        """Test that changing the bus_number of a grainbin invalidates its old key."""
+
+        grainbin = GrainbinFactory(bus_number=1)
+        dbsession.commit()
+        key = (grainbin.device_id_str, 1)
+        get_grainbin_cache().set(key, grainbin.id)
+
+        grainbin.bus_number = 2
+        dbsession.commit()
+
+        assert get_grainbin_cache().get(key) is None
+
+    @staticmethod
+    def test_deleted_device_invalidates_its_grainbins(dbsession):
+        """Test that deleting a device removes it and its grainbins from the cache."""
+
+        device = DeviceFactory(device_id="my_device_id")
+        dbsession.commit()
+        get_device_cache().set("my_device_id", device.id)
+        get_grainbin_cache().set(("my_device_id", 1), 1)
+        get_grainbin_cache().set(("other_device_id", 1), 2)
+
+        device.delete()
+
+        assert get_device_cache().get("my_device_id") is None
+        assert get_grainbin_cache().get(("my_device_id", 1)) is None
+        assert get_grainbin_cache().get(("other_device_id", 1)) == 2
+
+    @staticmethod
+    def test_stale_entry_is_healed(dbsession, grainbin_info):
+        """Test that a cached key for a row deleted elsewhere falls back to a lookup."""
+
+        DeviceFactory(device_id="my_device_id")
+        dbsession.commit()
+        process_grainbin_update(grainbin_info)
+
+        # delete without the ORM, as another process would.
+        dbsession.execute(delete(GrainbinUpdate))
+        dbsession.execute(delete(Grainbin))
+        dbsession.commit()
+
+        assert process_grainbin_update(dict(grainbin_info, created_at=LATER)) is True
+
+        grainbin = dbsession.scalars(select(Grainbin)).one()
+        # pylint: disable=not-callable
+        readings = dbsession.scalar(select(func.count()).select_from(GrainbinUpdate))
+        assert grainbin.total_updates == 1
+        assert readings == 2
+        assert get_grainbin_cache().get(("my_device_id", 1)) == grainbin.id
+        assert dbsession.scalar(select(func.count()).select_from(Device)) == 1
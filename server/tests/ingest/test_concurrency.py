@@ -0,0 +1,107 @@
+"""Stress test the update_index allocation with concurrent worker processes.
+
+Many processes send updates for the same grainbin and device at once, the way
+Celery workers with a concurrency above 1 do. Every update must get its own
+update_index. The load can be increased with the FM_SERVER_STRESS_PROCESSES
+and FM_SERVER_STRESS_UPDATES env variables.
+
+SQLite runs one writer at a time, so the race only exists on PostgreSQL and the
+test is skipped on other databases.
+"""
+
+import datetime as dt
+import multiprocessing
+import multiprocessing.synchronize
+import os
+
+import pytest
+from fm_database.database import engine, get_session
+from fm_database.models.device import Device, DeviceUpdate, Grainbin, GrainbinUpdate
+from sqlalchemy import func, select
+
+from fm_server.device.device_update import process_device_update
+from fm_server.grainbin.grainbin_update import process_grainbin_update
+from fm_server.ingest.cache import clear_key_caches
+
+from ..factories import GrainbinFactory
+
+PROCESSES = int(os.environ.get("FM_SERVER_STRESS_PROCESSES", 4))
+UPDATES = int(os.environ.get("FM_SERVER_STRESS_UPDATES", 25))
+
+postgresql_only = pytest.mark.skipif(
+    engine.dialect.name != "postgresql", reason="SQLite serializes the writers"
+)
+
+START_TIME = dt.datetime(2020, 1, 1)
+
+
+def send_updates(
+    start: multiprocessing.synchronize.Event,
+    worker: int,
+    updates: int,
+    messages: tuple[dict, dict],
+) -> int:
+    """Send the grainbin and device messages, each time with a new timestamp."""
+
+    # connections of the parent process must not be used after the fork.
+    get_session().remove()
+    engine.dispose(close=False)
+    clear_key_caches()
+
+    start.wait()
+    sent = 0
+    for number in range(updates):
+        created_at = START_TIME + dt.timedelta(minutes=worker * updates + number)
+        grainbin_info, device_info = (
+            dict(message, created_at=created_at.isoformat(sep=" "))
+            for message in messages
+        )
+        sent += process_grainbin_update(grainbin_info)
+        sent += process_device_update(device_info)
+    get_session().remove()
+    return sent
+
+
+@postgresql_only
+@pytest.mark.usefixtures("tables")
+def test_concurrent_updates_get_unique_indexes(dbsession, grainbin_info, device_info):
+    """Test that concurrent updates for one grainbin and device never share an index."""
+
+    # also creates the device
+    GrainbinFactory(device_id_str=device_info["id"], bus_number=1)
+    dbsession.commit()
+    dbsession.remove()
+    engine.dispose()
+
+    context = multiprocessing.get_context("fork")
+    start = context.Manager().Event()
+    with context.Pool(PROCESSES) as pool:
+        results = [
+            pool.apply_async(
+                send_updates, (start, worker, UPDATES, (grainbin_info, device_info))
+            )
+            for worker in range(PROCESSES)
+        ]
+        start.set()
+        sent = sum(result.get(timeout=300) for result in results)
+
+    expected = PROCESSES * UPDATES
+    assert sent == 2 * expected
+
+    grainbin = dbsession.scalars(select(Grainbin)).one()
+    device = dbsession.scalars(select(Device)).one()
+    assert grainbin.total_updates == expected
+    assert device.total_updates == expected
+
+    # pylint: disable=not-callable
+    grainbin_indexes = dbsession.execute(
+        select(GrainbinUpdate.update_index, func.count()).group_by(
+            GrainbinUpdate.update_index
+        )
+    ).all()
+    assert sorted(grainbin_indexes) == [
+        (index, len(grainbin_info["sensor_data"])) for index in range(1, expected + 1)
+    ]
+
+    device_indexes = dbsession.scalars(select(DeviceUpdate.update_index)).all()
+    assert sorted(device_indexes) == list(range(1, expected + 1))
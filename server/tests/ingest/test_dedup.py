@@ -0,0 +1,99 @@
+"""Tests for the ingest dedup module."""
+
+import pytest
+from fm_database.models.device import Device, DeviceUpdate, Grainbin, GrainbinUpdate
+from fm_database.models.rollup import GrainbinRollup
+from sqlalchemy import func, select
+
+from fm_server.device.device_update import process_device_update
+from fm_server.grainbin.grainbin_update import process_grainbin_update
+from fm_server.ingest.dedup import (
+    RecentKeys,
+    clear_recent_keys,
+    get_recent_grainbin_updates,
+)
+
+from ..factories import DeviceFactory
+
+
+def count(dbsession, model) -> int:
+    """Return the number of rows of model."""
+
+    # pylint: disable=not-callable
+    rows: int = dbsession.scalar(select(func.count()).select_from(model))
+    return rows
+
+
+def test_recent_keys():
+    """Test that stored keys are rejected and the oldest keys are forgotten."""
+
+    recent_keys = RecentKeys("test", 2)
+    recent_keys.add("a")
+    recent_keys.add("b")
+    recent_keys.add("c")
+
+    assert recent_keys.seen("a") is False
+    assert recent_keys.seen("c") is True
+    assert recent_keys.stats() == {"size": 2, "max_size": 2, "rejected": 1}
+
+
+@pytest.mark.usefixtures("tables")
+class TestDuplicateUpdates:
+    """Tests for redelivered device and grainbin updates."""
+
+    @staticmethod
+    def test_duplicate_rejected_by_filter(dbsession, grainbin_info):
+        """Test that a redelivered grainbin update is dropped by the filter."""
+
+        DeviceFactory(device_id="my_device_id")
+        dbsession.commit()
+
+        assert process_grainbin_update(grainbin_info) is True
+        assert process_grainbin_update(grainbin_info) is True
+
+        grainbin = dbsession.scalars(select(Grainbin)).one()
+        assert grainbin.total_updates == 1
+        assert count(dbsession, GrainbinUpdate) == 2
+        assert get_recent_grainbin_updates().stats()["rejected"] == 1
+
+    @staticmethod
+    def test_duplicate_grainbin_update_rejected_by_database(dbsession, grainbin_info):
+        """Test that a grainbin update redelivered to another worker is not stored twice."""
+
+        DeviceFactory(device_id="my_device_id")
+        dbsession.commit()
+
+        process_grainbin_update(grainbin_info)
+        # another worker process does not know the key.
+        clear_recent_keys()
+        assert process_grainbin_update(grainbin_info) is True
+
+        grainbin = dbsession.scalars(select(Grainbin)).one()
+        assert grainbin.total_updates == 1
+        assert count(dbsession, GrainbinUpdate) == 2
+        rollups = dbsession.scalars(select(GrainbinRollup)).all()
+        assert [rollup.temperature_count for rollup in rollups] == [1, 1, 1, 1]
+
+    @staticmethod
+    def test_duplicate_device_update_rejected_by_database(dbsession, device_info):
+        """Test that a device update redelivered to another worker is not stored twice."""
+
+        process_device_update(device_info)
+        clear_recent_keys()
+        assert process_device_update(device_info) is True
+
+        device = dbsession.scalars(select(Device)).one()
+        assert device.total_updates == 1
+        assert count(dbsession, DeviceUpdate) == 1
+
+    @staticmethod
+    def test_failed_update_is_not_remembered(dbsession, grainbin_info):
+        """Test that the key of an update that was not stored is not remembered."""
+
+        assert process_grainbin_update(grainbin_info) is False
+
+        DeviceFactory(device_id="my_device_id")
+        dbsession.commit()
+
+        assert process_grainbin_update(grainbin_info) is True
+        assert count(dbsession, GrainbinUpdate) == 2
@@ -0,0 +1,129 @@
+"""Tests for the ingest live module."""
+
+# pylint: disable=redefined-outer-name
+
+import datetime as dt
+
+import pytest
+from fm_database.models.device import Device, Grainbin
+from sqlalchemy import select
+
+from fm_server.device.device_update import process_device_update
+from fm_server.grainbin.grainbin_update import process_grainbin_update
+from fm_server.ingest.dedup import clear_recent_keys
+from fm_server.ingest.live import device_event, grainbin_event, queue_live_event
+from fm_server.settings import get_config
+
+from ..factories import DeviceFactory
+
+
+@pytest.fixture
+def published(monkeypatch):
+    """Enable the live events and return the list of the published events."""
+
+    events: list[dict] = []
+    monkeypatch.setattr(get_config(), "LIVE_EVENTS", True)
+    monkeypatch.setattr("fm_server.ingest.live.publish_live_events", events.extend)
+    return events
+
+
+def test_grainbin_event():
+    """Test the event of a grainbin update."""
+
+    rows = [
+        {
+            "timestamp": dt.datetime(2024, 1, 1, 12),
+            "sensor_name": "28.1",
+            "temperature": 20.5,
+            "temphigh": 1,
+            "templow": 2,
+        }
+    ]
+
+    assert grainbin_event(3, "my_device_id", 7, rows) == {
+        "type": "grainbin",
+        "id": 3,
+        "device_id": "my_device_id",
+        "update_index": 7,
+        "timestamp": "2024-01-01T12:00:00",
+        "readings": [
+            {"sensor_name": "28.1", "temperature": 20.5, "temphigh": 1, "templow": 2}
+        ],
+    }
+
+
+@pytest.mark.usefixtures("tables")
+class TestLiveEvents:
+    """Tests for the live events of the stored updates."""
+
+    @staticmethod
+    def test_grainbin_update_published_after_commit(
+        dbsession, published, grainbin_info
+    ):
+        """Test that a stored grainbin update is published once committed."""
+
+        DeviceFactory(device_id="my_device_id")
+        dbsession.commit()
+
+        assert process_grainbin_update(grainbin_info) is True
+
+        grainbin = dbsession.query(Grainbin).one()
+        assert len(published) == 1
+        assert published[0]["type"] == "grainbin"
+        assert published[0]["id"] == grainbin.id
+        assert published[0]["update_index"] == 1
+        assert [reading["temperature"] for reading in published[0]["readings"]] == [
+            20.0,
+            21.0,
+        ]
+
+    @staticmethod
+    def test_duplicate_update_not_published(dbsession, published, grainbin_info):
+        """Test that a redelivered update that is not stored is not published."""
+
+        DeviceFactory(device_id="my_device_id")
+        dbsession.commit()
+
+        process_grainbin_update(grainbin_info)
+        clear_recent_keys()
+        process_grainbin_update(grainbin_info)
+
+        assert len(published) == 1
+
+    @staticmethod
+    def test_device_update_published(dbsession, published, device_info):
+        """Test that a stored device update is published once committed."""
+
+        assert process_device_update(device_info) is True
+
+        device = dbsession.query(Device).one()
+        assert published == [
+            device_event(
+                device.id,
+                "my_device_id",
+                1,
+                dt.datetime(2020, 1, 1),
+                {"interior_temp": 20.0, "exterior_temp": 20.0},
+            )
+        ]
+
+    @staticmethod
+    def test_rolled_back_events_dropped(dbsession, published):
+        """Test that the events of a rolled back transaction are not published."""
+
+        dbsession.execute(select(Device))
+        queue_live_event(dbsession, {"type": "device"})
+        dbsession.rollback()
+        dbsession.commit()
+
+        assert not published
+
+    @staticmethod
+    def test_disabled(dbsession, published, monkeypatch):
+        """Test that no events are queued when the live events are disabled."""
+
+        monkeypatch.setattr(get_config(), "LIVE_EVENTS", False)
+        queue_live_event(dbsession, {"type": "device"})
+        dbsession.commit()
+
+        assert not published
@@ -0,0 +1,107 @@
+"""Tests for the ingest routing module."""
+
+# pylint: disable=redefined-outer-name,unused-argument
+
+import threading
+
+import pytest
+from celery import Celery
+from celery.contrib.testing.worker import start_worker
+from kombu import Connection
+
+from fm_server.celery_runner import app
+from fm_server.settings import get_config
+
+QUEUES = ("control", "ingest", "celery")
+
+
+@pytest.fixture
+def memory_broker(monkeypatch, tmp_path):
+    """Use the in-memory broker of kombu for the tasks of the server."""
+
+    monkeypatch.setattr(get_config(), "CELERY_LOG_FILE", str(tmp_path / "celery.log"))
+    monkeypatch.setattr(app.conf, "broker_url", "memory://")
+    monkeypatch.setattr(app.conf, "result_backend", "cache+memory://")
+    monkeypatch.setattr(app, "_pool", None)
+    monkeypatch.setattr(app.amqp, "_producer_pool", None)
+    yield
+    with Connection("memory://") as connection:
+        for queue in QUEUES:
+            connection.SimpleQueue(queue).clear()
+
+
+@pytest.fixture
+def device_app() -> Celery:
+    """A Celery app with the default configuration that a device publishes with."""
+
+    return Celery("device", broker="memory://")
+
+
+@pytest.fixture
+def processed(monkeypatch) -> dict[str, threading.Event]:
+    """Record which tasks ran instead of processing them."""
+
+    events = {"device.create": threading.Event(), "grainbin.update": threading.Event()}
+
+    def device_status(device_id):
+        events["device.create"].set()
+        return "connected"
+
+    def grainbin_update(info):
+        events["grainbin.update"].set()
+        return True
+
+    monkeypatch.setattr("fm_server.device.tasks.get_device_status", device_status)
+    monkeypatch.setattr(
+        "fm_server.grainbin.tasks.process_grainbin_update", grainbin_update
+    )
+    return events
+
+
+def queued_tasks(queue: str) -> list[str]:
+    """Return the names of the tasks that are waiting in the queue."""
+
+    names = []
+    with Connection("memory://") as connection:
+        simple_queue = connection.SimpleQueue(queue)
+        while simple_queue.qsize():
+            message = simple_queue.get(timeout=1)
+            names.append(message.headers["task"])
+            message.ack()
+    return names
+
+
+@pytest.mark.usefixtures("memory_broker")
+def test_device_tasks_publish_to_default_queue(device_app):
+    """Test that a device publishes its tasks to the default queue."""
+
+    device_app.send_task("device.create", args=[{"id": "my_device_id"}])
+    device_app.send_task("grainbin.update", args=[{"name": "my_device_id.01"}])
+
+    assert queued_tasks("celery") == ["device.create", "grainbin.update"]
+
+
+@pytest.mark.usefixtures("memory_broker")
+def test_updates_are_forwarded_from_default_queue(device_app, processed):
+    """Test that a worker on the default queue runs control tasks, not updates."""
+
+    for _ in range(3):
+        device_app.send_task("grainbin.update", args=[{"name": "my_device_id.01"}])
+    device_app.send_task("device.create", args=[{"id": "my_device_id"}])
+
+    with start_worker(app, perform_ping_check=False, queues=["celery"]):
+        assert processed["device.create"].wait(timeout=5)
+
+    assert not processed["grainbin.update"].is_set()
+    assert not queued_tasks("celery")
+    assert queued_tasks("ingest") == ["grainbin.update"] * 3
+
+
+@pytest.mark.usefixtures("memory_broker")
+def test_forwarded_updates_are_processed(device_app, processed):
+    """Test that an update of a device is processed from the ingest queue."""
+
+    device_app.send_task("grainbin.update", args=[{"name": "my_device_id.01"}])
+
+    with start_worker(app, perform_ping_check=False, queues=["celery", "ingest"]):
+        assert processed["grainbin.update"].wait(timeout=5)
@@ -0,0 +1,33 @@
+"""Tests for the maintenance tasks module."""
+
+import datetime as dt
+
+import pytest
+from fm_database.models.device import DeviceUpdate
+from sqlalchemy import select
+
+from fm_server.maintenance.tasks import prune_old_rows
+
+from ..factories import DeviceFactory
+
+
+@pytest.mark.usefixtures("tables")
+def test_prune_old_rows(dbsession):
+    """Test that the device updates older than the retention policy are deleted."""
+
+    device = DeviceFactory()
+    dbsession.commit()
+    now = dt.datetime.now()
+    for update_index, days in enumerate([1, 364, 366, 400]):
+        update = DeviceUpdate(device.id)
+        update.timestamp = now - dt.timedelta(days=days)
+        update.update_index = update_index
+        dbsession.add(update)
+    dbsession.commit()
+
+    deleted = prune_old_rows()
+
+    assert deleted == {"grainbin_update": 0, "device_update": 2, "message": 0}
+    dbsession.expire_all()
+    indexes = dbsession.scalars(select(DeviceUpdate.update_index)).all()
+    assert sorted(indexes) == [0, 1]